@@ -3,10 +3,10 @@
 FastAPI implementation with versioning, authentication, and OpenAPI docs
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, Header
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
@@ -15,11 +15,19 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from dotenv import load_dotenv
 from pathlib import Path
+import asyncio
 import bcrypt
 import jwt
 import os
 import uuid
 
+from db_indexes import start_index_reconciliation
+from fast_json import FastJSONResponse, NO_ID
+from pagination import fetch_page, reject_offset_params
+from query_compiler import search_words_update, with_search_words
+from query_profiler import profiler, QueryProfilerMiddleware
+from metrics import MetricsMiddleware, lag_probe, pool_listener, render_metrics
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -33,8 +41,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 # MongoDB connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "test_database")
-mongo_client = AsyncIOMotorClient(MONGO_URL)
+mongo_client = AsyncIOMotorClient(MONGO_URL, event_listeners=[profiler, pool_listener])
 db = mongo_client[DB_NAME]
+profiler.db = db
 
 # ==================== APP INITIALIZATION ====================
 
@@ -44,9 +53,13 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=FastJSONResponse
 )
 
+app.add_middleware(QueryProfilerMiddleware, profiler=profiler)
+app.add_middleware(MetricsMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -59,6 +72,21 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
+index_reconciliation: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global index_reconciliation
+    # Held here: the event loop keeps only a weak reference to its tasks
+    index_reconciliation = start_index_reconciliation(db)
+    lag_probe.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    lag_probe.stop()
+    if index_reconciliation is not None:
+        index_reconciliation.cancel()
+
 # ==================== ENUMS ====================
 
 class UserRole(str, Enum):
@@ -191,6 +219,11 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # ==================== API v1 PREFIX ====================
 
 from fastapi import APIRouter
@@ -243,7 +276,7 @@ async def register(request: RegisterRequest):
     }
     
     # Insert into database
-    result = await db.users.insert_one(user_doc)
+    result = await db.users.insert_one(with_search_words("users", user_doc))
     
     # Prepare user data for response (without password)
     user_data = {
@@ -333,7 +366,7 @@ async def update_my_profile(
     # Update database
     await db.users.update_one(
         {"email": current_user["email"]},
-        {"$set": updates}
+        search_words_update("users", current_user, {"$set": updates})
     )
     
     return {"success": True, "message": "Profile updated", "data": updates}
@@ -480,7 +513,7 @@ async def accept_squad_request(
 async def get_my_squad(current_user: Dict = Depends(get_current_user)):
     """Get my squad list"""
     # Get squad members
-    squad_docs = await db.squad.find({"user_id": current_user["id"]}).to_list(1000)
+    squad_docs = await db.squad.find({"user_id": current_user["id"]}, {"squad_member_id": 1}).to_list(1000)
     squad_ids = [doc["squad_member_id"] for doc in squad_docs]
     
     # Get user details for squad members
@@ -499,21 +532,21 @@ async def get_my_squad(current_user: Dict = Depends(get_current_user)):
     pending_sent = await db.squad_requests.find({
         "from_user_id": current_user["id"],
         "status": "pending"
-    }).to_list(100)
+    }, NO_ID).to_list(100)
     
     pending_received = await db.squad_requests.find({
         "to_user_id": current_user["id"],
         "status": "pending"
-    }).to_list(100)
+    }, NO_ID).to_list(100)
     
-    return {
+    return FastJSONResponse({
         "success": True,
         "data": {
             "squad": squad_members,
             "pending_sent": pending_sent,
             "pending_received": pending_received
         }
-    }
+    })
 
 class CreateThreadRequest(BaseModel):
     name: Optional[str] = None
@@ -550,46 +583,37 @@ async def get_chat_threads(current_user: Dict = Depends(get_current_user)):
     """Get all chat threads for current user"""
     threads = await db.chat_threads.find({
         "participants": current_user["id"]
-    }).sort("last_message_at", -1).to_list(100)
-    
-    for thread in threads:
-        thread['_id'] = str(thread['_id'])
+    }, NO_ID).sort("last_message_at", -1).to_list(100)
     
-    return {"success": True, "data": {"threads": threads}}
+    return FastJSONResponse({"success": True, "data": {"threads": threads}})
 
 @api_v1.get("/chat/threads/{thread_id}/messages", tags=["Chat"])
 async def get_thread_messages(
     thread_id: str,
-    page: int = 1,
+    request: Request,
+    cursor: Optional[str] = None,
     page_size: int = 50,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Get messages from a thread"""
+    """Get messages from a thread, newest first; pass next_cursor back to page"""
+    reject_offset_params(request.query_params)
     # Verify user is participant
     thread = await db.chat_threads.find_one({"id": thread_id})
     if not thread or current_user["id"] not in thread["participants"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Fetch messages
-    skip = (page - 1) * page_size
-    messages = await db.chat_messages.find({
-        "thread_id": thread_id
-    }).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
+    messages, next_cursor = await fetch_page(db.chat_messages, {"thread_id": thread_id}, cursor, page_size)
     
-    total = await db.chat_messages.count_documents({"thread_id": thread_id})
-    
-    for message in messages:
-        message['_id'] = str(message['_id'])
-    
-    return {
+    return FastJSONResponse({
         "success": True,
         "data": {
             "messages": messages,
-            "page": page,
             "page_size": page_size,
-            "total": total
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
-    }
+    })
 
 class SendMessageRequest(BaseModel):
     content: str
@@ -697,14 +721,14 @@ async def get_my_meetings(
         query["start_time"] = {"$lt": datetime.utcnow()}
         sort_order = -1  # Descending
     
-    meetings = await db.meetings.find(query).sort("start_time", sort_order).to_list(100)
+    meetings = await db.meetings.find(query, NO_ID).sort("start_time", sort_order).to_list(100)
     
-    for meeting in meetings:
-        meeting['_id'] = str(meeting['_id'])
-        meeting['start_time'] = meeting['start_time'].isoformat()
-        meeting['end_time'] = meeting['end_time'].isoformat()
-    
-    return {"success": True, "data": {"meetings": meetings}}
+    return FastJSONResponse({"success": True, "data": {"meetings": meetings}})
+
+@api_v1.get("/admin/query-profile", tags=["Admin"])
+async def get_query_profile(current_user: Dict = Depends(require_role([UserRole.SUPER_ADMIN]))):
+    """Per-route MongoDB query counts, DB time and the slow-query log"""
+    return {"success": True, "data": profiler.report()}
 
 # Include main router
 app.include_router(api_v1)
@@ -720,6 +744,13 @@ try:
 except ImportError as e:
     print(f"Warning: Could not import additional routers: {e}")
 
+# Seller storefront: sellers, the planned product listing with facets, cart and checkout
+try:
+    from api_marketplace import marketplace_router as storefront_router
+    app.include_router(storefront_router)
+except ImportError as e:
+    print(f"Warning: Could not import the storefront router: {e}")
+
 # ==================== ERROR HANDLERS ====================
 
 @app.exception_handler(HTTPException)
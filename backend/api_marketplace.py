@@ -10,7 +10,10 @@ from datetime import datetime
 from enum import Enum
 
 # Assuming these are imported from api_main
-from api_main import get_current_user, require_role, UserRole, OrderStatus
+from api_main import db, get_current_user, require_role, UserRole, OrderStatus
+from product_listing import plan_listing
+from projections import build_projection
+import product_listing
 
 marketplace_router = APIRouter(prefix="/api/v1", tags=["Marketplace"])
 
@@ -158,8 +161,8 @@ async def create_product(
 
 @marketplace_router.get("/products")
 async def list_products(
-    page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     brand: Optional[str] = None,
     min_price: Optional[float] = None,
@@ -167,18 +170,25 @@ async def list_products(
     condition: Optional[ProductCondition] = None,
     seller_id: Optional[str] = None,
     search: Optional[str] = None,
-    sort_by: str = "created_at",
-    order: str = "desc"
+    sort_by: str = "created_at",  # created_at, price, rating, popularity
+    order: str = "desc",
+    fields: Optional[str] = None
 ):
-    """List products with filters and pagination"""
-    # TODO: Build query with filters, fetch from database
+    """
+    List products with filters. Pages are keyset cursors (pass `next_cursor`
+    back as `cursor` with the same filters and sort); `facets` counts brand,
+    category, condition and price buckets (see product_listing.py)
+    """
+    plan = plan_listing(
+        category, brand, min_price, max_price, condition.value if condition else None,
+        seller_id, search, sort_by, order,
+    )
+    listing = await product_listing.list_products(db, plan, cursor, page_size, build_projection("products", fields))
     return {
         "success": True,
         "data": {
-            "products": [],
-            "page": page,
+            **listing,
             "page_size": page_size,
-            "total": 0,
             "filters_applied": {
                 "category": category,
                 "brand": brand,
@@ -3,16 +3,26 @@ Additional API routers for 18 Cricket Network
 Marketplace, Teams, Leagues, Services, Payments, AI Features
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ExecutionTimeout
 import uuid
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from fast_json import FastJSONResponse, NO_ID
+from projections import build_projection
+from cities import city_filter, with_city_key
+from query_compiler import LITERAL_MAX_TIME_MS, search_clause, search_words_update, with_search_words
+from etags import bump_collection_version, conditional_document, conditional_list, versioned_insert, versioned_update
+from response_cache import response_cache
+from query_profiler import profiler
+from metrics import pool_listener
+
 # Load environment
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -20,9 +30,13 @@ load_dotenv(ROOT_DIR / '.env')
 # MongoDB connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "test_database")
-mongo_client = AsyncIOMotorClient(MONGO_URL)
+mongo_client = AsyncIOMotorClient(MONGO_URL, event_listeners=[profiler, pool_listener])
 db = mongo_client[DB_NAME]
 
+
+def success(data: Any) -> Dict[str, Any]:
+    return {"success": True, "data": data}
+
 # ==================== MARKETPLACE MODELS ====================
 
 class ProductCreate(BaseModel):
@@ -61,44 +75,43 @@ async def create_product(product: ProductCreate, current_user: Dict = Depends(la
     product_doc['reviews_count'] = 0
     product_doc['is_featured'] = False
     
-    await db.products.insert_one(product_doc)
+    await db.products.insert_one(versioned_insert(with_search_words("products", product_doc)))
+    await bump_collection_version(db, "products")
     return {"success": True, "message": "Product created", "data": product_doc}
 
 @marketplace_router.get("/products")
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     is_used: Optional[bool] = None,
     search: Optional[str] = None,
     limit: int = 50,
-    skip: int = 0
+    skip: int = 0,
+    fields: Optional[str] = None
 ):
-    """Get all products with filters"""
+    """Get all products with filters; `fields` picks columns (default: summary, `all`: everything)"""
     query = {}
     if category:
         query['category'] = category
     if is_used is not None:
         query['is_used'] = is_used
     if search:
-        query['$or'] = [
-            {'name': {'$regex': search, '$options': 'i'}},
-            {'description': {'$regex': search, '$options': 'i'}},
-            {'brand': {'$regex': search, '$options': 'i'}}
-        ]
+        query.update(search_clause("products", search, ("name", "description", "brand")))
     
-    products = await db.products.find(query).skip(skip).limit(limit).to_list(limit)
-    for product in products:
-        product['_id'] = str(product['_id'])
+    async def load():
+        cursor = db.products.find(query, build_projection("products", fields)).max_time_ms(LITERAL_MAX_TIME_MS)
+        try:
+            products = await cursor.skip(skip).limit(limit).to_list(limit)
+        except ExecutionTimeout:
+            raise HTTPException(status_code=503, detail="Search took too long, try a more specific query")
+        return {"success": True, "data": products}
     
-    return {"success": True, "data": products}
+    return await conditional_list(request, db, "products", load)
 
 @marketplace_router.get("/products/{product_id}")
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get product by ID"""
-    product = await db.products.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    product['_id'] = str(product['_id'])
-    return {"success": True, "data": product}
+    return await conditional_document(request, db.products, product_id, "Product not found", wrap=success)
 
 @marketplace_router.patch("/products/{product_id}")
 async def update_product(
@@ -115,9 +128,9 @@ async def update_product(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     update_data = updates.dict(exclude_unset=True)
-    update_data['updated_at'] = datetime.utcnow()
     
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
+    await db.products.update_one({"id": product_id}, versioned_update(search_words_update("products", product, {"$set": update_data})))
+    await bump_collection_version(db, "products")
     return {"success": True, "message": "Product updated"}
 
 @marketplace_router.delete("/products/{product_id}")
@@ -131,6 +144,7 @@ async def delete_product(product_id: str, current_user: Dict = Depends(lambda: {
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.products.delete_one({"id": product_id})
+    await bump_collection_version(db, "products")
     return {"success": True, "message": "Product deleted"}
 
 # ==================== TEAMS MODELS ====================
@@ -157,30 +171,28 @@ async def create_team(team: TeamCreate, current_user: Dict = Depends(lambda: {"i
     team_doc['matches_played'] = 0
     team_doc['matches_won'] = 0
     
-    await db.teams.insert_one(team_doc)
+    await db.teams.insert_one(versioned_insert(with_city_key(with_search_words("teams", team_doc))))
+    await bump_collection_version(db, "teams")
+    await response_cache.invalidate("teams", team_doc.get('city'))
     return {"success": True, "message": "Team created", "data": team_doc}
 
 @teams_router.get("")
-async def get_teams(city: Optional[str] = None, limit: int = 50):
+async def get_teams(request: Request, city: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     """Get all teams"""
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     
-    teams = await db.teams.find(query).limit(limit).to_list(limit)
-    for team in teams:
-        team['_id'] = str(team['_id'])
+    async def load():
+        teams = await db.teams.find(query, build_projection("teams", fields)).limit(limit).to_list(limit)
+        return {"success": True, "data": teams}
     
-    return {"success": True, "data": teams}
+    return await response_cache.respond(request, "teams", city, lambda: conditional_list(request, db, "teams", load))
 
 @teams_router.get("/{team_id}")
-async def get_team(team_id: str):
+async def get_team(team_id: str, request: Request):
     """Get team by ID"""
-    team = await db.teams.find_one({"id": team_id})
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
-    team['_id'] = str(team['_id'])
-    return {"success": True, "data": team}
+    return await conditional_document(request, db.teams, team_id, "Team not found", wrap=success)
 
 @teams_router.post("/{team_id}/members")
 async def add_team_member(
@@ -198,8 +210,10 @@ async def add_team_member(
     
     await db.teams.update_one(
         {"id": team_id},
-        {"$addToSet": {"members": member_id}}
+        versioned_update({"$addToSet": {"members": member_id}})
     )
+    await bump_collection_version(db, "teams")
+    await response_cache.invalidate("teams", team.get('city'))
     
     return {"success": True, "message": "Member added"}
 
@@ -229,32 +243,29 @@ async def create_league(league: LeagueCreate, current_user: Dict = Depends(lambd
     league_doc['status'] = 'upcoming'
     league_doc['created_at'] = datetime.utcnow()
     
-    await db.leagues.insert_one(league_doc)
+    await db.leagues.insert_one(with_city_key(league_doc))
     return {"success": True, "message": "League created", "data": league_doc}
 
 @leagues_router.get("")
-async def get_leagues(city: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+async def get_leagues(city: Optional[str] = None, status: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     """Get all leagues"""
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     if status:
         query['status'] = status
     
-    leagues = await db.leagues.find(query).limit(limit).to_list(limit)
-    for league in leagues:
-        league['_id'] = str(league['_id'])
+    leagues = await db.leagues.find(query, build_projection("leagues", fields)).limit(limit).to_list(limit)
     
-    return {"success": True, "data": leagues}
+    return FastJSONResponse({"success": True, "data": leagues})
 
 @leagues_router.get("/{league_id}")
 async def get_league(league_id: str):
     """Get league by ID"""
-    league = await db.leagues.find_one({"id": league_id})
+    league = await db.leagues.find_one({"id": league_id}, NO_ID)
     if not league:
         raise HTTPException(status_code=404, detail="League not found")
-    league['_id'] = str(league['_id'])
-    return {"success": True, "data": league}
+    return FastJSONResponse({"success": True, "data": league})
 
 @leagues_router.post("/{league_id}/register")
 async def register_team_to_league(
@@ -310,32 +321,30 @@ async def create_ground(ground: GroundCreate, current_user: Dict = Depends(lambd
     ground_doc['rating'] = 0.0
     ground_doc['is_verified'] = False
     
-    await db.grounds.insert_one(ground_doc)
+    await db.grounds.insert_one(versioned_insert(with_city_key(with_search_words("grounds", ground_doc))))
+    await bump_collection_version(db, "grounds")
+    await response_cache.invalidate("grounds", ground_doc.get('city'))
     return {"success": True, "message": "Ground created", "data": ground_doc}
 
 @services_router.get("/grounds")
-async def get_grounds(city: Optional[str] = None, ground_type: Optional[str] = None, limit: int = 50):
+async def get_grounds(request: Request, city: Optional[str] = None, ground_type: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     """Get all grounds"""
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     if ground_type:
         query['ground_type'] = ground_type
     
-    grounds = await db.grounds.find(query).limit(limit).to_list(limit)
-    for ground in grounds:
-        ground['_id'] = str(ground['_id'])
+    async def load():
+        grounds = await db.grounds.find(query, build_projection("grounds", fields)).limit(limit).to_list(limit)
+        return {"success": True, "data": grounds}
     
-    return {"success": True, "data": grounds}
+    return await response_cache.respond(request, "grounds", city, lambda: conditional_list(request, db, "grounds", load))
 
 @services_router.get("/grounds/{ground_id}")
-async def get_ground(ground_id: str):
+async def get_ground(ground_id: str, request: Request):
     """Get ground by ID"""
-    ground = await db.grounds.find_one({"id": ground_id})
-    if not ground:
-        raise HTTPException(status_code=404, detail="Ground not found")
-    ground['_id'] = str(ground['_id'])
-    return {"success": True, "data": ground}
+    return await conditional_document(request, db.grounds, ground_id, "Ground not found", wrap=success)
 
 # ==================== AI FEATURES ROUTER ====================
 
@@ -371,8 +380,7 @@ async def generate_highlights(video_url: str, current_user: Dict = Depends(lambd
 @ai_router.get("/highlights/{highlight_id}")
 async def get_highlight(highlight_id: str):
     """Get highlight by ID"""
-    highlight = await db.highlights.find_one({"id": highlight_id})
+    highlight = await db.highlights.find_one({"id": highlight_id}, NO_ID)
     if not highlight:
         raise HTTPException(status_code=404, detail="Highlight not found")
-    highlight['_id'] = str(highlight['_id'])
-    return {"success": True, "data": highlight}
+    return FastJSONResponse({"success": True, "data": highlight})
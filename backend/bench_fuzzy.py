@@ -0,0 +1,88 @@
+"""
+Fuzzy name benchmark
+Builds the typo-tolerant name index (fuzzy_search.py) over synthetic player
+profiles and times misspelt-name queries against it and against checking
+the edit distance of every distinct name word, which is what candidate
+generation saves
+
+Usage: python bench_fuzzy.py --names 1000000 --queries 500
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from fuzzy_search import FuzzyIndex, allowed_distance, distance, name_words
+
+FIRST = ["Mahendra", "Virat", "Rohit", "Mohammed", "Mohammad", "Muhammad", "Shubman", "Jasprit", "Ravindra", "Hardik",
+         "Rishabh", "Suryakumar", "Yuzvendra", "Bhuvneshwar", "Cheteshwar", "Ajinkya", "Kuldeep", "Shreyas", "Ishan"]
+LAST = ["Dhoni", "Kohli", "Sharma", "Shami", "Siraj", "Rizwan", "Gill", "Bumrah", "Jadeja", "Pandya", "Pant", "Yadav",
+        "Chahal", "Kumar", "Pujara", "Rahane", "Iyer", "Kishan", "Singh", "Patel", "Chaudhary", "Deshpande"]
+SYLLABLES = ["ra", "vi", "sh", "an", "ku", "ma", "de", "ar", "ji", "ta", "pr", "su", "ha", "na", "ro", "ka", "li", "es"]
+# (query, name it should find)
+TYPOS = [("dhony", "Dhoni"), ("virat kholi", "Kohli"), ("muhammed shami", "Shami"), ("jasprit bumra", "Bumrah"),
+         ("ravinder jadeja", "Jadeja"), ("shubhman gil", "Gill"), ("bhuvaneshwar kumar", "Kumar"), ("chetswar pujara", "Pujara"),
+         ("yuzvender chahal", "Chahal"), ("shreyas ayer", "Iyer")]
+
+
+def make_name(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+    made_up = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+    return f"{made_up} {rng.choice(LAST) if rng.random() < 0.5 else ''.join(rng.choices(SYLLABLES, k=3)).capitalize()}"
+
+
+def scan_vocabulary(index: FuzzyIndex, query: str) -> int:
+    """Words within reach of each query word, checking every word of the vocabulary"""
+    found = 0
+    for word in name_words(query):
+        bound = allowed_distance(word)
+        found += sum(1 for other in index.words if distance(word, other, bound) <= bound)
+    return found
+
+
+def timeit(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    index = FuzzyIndex()
+    for i in range(args.names):
+        index.upsert("users", {"_id": f"{i:024x}", "name": make_name(rng)})
+    build_s = time.perf_counter() - start
+    report = index.report()
+
+    missed = [query for query, expected in TYPOS
+              if not any(word in name_words(expected) for word_id, _ in index.similar_words(name_words(query)[-1])
+                         for word in [index.words[word_id]])]
+    queries = [rng.choice(TYPOS)[0] for _ in range(args.queries)]
+    rows = [
+        ("edit distance, every word", *timeit(lambda q: scan_vocabulary(index, q), queries[:max(2, len(queries) // 50)])),
+        ("gram candidates + distance", *timeit(lambda q: index.search(q, limit=args.limit), queries)),
+    ]
+
+    print(f"{report['names']} names, {report['words']} distinct words, {report['grams']} grams "
+          f"({report['gram_postings']} postings), built in {build_s:.1f} s")
+    print(f"{'path':<30}{'median ms':>12}{'p99 ms':>10}")
+    for name, median, p99 in rows:
+        print(f"{name:<30}{median:>12.3f}{p99:>10.3f}")
+    print(f"typos whose surname was not found: {missed or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Payment gateway client benchmark
+Fires concurrent checkouts, each making one gateway order, at the fake
+gateway (fake_gateway.py, served from its own thread). It compares three
+clients: the blocking SDK-style call made inside the async handler, an aiohttp
+session opened per call, and the pooled PaymentGateway. For each it reports
+throughput, latency, the worst event-loop stall seen by a 10 ms ticker, and
+the most calls the gateway had in flight at once.
+
+Usage: python bench_gateway.py --checkouts 200 --concurrency 50 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+import aiohttp
+import requests
+
+from fake_gateway import FakeGateway
+from payment_gateway import PAYMENT_GATEWAY_CONNECTIONS, PaymentGateway
+
+TICK_SECONDS = 0.01
+
+
+def serve_in_thread(fake: FakeGateway) -> str:
+    """Run the fake on its own loop, so a blocked client loop cannot stall it"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(fake.start(), loop).result()
+
+
+async def loop_stalls(stop: asyncio.Event) -> float:
+    """Worst lateness of a TICK_SECONDS sleep while the checkouts run"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        worst = max(worst, time.perf_counter() - start - TICK_SECONDS)
+    return worst
+
+
+async def storm(create, checkouts: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(n: int):
+        async with gate:
+            start = time.perf_counter()
+            await create(10_000 + n, f"bench-{time.monotonic_ns()}-{n}")
+            samples.append((time.perf_counter() - start) * 1000)
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_stalls(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(checkouts)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, samples, await ticker
+
+
+async def run(args):
+    fake = FakeGateway(latency=args.latency_ms / 1000)
+    url = serve_in_thread(fake)
+
+    gateway = PaymentGateway(fake.key_id, fake.key_secret, url, max_connections=args.connections)
+    http = requests.Session()
+    http.auth = (fake.key_id, fake.key_secret)
+
+    async def blocking(amount: int, receipt: str):
+        # What the SDK call in the handler did: the loop waits out the round trip
+        response = http.post(f"{url}/v1/orders", json={"amount": amount, "currency": "INR", "receipt": receipt},
+                             timeout=10)
+        response.raise_for_status()
+
+    async def session_per_call(amount: int, receipt: str):
+        async with aiohttp.ClientSession(url, headers=gateway.headers) as session:
+            async with session.post("/v1/orders", json={"amount": amount, "receipt": receipt}) as response:
+                response.raise_for_status()
+
+    clients = [
+        ("blocking call in handler", blocking),
+        ("aiohttp session per call", session_per_call),
+        (f"pooled client ({args.connections} conns)", gateway.create_order),
+    ]
+    try:
+        print(f"{args.checkouts} checkouts, {args.concurrency} at a time, gateway latency {args.latency_ms:.0f} ms")
+        print(f"{'client':<30}{'checkouts/s':>12}{'median ms':>11}{'p99 ms':>9}{'loop stall ms':>15}{'peak in flight':>16}")
+        for name, create in clients:
+            fake.peak_in_flight = 0
+            elapsed, samples, stall = await storm(create, args.checkouts, args.concurrency)
+            p99 = statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+            print(f"{name:<30}{args.checkouts / elapsed:>12.0f}{statistics.median(samples):>11.1f}{p99:>9.1f}"
+                  f"{stall * 1000:>15.1f}{fake.peak_in_flight:>16}")
+    finally:
+        await gateway.close()
+        http.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    # Below --concurrency, checkouts queue for a connection: the gateway sees at most this many
+    parser.add_argument("--connections", type=int, default=PAYMENT_GATEWAY_CONNECTIONS)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
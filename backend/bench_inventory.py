@@ -0,0 +1,126 @@
+"""
+Checkout contention benchmark
+Fires thousands of concurrent checkouts at one SKU in a scratch database and
+checks that stock is never oversold. It compares the reservation engine
+(inventory.py: conditional $inc in one bulk write) with a read-then-write
+decrement. It then commits, releases and expires the reservations, checking
+that every unit is accounted for.
+
+Usage: python bench_inventory.py --mongo-url mongodb://localhost:27017 --checkouts 5000 --stock 500
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import inventory
+from inventory import OutOfStock
+
+SKU = "flash-sale-bat"
+
+
+async def reset_stock(db, stock: int):
+    await db.products.delete_many({})
+    await db[inventory.RESERVATIONS].delete_many({})
+    await db.products.insert_one({"id": SKU, "name": "English Willow Bat", "stock": stock, "version": 1,
+                                  "created_at": datetime.utcnow()})
+
+
+async def naive_checkout(db, quantity: int) -> bool:
+    """What a handler without a conditional update does: check, then decrement"""
+    product = await db.products.find_one({"id": SKU}, {"stock": 1})
+    if product["stock"] < quantity:
+        return False
+    await db.products.update_one({"id": SKU}, {"$inc": {"stock": -quantity}})
+    return True
+
+
+async def engine_checkout(db, quantity: int) -> bool:
+    try:
+        await inventory.reserve(db, uuid.uuid4().hex, [(SKU, quantity)])
+        return True
+    except OutOfStock:
+        return False
+
+
+async def storm(db, checkout, quantities, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(quantity: int) -> int:
+        async with gate:
+            start = time.perf_counter()
+            ok = await checkout(db, quantity)
+            samples.append((time.perf_counter() - start) * 1000)
+            return quantity if ok else 0
+
+    start = time.perf_counter()
+    taken = await asyncio.gather(*(one(quantity) for quantity in quantities))
+    elapsed = time.perf_counter() - start
+    return sum(taken), sum(1 for quantity in taken if quantity), elapsed, samples
+
+
+async def settle(db, stock: int):
+    """Commit half the reservations, release a quarter, expire the rest and check the books"""
+    reservations = [doc["_id"] async for doc in db[inventory.RESERVATIONS].find({"status": "held"}, {"_id": 1})]
+    random.shuffle(reservations)
+    half, quarter = len(reservations) // 2, len(reservations) // 4
+    for reservation_id in reservations[:half]:
+        await inventory.commit(db, reservation_id)
+    for reservation_id in reservations[half:half + quarter]:
+        await inventory.release(db, reservation_id)
+    # Stand-in for the TTL monitor deleting the rest once they expire
+    await db[inventory.RESERVATIONS].delete_many({"_id": {"$in": reservations[half + quarter:]}})
+    expired = await inventory.sweep(db)
+
+    sold = sum([line["quantity"] async for doc in db[inventory.RESERVATIONS].find({"status": "committed"})
+                for line in doc["lines"]])
+    product = await db.products.find_one({"id": SKU})
+    print(f"settled: {half} committed ({sold} units sold), {quarter} released, {expired} expired and swept")
+    print(f"stock {product['stock']} + sold {sold} = {product['stock'] + sold} of {stock}; "
+          f"reserved {product.get('reserved', 0)}, holds left {len(product.get('holds', []))}")
+    assert product["stock"] + sold == stock and not product.get("holds"), "units were lost or duplicated"
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url, maxPoolSize=args.pool_size)
+    db = client[f"bench_inventory_{uuid.uuid4().hex[:8]}"]
+    rng = random.Random(args.seed)
+    # Mostly single bats, some buy a pair
+    quantities = [2 if rng.random() < 0.1 else 1 for _ in range(args.checkouts)]
+    try:
+        print(f"{args.checkouts} checkouts of one SKU with {args.stock} in stock, {args.concurrency} at a time")
+        print(f"{'path':<26}{'sold':>7}{'oversold':>10}{'orders':>8}{'checkouts/s':>13}{'median ms':>11}{'p99 ms':>9}")
+        for name, checkout in [("read, then $inc", naive_checkout), ("conditional $inc (engine)", engine_checkout)]:
+            await reset_stock(db, args.stock)
+            sold, orders, elapsed, samples = await storm(db, checkout, quantities, args.concurrency)
+            product = await db.products.find_one({"id": SKU})
+            oversold = max(0, sold - args.stock)
+            p99 = statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+            print(f"{name:<26}{sold:>7}{oversold:>10}{orders:>8}{len(quantities) / elapsed:>13.0f}"
+                  f"{statistics.median(samples):>11.2f}{p99:>9.2f}   final stock {product['stock']}")
+        await settle(db, args.stock)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--checkouts", type=int, default=5_000)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=2_000)
+    parser.add_argument("--pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Proximity benchmark
+Ranks synthetic venues around a point with the pure-Python loop the list
+routes used (plus a pure-Python haversine for a fair comparison) and with
+the NumPy proximity engine, and times incremental updates to the index
+
+Usage: python bench_proximity.py --venues 100000 --queries 200
+"""
+
+import argparse
+import math
+import random
+import statistics
+import time
+
+from proximity import EARTH_RADIUS_KM, ProximityIndex
+
+# Venues are spread over a few metros, like the production data
+METROS = [(19.0760, 72.8777), (28.7041, 77.1025), (12.9716, 77.5946), (13.0827, 80.2707), (22.5726, 88.3639)]
+
+
+def make_venues(rng: random.Random, count: int):
+    for i in range(count):
+        lat, lon = rng.choice(METROS)
+        yield {
+            "id": f"venue-{i}",
+            "latitude": lat + rng.uniform(-0.4, 0.4),
+            "longitude": lon + rng.uniform(-0.4, 0.4),
+            "pricing": {"hourly": float(rng.randrange(500, 5000, 100))},
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+        }
+
+
+def python_flat(venues, lat, lon, radius_km, k):
+    # The loop the list routes used before $geoNear
+    nearby = []
+    for venue in venues:
+        distance = (((venue["latitude"] - lat) ** 2 + (venue["longitude"] - lon) ** 2) ** 0.5) * 111
+        if distance <= radius_km:
+            nearby.append((distance, venue["id"]))
+    nearby.sort()
+    return nearby[:k]
+
+
+def python_haversine(venues, lat, lon, radius_km, k):
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    nearby = []
+    for venue in venues:
+        lat2, lon2 = math.radians(venue["latitude"]), math.radians(venue["longitude"])
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+        if distance <= radius_km:
+            nearby.append((distance, venue["id"]))
+    nearby.sort()
+    return nearby[:k]
+
+
+def timeit(fn, points, repeat_args):
+    samples = []
+    for lat, lon in points:
+        start = time.perf_counter()
+        fn(lat, lon, *repeat_args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--venues", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius-km", type=float, default=10)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    venues = list(make_venues(rng, args.venues))
+    points = []
+    for _ in range(args.queries):
+        lat, lon = rng.choice(METROS)
+        points.append((lat + rng.uniform(-0.2, 0.2), lon + rng.uniform(-0.2, 0.2)))
+
+    start = time.perf_counter()
+    index = ProximityIndex("venues")
+    for venue in venues:
+        index.upsert(venue)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Same nearest-first answer from every path
+    lat, lon = points[0]
+    expected = [doc_id for _, doc_id in python_haversine(venues, lat, lon, args.radius_km, args.k)]
+    got = [r["id"] for r in index.nearest(lat, lon, args.radius_km, args.k)]
+    assert got == expected, "engine and reference disagree"
+
+    python_points = points[:max(1, len(points) // 10)]
+    rows = [
+        ("python flat-earth loop", *timeit(lambda a, b, r, k: python_flat(venues, a, b, r, k), python_points, (args.radius_km, args.k))),
+        ("python haversine loop", *timeit(lambda a, b, r, k: python_haversine(venues, a, b, r, k), python_points, (args.radius_km, args.k))),
+        ("numpy nearest", *timeit(lambda a, b, r, k: index.nearest(a, b, r, k), points, (args.radius_km, args.k))),
+        ("numpy blended score", *timeit(
+            lambda a, b, r, k: index.nearest(a, b, r, k, weights={"distance": 1, "price": 0.5, "rating": 0.5}),
+            points, (args.radius_km, args.k),
+        )),
+    ]
+
+    moves = [dict(venue, latitude=venue["latitude"] + 0.001) for venue in rng.sample(venues, min(10_000, len(venues)))]
+    start = time.perf_counter()
+    for venue in moves:
+        index.upsert(venue)
+    upsert_us = (time.perf_counter() - start) * 1e6 / len(moves)
+
+    print(f"{args.venues} venues, radius {args.radius_km} km, top {args.k}")
+    print(f"index build: {build_ms:.0f} ms, incremental upsert: {upsert_us:.1f} us")
+    print(f"{'path':<26}{'median ms':>12}{'p99 ms':>10}")
+    for name, median, p99 in rows:
+        print(f"{name:<26}{median:>12.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Search query compilation benchmark
+Times what user search input costs per query over synthetic product names:
+- as a raw pattern, the way `$regex: search` used to evaluate it (Python's
+  backtracking `re` stands in for the server's PCRE), including
+  catastrophic patterns against a few planted adversarial names
+- escaped into a literal, the fallback for input that does not compile
+- compiled by query_compiler.py into word-prefix ranges, answered here by
+  bisecting a sorted (word, document) list the way the search_words index is
+
+Usage: python bench_query_compiler.py --names 200000 --evil-length 22
+"""
+
+from bisect import bisect_left
+import argparse
+import random
+import re
+import statistics
+import time
+
+from query_compiler import compile_search, prefix_range, search_words
+
+BRANDS = ["SG", "SS", "Kookaburra", "Gray-Nicolls", "MRF", "New Balance", "Gunn & Moore", "DSC", "Puma", "Adidas"]
+PRODUCTS = ["English Willow Bat", "Kashmir Willow Bat", "Batting Gloves", "Keeping Gloves", "Batting Pads",
+            "Helmet", "Leather Ball", "Tennis Ball", "Kit Bag", "Spikes", "Thigh Guard", "Arm Guard", "Stumps"]
+PLAIN = ["kookaburra", "willow bat", "SG Kash", "gray-nicolls pads", "keeping gl", "Gunn & Moore"]
+# Nested quantifiers and overlapping alternations: exponential backtracking on a near-miss
+PATHOLOGICAL = ["(a+)+$", "(a|aa)+$", "(a|a?)+$", "([a-z]+)*!$", "(.*a){12}"]
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=200_000)
+    parser.add_argument("--evil-length", type=int, default=22, help="length of the planted 'aaa...a!' names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = [f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS)} {rng.randint(1, 999)}" for _ in range(args.names)]
+    # A seller can name a listing anything, so an attacker plants the near-miss input too
+    names[::max(1, args.names // 3)] = ["a" * args.evil_length + "!"] * len(names[::max(1, args.names // 3)])
+    postings = sorted((word, i) for i, name in enumerate(names) for word in search_words("products", {"name": name}))
+    terms = [word for word, _ in postings]
+
+    def indexed(query: str) -> int:
+        folded = compile_search(query)
+        matched = None
+        for word in sorted(set(folded), key=len, reverse=True):
+            bounds = prefix_range(word)
+            lo, hi = bisect_left(terms, bounds["$gte"]), bisect_left(terms, bounds["$lt"])
+            ids = {doc for _, doc in postings[lo:hi]}
+            matched = ids if matched is None else matched & ids
+        return len(matched)
+
+    def scan(pattern: str) -> int:
+        compiled = re.compile(pattern, re.IGNORECASE)
+        return sum(1 for name in names if compiled.search(name))
+
+    print(f"{len(names)} names, {len(postings)} word postings")
+    print(f"{'query':<22}{'compiles to':<26}{'raw $regex ms':>15}{'escaped ms':>12}{'indexed ms':>12}")
+    for query in PLAIN + PATHOLOGICAL:
+        folded = compile_search(query)
+        route = " ".join(f"{word}*" for word in folded) if folded else "text index"
+        raw = timed(lambda: scan(query), args.repeat)
+        escaped = timed(lambda: scan(re.escape(query)), args.repeat)
+        fast = f"{timed(lambda: indexed(query), args.repeat):.3f}" if folded else "-"
+        print(f"{query:<22}{route:<26}{raw:>15.1f}{escaped:>12.1f}{fast:>12}")
+
+
+if __name__ == "__main__":
+    main()
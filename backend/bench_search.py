@@ -0,0 +1,116 @@
+"""
+Search benchmark
+Times typical /search queries against synthetic listings with the inverted
+index (text_search.py) and with a case-insensitive regex scan over the same
+fields, the work each of the regex path's $regex collection scans does per
+document
+
+Usage: python bench_search.py --docs 1000000 --queries 200
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+
+from text_search import SEARCH_TYPES, SearchIndex
+
+BRANDS = ["SG", "SS", "Kookaburra", "Gray-Nicolls", "MRF", "New Balance", "Gunn & Moore", "DSC", "Puma", "Adidas"]
+PRODUCTS = ["English Willow Bat", "Kashmir Willow Bat", "Batting Gloves", "Wicket Keeping Gloves", "Batting Pads",
+            "Helmet", "Leather Ball", "Tennis Ball", "Kit Bag", "Spikes", "Thigh Guard", "Arm Guard", "Stumps"]
+PLACES = ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata", "Pune", "Hyderabad", "Ahmedabad", "Jaipur", "Lucknow"]
+FIRST = ["Rohit", "Virat", "Mahendra", "Shubman", "Jasprit", "Ravindra", "Hardik", "Rishabh", "Mohammed", "Suryakumar"]
+LAST = ["Sharma", "Kohli", "Singh", "Gill", "Bumrah", "Jadeja", "Pandya", "Pant", "Shami", "Yadav", "Patel", "Iyer"]
+FILLER = ["premium", "grade", "match", "practice", "junior", "senior", "professional", "lightweight", "club", "edition"]
+
+QUERIES = ["english willow bat", "gloves", "mumbai ground", "t20 tournament", "keeper gloves", "kohli",
+           "pune academy", "leather ball", "helmet", "bengaluru turf"]
+
+
+def make_docs(rng: random.Random, count: int):
+    for i in range(count):
+        kind = rng.choices(SEARCH_TYPES, weights=[30, 40, 5, 5, 15, 5])[0]
+        city = rng.choice(PLACES)
+        filler = " ".join(rng.choices(FILLER, k=rng.randint(4, 12)))
+        if kind == "users":
+            doc = {"_id": f"{i:024x}", "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}", "phone": f"+91{rng.randrange(10**9, 10**10)}"}
+        elif kind == "products":
+            doc = {"name": f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS)}", "brand": rng.choice(BRANDS),
+                   "category": "equipment", "description": filler}
+        elif kind == "livestreams":
+            doc = {"title": f"Live: {city} {rng.choice(['T20', 'league', 'nets', 'final'])}", "broadcaster_name": rng.choice(LAST), "is_live": True}
+        else:
+            label = {"academies": "Cricket Academy", "tournaments": rng.choice(["T20 Cup", "Premier League", "One Day Trophy"]),
+                     "grounds": rng.choice(["Turf Ground", "Cricket Stadium", "Box Cricket Arena"])}[kind]
+            doc = {"name": f"{city} {label} {i}", "city": city, "location": f"Sector {rng.randint(1, 80)}", "description": filler}
+        doc.setdefault("id", f"doc-{i}")
+        yield kind, doc
+
+
+def regex_scan(docs, query: str, limit: int):
+    """Per-type regex scans as the regex path runs them, each stopping at `limit` matches"""
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    found = {}
+    for kind, items in docs.items():
+        fields = ("name", "phone", "title", "broadcaster_name", "brand", "city", "description")
+        matches = []
+        for doc in items:
+            if any(isinstance(doc.get(f), str) and pattern.search(doc[f]) for f in fields):
+                matches.append(doc)
+                if len(matches) >= limit:
+                    break
+        found[kind] = matches
+    return found
+
+
+def timeit(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs = {kind: [] for kind in SEARCH_TYPES}
+    for kind, doc in make_docs(rng, args.docs):
+        docs[kind].append(doc)
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    for kind, items in docs.items():
+        for doc in items:
+            index.upsert(kind, doc)
+    build_s = time.perf_counter() - start
+    report = index.report()
+
+    queries = [rng.choice(QUERIES) for _ in range(args.queries)]
+    regex_queries = queries[:max(2, len(queries) // 20)]
+    rows = [
+        ("regex scan (6 types)", *timeit(lambda q: regex_scan(docs, q, args.limit), regex_queries)),
+        ("inverted index + bm25", *timeit(lambda q: index.search(q, limit=args.limit), queries)),
+        ("inverted index, 1 type", *timeit(lambda q: index.search(q, ["products"], limit=args.limit), queries)),
+    ]
+
+    print(f"{args.docs} documents, {report['terms']} terms, {report['postings']} postings "
+          f"({report['posting_bytes'] / 2**20:.0f} MiB), built in {build_s:.1f} s")
+    print(f"{'path':<26}{'median ms':>12}{'p99 ms':>10}")
+    for name, median, p99 in rows:
+        print(f"{name:<26}{median:>12.3f}{p99:>10.3f}")
+    # Regex matching stops at `limit` per type, so common words look cheap;
+    # a rare or absent word scans every document
+    print(f"regex scan, no match: {timeit(lambda q: regex_scan(docs, q, args.limit), ['zzyzx'])[0]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Serialization benchmark for list responses
+Compares the old per-document _id rewrite + jsonable_encoder + json path
+with FastJSONResponse (orjson) on the same synthetic ground documents,
+whole and cut down to the list summary projection
+
+Usage: python bench_serialization.py --rows 500 --repeat 20
+"""
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+from datetime import datetime, timedelta
+import argparse
+import copy
+import statistics
+import time
+import uuid
+
+from fast_json import FastJSONResponse
+from projections import SUMMARY_FIELDS
+
+
+def make_ground(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "owner_id": str(ObjectId()),
+        "owner_name": f"Owner {i}",
+        "owner_phone": f"+9190000{i:05d}",
+        "name": f"Ground {i}",
+        "description": "Floodlit turf wicket with practice nets and pavilion " * 3,
+        "location": f"Sector {i % 50}",
+        "city": ["Mumbai", "Pune", "Delhi", "Chennai", "Bengaluru"][i % 5],
+        "latitude": 18.5 + (i % 100) / 1000,
+        "longitude": 73.8 + (i % 100) / 1000,
+        "ground_type": ["turf", "mat", "concrete"][i % 3],
+        "facilities": ["nets", "pavilion", "lighting", "parking"],
+        "pricing": {"hourly": 1000.0, "match": 5000.0, "session": 800.0},
+        "images": [f"https://cdn.example.com/grounds/{i}/{n}.jpg" for n in range(4)],
+        "time_slots": [{"day": day, "slots": ["6-8AM", "8-10AM", "4-6PM"]} for day in ("Mon", "Tue", "Wed", "Sat", "Sun")],
+        "contact_phone": f"+9190000{i:05d}",
+        "created_at": datetime.utcnow() - timedelta(days=i % 365),
+        "rating": 4.2,
+        "reviews_count": i % 200,
+        "is_verified": bool(i % 2),
+        "commission_rate": 0.15,
+    }
+
+
+def old_path(docs):
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+    return JSONResponse(content=jsonable_encoder(docs)).body
+
+
+def new_path_projected(docs):
+    # Documents as returned by find(query, NO_ID)
+    return FastJSONResponse(docs).body
+
+
+def new_path_object_id(docs):
+    # Collections without a uuid id keep _id and let orjson encode it
+    return FastJSONResponse(docs).body
+
+
+def timeit(fn, make_input, repeat: int):
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        docs = make_input()
+        start = time.perf_counter()
+        body = fn(docs)
+        samples.append((time.perf_counter() - start) * 1000)
+        size = len(body)
+    return statistics.median(samples), min(samples), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    base = [make_ground(i) for i in range(args.rows)]
+    projected = [{k: v for k, v in doc.items() if k != "_id"} for doc in base]
+    # What find(query, build_projection("grounds")) returns
+    summary = [
+        {**{k: doc[k] for k in SUMMARY_FIELDS["grounds"] if k in doc}, "images": doc["images"][:1]}
+        for doc in base
+    ]
+
+    cases = [
+        ("jsonable_encoder + json (current)", old_path, lambda: copy.deepcopy(base)),
+        ("orjson, _id projected out", new_path_projected, lambda: copy.deepcopy(projected)),
+        ("orjson, native ObjectId", new_path_object_id, lambda: copy.deepcopy(base)),
+        ("orjson, summary projection", new_path_projected, lambda: copy.deepcopy(summary)),
+    ]
+
+    print(f"{args.rows} documents, {args.repeat} runs each")
+    print(f"{'path':<36}{'median ms':>12}{'best ms':>12}{'bytes':>12}")
+    baseline = None
+    for label, fn, make_input in cases:
+        median, best, size = timeit(fn, make_input, args.repeat)
+        baseline = baseline or median
+        print(f"{label:<36}{median:>12.2f}{best:>12.2f}{size:>12}  ({baseline / median:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
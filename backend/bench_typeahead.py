@@ -0,0 +1,109 @@
+"""
+Typeahead benchmark
+Builds the prefix index (typeahead.py) over synthetic products, players,
+grounds and teams, reports its memory footprint (measured with tracemalloc
+and as estimated by the admin report) and times suggestions for one- to
+several-letter prefixes and incremental upserts
+
+Usage: python bench_typeahead.py --entries 1000000 --queries 2000
+"""
+
+import argparse
+import random
+import statistics
+import string
+import time
+import tracemalloc
+
+from typeahead import PrefixIndex
+
+BRANDS = ["SG", "SS", "Kookaburra", "Gray-Nicolls", "MRF", "New Balance", "Gunn & Moore", "DSC", "Puma", "Adidas"]
+PRODUCTS = ["English Willow Bat", "Kashmir Willow Bat", "Batting Gloves", "Keeping Gloves", "Batting Pads",
+            "Helmet", "Leather Ball", "Tennis Ball", "Kit Bag", "Spikes", "Thigh Guard", "Arm Guard", "Stumps"]
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata", "Pune", "Hyderabad", "Ahmedabad", "Jaipur", "Lucknow"]
+SYLLABLES = ["ra", "vi", "sh", "an", "ku", "ma", "de", "ar", "ji", "ta", "pr", "su", "ha", "na", "ro", "ka", "li", "es"]
+
+
+def name_like(rng: random.Random) -> str:
+    # Distinct made-up names so the word list grows like real player names do
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+
+
+def make_entries(rng: random.Random, count: int):
+    for i in range(count):
+        kind = rng.choices(["products", "players", "grounds", "teams"], weights=[35, 45, 10, 10])[0]
+        if kind == "products":
+            brand = rng.choice(BRANDS)
+            yield kind, {"id": f"p{i}", "name": f"{brand} {rng.choice(PRODUCTS)} {name_like(rng)}", "brand": brand,
+                         "rating": round(rng.uniform(2.5, 5), 1), "reviews_count": rng.randint(0, 2000)}
+        elif kind == "players":
+            yield kind, {"_id": f"{i:024x}", "name": f"{name_like(rng)} {name_like(rng)}", "user_type": "player",
+                         "is_verified": rng.random() < 0.05}
+        elif kind == "grounds":
+            yield kind, {"id": f"g{i}", "name": f"{rng.choice(CITIES)} {name_like(rng)} Ground",
+                         "rating": round(rng.uniform(3, 5), 1), "reviews_count": rng.randint(0, 400)}
+        else:
+            yield kind, {"id": f"t{i}", "name": f"{rng.choice(CITIES)} {name_like(rng)}", "matches_played": rng.randint(0, 200)}
+
+
+def percentiles(samples):
+    return statistics.median(samples), statistics.quantiles(samples, n=100)[98] if len(samples) >= 2 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    by_type = {}
+    for kind, doc in make_entries(rng, args.entries):
+        by_type.setdefault(kind, []).append(doc)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    index = PrefixIndex()
+    for kind, docs in by_type.items():
+        index._add_unsorted(kind, docs)
+    index._finish_bulk()
+    build_s = time.perf_counter() - start
+    measured = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    report = index.report()
+
+    print(f"{report['entries']} entries, {report['words']} distinct words, {report['postings']} postings, built in {build_s:.1f} s")
+    print(f"memory: {measured / 2**20:.0f} MiB measured, {report['bytes']['total'] / 2**20:.0f} MiB estimated "
+          f"(terms {report['bytes']['terms'] / 2**20:.0f}, postings {report['bytes']['postings'] / 2**20:.0f}, "
+          f"entries {report['bytes']['entries'] / 2**20:.0f}); {measured / max(1, report['entries']):.0f} bytes per entry")
+
+    print(f"{'query':<32}{'median ms':>12}{'p99 ms':>10}")
+    for label, make in [
+        ("1 letter", lambda: rng.choice(string.ascii_lowercase)),
+        ("2 letters", lambda: rng.choice(SYLLABLES)),
+        ("3-5 letters", lambda: "".join(rng.choices(SYLLABLES, k=2))[:rng.randint(3, 5)]),
+        ("two words (\"kookaburra ba\")", lambda: f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS)[:2]}"),
+        ("players only, 2 letters", lambda: rng.choice(SYLLABLES)),
+    ]:
+        types = ["players"] if "players only" in label else None
+        samples = []
+        for _ in range(args.queries):
+            query = make()
+            start = time.perf_counter()
+            index.suggest(query, types, args.limit)
+            samples.append((time.perf_counter() - start) * 1000)
+        median, p99 = percentiles(samples)
+        print(f"{label:<32}{median:>12.3f}{p99:>10.3f}")
+
+    docs = [doc for doc in by_type["products"][:5_000]]
+    start = time.perf_counter()
+    for doc in docs:
+        index.upsert("products", dict(doc, reviews_count=doc["reviews_count"] + 1))
+    print(f"incremental upsert: {(time.perf_counter() - start) * 1e6 / len(docs):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
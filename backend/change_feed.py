@@ -0,0 +1,354 @@
+"""
+Change feed for 18 Cricket Network
+Tails MongoDB change streams of the collections derived data is built from
+and hands their events, in batches, to subscribed handlers, so search
+indexes and caches follow writes made anywhere (server.py, api_main.py,
+api_routers.py, other workers, the shell) without periodic full rebuilds.
+Resume tokens are checkpointed in `change_feed_checkpoints` after every
+batch the handlers accepted; lag is exported as metrics and in report().
+
+Change streams need a replica set; a single-node one is enough. On a
+standalone server each stream reports itself unavailable and callers keep
+their periodic rebuilds (see maintains()).
+"""
+
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+import asyncio
+import logging
+import os
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from coalesce import single_flight
+from metrics import Counter, Gauge, Histogram, LATENCY_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_BATCH_SIZE = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "500"))
+# Longest an event waits for its batch to fill
+CHANGE_FEED_MAX_WAIT = float(os.getenv("CHANGE_FEED_MAX_WAIT", "0.25"))
+# An idle stream still advances its resume token; it is saved this often
+CHECKPOINT_IDLE_SECONDS = 30.0
+MAX_BACKOFF_SECONDS = 30.0
+
+OPERATIONS = ("insert", "update", "replace", "delete")
+# "$changeStream is only supported on replica sets"
+NOT_A_REPLICA_SET = 40573
+# The resume token is no longer in the oplog, or cannot be used
+RESUME_LOST = {260, 280, 286}
+
+feed_events = registry.register(Counter("change_feed_events_total", "Change events handled by feed, collection and operation"))
+feed_lag = registry.register(Gauge("change_feed_lag_seconds", "Age of the newest change event handled, 0 when caught up"))
+feed_batch_duration = registry.register(Histogram("change_feed_batch_duration_seconds", "Time handlers took per batch", LATENCY_BUCKETS))
+feed_errors = registry.register(Counter("change_feed_errors_total", "Stream and handler failures by feed and collection"))
+feed_resets = registry.register(Counter("change_feed_resets_total", "Streams restarted without their resume token"))
+
+
+class ChangeEvent(NamedTuple):
+    collection: str
+    operation: str
+    # The _id of the changed document
+    document_id: Any
+    # After the change (None for deletes, or if the document is gone by the time it was looked up)
+    doc: Optional[Dict[str, Any]]
+    # Before the change, when the collection records pre-images
+    before: Optional[Dict[str, Any]]
+    cluster_time: float
+
+    @property
+    def deleted(self) -> bool:
+        return self.operation == "delete" or self.doc is None
+
+
+Handler = Callable[[List[ChangeEvent]], Awaitable[None]]
+
+
+class Subscription(NamedTuple):
+    name: str
+    collections: Sequence[str]
+    handler: Handler
+    # Document fields the handler reads; None for whole documents
+    fields: Optional[Sequence[str]]
+    # Rebuilds the derived data from scratch; awaited whenever events may have
+    # been missed, including when the feed starts
+    on_reset: Optional[Callable[[], Awaitable[None]]]
+
+
+class StreamState:
+    def __init__(self):
+        self.status = "starting"  # starting, live, retrying, unavailable, stopped
+        self.token: Optional[Dict[str, Any]] = None
+        self.saved_token: Optional[Dict[str, Any]] = None
+        self.saved_at = 0.0
+        self.pre_images = False
+        self.events = 0
+        self.batches = 0
+        self.resets = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_event_at: Optional[float] = None
+        self.lag_seconds = 0.0
+        # Set once the first attempt to open the stream is over, however it went
+        self.opened = asyncio.Event()
+        # Set once the stream is live (after any rebuild) or known not to be
+        self.settled = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "pre_images": self.pre_images,
+            "events": self.events,
+            "batches": self.batches,
+            "resets": self.resets,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_event_at": datetime.utcfromtimestamp(self.last_event_at).isoformat() if self.last_event_at else None,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "checkpointed": self.saved_token is not None,
+        }
+
+
+class ChangeFeed:
+    """
+    `feed.subscribe(name, collections, handler, fields, on_reset)` before
+    `feed.start(db)`; one task then tails each subscribed collection.
+    Delivery is at least once: a batch whose handler fails is delivered
+    again from the last checkpoint, so handlers must be idempotent.
+    """
+
+    def __init__(self, name: str, batch_size: int = CHANGE_FEED_BATCH_SIZE, max_wait: float = CHANGE_FEED_MAX_WAIT):
+        self.name = name
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.subscriptions: List[Subscription] = []
+        self.streams: Dict[str, StreamState] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(
+        self,
+        name: str,
+        collections: Iterable[str],
+        handler: Handler,
+        fields: Optional[Iterable[str]] = None,
+        on_reset: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        collections = tuple(dict.fromkeys(collections))
+        self.subscriptions.append(Subscription(name, collections, handler, tuple(fields) if fields is not None else None, on_reset))
+        for collection in collections:
+            self.streams.setdefault(collection, StreamState())
+
+    def start(self, db):
+        for collection in self.streams:
+            self._tasks.append(asyncio.create_task(self._tail(db, collection)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for state in self.streams.values():
+            state.status = "stopped"
+
+    async def maintains(self, collections: Iterable[str]) -> bool:
+        """
+        Whether the feed keeps derived data of `collections` current, after
+        waiting for their streams' first attempt to open. False means the
+        caller should rebuild on its own schedule.
+        """
+        states = [self.streams.get(collection) for collection in collections]
+        if any(state is None for state in states) or not self._tasks:
+            return False
+        await asyncio.gather(*(state.settled.wait() for state in states))
+        return all(state.status == "live" for state in states)
+
+    def live(self, collections: Iterable[str]) -> bool:
+        """Whether every stream of `collections` is tailing right now; unlike maintains(), never waits"""
+        return bool(self._tasks) and all(
+            collection in self.streams and self.streams[collection].status == "live" for collection in collections
+        )
+
+    # ==================== STREAMS ====================
+
+    def _subscribers(self, collection: str) -> List[Subscription]:
+        return [sub for sub in self.subscriptions if collection in sub.collections]
+
+    def _pipeline(self, collection: str) -> List[Dict[str, Any]]:
+        pipeline: List[Dict[str, Any]] = [{"$match": {"operationType": {"$in": list(OPERATIONS)}}}]
+        subscribers = self._subscribers(collection)
+        if all(sub.fields is not None for sub in subscribers):
+            # Only what the handlers read crosses the wire, not whole documents
+            fields = sorted({field for sub in subscribers for field in sub.fields})
+            projection = {"operationType": 1, "documentKey": 1, "clusterTime": 1}
+            for image in ("fullDocument", "fullDocumentBeforeChange"):
+                projection.update({f"{image}.{field}": 1 for field in fields})
+            pipeline.append({"$project": projection})
+        return pipeline
+
+    async def _enable_pre_images(self, db, collection: str) -> bool:
+        """Ask the server to record pre-images (MongoDB 6.0+) so deletes say what was deleted"""
+        try:
+            await db.command("collMod", collection, changeStreamPreAndPostImages={"enabled": True})
+            return True
+        except PyMongoError as e:
+            logger.info(f"Change feed {self.name}: no pre-images for {collection} ({e}); deletes carry only the _id")
+            return False
+
+    async def _tail(self, db, collection: str):
+        state = self.streams[collection]
+        prepared = False
+        # Derived data lives in memory, so a fresh process always rebuilds once
+        reset_needed = True
+        backoff = 1.0
+        while True:
+            try:
+                if not prepared:
+                    state.token = state.saved_token = await self._load_checkpoint(db, collection)
+                    state.pre_images = await self._enable_pre_images(db, collection)
+                    prepared = True
+                options: Dict[str, Any] = {"full_document": "updateLookup", "max_await_time_ms": max(1, int(self.max_wait * 1000))}
+                if state.pre_images:
+                    options["full_document_before_change"] = "whenAvailable"
+                if state.token is not None:
+                    options["resume_after"] = state.token
+                async with db[collection].watch(self._pipeline(collection), **options) as stream:
+                    state.opened.set()
+                    # Where a retry resumes if the first batch fails
+                    state.token = state.token or stream.resume_token
+                    if reset_needed:
+                        # The stream is open, so nothing written from here on is missed
+                        await self._reset(collection)
+                        reset_needed = False
+                    state.status = "live"
+                    state.settled.set()
+                    backoff = 1.0
+                    while True:
+                        batch = await self._read_batch(stream)
+                        if batch:
+                            await self._dispatch(collection, batch)
+                        elif state.lag_seconds:
+                            state.lag_seconds = 0.0
+                            feed_lag.set(0.0, feed=self.name, collection=collection)
+                        state.token = stream.resume_token
+                        await self._save_checkpoint(db, collection, force=bool(batch))
+            except asyncio.CancelledError:
+                raise
+            except NotImplementedError:
+                self._unavailable(collection, "change streams are not supported by this client")
+                return
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET:
+                    self._unavailable(collection, str(e))
+                    return
+                if e.code in RESUME_LOST:
+                    logger.warning(f"Change feed {self.name}: cannot resume {collection} ({e}); rebuilding")
+                    state.token = None
+                    reset_needed = True
+                    feed_resets.inc(feed=self.name, collection=collection)
+                backoff = await self._failed(collection, e, backoff)
+            except Exception as e:
+                backoff = await self._failed(collection, e, backoff)
+
+    def _unavailable(self, collection: str, reason: str):
+        state = self.streams[collection]
+        state.status = "unavailable"
+        state.last_error = reason
+        state.opened.set()
+        state.settled.set()
+        logger.warning(f"Change feed {self.name}: not tailing {collection}: {reason}")
+
+    async def _failed(self, collection: str, error: Exception, backoff: float) -> float:
+        state = self.streams[collection]
+        state.status = "retrying"
+        state.errors += 1
+        state.last_error = str(error)
+        state.opened.set()
+        state.settled.set()
+        feed_errors.inc(feed=self.name, collection=collection)
+        logger.error(f"Change feed {self.name} on {collection} failed, retrying in {backoff:.0f}s: {error}")
+        await asyncio.sleep(backoff)
+        return min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    async def _read_batch(self, stream) -> List[Dict[str, Any]]:
+        """Up to batch_size changes, waiting at most max_wait for the batch to fill"""
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            change = await stream.try_next()
+            if change is not None:
+                batch.append(change)
+            elif batch or time.monotonic() >= deadline:
+                break
+        return batch
+
+    async def _reset(self, collection: str):
+        state = self.streams[collection]
+        state.resets += 1
+        for sub in self._subscribers(collection):
+            if sub.on_reset is not None:
+                # Rebuild once every stream the subscription reads is open, so
+                # no write falls between the rebuild's reads and the streams;
+                # streams opening together share the one rebuild
+                await asyncio.gather(*(self.streams[other].opened.wait() for other in sub.collections))
+                await single_flight.do("change feed reset", (self.name, sub.name), sub.on_reset)
+
+    async def _dispatch(self, collection: str, batch: List[Dict[str, Any]]):
+        state = self.streams[collection]
+        events = [_event(collection, change) for change in batch]
+        start = time.perf_counter()
+        for sub in self._subscribers(collection):
+            await sub.handler(events)
+        feed_batch_duration.observe(time.perf_counter() - start, feed=self.name, collection=collection)
+        for event in events:
+            feed_events.inc(feed=self.name, collection=collection, operation=event.operation)
+        state.events += len(events)
+        state.batches += 1
+        state.last_event_at = events[-1].cluster_time
+        state.lag_seconds = max(0.0, time.time() - events[-1].cluster_time)
+        feed_lag.set(state.lag_seconds, feed=self.name, collection=collection)
+
+    # ==================== CHECKPOINTS ====================
+
+    def _checkpoint_id(self, collection: str) -> str:
+        return f"{self.name}:{collection}"
+
+    async def _load_checkpoint(self, db, collection: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = await db.change_feed_checkpoints.find_one({"_id": self._checkpoint_id(collection)})
+        except PyMongoError as e:
+            logger.error(f"Change feed {self.name}: could not read the checkpoint of {collection}: {e}")
+            return None
+        return doc["token"] if doc else None
+
+    async def _save_checkpoint(self, db, collection: str, force: bool):
+        state = self.streams[collection]
+        if state.token is None or state.token == state.saved_token:
+            return
+        if not force and time.monotonic() - state.saved_at < CHECKPOINT_IDLE_SECONDS:
+            return
+        await db.change_feed_checkpoints.update_one(
+            {"_id": self._checkpoint_id(collection)},
+            {"$set": {"token": state.token, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        state.saved_token, state.saved_at = state.token, time.monotonic()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "feed": self.name,
+            "subscriptions": {sub.name: list(sub.collections) for sub in self.subscriptions},
+            "streams": {collection: state.to_dict() for collection, state in self.streams.items()},
+        }
+
+
+def _event(collection: str, change: Dict[str, Any]) -> ChangeEvent:
+    cluster_time = change.get("clusterTime")
+    return ChangeEvent(
+        collection=collection,
+        operation=change["operationType"],
+        document_id=(change.get("documentKey") or {}).get("_id"),
+        doc=change.get("fullDocument"),
+        before=change.get("fullDocumentBeforeChange"),
+        cluster_time=float(cluster_time.time) if cluster_time is not None else time.time(),
+    )
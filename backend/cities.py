@@ -0,0 +1,156 @@
+"""
+City keys for 18 Cricket Network
+Listings keep the city as the user typed it and also carry a canonical
+`city_key` (accents stripped, case folded, old names mapped to current ones)
+that is indexed, so a city filter is an exact index lookup instead of a
+case-insensitive regex that matches substrings ("Pune" ~ "Punewadi").
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import unicodedata
+
+CITY_KEY_FIELD = "city_key"
+
+# Collections whose documents carry CITY_KEY_FIELD (backfilled by migrate_city_keys.py)
+CITY_COLLECTIONS = (
+    "academies", "tournaments", "grounds", "training_facilities",
+    "personal_trainers", "cricket_gyms", "teams", "leagues",
+)
+
+# Display names of the cities served by autocomplete
+CITIES = (
+    "Agra", "Ahmedabad", "Ajmer", "Aligarh", "Amritsar", "Aurangabad",
+    "Bengaluru", "Bhopal", "Bhubaneswar", "Chandigarh", "Chennai", "Coimbatore",
+    "Cuttack", "Dehradun", "Delhi", "Dharamshala", "Dhanbad", "Faridabad", "Ghaziabad",
+    "Guwahati", "Gurugram", "Gwalior", "Hyderabad", "Indore", "Jabalpur", "Jaipur",
+    "Jalandhar", "Jamshedpur", "Jodhpur", "Kanpur", "Kochi", "Kolkata", "Kota",
+    "Kozhikode", "Lucknow", "Ludhiana", "Madurai", "Mangaluru", "Meerut", "Mohali",
+    "Mumbai", "Mysuru", "Nagpur", "Nashik", "Navi Mumbai", "Noida", "Patna",
+    "Prayagraj", "Puducherry", "Pune", "Raipur", "Rajkot", "Ranchi", "Shimla", "Srinagar", "Surat",
+    "Thane", "Thiruvananthapuram", "Tiruchirappalli", "Udaipur", "Vadodara", "Varanasi",
+    "Vijayawada", "Visakhapatnam",
+    # Cricket cities abroad with active communities on the platform
+    "Adelaide", "Birmingham", "Brisbane", "Cape Town", "Colombo", "Dhaka", "Dubai",
+    "Johannesburg", "Karachi", "Lahore", "London", "Manchester", "Melbourne",
+    "Perth", "Sharjah", "Sydney", "Toronto",
+)
+
+# Former and colloquial names -> key of the current name
+ALIASES = {
+    "bangalore": "bengaluru",
+    "bombay": "mumbai",
+    "calcutta": "kolkata",
+    "madras": "chennai",
+    "poona": "pune",
+    "gurgaon": "gurugram",
+    "new delhi": "delhi",
+    "cochin": "kochi",
+    "calicut": "kozhikode",
+    "mangalore": "mangaluru",
+    "mysore": "mysuru",
+    "baroda": "vadodara",
+    "trivandrum": "thiruvananthapuram",
+    "trichy": "tiruchirappalli",
+    "vizag": "visakhapatnam",
+    "benares": "varanasi",
+    "banaras": "varanasi",
+    "simla": "shimla",
+    "pondicherry": "puducherry",
+    "allahabad": "prayagraj",
+    "dharamsala": "dharamshala",
+    "sas nagar": "mohali",
+    "secunderabad": "hyderabad",
+    "bengaluru urban": "bengaluru",
+    "mumbai suburban": "mumbai",
+}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _fold(name: str) -> str:
+    """Lowercase ASCII words of a name: accents stripped, punctuation collapsed"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    ascii_only = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", ascii_only.casefold()).strip()
+
+
+def city_key(name: Optional[str]) -> Optional[str]:
+    """Canonical key of a city name, None when there is nothing to key"""
+    if not isinstance(name, str):
+        return None
+    folded = _fold(name)
+    if not folded:
+        return None
+    # "Mumbai, Maharashtra" and "Mumbai (MH)" key as Mumbai
+    if folded not in ALIASES and folded not in _DISPLAY:
+        head = _fold(re.split(r"[,(]", name, maxsplit=1)[0])
+        if head in ALIASES or head in _DISPLAY:
+            folded = head
+    return ALIASES.get(folded, folded)
+
+
+def city_filter(city: str) -> Dict[str, Any]:
+    """Query clause for listings in `city` (an exact lookup on the indexed key)"""
+    return {CITY_KEY_FIELD: city_key(city)}
+
+
+def with_city_key(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Stamp CITY_KEY_FIELD on a document about to be inserted"""
+    key = city_key(doc.get("city"))
+    if key is None:
+        doc.pop(CITY_KEY_FIELD, None)
+    else:
+        doc[CITY_KEY_FIELD] = key
+    return doc
+
+
+def city_key_update(update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep CITY_KEY_FIELD in step with a $set of city in update operators
+    (as built by geo_update); modifies and returns `update`
+    """
+    fields = update.get("$set", {})
+    if "city" not in fields:
+        return update
+    key = city_key(fields["city"])
+    if key is None:
+        update.setdefault("$unset", {})[CITY_KEY_FIELD] = ""
+    else:
+        fields[CITY_KEY_FIELD] = key
+    return update
+
+
+# ==================== AUTOCOMPLETE ====================
+
+_DISPLAY: Dict[str, str] = {_fold(name): name for name in CITIES}
+
+# (searchable name, key) sorted, so a prefix is a bisect and a short scan
+_TERMS: List[Tuple[str, str]] = sorted(
+    [(folded, folded) for folded in _DISPLAY] + [(alias, key) for alias, key in ALIASES.items()]
+)
+
+
+def display_name(key: str) -> str:
+    return _DISPLAY.get(key) or key.title()
+
+
+def autocomplete(prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+    """Cities whose name or a former name starts with `prefix`, one entry per city"""
+    folded = _fold(prefix or "")
+    if not folded:
+        return []
+    results: List[Dict[str, str]] = []
+    seen = set()
+    for term, key in _TERMS[bisect_left(_TERMS, (folded, "")):]:
+        if not term.startswith(folded) or len(results) >= limit:
+            break
+        if key in seen:
+            continue
+        seen.add(key)
+        entry = {"city": display_name(key), "key": key}
+        if term != key:
+            entry["matched"] = display_name(term)
+        results.append(entry)
+    return results
@@ -0,0 +1,122 @@
+"""
+Single-flight request coalescing for 18 Cricket Network
+Concurrent identical reads share one in-flight database call, optionally
+followed by a micro-TTL (250ms-2s) so a burst of match-time traffic turns
+into a handful of queries per second per key
+"""
+
+from fastapi.responses import Response
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+
+from fast_json import dumps
+from metrics import Counter, registry
+
+MAX_CACHED_KEYS = 2048
+
+coalesce_requests = registry.register(
+    Counter("singleflight_requests_total", "Coalesced reads by route and outcome (executed, joined, cached)")
+)
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.executed = 0
+        self.joined = 0
+        self.cached = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "joined": self.joined,
+            "cached": self.cached,
+            # Share of requests that did not run their own query
+            "coalescing_ratio": round(1 - self.executed / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    `await single_flight.do(name, key, fn, ttl)` runs `fn` once per
+    (name, key) at a time; callers arriving while it runs await the same
+    result. With ttl > 0 the result is also served for `ttl` seconds.
+
+    The call runs in its own task, so a caller that disconnects does not
+    cancel the query for everyone else. Errors are shared but never cached.
+    Results are shared objects and must not be mutated by callers.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_KEYS):
+        self.max_entries = max_entries
+        self.routes: Dict[str, RouteStats] = {}
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._cache: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+
+    async def do(self, name: str, key: Hashable, fn: Callable[[], Awaitable[Any]], ttl: float = 0.0) -> Any:
+        stats = self.routes.get(name)
+        if stats is None:
+            stats = self.routes.setdefault(name, RouteStats())
+        stats.requests += 1
+        full_key = (name, key)
+        loop = asyncio.get_running_loop()
+
+        if ttl > 0:
+            hit = self._cache.get(full_key)
+            if hit is not None and hit[0] > loop.time():
+                stats.cached += 1
+                coalesce_requests.inc(route=name, outcome="cached")
+                return hit[1]
+
+        task = self._inflight.get(full_key)
+        if task is None:
+            stats.executed += 1
+            coalesce_requests.inc(route=name, outcome="executed")
+            task = asyncio.create_task(self._run(full_key, fn, ttl))
+            task.add_done_callback(_consume_exception)
+            self._inflight[full_key] = task
+        else:
+            stats.joined += 1
+            coalesce_requests.inc(route=name, outcome="joined")
+        return await asyncio.shield(task)
+
+    async def _run(self, full_key: Tuple[str, Hashable], fn: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        try:
+            value = await fn()
+        finally:
+            self._inflight.pop(full_key, None)
+        if ttl > 0:
+            self._cache[full_key] = (asyncio.get_running_loop().time() + ttl, value)
+            self._cache.move_to_end(full_key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "cached_keys": len(self._cache),
+            "routes": {name: stats.to_dict() for name, stats in sorted(self.routes.items())},
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    # Every waiter may have gone away; don't log "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+# Shared instance for the apps in this process
+single_flight = SingleFlight()
+
+
+async def shared_json_response(name: str, key: Hashable, load: Callable[[], Awaitable[Any]], ttl: float = 0.0) -> Response:
+    """Coalesce `load` and its JSON rendering; every waiter gets the same bytes"""
+
+    async def render() -> bytes:
+        return dumps(await load())
+
+    body = await single_flight.do(name, key, render, ttl)
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,363 @@
+"""
+Index Manager for 18 Cricket Network
+Declarative registry of the MongoDB indexes every hot path relies on,
+reconciled in the background at startup with a drift report
+"""
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import PyMongoError
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes with the same keys behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "collation")
+
+
+class IndexSpec:
+    """A single required index on a collection"""
+
+    def __init__(
+        self,
+        keys: List[Tuple[str, Any]],
+        name: Optional[str] = None,
+        unique: bool = False,
+        sparse: bool = False,
+        ttl_seconds: Optional[int] = None,
+        partial: Optional[Dict[str, Any]] = None,
+        collation: Optional[Dict[str, Any]] = None,
+    ):
+        self.keys = keys
+        self.name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        self.unique = unique
+        self.sparse = sparse
+        self.ttl_seconds = ttl_seconds
+        self.partial = partial
+        self.collation = collation
+
+    def options(self) -> Dict[str, Any]:
+        """Options as they are reported by index_information()"""
+        opts: Dict[str, Any] = {}
+        if self.unique:
+            opts["unique"] = True
+        if self.sparse:
+            opts["sparse"] = True
+        if self.ttl_seconds is not None:
+            opts["expireAfterSeconds"] = self.ttl_seconds
+        if self.partial is not None:
+            opts["partialFilterExpression"] = self.partial
+        if self.collation is not None:
+            opts["collation"] = self.collation
+        return opts
+
+    def to_model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, background=True, **self.options())
+
+    def matches(self, info: Dict[str, Any]) -> bool:
+        """Check an existing index (from index_information()) against this spec"""
+        existing_keys = [(field, direction) for field, direction in info.get("key", [])]
+        if existing_keys != list(self.keys):
+            return False
+        wanted = self.options()
+        for option in COMPARED_OPTIONS:
+            have = info.get(option)
+            want = wanted.get(option)
+            if option == "collation" and have is not None and want is not None:
+                # The server expands collations with defaults, only compare what we asked for
+                if any(have.get(k) != v for k, v in want.items()):
+                    return False
+                continue
+            if option in ("unique", "sparse"):
+                have, want = bool(have), bool(want)
+            if have != want:
+                return False
+        return True
+
+
+# Only index documents that carry a real string value, so legacy rows
+# with null/missing fields do not collide on unique indexes
+def _has_string(field: str) -> Dict[str, Any]:
+    return {field: {"$type": "string"}}
+
+
+# ==================== INDEX REGISTRY ====================
+# Add the indexes for a new endpoint here in the same change as the endpoint.
+
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        IndexSpec([("id", ASCENDING)], unique=True, partial=_has_string("id")),
+        IndexSpec([("phone", ASCENDING)], unique=True, partial=_has_string("phone")),
+        IndexSpec([("email", ASCENDING)], unique=True, partial=_has_string("email")),
+        IndexSpec([("is_verified", ASCENDING), ("verification_type", ASCENDING)]),
+        # Word-prefix ranges of compiled search queries (query_compiler.py)
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "products": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        # Covers the version-only lookup behind If-None-Match
+        IndexSpec([("id", ASCENDING), ("version", ASCENDING)]),
+        IndexSpec([("vendor_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexSpec([("category", ASCENDING), ("is_used", ASCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+        # Marketplace listing plans (product_listing.py): equality filters, the
+        # sort field, then id as the keyset tie-breaker; each serves both orders
+        IndexSpec([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("price", ASCENDING), ("id", ASCENDING)]),
+        IndexSpec([("rating", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("reviews_count", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("category", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)]),
+        IndexSpec([("category", ASCENDING), ("rating", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("category", ASCENDING), ("brand", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)]),
+        IndexSpec([("brand", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("brand", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)]),
+        # Stock held by checkout reservations (inventory.py)
+        IndexSpec([("holds.r", ASCENDING)], sparse=True),
+    ],
+    "academies": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("id", ASCENDING), ("version", ASCENDING)]),
+        # City filters are exact lookups on the normalized key (cities.city_key)
+        IndexSpec([("city_key", ASCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "academy_leads": [
+        IndexSpec([("academy_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "tournaments": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("id", ASCENDING), ("version", ASCENDING)]),
+        IndexSpec([("status", ASCENDING), ("start_date", DESCENDING)]),
+        IndexSpec([("city_key", ASCENDING), ("start_date", DESCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "matches": [
+        IndexSpec([("tournament_id", ASCENDING)]),
+        IndexSpec(
+            [("source", ASCENDING), ("source_match_id", ASCENDING)],
+            unique=True,
+            partial=_has_string("source"),
+        ),
+    ],
+    "grounds": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("id", ASCENDING), ("version", ASCENDING)]),
+        IndexSpec([("city_key", ASCENDING), ("ground_type", ASCENDING)]),
+        IndexSpec([("owner_id", ASCENDING)]),
+        # $geoNear for /grounds/nearby and /nearby; documents without a point are not indexed
+        # geohash prefix ranges back the /map/viewport tiles
+        IndexSpec([("geo", GEOSPHERE), ("ground_type", ASCENDING)]),
+        IndexSpec([("geohash", ASCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "training_facilities": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("city_key", ASCENDING), ("facility_type", ASCENDING)]),
+        IndexSpec([("geo", GEOSPHERE), ("facility_type", ASCENDING)]),
+        IndexSpec([("geohash", ASCENDING)]),
+    ],
+    "personal_trainers": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("city_key", ASCENDING), ("specialization", ASCENDING)]),
+        IndexSpec([("geo", GEOSPHERE), ("specialization", ASCENDING)]),
+        IndexSpec([("geohash", ASCENDING)]),
+    ],
+    "cricket_gyms": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("city_key", ASCENDING)]),
+        IndexSpec([("geo", GEOSPHERE)]),
+        IndexSpec([("geohash", ASCENDING)]),
+    ],
+    "bookings": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexSpec([("ground_id", ASCENDING), ("booking_date", ASCENDING)]),
+    ],
+    "contact_requests": [
+        IndexSpec([("to_owner_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "posts": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        # Keyset pagination: every feed index ends in created_at -1, id -1
+        IndexSpec([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("post_type", ASCENDING), ("is_archived", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "comments": [
+        IndexSpec([("post_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "stories": [
+        # Expired stories are removed by the server; highlights are kept forever
+        IndexSpec([("expires_at", ASCENDING)], ttl_seconds=0, partial={"is_highlight": False}),
+        IndexSpec([("is_highlight", ASCENDING), ("expires_at", ASCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("is_highlight", ASCENDING)]),
+    ],
+    "squad": [
+        IndexSpec([("user_id", ASCENDING), ("squad_member_id", ASCENDING)]),
+    ],
+    "squad_requests": [
+        IndexSpec([("id", ASCENDING)], unique=True, partial=_has_string("id")),
+        IndexSpec([("from_user_id", ASCENDING), ("status", ASCENDING)]),
+        IndexSpec([("to_user_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "direct_messages": [
+        IndexSpec([("sender_id", ASCENDING), ("receiver_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexSpec([("receiver_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexSpec([("sender_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "group_chats": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("members", ASCENDING)]),
+    ],
+    "group_messages": [
+        IndexSpec([("group_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "chat_threads": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("participants", ASCENDING), ("last_message_at", DESCENDING)]),
+    ],
+    "chat_messages": [
+        IndexSpec([("thread_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "meetings": [
+        IndexSpec([("participants", ASCENDING), ("start_time", ASCENDING)]),
+    ],
+    "verifications": [
+        IndexSpec([("user_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "livestreams": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("is_live", ASCENDING), ("region", ASCENDING), ("started_at", DESCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "teams": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("id", ASCENDING), ("version", ASCENDING)]),
+        IndexSpec([("city_key", ASCENDING)]),
+        IndexSpec([("search_words", ASCENDING)]),
+    ],
+    "leagues": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("city_key", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "stock_reservations": [
+        # Deletes reservations whose payment never completed; the sweeper then restocks
+        IndexSpec([("expires_at", ASCENDING)], ttl_seconds=0),
+    ],
+    "orders": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("items.vendor_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("created_at", DESCENDING), ("id", DESCENDING)]),
+        # Outbox claims (order_outbox.py); orders placed without a gateway stay out
+        IndexSpec([("gateway_outbox.status", ASCENDING), ("gateway_outbox.next_attempt_at", ASCENDING)], sparse=True),
+    ],
+    "highlights": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+    ],
+    "news": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("published_at", DESCENDING)]),
+    ],
+}
+
+# Result of the most recent reconciliation, served by the admin endpoint
+last_report: Dict[str, Any] = {}
+
+
+async def reconcile_collection(collection, specs: List[IndexSpec], drop_conflicting: bool = False) -> Dict[str, List[str]]:
+    """Create missing indexes on one collection and describe any drift"""
+    drift: Dict[str, List[str]] = {"created": [], "conflicting": [], "unmanaged": [], "failed": []}
+
+    try:
+        existing = await collection.index_information()
+    except PyMongoError as e:
+        logger.error(f"Could not list indexes on {collection.name}: {e}")
+        drift["failed"] = [spec.name for spec in specs]
+        return drift
+
+    wanted_names = {spec.name for spec in specs}
+    to_create: List[IndexSpec] = []
+
+    for spec in specs:
+        info = existing.get(spec.name)
+        if info is None:
+            to_create.append(spec)
+        elif not spec.matches(info):
+            if drop_conflicting:
+                try:
+                    await collection.drop_index(spec.name)
+                    to_create.append(spec)
+                except PyMongoError as e:
+                    logger.error(f"Could not drop index {collection.name}.{spec.name}: {e}")
+                    drift["failed"].append(spec.name)
+            else:
+                drift["conflicting"].append(spec.name)
+
+    for spec in to_create:
+        # One index at a time so a single bad index (e.g. duplicates under a
+        # unique key) does not stop the rest from being built
+        try:
+            await collection.create_indexes([spec.to_model()])
+            drift["created"].append(spec.name)
+        except PyMongoError as e:
+            logger.error(f"Could not create index {collection.name}.{spec.name}: {e}")
+            drift["failed"].append(spec.name)
+
+    drift["unmanaged"] = sorted(name for name in existing if name != "_id_" and name not in wanted_names)
+    return drift
+
+
+async def reconcile_indexes(db, registry: Optional[Dict[str, List[IndexSpec]]] = None, drop_conflicting: bool = False) -> Dict[str, Any]:
+    """Reconcile every collection in the registry and return a drift report"""
+    registry = registry if registry is not None else INDEXES
+    started = datetime.utcnow()
+
+    results = await asyncio.gather(*[
+        reconcile_collection(db[name], specs, drop_conflicting) for name, specs in registry.items()
+    ])
+
+    collections = {}
+    for name, drift in zip(registry.keys(), results):
+        if any(drift.values()):
+            collections[name] = drift
+
+    report = {
+        "started_at": started.isoformat(),
+        "finished_at": datetime.utcnow().isoformat(),
+        "collections_checked": len(registry),
+        "indexes_declared": sum(len(specs) for specs in registry.values()),
+        "created": sum(len(d["created"]) for d in results),
+        "conflicting": sum(len(d["conflicting"]) for d in results),
+        "failed": sum(len(d["failed"]) for d in results),
+        "unmanaged": sum(len(d["unmanaged"]) for d in results),
+        "drift": collections,
+    }
+
+    last_report.clear()
+    last_report.update(report)
+
+    logger.info(
+        f"Index reconciliation: {report['created']} created, {report['conflicting']} conflicting, "
+        f"{report['failed']} failed, {report['unmanaged']} unmanaged"
+    )
+    for name, drift in collections.items():
+        if drift["conflicting"] or drift["failed"]:
+            logger.warning(f"Index drift on {name}: {drift}")
+
+    return report
+
+
+async def _reconcile_in_background(db):
+    try:
+        await reconcile_indexes(db)
+    except Exception as e:
+        logger.error(f"Index reconciliation failed: {e}")
+
+
+def start_index_reconciliation(db) -> asyncio.Task:
+    """Schedule reconciliation without delaying startup"""
+    return asyncio.create_task(_reconcile_in_background(db))
@@ -0,0 +1,146 @@
+"""
+Conditional GET for 18 Cricket Network catalog reads
+Strong ETags from a per-document `version` (detail routes) and a
+per-collection version counter (list routes), so If-None-Match can be
+answered with 304 after one tiny lookup instead of the full query
+"""
+
+from fastapi import HTTPException, Request, Response
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+import hashlib
+
+from coalesce import single_flight
+from fast_json import FastJSONResponse, NO_ID
+from projections import FULL_PROJECTIONS
+
+# Collections served with ETags; every write path to them must go through
+# versioned_insert()/versioned_update() and then bump_collection_version(),
+# unless it only touches fields lists leave out (projections.LIST_HIDDEN_FIELDS)
+VERSIONED_COLLECTIONS = {"products", "grounds", "academies", "tournaments", "teams"}
+
+# Clients may keep the body but must revalidate before using it
+CACHE_CONTROL = "no-cache"
+
+VERSION_ONLY = {"_id": 0, "version": 1}
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def etag_response(content: Any, etag: str) -> FastJSONResponse:
+    return FastJSONResponse(content, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+# ==================== WRITE PATHS ====================
+
+def versioned_insert(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Stamp a new document with version 1"""
+    doc["version"] = 1
+    doc["updated_at"] = datetime.utcnow()
+    return doc
+
+
+def versioned_update(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the version bump to an update document: {"$set": {...}} -> {"$set": {..., updated_at}, "$inc": {version: 1}}"""
+    update = dict(update)
+    update["$set"] = {**update.get("$set", {}), "updated_at": datetime.utcnow()}
+    update["$inc"] = {**update.get("$inc", {}), "version": 1}
+    return update
+
+
+async def bump_collection_version(db, collection: str):
+    """
+    Invalidate list ETags for `collection`. Call it after the write and
+    before response_cache.invalidate(). Requests whose version lookup starts
+    once this has returned see the write, in full responses and in 304s.
+    Between the write and the bump the old ETag covers two bodies: a reader
+    may get the new data under it, and a client holding the old body may
+    still get a 304. Keep that window short; nothing may be awaited between
+    the write and this call that could take long.
+    """
+    await db.collection_versions.update_one({"_id": collection}, {"$inc": {"version": 1}}, upsert=True)
+
+
+async def collection_version(db, collection: str) -> int:
+    async def fetch():
+        doc = await db.collection_versions.find_one({"_id": collection})
+        return doc["version"] if doc else 0
+
+    # Concurrent list requests share one lookup; no TTL so writes show up at once
+    return await single_flight.do("collection_version", (db.name, collection), fetch)
+
+
+# ==================== READ PATHS ====================
+
+async def conditional_list(
+    request: Request,
+    db,
+    collection: str,
+    load: Callable[[], Awaitable[Any]],
+    coalesce_ttl: Optional[float] = None,
+) -> Response:
+    """
+    List route: 304 from the collection version alone, else run `load`.
+    With coalesce_ttl, identical concurrent misses share one `load`; the key
+    is the ETag, so a result is never reused across collection versions.
+    `load` may return a ready Response (e.g. with a cursor header), which
+    then only gets the caching headers added.
+    """
+    version = await collection_version(db, collection)
+    etag = make_etag(collection, version, request.url.path, request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if coalesce_ttl is not None:
+        content = await single_flight.do(f"{collection} list", etag, load, coalesce_ttl)
+    else:
+        content = await load()
+    if isinstance(content, Response):
+        content.headers["ETag"] = etag
+        content.headers["Cache-Control"] = CACHE_CONTROL
+        return content
+    return etag_response(content, etag)
+
+
+async def conditional_document(
+    request: Request,
+    collection,
+    doc_id: str,
+    not_found: str,
+    wrap: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> Response:
+    """
+    Detail route by uuid `id`. With If-None-Match only the version is read
+    (a covered query on the id_1_version_1 index); the body is fetched and
+    serialized only when it changed, without the collection's hidden fields.
+    """
+    if request.headers.get("if-none-match"):
+        current = await collection.find_one({"id": doc_id}, VERSION_ONLY)
+        if current is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        etag = make_etag(collection.name, doc_id, current.get("version", 0))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    doc = await collection.find_one({"id": doc_id}, FULL_PROJECTIONS.get(collection.name, NO_ID))
+    if not doc:
+        raise HTTPException(status_code=404, detail=not_found)
+    etag = make_etag(collection.name, doc_id, doc.get("version", 0))
+    return etag_response(wrap(doc) if wrap else doc, etag)
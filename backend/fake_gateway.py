@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Razorpay Orders API
+Serves POST /v1/orders and GET /v1/orders?receipt= with basic auth, a set
+latency and injectable failures (5xx responses, and calls that are carried
+out but answered only after the client timeout), and counts the requests and the peak number in flight.
+Tests and bench_gateway.py start it in-process; run it standalone and point
+RAZORPAY_API_URL at it to exercise checkout end to end.
+
+Usage: python fake_gateway.py --port 9100 --latency-ms 150 --error-rate 0.05
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import base64
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+
+class FakeGateway:
+    def __init__(
+        self,
+        key_id: str = "rzp_test_fake",
+        key_secret: str = "fake_secret",
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 30.0,
+        seed: Optional[int] = None,
+    ):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        # Failures scripted per call ahead of the random ones: "error", "hang" or "ok"
+        self.script: List[str] = []
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.by_receipt: Dict[str, str] = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/v1/orders", self.create_order)
+        app.router.add_get("/v1/orders", self.list_orders)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            auth = request.headers.get("Authorization", "")
+            try:
+                key_id, _, secret = base64.b64decode(auth.split(" ", 1)[1]).decode().partition(":")
+            except (IndexError, ValueError):
+                key_id = secret = ""
+            if (key_id, secret) != (self.key_id, self.key_secret):
+                return _error(401, "BAD_REQUEST_ERROR", "Authentication failed")
+            fate = self.script.pop(0) if self.script else None
+            roll = self._rng.random()
+            await asyncio.sleep(self.latency)
+            if fate == "error" or (fate is None and self.hang_rate <= roll < self.hang_rate + self.error_rate):
+                return _error(503, "SERVER_ERROR", "The server is unable to handle the request")
+            response = await handler(request)
+            # Done, but the response is lost to the client's timeout
+            if fate == "hang" or (fate is None and roll < self.hang_rate):
+                await asyncio.sleep(self.hang_seconds)
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def create_order(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        amount = body.get("amount")
+        if not isinstance(amount, int) or amount < 100:
+            return _error(400, "BAD_REQUEST_ERROR", "The amount must be atleast INR 1.00")
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": amount,
+            "amount_paid": 0,
+            "amount_due": amount,
+            "currency": body.get("currency", "INR"),
+            "receipt": body.get("receipt"),
+            "status": "created",
+            "attempts": 0,
+            "notes": body.get("notes") or {},
+            "created_at": int(time.time()),
+        }
+        self.orders[order["id"]] = order
+        if order["receipt"]:
+            self.by_receipt[order["receipt"]] = order["id"]
+        return web.json_response(order)
+
+    async def list_orders(self, request: web.Request) -> web.Response:
+        receipt = request.query.get("receipt")
+        if receipt is not None:
+            items = [self.orders[self.by_receipt[receipt]]] if receipt in self.by_receipt else []
+        else:
+            items = list(self.orders.values())[-10:]
+        return web.json_response({"entity": "collection", "count": len(items), "items": items})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the running loop; returns the base URL (port 0 picks a free one)"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _error(status: int, code: str, description: str) -> web.Response:
+    return web.json_response({"error": {"code": code, "description": description}}, status=status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--key-id", default="rzp_test_fake")
+    parser.add_argument("--key-secret", default="fake_secret")
+    args = parser.parse_args()
+    gateway = FakeGateway(args.key_id, args.key_secret, args.latency_ms / 1000, args.error_rate, args.hang_rate)
+    web.run_app(gateway.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
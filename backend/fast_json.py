@@ -0,0 +1,50 @@
+"""
+Fast JSON encoding for 18 Cricket Network
+orjson-backed response class with native datetime and ObjectId support
+"""
+
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from pydantic import BaseModel
+from typing import Any
+import orjson
+
+# Projection for collections that carry their own uuid `id`; the Mongo `_id`
+# never leaves the database so handlers don't have to rewrite it per document
+NO_ID = {"_id": 0}
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Encode the BSON and pydantic types orjson does not know about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Drop-in JSONResponse that renders with orjson.
+
+    Returning an instance directly from a handler also skips FastAPI's
+    jsonable_encoder pass, which is where most of the list-endpoint CPU goes.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,405 @@
+"""
+Typo-tolerant name matching for 18 Cricket Network
+Player and team names are transliterated many ways (Dhoni/Dhony,
+Mohammed/Mohammad/Muhammad), so the exact terms of text_search.py miss them.
+Names are split into words and the distinct words go into a trigram index
+whose grams mask the vowels, where most transliterations differ, plus a
+table of consonant skeletons ("kohli" and "kholi" are both "kl"). A query
+word reads its skeleton and the postings of its rarest grams, keeps the
+words sharing enough grams with it and re-ranks those by an edit distance
+in which vowel and "h" edits cost half. Work grows with the vocabulary of
+names, not with the number of profiles.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import re
+
+import numpy as np
+
+from search_sources import FUZZY_SOURCES as SOURCES
+from text_search import COMPACT_MIN_STALE, _fold
+
+logger = logging.getLogger(__name__)
+
+FUZZY_TYPES = tuple(SOURCES)
+
+# Candidate words checked with the edit distance per query word, most shared grams first
+MAX_VERIFY = 256
+VOWELS = frozenset("aeiou")
+# Edits that mostly come from spelling a name in Latin script
+HALF_COST = VOWELS | {"h"}
+
+_WORD = re.compile(r"[0-9a-z]+")
+# Applied in order; then doubled letters collapse ("mohammed" -> "mohamed")
+_SPELLINGS = (("ph", "f"), ("ck", "k"), ("ee", "i"), ("oo", "u"), ("w", "v"), ("z", "j"))
+_DOUBLED = re.compile(r"(.)\1+")
+_TRAILING_Y = re.compile(r"(?<=[^aeiou])y$")
+_VOWEL = re.compile(r"[aeiou]")
+_SOFT = re.compile(r"[aeiouh]")
+
+
+# ==================== SPELLING ====================
+
+def spelling(word: str) -> str:
+    """Common transliteration variants folded together: "Dhony" -> "dhoni" """
+    for variant, form in _SPELLINGS:
+        word = word.replace(variant, form)
+    return _TRAILING_Y.sub("i", _DOUBLED.sub(r"\1", word))
+
+
+def name_words(text: Any) -> List[str]:
+    """Distinct spelled words of a name, in order"""
+    if not isinstance(text, str):
+        return []
+    return list(dict.fromkeys(spelling(word) for word in _WORD.findall(_fold(text))))
+
+
+def grams(word: str) -> List[str]:
+    """Padded trigrams of a word with its vowels masked: "muhamad" and "mohamed" share all of them"""
+    masked = f"$${_VOWEL.sub('*', word)}$$"
+    return list(dict.fromkeys(masked[i:i + 3] for i in range(len(masked) - 2)))
+
+
+def skeleton(word: str) -> str:
+    """Consonants other than "h", in order: what survives most misspellings of a name"""
+    return _SOFT.sub("", word)
+
+
+def allowed_distance(word: str) -> float:
+    if len(word) < 3:
+        return 0.0
+    return 1.0 if len(word) <= 5 else 2.0 if len(word) <= 9 else 3.0
+
+
+def distance(a: str, b: str, bound: float) -> float:
+    """
+    Weighted edit distance counting a swap of neighbours as one edit, or
+    something above `bound` once it is certain to exceed it
+    """
+    if a == b:
+        return 0.0
+    indel_b = [0.5 if ch in HALF_COST else 1.0 for ch in b]
+    vowel_b = [ch in VOWELS for ch in b]
+    before: List[float] = []
+    previous = [0.0]
+    for cost in indel_b:
+        previous.append(previous[-1] + cost)
+    for i, ca in enumerate(a):
+        indel_a = 0.5 if ca in HALF_COST else 1.0
+        vowel_a = ca in VOWELS
+        left = previous[0] + indel_a
+        current = [left]
+        for j, cb in enumerate(b):
+            if ca == cb:
+                cost = previous[j]
+            else:
+                cost = previous[j] + (0.5 if vowel_a and vowel_b[j] else 1.0)
+            if previous[j + 1] + indel_a < cost:
+                cost = previous[j + 1] + indel_a
+            if left + indel_b[j] < cost:
+                cost = left + indel_b[j]
+            if i and j and ca == b[j - 1] and a[i - 1] == cb and before[j - 1] + 1.0 < cost:
+                cost = before[j - 1] + 1.0
+            current.append(cost)
+            left = cost
+        if min(current) > bound:
+            return bound + 1.0
+        before, previous = previous, current
+    return previous[-1]
+
+
+def similarity(a: str, b: str, dist: float) -> float:
+    return 1.0 - dist / max(len(a), len(b), 1)
+
+
+# ==================== INDEX ====================
+
+class FuzzyIndex:
+    """
+    Words get ids in insertion order, so every gram posting is an ascending
+    array('i') that can be searched with np.searchsorted. Word postings list
+    entity slots; as in SearchIndex, a re-indexed or removed entity only has
+    its slot switched off, and compact() drops stale slots and the words no
+    live entity uses any more.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.words: List[str] = []
+        self._word_ids: Dict[str, int] = {}
+        self._grams: Dict[str, array] = {}
+        self._skeletons: Dict[str, array] = {}
+        self._lengths = array("b")
+        self._word_slots: List[array] = []
+        self.keys: List[Optional[str]] = []
+        # Each slot's words, to tell a rename from a write to other fields
+        self.names: List[Tuple[str, ...]] = []
+        self.slots: Dict[Tuple[int, str], int] = {}
+        self._allocate(capacity)
+        self.size = 0
+        self.loaded = False
+        self._pending: Optional[List[Tuple[str, str, Any]]] = None
+
+    def _allocate(self, capacity: int):
+        self.types = np.zeros(capacity, dtype=np.int8)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = (self.types, self.active)
+        self._allocate(len(self.types) * 2)
+        for new, current in zip((self.types, self.active), old):
+            new[:len(current)] = current
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # ==================== WRITES ====================
+
+    def upsert(self, type_name: str, doc: Dict[str, Any]):
+        if self._pending is not None:
+            self._pending.append(("upsert", type_name, doc))
+        source = SOURCES[type_name]
+        key = doc.get(source.key)
+        if key is None:
+            return
+        key = str(key)
+        if any(doc.get(field) != value for field, value in source.query.items()):
+            self._remove(type_name, key)
+            return
+        entity_words = tuple(dict.fromkeys(word for field in source.fields for word in name_words(doc.get(field))))
+        current = self.slots.get((FUZZY_TYPES.index(type_name), key))
+        if current is not None and self.names[current] == entity_words:
+            return
+        self._remove(type_name, key)
+        if not entity_words:
+            self._compact_if_stale()
+            return
+
+        if self.size == len(self.types):
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.keys.append(key)
+        self.names.append(entity_words)
+        self.slots[(FUZZY_TYPES.index(type_name), key)] = slot
+        self.types[slot] = FUZZY_TYPES.index(type_name)
+        self.active[slot] = True
+        for word in entity_words:
+            self._word_slots[self._word_id(word)].append(slot)
+        self._compact_if_stale()
+
+    def _word_id(self, word: str) -> int:
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self.words)
+            self.words.append(word)
+            self._lengths.append(min(len(word), 127))
+            self._word_slots.append(array("i"))
+            for gram in grams(word):
+                posting = self._grams.get(gram)
+                if posting is None:
+                    posting = self._grams[gram] = array("i")
+                posting.append(word_id)
+            key = skeleton(word)
+            if len(key) >= 2:
+                self._skeletons.setdefault(key, array("i")).append(word_id)
+        return word_id
+
+    def remove(self, type_name: str, key: Any):
+        if self._pending is not None:
+            self._pending.append(("remove", type_name, key))
+        self._remove(type_name, str(key))
+        self._compact_if_stale()
+
+    def _remove(self, type_name: str, key: str):
+        slot = self.slots.pop((FUZZY_TYPES.index(type_name), key), None)
+        if slot is None:
+            return
+        self.active[slot] = False
+        self.keys[slot] = None
+        self.names[slot] = ()
+
+    def _compact_if_stale(self):
+        stale = self.size - len(self.slots)
+        if stale >= COMPACT_MIN_STALE and stale > len(self.slots):
+            self.compact()
+
+    def compact(self):
+        """Renumber the live slots densely; words left without a live entity are dropped"""
+        live = np.flatnonzero(self.active[:self.size])
+        renumbered = np.full(self.size, -1, dtype=np.int32)
+        renumbered[live] = np.arange(len(live), dtype=np.int32)
+        fresh = FuzzyIndex(max(1024, 2 * len(live)))
+        # In id order, so the fresh gram postings stay ascending
+        for word, word_slots in zip(self.words, self._word_slots):
+            slots = renumbered[np.frombuffer(word_slots, dtype=np.int32)]
+            slots = slots[slots >= 0]
+            if len(slots):
+                fresh._word_slots[fresh._word_id(word)] = array("i", slots.tobytes())
+        fresh.keys = [self.keys[slot] for slot in live.tolist()]
+        fresh.names = [self.names[slot] for slot in live.tolist()]
+        fresh.slots = {type_key: int(renumbered[slot]) for type_key, slot in self.slots.items()}
+        fresh.size = len(live)
+        fresh.types[:fresh.size] = self.types[live]
+        fresh.active[:fresh.size] = True
+        self._adopt(fresh)
+
+    def _adopt(self, fresh: "FuzzyIndex"):
+        for name in ("words", "_word_ids", "_grams", "_skeletons", "_lengths", "_word_slots", "keys", "names", "slots",
+                     "types", "active", "size"):
+            setattr(self, name, getattr(fresh, name))
+
+    async def load(self, db, batch_size: int = 5_000):
+        """Rebuild from the collections on a worker thread; writes made meanwhile are replayed"""
+        fresh = FuzzyIndex()
+        loop = asyncio.get_running_loop()
+        self._pending = []
+        try:
+            for type_name, source in SOURCES.items():
+                projection = {field: 1 for field in (*source.fields, *source.query)}
+                projection[source.key] = 1
+                if source.key != "_id":
+                    projection["_id"] = 0
+                batch: List[Dict[str, Any]] = []
+                async for doc in db[source.collection].find(source.query, projection).batch_size(batch_size):
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        await loop.run_in_executor(None, fresh._upsert_many, type_name, batch)
+                        batch = []
+                if batch:
+                    await loop.run_in_executor(None, fresh._upsert_many, type_name, batch)
+            pending, self._pending = self._pending, None
+        except BaseException:
+            self._pending = None
+            raise
+        for op, type_name, value in pending:
+            if op == "upsert":
+                fresh.upsert(type_name, value)
+            else:
+                fresh._remove(type_name, str(value))
+        self._adopt(fresh)
+        self.loaded = True
+        logger.info(f"Fuzzy name index: {len(self.slots)} names, {len(self.words)} words")
+
+    def _upsert_many(self, type_name: str, docs: Iterable[Dict[str, Any]]):
+        for doc in docs:
+            self.upsert(type_name, doc)
+
+    # ==================== QUERIES ====================
+
+    def similar_words(self, word: str) -> List[Tuple[int, float]]:
+        """(word id, similarity) of the indexed words within allowed_distance(word)"""
+        bound = allowed_distance(word)
+        exact = self._word_ids.get(word)
+        if bound == 0.0:
+            return [(exact, 1.0)] if exact is not None else []
+        query_grams = grams(word)
+        postings = sorted(
+            (np.frombuffer(self._grams[gram], dtype=np.int32) for gram in query_grams if gram in self._grams),
+            key=len,
+        )
+        # An edit breaks at most three grams (a vowel change none); a match keeps
+        # `needed` of them, so it holds at least one of the rarest len - needed + 1.
+        # Swapped neighbours can break four: the skeleton table catches those
+        needed = max(1, len(query_grams) - 3 * int(bound))
+        candidates = np.empty(0, dtype=np.int32)
+        if len(postings) >= needed:
+            candidates = np.unique(np.concatenate(postings[:len(postings) - needed + 1]))
+            lengths = np.frombuffer(self._lengths, dtype=np.int8)[candidates]
+            candidates = candidates[np.abs(lengths.astype(np.int32) - len(word)) <= 2 * bound]
+            shared = np.zeros(len(candidates), dtype=np.int32)
+            for posting in postings:
+                at = np.searchsorted(posting, candidates)
+                shared += (posting[np.minimum(at, len(posting) - 1)] == candidates)
+            keep = shared >= needed
+            candidates, shared = candidates[keep], shared[keep]
+            if len(candidates) > MAX_VERIFY:
+                candidates = candidates[np.argpartition(-shared, MAX_VERIFY - 1)[:MAX_VERIFY]]
+        same_skeleton = self._skeletons.get(skeleton(word))
+        if same_skeleton is not None:
+            candidates = np.union1d(candidates, np.frombuffer(same_skeleton, dtype=np.int32)[:MAX_VERIFY])
+
+        matches = []
+        for word_id in candidates.tolist():
+            other = self.words[word_id]
+            if abs(len(other) - len(word)) > 2 * bound:
+                continue
+            dist = distance(word, other, bound)
+            if dist <= bound:
+                matches.append((word_id, similarity(word, other, dist)))
+        return matches
+
+    def _word_scores(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Live slots with a word like `word`, each with its best similarity"""
+        slot_parts, score_parts = [], []
+        for word_id, score in self.similar_words(word):
+            slots = np.frombuffer(self._word_slots[word_id], dtype=np.int32)
+            slot_parts.append(slots)
+            score_parts.append(np.full(len(slots), score, dtype=np.float32))
+        if not slot_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        slots, scores = np.concatenate(slot_parts), np.concatenate(score_parts)
+        # Best score first within each slot, then the first row of every slot
+        order = np.lexsort((-scores, slots))
+        slots, scores = slots[order], scores[order]
+        first = np.concatenate(([True], slots[1:] != slots[:-1]))
+        slots, scores = slots[first], scores[first]
+        live = self.active[slots]
+        return slots[live], scores[live]
+
+    def search(
+        self,
+        query: str,
+        types: Optional[Iterable[str]] = None,
+        limit: int = 20,
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Best `limit` (key, score) matches per type. Every word of the query
+        must be like some word of the name; the score is the mean similarity
+        of those words, 1.0 when all are spelled as indexed.
+        """
+        wanted = [FUZZY_TYPES.index(name) for name in (types or FUZZY_TYPES)]
+        hits: Dict[str, List[Tuple[str, float]]] = {FUZZY_TYPES[code]: [] for code in wanted}
+        query_words = name_words(query)
+        if not query_words or not self.slots or limit <= 0:
+            return hits
+
+        slots, scores = self._word_scores(query_words[0])
+        for word in query_words[1:]:
+            if not len(slots):
+                break
+            other_slots, other_scores = self._word_scores(word)
+            slots, mine, theirs = np.intersect1d(slots, other_slots, assume_unique=True, return_indices=True)
+            scores = scores[mine] + other_scores[theirs]
+        scores = scores / len(query_words)
+        slot_types = self.types[slots]
+        for code in wanted:
+            of_type = slot_types == code
+            matches, match_scores = slots[of_type], scores[of_type]
+            if matches.size == 0:
+                continue
+            if matches.size > limit:
+                top = np.argpartition(-match_scores, limit - 1)[:limit]
+                matches, match_scores = matches[top], match_scores[top]
+            order = np.argsort(-match_scores, kind="stable")
+            hits[FUZZY_TYPES[code]] = [(self.keys[matches[i]], round(float(match_scores[i]), 4)) for i in order]
+        return hits
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "names": len(self.slots),
+            "by_type": {name: int(np.count_nonzero(self.active[:self.size] & (self.types[:self.size] == code)))
+                        for code, name in enumerate(FUZZY_TYPES)},
+            "words": len(self.words),
+            "grams": len(self._grams),
+            "skeletons": len(self._skeletons),
+            "gram_postings": sum(len(p) for p in self._grams.values()),
+            "stale_slots": self.size - len(self.slots),
+        }
+
+
+# Shared instance for the apps in this process
+index = FuzzyIndex()
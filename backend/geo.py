@@ -0,0 +1,318 @@
+"""
+Geospatial helpers for 18 Cricket Network
+Documents keep their flat latitude/longitude fields for existing clients and
+also carry a GeoJSON point in GEO_FIELD, indexed 2dsphere, so nearby
+searches run as $geoNear with great-circle distances
+"""
+
+from fastapi import HTTPException
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import base64
+import binascii
+import heapq
+
+import orjson
+
+GEO_FIELD = "geo"
+# Geohash of the point, indexed so a map tile is a prefix range scan
+GEOHASH_FIELD = "geohash"
+GEOHASH_PRECISION = 9
+
+# Collections whose documents carry GEO_FIELD (backfilled by migrate_geo.py)
+GEO_COLLECTIONS = ("grounds", "training_facilities", "personal_trainers", "cricket_gyms")
+# Fields the in-memory proximity engine (proximity.py) loads and follows
+PROXIMITY_PROJECTION = {"_id": 0, "id": 1, "latitude": 1, "longitude": 1, "pricing": 1, "rating": 1}
+
+# Internal distance field of the $geoNear stage, in meters
+_DISTANCE = "_distance_m"
+
+MAX_RADIUS_KM = 100
+MAX_PAGE_SIZE = 100
+
+
+def geo_point(latitude: Optional[float], longitude: Optional[float]) -> Optional[Dict[str, Any]]:
+    """GeoJSON point for a coordinate pair, None when either is missing or out of range"""
+    if latitude is None or longitude is None:
+        return None
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    # GeoJSON order is [longitude, latitude]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geo_fields(latitude: Optional[float], longitude: Optional[float]) -> Dict[str, Any]:
+    """GEO_FIELD and GEOHASH_FIELD for a coordinate pair, {} when it has no valid point"""
+    point = geo_point(latitude, longitude)
+    if point is None:
+        return {}
+    longitude, latitude = point["coordinates"]
+    return {GEO_FIELD: point, GEOHASH_FIELD: geohash_encode(latitude, longitude)}
+
+
+def with_geo_point(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Stamp GEO_FIELD and GEOHASH_FIELD on a document about to be inserted"""
+    fields = geo_fields(doc.get("latitude"), doc.get("longitude"))
+    doc.pop(GEO_FIELD, None)
+    doc.pop(GEOHASH_FIELD, None)
+    doc.update(fields)
+    return doc
+
+
+def geo_update(current: Dict[str, Any], update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Update operators keeping GEO_FIELD and GEOHASH_FIELD in step with a $set
+    of latitude/longitude: {"$set": {..., "geo": point, "geohash": hash}} or
+    {"$set": {...}, "$unset": {"geo": "", "geohash": ""}}
+    """
+    update: Dict[str, Any] = {"$set": dict(update_data)}
+    if "latitude" not in update_data and "longitude" not in update_data:
+        return update
+    fields = geo_fields(
+        update_data.get("latitude", current.get("latitude")),
+        update_data.get("longitude", current.get("longitude")),
+    )
+    if fields:
+        update["$set"].update(fields)
+    else:
+        update["$unset"] = {GEO_FIELD: "", GEOHASH_FIELD: ""}
+    return update
+
+
+# ==================== NEARBY QUERIES ====================
+
+Position = Tuple[float, str]
+
+
+def encode_cursor(position: Any) -> str:
+    raw = orjson.dumps(position)
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return orjson.loads(raw)
+    except (binascii.Error, orjson.JSONDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _position(value: Any) -> Position:
+    """A [distance_m, id] pair from a decoded cursor"""
+    try:
+        distance, doc_id = value
+        return float(distance), str(doc_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _aggregation_projection(projection: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A find() projection as a $project stage: find's {"$slice": n} becomes the
+    aggregation form, and inclusion projections keep what paging needs
+    """
+    stage: Dict[str, Any] = {}
+    for field, value in projection.items():
+        if isinstance(value, dict) and "$slice" in value:
+            stage[field] = {"$slice": [f"${field}", value["$slice"]]}
+        else:
+            stage[field] = value
+    if any(value not in (0, False) for field, value in stage.items() if field != "_id"):
+        stage["id"] = 1
+        stage[_DISTANCE] = 1
+    return stage
+
+
+def near_pipeline(
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    limit: int,
+    after: Optional[Position] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregation pipeline for up to `limit` documents within `radius_km`,
+    nearest first with id breaking ties, strictly after the (distance, id)
+    position `after`. Needs a 2dsphere index on GEO_FIELD.
+    """
+    point = geo_point(latitude, longitude)
+    if point is None:
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+
+    geo_near: Dict[str, Any] = {
+        "near": point,
+        "key": GEO_FIELD,
+        "distanceField": _DISTANCE,
+        "maxDistance": radius_km * 1000,
+        "spherical": True,
+        "query": query,
+    }
+    pipeline: List[Dict[str, Any]] = [{"$geoNear": geo_near}]
+    if after is not None:
+        last_distance, last_id = after
+        # minDistance lets the index skip the pages already served
+        geo_near["minDistance"] = last_distance
+        pipeline.append({"$match": {"$or": [
+            {_DISTANCE: {"$gt": last_distance}},
+            {_DISTANCE: last_distance, "id": {"$gt": last_id}},
+        ]}})
+    pipeline += [
+        {"$sort": {_DISTANCE: 1, "id": 1}},
+        {"$limit": limit},
+        {"$project": _aggregation_projection(projection)},
+    ]
+    return pipeline
+
+
+async def _near_docs(collection, latitude, longitude, radius_km, query, projection, limit, after=None) -> List[Dict[str, Any]]:
+    radius_km = max(0.0, min(radius_km, MAX_RADIUS_KM))
+    pipeline = near_pipeline(latitude, longitude, radius_km, query, projection, limit, after)
+    return await collection.aggregate(pipeline).to_list(limit)
+
+
+def _finish(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc["distance_km"] = round(doc.pop(_DISTANCE) / 1000, 2)
+    return doc
+
+
+async def fetch_nearby(
+    collection,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of `collection` by great-circle distance from the point, each
+    document with `distance_km`, and the cursor for the next page (None on
+    the last page)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = _position(decode_cursor(cursor)) if cursor else None
+    docs = await _near_docs(collection, latitude, longitude, radius_km, query, projection, limit + 1, after)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1][_DISTANCE], docs[-1]["id"]])
+    return [_finish(doc) for doc in docs], next_cursor
+
+
+async def fetch_nearby_merged(
+    sources: Dict[str, Tuple[Any, Dict[str, Any], Dict[str, Any]]],
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: int,
+    quota: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page across several collections, merged by distance.
+
+    `sources` maps a result type to (collection, query, projection); every
+    document comes back with `type` and `distance_km`. Each collection is
+    queried concurrently for at most one page, then the sorted streams are
+    k-way merged. `quota` caps the rows of one type on a page while other
+    types still have rows to show, so a dense vertical cannot crowd out the
+    rest; a page that would come up short is topped up past the quota.
+
+    The cursor holds each type's last served (distance, id); a type missing
+    from it is exhausted.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if cursor:
+        state = decode_cursor(cursor)
+        if not isinstance(state, dict) or not set(state) <= set(sources):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        positions = {name: _position(value) if value is not None else None for name, value in state.items()}
+    else:
+        positions = {name: None for name in sources}
+
+    names = list(positions)
+    results = await asyncio.gather(*[
+        _near_docs(
+            sources[name][0], latitude, longitude, radius_km,
+            sources[name][1], sources[name][2], limit + 1, positions[name],
+        )
+        for name in names
+    ])
+
+    streams = [
+        [(doc[_DISTANCE], name, doc["id"], doc) for doc in docs[:limit]]
+        for name, docs in zip(names, results)
+    ]
+    taken: List[Tuple[float, str, str, Dict[str, Any]]] = []
+    held: List[Tuple[float, str, str, Dict[str, Any]]] = []
+    served: Dict[str, int] = {}
+    for item in heapq.merge(*streams, key=lambda item: item[:3]):
+        if len(taken) == limit:
+            break
+        name = item[1]
+        if quota and served.get(name, 0) >= quota:
+            held.append(item)
+            continue
+        served[name] = served.get(name, 0) + 1
+        taken.append(item)
+    # Top up from the capped types; held rows are in distance order, so each
+    # type still serves a prefix of its stream
+    for item in held[:limit - len(taken)]:
+        served[item[1]] += 1
+        taken.append(item)
+    taken.sort(key=lambda item: item[:3])
+
+    page: List[Dict[str, Any]] = []
+    for distance, name, doc_id, doc in taken:
+        positions[name] = (distance, doc_id)
+        doc["type"] = name
+        page.append(_finish(doc))
+
+    remaining = {}
+    for name, docs in zip(names, results):
+        # More rows exist past this page's last one for the type
+        if len(docs) > served.get(name, 0):
+            last = positions[name]
+            remaining[name] = list(last) if last is not None else None
+    next_cursor = encode_cursor(remaining) if remaining else None
+    return page, next_cursor
@@ -0,0 +1,260 @@
+"""
+Map viewport tiles for 18 Cricket Network
+A viewport is covered by geohash tiles; each tile's markers (or, for coarse
+tiles, its clusters) are read with one prefix range scan on the `geohash`
+index and cached per collection, tile and precision until a listing in the
+tile changes. Overlapping viewports while the map pans reuse the same tiles.
+"""
+
+from collections import OrderedDict
+from fastapi import HTTPException
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import math
+import os
+import time
+
+from coalesce import single_flight
+from geo import GEOHASH_FIELD, geohash_cell_size, geohash_encode
+from metrics import Counter, Gauge, registry
+
+# Tiles of this precision or finer ship individual markers (~4.9 x 4.9 km);
+# coarser tiles are clustered in the database
+MARKER_PRECISION = 5
+MAX_TILE_PRECISION = 7
+# Upper bound on the tiles one viewport is split into
+MAX_TILES = 24
+MAX_TILE_MARKERS = 2000
+# Above this many markers a viewport is clustered even at street zoom
+MAX_MARKERS = 500
+# Web-map zoom below which markers are always clustered
+CLUSTER_BELOW_ZOOM = 13
+
+TILE_CACHE_MAX_TILES = int(os.getenv("TILE_CACHE_MAX_TILES", "20000"))
+# Bounds staleness when no change feed delivers other workers' writes
+TILE_CACHE_TTL = float(os.getenv("TILE_CACHE_TTL", "30"))
+
+MARKER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "latitude": 1, "longitude": 1, "rating": 1, GEOHASH_FIELD: 1}
+
+tile_requests = registry.register(Counter("map_tile_requests_total", "Map tile lookups by collection and outcome"))
+tile_entries = registry.register(Gauge("map_tile_cache_entries", "Tiles held by the in-process map tile cache"))
+
+
+def _prefix_range(prefix: str) -> Dict[str, Any]:
+    # "{" sorts right after "z", the last geohash character
+    return {GEOHASH_FIELD: {"$gte": prefix, "$lt": prefix + "{"}}
+
+
+def _boxes(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Tuple[float, float, float, float]]:
+    """The viewport as one or two boxes; a viewport across the antimeridian is split"""
+    if not (-90 <= min_lat <= max_lat <= 90) or not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid viewport")
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def _tiles_at(
+    boxes: Iterable[Tuple[float, float, float, float]],
+    precision: int,
+    limit: Optional[int] = MAX_TILES,
+) -> List[str]:
+    """The tiles covering the boxes, or [] when that takes more than `limit` tiles"""
+    height, width = geohash_cell_size(precision)
+    tiles: Set[str] = set()
+    for min_lat, min_lon, max_lat, max_lon in boxes:
+        rows = int(math.floor(max_lat / height) - math.floor(min_lat / height)) + 1
+        cols = int(math.floor(max_lon / width) - math.floor(min_lon / width)) + 1
+        if limit is not None and len(tiles) + rows * cols > limit:
+            return []
+        for row in range(rows):
+            lat = min(max_lat, (math.floor(min_lat / height) + row + 0.5) * height)
+            for col in range(cols):
+                lon = min(max_lon, (math.floor(min_lon / width) + col + 0.5) * width)
+                tiles.add(geohash_encode(max(min_lat, lat), max(min_lon, lon), precision))
+    return sorted(tiles)
+
+
+def cover_viewport(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Tuple[int, List[str]]:
+    """
+    Finest precision whose tiles cover the viewport in at most MAX_TILES
+    tiles, and those tiles. A viewport too wide even for that gets the whole
+    precision 1 cover (at most the 32 tiles of the globe)
+    """
+    boxes = _boxes(min_lat, min_lon, max_lat, max_lon)
+    best = (1, _tiles_at(boxes, 1, limit=None))
+    for precision in range(2, MAX_TILE_PRECISION + 1):
+        tiles = _tiles_at(boxes, precision)
+        if not tiles:
+            break
+        best = (precision, tiles)
+    return best
+
+
+class TileCache:
+    """
+    LRU of tile contents keyed by (collection, tile). A write invalidates
+    every tile containing the listing: all prefixes of its geohash.
+    """
+
+    def __init__(self, max_tiles: int = TILE_CACHE_MAX_TILES, ttl: float = TILE_CACHE_TTL):
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self._tiles: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        # Bumped by invalidation so a load that raced a write is not stored
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db, collection: str, tile: str) -> List[Dict[str, Any]]:
+        key = (collection, tile)
+        cached = self._tiles.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            tile_requests.inc(collection=collection, outcome="hit")
+            return cached[1]
+
+        self.misses += 1
+        tile_requests.inc(collection=collection, outcome="miss")
+        generation = self._generations.get(collection, 0)
+        items = await single_flight.do("map tile", (db.name, collection, tile), lambda: load_tile(db, collection, tile))
+        if self._generations.get(collection, 0) == generation:
+            self._tiles[key] = (time.monotonic() + self.ttl, items)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+            tile_entries.set(len(self._tiles))
+        return items
+
+    def invalidate(self, collection: str, *geohashes: Optional[str]):
+        """
+        Drop every cached tile of `collection` containing one of the
+        geohashes. With no geohashes the whole collection is dropped.
+        """
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        if not any(geohashes):
+            for key in [key for key in self._tiles if key[0] == collection]:
+                del self._tiles[key]
+        for geohash in geohashes:
+            if not geohash:
+                continue
+            for precision in range(1, MAX_TILE_PRECISION + 1):
+                self._tiles.pop((collection, geohash[:precision]), None)
+        tile_entries.set(len(self._tiles))
+
+    def report(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "tiles": len(self._tiles),
+            "max_tiles": self.max_tiles,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+async def load_tile(db, collection: str, tile: str) -> List[Dict[str, Any]]:
+    """
+    Markers of a fine tile, or for a coarse tile one cluster per child cell
+    (a cell holding a single listing comes back as that listing's marker)
+    """
+    if len(tile) >= MARKER_PRECISION:
+        docs = await db[collection].find(_prefix_range(tile), MARKER_PROJECTION).limit(MAX_TILE_MARKERS).to_list(MAX_TILE_MARKERS)
+        return [{"kind": "marker", **doc} for doc in docs]
+
+    pipeline = [
+        {"$match": _prefix_range(tile)},
+        {"$group": {
+            "_id": {"$substrBytes": [f"${GEOHASH_FIELD}", 0, len(tile) + 1]},
+            "count": {"$sum": 1},
+            "latitude": {"$avg": "$latitude"},
+            "longitude": {"$avg": "$longitude"},
+            "id": {"$first": "$id"},
+            "name": {"$first": "$name"},
+            "rating": {"$first": "$rating"},
+            GEOHASH_FIELD: {"$first": f"${GEOHASH_FIELD}"},
+        }},
+    ]
+    items = []
+    async for group in db[collection].aggregate(pipeline):
+        if group["count"] == 1:
+            items.append({
+                "kind": "marker", "id": group["id"], "name": group["name"], "rating": group.get("rating"),
+                "latitude": group["latitude"], "longitude": group["longitude"], GEOHASH_FIELD: group[GEOHASH_FIELD],
+            })
+        else:
+            items.append(_cluster(group["_id"], group["count"], group["latitude"], group["longitude"]))
+    return items
+
+
+def _cluster(cell: str, count: int, latitude: float, longitude: float) -> Dict[str, Any]:
+    return {"kind": "cluster", "cell": cell, "count": count, "latitude": round(latitude, 6), "longitude": round(longitude, 6)}
+
+
+def cluster_markers(markers: List[Dict[str, Any]], precision: int) -> List[Dict[str, Any]]:
+    """Group markers by geohash cell of `precision`; single-marker cells stay markers"""
+    cells: Dict[str, List[Dict[str, Any]]] = {}
+    for marker in markers:
+        cells.setdefault(marker[GEOHASH_FIELD][:precision], []).append(marker)
+    items = []
+    for cell, members in cells.items():
+        if len(members) == 1:
+            items.append(members[0])
+            continue
+        latitude = sum(m["latitude"] for m in members) / len(members)
+        longitude = sum(m["longitude"] for m in members) / len(members)
+        items.append(_cluster(cell, len(members), latitude, longitude))
+    return items
+
+
+def _in_viewport(item: Dict[str, Any], boxes: List[Tuple[float, float, float, float]]) -> bool:
+    lat, lon = item.get("latitude"), item.get("longitude")
+    if lat is None or lon is None:
+        return False
+    return any(b[0] <= lat <= b[2] and b[1] <= lon <= b[3] for b in boxes)
+
+
+async def viewport(
+    db,
+    collections: Dict[str, str],
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    zoom: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Markers and clusters inside the viewport for each result type in
+    `collections` (type -> collection), built from cached tiles
+    """
+    boxes = _boxes(min_lat, min_lon, max_lat, max_lon)
+    precision, tiles = cover_viewport(min_lat, min_lon, max_lat, max_lon)
+
+    keys = [(type_name, collection, tile) for type_name, collection in collections.items() for tile in tiles]
+    contents = await asyncio.gather(*[tile_cache.get(db, collection, tile) for _, collection, tile in keys])
+    by_type: Dict[str, List[Dict[str, Any]]] = {type_name: [] for type_name in collections}
+    for (type_name, _, _), items in zip(keys, contents):
+        by_type[type_name].extend(item for item in items if _in_viewport(item, boxes))
+
+    markers = sum(1 for items in by_type.values() for item in items if item["kind"] == "marker")
+    clustered = precision < MARKER_PRECISION or (zoom is not None and zoom < CLUSTER_BELOW_ZOOM) or markers > MAX_MARKERS
+    if clustered and precision >= MARKER_PRECISION:
+        by_type = {
+            type_name: cluster_markers(items, precision + 1)
+            for type_name, items in by_type.items()
+        }
+
+    results = []
+    for type_name, items in by_type.items():
+        for item in items:
+            item = dict(item)
+            item.pop(GEOHASH_FIELD, None)
+            item["type"] = type_name
+            results.append(item)
+    return {"precision": precision, "tiles": len(tiles), "clustered": clustered, "items": results}
+
+
+# Shared instance for the apps in this process
+tile_cache = TileCache()
@@ -0,0 +1,194 @@
+"""
+Inventory reservation for 18 Cricket Network
+Checkout holds stock before payment with one unordered bulk write of
+conditional decrements, one per product: {"id": ..., "stock": {"$gte": qty}}
+-> $inc stock by -qty. A line that finds too little stock matches nothing,
+so concurrent checkouts can never take a product below zero, and no lock or
+transaction is held. Each decrement also pushes a hold {r: reservation id,
+q: qty} on the product. That makes retries idempotent and tells which lines
+got their stock.
+
+A reservation lives in `stock_reservations` until its `expires_at`. When
+payment never completes, a TTL index deletes it and the sweeper returns the
+stock of every hold whose reservation is gone. Paying commits the
+reservation: its holds are dropped and the stock stays sold.
+
+Holds move a product's own version (detail ETags) but never the
+collection's: stock is left out of list responses (projections.py), so
+checkout does not expire every list ETag and cached facet.
+"""
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from etags import versioned_update
+from metrics import Counter, Histogram, LATENCY_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+RESERVATIONS = "stock_reservations"
+# How long checkout holds stock while the buyer pays
+RESERVATION_TTL_SECONDS = float(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+# The TTL monitor deletes expired reservations about once a minute; the
+# sweeper then puts their stock back on sale
+SWEEP_INTERVAL_SECONDS = float(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+
+reservation_outcomes = registry.register(
+    Counter("inventory_reservations_total", "Reservations by outcome (held, out_of_stock, committed, released, expired)")
+)
+reserve_duration = registry.register(
+    Histogram("inventory_reserve_duration_seconds", "Time to reserve the lines of one checkout", LATENCY_BUCKETS)
+)
+
+
+class OutOfStock(Exception):
+    """Lines of a checkout that could not be reserved; nothing stays held"""
+
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Out of stock: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+
+class AlreadyCommitted(ValueError):
+    """reserve() for a reservation that was paid for: its stock is already sold to it"""
+
+
+def merge_lines(lines: Iterable[Tuple[str, int]]) -> Dict[str, int]:
+    """Quantity per product; a product listed twice is reserved once, for the sum"""
+    wanted: Dict[str, int] = {}
+    for product_id, quantity in lines:
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive: {product_id}")
+        wanted[product_id] = wanted.get(product_id, 0) + quantity
+    if not wanted:
+        raise ValueError("Nothing to reserve")
+    return wanted
+
+
+async def reserve(
+    db,
+    reservation_id: str,
+    lines: Iterable[Tuple[str, int]],
+    ttl: float = RESERVATION_TTL_SECONDS,
+) -> Dict[str, Any]:
+    """
+    Hold stock for every (product id, quantity) line, or for none of them
+    (raises OutOfStock). Safe to retry with the same reservation id
+    """
+    start = time.perf_counter()
+    wanted = merge_lines(lines)
+    now = datetime.utcnow()
+    reservation = {
+        "lines": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in wanted.items()],
+        "status": "held",
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+    # Written before the holds: a hold is only ever released once its reservation is gone
+    try:
+        await db[RESERVATIONS].update_one(
+            {"_id": reservation_id, "status": {"$ne": "committed"}},
+            {"$set": reservation, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise AlreadyCommitted(f"Reservation {reservation_id} is already committed")
+    ops = [
+        UpdateOne(
+            {"id": product_id, "stock": {"$gte": quantity}, "holds.r": {"$ne": reservation_id}},
+            versioned_update({
+                "$inc": {"stock": -quantity, "reserved": quantity},
+                "$push": {"holds": {"r": reservation_id, "q": quantity}},
+            }),
+        )
+        for product_id, quantity in wanted.items()
+    ]
+    result = await db.products.bulk_write(ops, ordered=False)
+    # Short lines (or lines already held by an earlier attempt) modified nothing
+    if result.modified_count < len(ops):
+        held = await db.products.distinct("id", {"id": {"$in": list(wanted)}, "holds.r": reservation_id})
+        missing = [product_id for product_id in wanted if product_id not in set(held)]
+        if missing:
+            await release(db, reservation_id, "out_of_stock")
+            reserve_duration.observe(time.perf_counter() - start)
+            raise OutOfStock(missing)
+    reservation_outcomes.inc(outcome="held")
+    reserve_duration.observe(time.perf_counter() - start)
+    return {"_id": reservation_id, **reservation}
+
+
+async def _drop_holds(db, reservation_id: str, restock: bool) -> int:
+    """Remove the reservation's holds, returning their stock when `restock`; the number of products touched"""
+    holders = await db.products.find(
+        {"holds.r": reservation_id}, {"_id": 0, "id": 1, "holds": {"$elemMatch": {"r": reservation_id}}}
+    ).to_list(None)
+    ops = []
+    for product in holders:
+        quantity = product["holds"][0]["q"]
+        update: Dict[str, Any] = {"$inc": {"reserved": -quantity}, "$pull": {"holds": {"r": reservation_id}}}
+        if restock:
+            update = versioned_update({**update, "$inc": {"stock": quantity, "reserved": -quantity}})
+        # Matching on the hold makes a concurrent second release a no-op
+        ops.append(UpdateOne({"id": product["id"], "holds.r": reservation_id}, update))
+    if not ops:
+        return 0
+    result = await db.products.bulk_write(ops, ordered=False)
+    return result.modified_count
+
+
+async def release(db, reservation_id: str, outcome: str = "released") -> int:
+    """Put a reservation's stock back on sale (payment failed or the order was cancelled)"""
+    result = await db[RESERVATIONS].update_one({"_id": reservation_id, "status": "held"}, {"$set": {"status": outcome}})
+    # Committed (the stock is sold) or already released
+    if not result.matched_count:
+        return 0
+    released = await _drop_holds(db, reservation_id, restock=True)
+    reservation_outcomes.inc(outcome=outcome)
+    return released
+
+
+async def commit(db, reservation_id: str) -> bool:
+    """
+    Turn a held reservation into a sale once payment completes; True again
+    for one already committed (a retried payment). False when it has expired:
+    its stock may already be back on sale
+    """
+    committed = await db[RESERVATIONS].find_one_and_update(
+        {"_id": reservation_id, "status": "held"},
+        # Without expires_at the TTL index never deletes it
+        {"$set": {"status": "committed", "committed_at": datetime.utcnow()}, "$unset": {"expires_at": ""}},
+    )
+    if committed is None:
+        return await db[RESERVATIONS].find_one({"_id": reservation_id, "status": "committed"}, {"_id": 1}) is not None
+    await _drop_holds(db, reservation_id, restock=False)
+    reservation_outcomes.inc(outcome="committed")
+    return True
+
+
+async def sweep(db) -> int:
+    """Release the holds of reservations the TTL index has deleted; the number released"""
+    held_by = await db.products.distinct("holds.r", {"holds.r": {"$exists": True}})
+    if not held_by:
+        return 0
+    alive = set(await db[RESERVATIONS].distinct("_id", {"_id": {"$in": held_by}}))
+    expired = [reservation_id for reservation_id in held_by if reservation_id not in alive]
+    for reservation_id in expired:
+        await _drop_holds(db, reservation_id, restock=True)
+        reservation_outcomes.inc(outcome="expired")
+    return len(expired)
+
+
+async def run_sweeper(db, interval: float = SWEEP_INTERVAL_SECONDS):
+    while True:
+        try:
+            released = await sweep(db)
+            if released:
+                logger.info(f"Released the stock of {released} expired reservations")
+        except PyMongoError as e:
+            logger.error(f"Reservation sweep failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,351 @@
+"""
+Load-test data seeder for 18 Cricket Network
+Fills a local MongoDB with reproducible synthetic data at production scale
+(1M posts, 100k products, 50k grounds, 10M direct messages at --scale 1)
+
+Usage: python load_seed.py --mongo-url mongodb://localhost:27017 --db cricket_load --scale 0.01
+Never point this at a real database: it drops the collections it seeds.
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+import argparse
+import asyncio
+import bcrypt
+import logging
+import random
+import time
+import uuid
+
+from cities import with_city_key
+from query_compiler import with_search_words
+from db_indexes import reconcile_indexes
+from geo import with_geo_point
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Row counts at --scale 1
+FULL_SCALE = {
+    "users": 100_000,
+    "posts": 1_000_000,
+    "comments": 500_000,
+    "products": 100_000,
+    "grounds": 50_000,
+    "direct_messages": 10_000_000,
+    "orders": 200_000,
+}
+
+BATCH_SIZE = 5_000
+MAX_IN_FLIGHT = 4
+PEERS_PER_USER = 10
+LOAD_TEST_PASSWORD = "loadtest123"
+# Fixed "now" so two seeds with the same --seed are identical
+EPOCH = datetime(2025, 6, 1)
+
+CITIES = {
+    "Mumbai": (19.0760, 72.8777),
+    "Delhi": (28.7041, 77.1025),
+    "Bengaluru": (12.9716, 77.5946),
+    "Chennai": (13.0827, 80.2707),
+    "Kolkata": (22.5726, 88.3639),
+    "Pune": (18.5204, 73.8567),
+    "Hyderabad": (17.3850, 78.4867),
+    "Ahmedabad": (23.0225, 72.5714),
+    "Jaipur": (26.9124, 75.7873),
+    "Lucknow": (26.8467, 80.9462),
+    "Dallas": (32.7767, -96.7970),
+    "New York": (40.7128, -74.0060),
+    "Melbourne": (-37.8136, 144.9631),
+    "London": (51.5074, -0.1278),
+}
+BRANDS = ["MRF", "SG", "SS", "Kookaburra", "Gray-Nicolls", "GM", "New Balance", "Adidas", "Puma", "DSC", "Spartan", "BDM"]
+CATEGORIES = ["bat", "ball", "pads", "gloves", "shoes", "helmet", "accessories", "protein", "supplements", "energy"]
+PRODUCT_WORDS = ["Genius", "Grand", "Edition", "Players", "Pro", "Elite", "Limited", "Classic", "Kashmir", "English", "Willow", "Tour", "Match", "Junior"]
+FIRST_NAMES = ["Virat", "Rohit", "Mohammed", "Muhammad", "Mohammad", "Rahul", "Jasprit", "Ravindra", "Shubman", "Hardik", "Suryakumar", "Rishabh", "Sanju", "Arjun", "Aakash", "Dinesh", "Smriti", "Harmanpreet", "Jemimah", "Shafali"]
+LAST_NAMES = ["Kohli", "Sharma", "Shami", "Siraj", "Dhoni", "Dhony", "Bumrah", "Jadeja", "Gill", "Pandya", "Yadav", "Pant", "Samson", "Tendulkar", "Chopra", "Karthik", "Mandhana", "Kaur", "Rodrigues", "Verma"]
+POST_WORDS = ["cover", "drive", "yorker", "six", "century", "nets", "practice", "match", "win", "bouncer", "spin", "pace", "fielding", "catch", "innings", "wicket", "turf", "league", "team", "session"]
+
+
+def user_object_id(index: int) -> ObjectId:
+    """Deterministic _id for seeded user `index`, shared with load_test.py"""
+    return ObjectId(b"\x65\x00\x00\x00" + index.to_bytes(8, "big"))
+
+
+def user_phone(index: int) -> str:
+    return f"+91{9000000000 + index}"
+
+
+def conversation_peer(index: int, k: int, user_count: int) -> int:
+    """The k-th chat partner of user `index`; the same pairs are queried by load_test.py"""
+    return (index + (k + 1) * 7919) % user_count
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _ago(rng: random.Random, days: int = 365) -> datetime:
+    return EPOCH - timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def _near(rng: random.Random, city: str, km: float = 25) -> Dict[str, float]:
+    lat, lon = CITIES[city]
+    spread = km / 111
+    return {"latitude": round(lat + rng.uniform(-spread, spread), 6), "longitude": round(lon + rng.uniform(-spread, spread), 6)}
+
+
+def make_users(rng: random.Random, count: int) -> Iterator[Dict[str, Any]]:
+    password = bcrypt.hashpw(LOAD_TEST_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        yield with_search_words("users", {
+            "_id": user_object_id(i),
+            "phone": user_phone(i),
+            "name": name,
+            "email": f"loadtest{i}@cricket18.test",
+            "user_type": "admin" if i == 0 else ("vendor" if i % 100 == 1 else "player"),
+            "password": password,
+            "profile_image": None,
+            "created_at": _ago(rng, 720),
+            "wishlist": [],
+            "cart": [],
+        })
+
+
+def make_posts(rng: random.Random, count: int, user_count: int) -> Iterator[Dict[str, Any]]:
+    for _ in range(count):
+        author = rng.randrange(user_count)
+        is_reel = rng.random() < 0.2
+        yield {
+            "id": _uuid(rng),
+            "user_id": str(user_object_id(author)),
+            "user_name": f"Player {author}",
+            "user_image": None,
+            "content": " ".join(rng.choices(POST_WORDS, k=rng.randint(5, 25))),
+            "images": [f"https://cdn.cricket18.test/p/{rng.getrandbits(40):x}.jpg"] if rng.random() < 0.6 else [],
+            "post_type": "reel" if is_reel else "post",
+            "video_url": f"https://cdn.cricket18.test/v/{rng.getrandbits(40):x}.mp4" if is_reel else None,
+            "likes": rng.randint(0, 5000),
+            "comments": rng.randint(0, 300),
+            "shares": rng.randint(0, 100),
+            "created_at": _ago(rng),
+            "is_archived": rng.random() < 0.03,
+        }
+
+
+def make_comments(rng: random.Random, count: int, user_count: int, post_ids: List[str]) -> Iterator[Dict[str, Any]]:
+    for _ in range(count):
+        author = rng.randrange(user_count)
+        yield {
+            "id": _uuid(rng),
+            "post_id": rng.choice(post_ids),
+            "user_id": str(user_object_id(author)),
+            "user_name": f"Player {author}",
+            "user_image": None,
+            "content": " ".join(rng.choices(POST_WORDS, k=rng.randint(2, 12))),
+            "likes": rng.randint(0, 50),
+            "created_at": _ago(rng),
+        }
+
+
+def make_products(rng: random.Random, count: int, user_count: int) -> Iterator[Dict[str, Any]]:
+    vendors = [i for i in range(user_count) if i % 100 == 1] or [0]
+    for _ in range(count):
+        vendor = rng.choice(vendors)
+        brand = rng.choice(BRANDS)
+        category = rng.choice(CATEGORIES)
+        price = round(rng.uniform(199, 60000), 2)
+        yield with_search_words("products", {
+            "id": _uuid(rng),
+            "vendor_id": str(user_object_id(vendor)),
+            "vendor_name": f"Vendor {vendor}",
+            "vendor_type": "nutrition" if category in ("protein", "supplements", "energy") else "general",
+            "name": f"{brand} {' '.join(rng.sample(PRODUCT_WORDS, 2))} {category.title()}",
+            "description": f"{brand} {category} " + " ".join(rng.choices(PRODUCT_WORDS + POST_WORDS, k=20)),
+            "category": category,
+            "price": price,
+            "original_price": round(price * rng.uniform(1.0, 1.4), 2),
+            "stock": rng.randint(0, 500),
+            "images": [f"https://cdn.cricket18.test/products/{rng.getrandbits(40):x}.jpg" for _ in range(3)],
+            "brand": brand,
+            "is_used": rng.random() < 0.15,
+            "is_featured": rng.random() < 0.02,
+            "created_at": _ago(rng),
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "reviews_count": rng.randint(0, 2000),
+        })
+
+
+def make_grounds(rng: random.Random, count: int, user_count: int) -> Iterator[Dict[str, Any]]:
+    city_names = list(CITIES)
+    for i in range(count):
+        owner = rng.randrange(user_count)
+        city = rng.choice(city_names)
+        yield with_city_key(with_search_words("grounds", with_geo_point({
+            "id": _uuid(rng),
+            "owner_id": str(user_object_id(owner)),
+            "owner_name": f"Owner {owner}",
+            "owner_phone": user_phone(owner),
+            "name": f"{city} {rng.choice(['Cricket', 'Sports', 'Turf', 'Box'])} Ground {i}",
+            "description": "Floodlit ground with practice nets, pavilion and parking",
+            "location": f"Sector {rng.randint(1, 80)}",
+            "city": city,
+            **_near(rng, city),
+            "ground_type": rng.choice(["turf", "mat", "concrete"]),
+            "facilities": rng.sample(["nets", "pavilion", "lighting", "parking", "bowling_machine"], 3),
+            "pricing": {"hourly": float(rng.randrange(500, 5000, 100)), "match": float(rng.randrange(3000, 20000, 500))},
+            "images": [f"https://cdn.cricket18.test/grounds/{rng.getrandbits(40):x}.jpg" for _ in range(4)],
+            "time_slots": [{"day": d, "slots": ["6-8AM", "8-10AM", "4-6PM", "6-8PM"]} for d in ("Mon", "Wed", "Sat", "Sun")],
+            "contact_phone": user_phone(owner),
+            "created_at": _ago(rng),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "reviews_count": rng.randint(0, 400),
+            "is_verified": rng.random() < 0.4,
+            "commission_rate": 0.15,
+        })))
+
+
+def make_messages(rng: random.Random, count: int, user_count: int) -> Iterator[Dict[str, Any]]:
+    for _ in range(count):
+        sender = rng.randrange(user_count)
+        receiver = conversation_peer(sender, rng.randrange(PEERS_PER_USER), user_count)
+        yield {
+            "id": _uuid(rng),
+            "sender_id": str(user_object_id(sender)),
+            "sender_name": f"Player {sender}",
+            "receiver_id": str(user_object_id(receiver)),
+            "content": " ".join(rng.choices(POST_WORDS, k=rng.randint(1, 15))),
+            "images": [],
+            "is_read": rng.random() < 0.9,
+            "created_at": _ago(rng, 180),
+        }
+
+
+def make_orders(rng: random.Random, count: int, user_count: int, products: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for _ in range(count):
+        buyer = rng.randrange(user_count)
+        items = []
+        for product in rng.sample(products, rng.randint(1, 3)):
+            items.append({
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "vendor_id": product["vendor_id"],
+                "vendor_name": product["vendor_name"],
+                "quantity": rng.randint(1, 3),
+                "price": product["price"],
+                "image": None,
+            })
+        total = sum(item["price"] * item["quantity"] for item in items)
+        created = _ago(rng)
+        yield {
+            "id": _uuid(rng),
+            "user_id": str(user_object_id(buyer)),
+            "user_name": f"Player {buyer}",
+            "user_phone": user_phone(buyer),
+            "items": items,
+            "total_amount": total,
+            "platform_commission": total * 0.15,
+            "shipping_address": "12 Test Street",
+            "city": rng.choice(list(CITIES)),
+            "pincode": f"{rng.randint(100000, 999999)}",
+            "payment_status": rng.choice(["pending", "paid", "paid", "paid"]),
+            "order_status": rng.choice(["placed", "confirmed", "shipped", "delivered"]),
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+async def insert_stream(collection, docs: Iterator[Dict[str, Any]], total: int):
+    """insert_many in fixed-size batches with a few batches in flight"""
+    started = time.perf_counter()
+    in_flight: set = set()
+    inserted = 0
+    batch: List[Dict[str, Any]] = []
+
+    async def flush(rows):
+        await collection.insert_many(rows, ordered=False)
+
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == BATCH_SIZE:
+            in_flight.add(asyncio.create_task(flush(batch)))
+            inserted += len(batch)
+            batch = []
+            if len(in_flight) >= MAX_IN_FLIGHT:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            if inserted % (BATCH_SIZE * 100) == 0:
+                logger.info(f"  {collection.name}: {inserted:,}/{total:,}")
+    if batch:
+        in_flight.add(asyncio.create_task(flush(batch)))
+        inserted += len(batch)
+    if in_flight:
+        for task in (await asyncio.wait(in_flight))[0]:
+            task.result()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Seeded {inserted:,} {collection.name} in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):,.0f}/s)")
+
+
+async def seed(mongo_url: str, db_name: str, scale: float, seed_value: int):
+    if db_name in ("18cricketnetwork", "test_database"):
+        raise SystemExit(f"Refusing to seed the application database '{db_name}'")
+
+    counts = {name: max(1, int(n * scale)) for name, n in FULL_SCALE.items()}
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    logger.info(f"Seeding {db_name} at scale {scale}: {counts}")
+
+    for name in counts:
+        await db[name].drop()
+    # Reseeding must not reuse list ETags from the previous data set
+    await db.collection_versions.drop()
+
+    # Each collection gets its own RNG stream so counts can change independently
+    def rng_for(name: str) -> random.Random:
+        return random.Random(f"{seed_value}:{name}")
+
+    generators: List[tuple] = [
+        ("users", lambda: make_users(rng_for("users"), counts["users"])),
+        ("posts", lambda: make_posts(rng_for("posts"), counts["posts"], counts["users"])),
+        ("products", lambda: make_products(rng_for("products"), counts["products"], counts["users"])),
+        ("grounds", lambda: make_grounds(rng_for("grounds"), counts["grounds"], counts["users"])),
+        ("direct_messages", lambda: make_messages(rng_for("direct_messages"), counts["direct_messages"], counts["users"])),
+    ]
+    for name, make in generators:
+        await insert_stream(db[name], make(), counts[name])
+
+    post_ids = [doc["id"] async for doc in db.posts.find({}, {"id": 1, "_id": 0}).limit(50_000)]
+    await insert_stream(db.comments, make_comments(rng_for("comments"), counts["comments"], counts["users"], post_ids), counts["comments"])
+
+    products = await db.products.find({}, {"_id": 0, "id": 1, "name": 1, "vendor_id": 1, "vendor_name": 1, "price": 1}).limit(10_000).to_list(10_000)
+    await insert_stream(db.orders, make_orders(rng_for("orders"), counts["orders"], counts["users"], products), counts["orders"])
+
+    logger.info("Building indexes...")
+    report = await reconcile_indexes(db)
+    logger.info(f"Indexes: {report['created']} created, {report['failed']} failed")
+
+    await db.load_test_meta.replace_one(
+        {"_id": "seed"},
+        {"_id": "seed", "scale": scale, "seed": seed_value, "counts": counts, "seeded_at": datetime.utcnow()},
+        upsert=True,
+    )
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="cricket_load")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full-scale row counts")
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+    asyncio.run(seed(args.mongo_url, args.db, args.scale, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Load generator for 18 Cricket Network
+Drives the hot read paths (feed, reels, search, nearby grounds, products,
+orders, chat) of a running server seeded by load_seed.py and reports
+p50/p95/p99 latency and throughput per route
+
+Usage:
+  python load_seed.py --mongo-url mongodb://localhost:27017 --db cricket_load --scale 0.01
+  export JWT_SECRET=load-test-secret
+  MONGO_URL=mongodb://localhost:27017 DB_NAME=cricket_load uvicorn server:app --port 8001
+  python load_test.py --base-url http://localhost:8001 --users 1000 --duration 60 --concurrency 64 \
+      --out results.json --baseline baseline.json
+
+MONGO_URL must be set on the server: otherwise it takes the one in .env,
+which is not the local database the seeder filled. Tokens are signed with
+JWT_SECRET, read like the server does (environment first, then .env), so
+both sides agree as long as they run with the same environment.
+"""
+
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import jwt
+
+from load_seed import CITIES, FIRST_NAMES, LAST_NAMES, PEERS_PER_USER, BRANDS, CATEGORIES, conversation_peer, user_object_id, user_phone
+
+# Must match the server under test, which reads the same .env
+load_dotenv(Path(__file__).resolve().parent / ".env")
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
+JWT_ALGORITHM = 'HS256'
+
+SEARCH_TERMS = FIRST_NAMES[:8] + LAST_NAMES[:8] + BRANDS[:6] + list(CITIES)[:6] + ["bat", "turf", "academy", "league"]
+
+# Relative weight of each scenario in the mixed workload
+DEFAULT_MIX = {
+    "feed": 30,
+    "reels": 10,
+    "search": 15,
+    "nearby_grounds": 15,
+    "products": 10,
+    "orders": 10,
+    "chat": 10,
+}
+
+
+def make_token(index: int) -> str:
+    payload = {
+        "phone": user_phone(index),
+        "user_type": "admin" if index == 0 else ("vendor" if index % 100 == 1 else "player"),
+        "exp": datetime.utcnow() + timedelta(days=1),
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+class Scenarios:
+    """Builds (route, path, headers) for each scenario from a seeded RNG"""
+
+    def __init__(self, rng: random.Random, user_count: int):
+        self.rng = rng
+        self.user_count = user_count
+        # Only the first few thousand users act as clients; tokens are reused
+        self.clients = list(range(2, min(user_count, 5000)))
+        self.tokens: Dict[int, str] = {}
+
+    def _auth(self, index: int) -> Dict[str, str]:
+        token = self.tokens.get(index)
+        if token is None:
+            token = self.tokens[index] = make_token(index)
+        return {"Authorization": f"Bearer {token}"}
+
+    def feed(self):
+        return "/api/posts", "/api/posts?limit=20", {}
+
+    def reels(self):
+        return "/api/reels", "/api/reels?limit=20", {}
+
+    def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        return "/api/search", f"/api/search?query={term}&limit=20", {}
+
+    def nearby_grounds(self):
+        lat, lon = self.rng.choice(list(CITIES.values()))
+        lat += self.rng.uniform(-0.1, 0.1)
+        lon += self.rng.uniform(-0.1, 0.1)
+        return "/api/grounds/nearby", f"/api/grounds/nearby?latitude={lat:.5f}&longitude={lon:.5f}&radius_km=10", {}
+
+    def products(self):
+        category = self.rng.choice(CATEGORIES)
+        return "/api/products", f"/api/products?category={category}&limit=20", {}
+
+    def orders(self):
+        user = self.rng.choice(self.clients)
+        return "/api/orders", "/api/orders", self._auth(user)
+
+    def chat(self):
+        user = self.rng.choice(self.clients)
+        peer = conversation_peer(user, self.rng.randrange(PEERS_PER_USER), self.user_count)
+        return "/api/messages/{user_id}", f"/api/messages/{user_object_id(peer)}", self._auth(user)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    routes = {}
+    for route in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(route, []))
+        count = len(values)
+        routes[route] = {
+            "requests": count,
+            "errors": errors.get(route, 0),
+            "rps": round(count / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "mean_ms": round(sum(values) / count, 2) if count else 0.0,
+            "max_ms": round(values[-1], 2) if values else 0.0,
+        }
+    return routes
+
+
+async def run_load(base_url: str, mix: Dict[str, int], user_count: int, duration: float,
+                   concurrency: int, warmup: float, seed: int, timeout: float) -> Dict[str, Any]:
+    scenarios = Scenarios(random.Random(seed), user_count)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    builders: Dict[str, Callable[[], Tuple[str, str, Dict[str, str]]]] = {name: getattr(scenarios, name) for name in names}
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    status_counts: Dict[str, Dict[int, int]] = {}
+    recording = {"on": False}
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=client_timeout) as session:
+
+        async def worker(deadline: float):
+            while time.perf_counter() < deadline:
+                name = scenarios.rng.choices(names, weights)[0]
+                route, path, headers = builders[name]()
+                start = time.perf_counter()
+                status = 0
+                try:
+                    async with session.get(path, headers=headers) as response:
+                        await response.read()
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = 0
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if not recording["on"]:
+                    continue
+                status_counts.setdefault(route, {})
+                status_counts[route][status] = status_counts[route].get(status, 0) + 1
+                if 200 <= status < 400:
+                    latencies.setdefault(route, []).append(elapsed_ms)
+                else:
+                    errors[route] = errors.get(route, 0) + 1
+
+        if warmup > 0:
+            await asyncio.gather(*(worker(time.perf_counter() + warmup) for _ in range(concurrency)))
+
+        recording["on"] = True
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + duration) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    routes = summarize(latencies, errors, elapsed)
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "meta": {
+            "run_at": datetime.utcnow().isoformat(),
+            "git_sha": _git_sha(),
+            "base_url": base_url,
+            "duration_s": round(elapsed, 2),
+            "concurrency": concurrency,
+            "users": user_count,
+            "seed": seed,
+            "mix": mix,
+        },
+        "total": {"requests": total, "rps": round(total / elapsed, 2)},
+        "routes": routes,
+        "status_codes": {route: {str(k): v for k, v in codes.items()} for route, codes in status_counts.items()},
+    }
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Print per-route deltas against a baseline run; returns the routes whose p95 regressed"""
+    regressions = []
+    print(f"\n{'route':<28}{'p50 ms':>16}{'p95 ms':>18}{'p99 ms':>18}{'rps':>16}")
+    for route, current in result["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            print(f"{route:<28}{'(new route)':>16}")
+            continue
+
+        def delta(key):
+            old, new = before.get(key, 0), current.get(key, 0)
+            change = (new - old) / old if old else 0.0
+            return f"{new:>8.1f} ({change:+.0%})", change
+
+        p50, _ = delta("p50_ms")
+        p95, p95_change = delta("p95_ms")
+        p99, _ = delta("p99_ms")
+        rps, _ = delta("rps")
+        flag = ""
+        if p95_change > max_regression:
+            regressions.append(route)
+            flag = "  REGRESSION"
+        print(f"{route:<28}{p50:>16}{p95:>18}{p99:>18}{rps:>16}{flag}")
+    return regressions
+
+
+def print_table(result: Dict[str, Any]):
+    meta = result["meta"]
+    print(f"{meta['duration_s']}s at concurrency {meta['concurrency']}: "
+          f"{result['total']['requests']} requests, {result['total']['rps']} req/s")
+    print(f"{'route':<28}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, stats in result["routes"].items():
+        print(f"{route:<28}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+
+def parse_mix(value: Optional[str]) -> Dict[str, int]:
+    """'feed=3,search=1' -> {'feed': 3, 'search': 1}"""
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario '{name}', expected one of {sorted(DEFAULT_MIX)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--users", type=int, default=1000, help="user count the database was seeded with")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mix", help="scenario weights, e.g. feed=3,search=1 (default: all)")
+    parser.add_argument("--seed", type=int, default=18)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="allowed p95 increase before failing")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(
+        args.base_url, parse_mix(args.mix), args.users, args.duration,
+        args.concurrency, args.warmup, args.seed, args.timeout,
+    ))
+    print_table(result)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.max_regression)
+        if regressions:
+            print(f"\np95 regressed by more than {args.max_regression:.0%} on: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
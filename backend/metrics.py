@@ -0,0 +1,331 @@
+"""
+Metrics for 18 Cricket Network
+In-process Prometheus text-format metrics: per-route latency histograms,
+in-flight requests, MongoDB pool stats, scheduler job timings and an
+event-loop lag probe. No external collector or client library needed.
+"""
+
+from pymongo import monitoring
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0)
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+# Lag above this is logged together with the requests that were in flight
+LOOP_LAG_WARN_SECONDS = float(os.getenv("LOOP_LAG_WARN_SECONDS", "0.1"))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        for labels, value in list(self.values.items()):
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_labels(**labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        for labels, value in list(self.values.items()):
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count], sum
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(**labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+                self.sums[key] = 0.0
+            counts[index] += 1
+            self.sums[key] += value
+
+    def samples(self):
+        for labels, counts in list(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(self.sums[labels])}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.setdefault(metric.name, metric)
+        return self.metrics[metric.name]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ==================== HTTP ====================
+
+http_requests = registry.register(Counter("http_requests_total", "HTTP requests by route, method and status"))
+http_latency = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency by route and method"))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being served"))
+
+# ==================== EVENT LOOP ====================
+
+loop_lag = registry.register(Histogram("event_loop_lag_seconds", "Delay of the event loop waking a sleeping task", LAG_BUCKETS))
+loop_lag_max = registry.register(Gauge("event_loop_lag_max_seconds", "Largest event loop lag seen since start"))
+loop_blocked = registry.register(Counter("event_loop_blocked_total", "Probes where the loop lag exceeded LOOP_LAG_WARN_SECONDS"))
+
+# ==================== MONGODB POOL ====================
+
+db_pool_connections = registry.register(Gauge("mongodb_pool_connections", "Open MongoDB connections per server"))
+db_pool_checked_out = registry.register(Gauge("mongodb_pool_checked_out", "MongoDB connections checked out per server"))
+db_pool_checkout_failures = registry.register(Counter("mongodb_pool_checkout_failures_total", "Failed connection checkouts by reason"))
+db_pool_cleared = registry.register(Counter("mongodb_pool_cleared_total", "Times a MongoDB pool was cleared"))
+
+# ==================== SCHEDULER ====================
+
+job_duration = registry.register(Histogram("scheduler_job_duration_seconds", "Scheduler job run time", JOB_BUCKETS))
+job_runs = registry.register(Counter("scheduler_job_runs_total", "Scheduler job runs by outcome"))
+job_last_success = registry.register(Gauge("scheduler_job_last_success_timestamp_seconds", "Unix time of the last successful run"))
+
+
+# ==================== SEARCH ====================
+
+search_type_latency = registry.register(Histogram("search_type_duration_seconds", "Per-type /search query time by type, path and outcome"))
+search_type_timeouts = registry.register(Counter("search_type_timeouts_total", "Per-type /search queries that missed the search deadline"))
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds PyMongo connection pool events into the pool gauges"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        db_pool_cleared.inc(server=self._server(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        db_pool_connections.inc(server=self._server(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        db_pool_connections.dec(server=self._server(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        db_pool_checkout_failures.inc(server=self._server(event), reason=event.reason)
+
+    def connection_checked_out(self, event):
+        db_pool_checked_out.inc(server=self._server(event))
+
+    def connection_checked_in(self, event):
+        db_pool_checked_out.dec(server=self._server(event))
+
+    @staticmethod
+    def _server(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+
+pool_listener = PoolMetricsListener()
+
+# Routes currently being served, reported when the loop lag probe fires
+_in_flight_routes: Dict[int, str] = {}
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight requests per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        status = {"code": 500}
+        request_key = id(scope)
+        _in_flight_routes[request_key] = f"{method} {scope.get('path', '')}"
+        http_in_flight.inc()
+        start = time.perf_counter()
+
+        async def send_and_capture(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_capture)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _in_flight_routes.pop(request_key, None)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_latency.observe(elapsed, route=route, method=method)
+            http_requests.inc(route=route, method=method, status=status["code"])
+
+
+class EventLoopLagProbe:
+    """
+    Sleeps for a fixed interval and measures how late the loop wakes it up.
+
+    Any synchronous call inside a handler (a blocking HTTP client, bcrypt,
+    a big json.dumps) delays every other coroutine; it shows up here as lag
+    and is logged with the requests that were running at the time.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, warn_seconds: float = LOOP_LAG_WARN_SECONDS):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            loop_lag.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+                loop_lag_max.set(lag)
+            if lag >= self.warn_seconds:
+                loop_blocked.inc()
+                logger.warning(
+                    f"Event loop blocked for {lag * 1000:.0f}ms; in flight: {sorted(set(_in_flight_routes.values()))}"
+                )
+
+
+lag_probe = EventLoopLagProbe()
+
+
+@asynccontextmanager
+async def job_timer(job: str):
+    """Time a scheduler job and record its outcome"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+        job_last_success.set(time.time(), job=job)
+    finally:
+        job_duration.observe(time.perf_counter() - start, job=job)
+        job_runs.inc(job=job, outcome=outcome)
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,114 @@
+"""
+City key backfill for 18 Cricket Network
+Stamps the normalized `city_key` (see cities.py) on listings written before
+the list routes filtered on it, builds the city_key indexes and drops the
+`city` indexes they replace. Safe to re-run: documents whose key is already
+right are not touched.
+
+Usage: python migrate_city_keys.py --mongo-url mongodb://localhost:27017 --db 18cricketnetwork [--dry-run]
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import logging
+
+from cities import CITY_COLLECTIONS, CITY_KEY_FIELD, city_key
+from db_indexes import INDEXES, reconcile_indexes
+from etags import VERSIONED_COLLECTIONS, bump_collection_version, versioned_update
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1_000
+
+
+def backfill_op(collection: str, doc: Dict[str, Any]) -> Any:
+    """The update for one document, or None when it is already correct"""
+    key = city_key(doc.get("city"))
+    if key == doc.get(CITY_KEY_FIELD):
+        return None
+    update: Dict[str, Any] = {"$set": {CITY_KEY_FIELD: key}} if key else {"$unset": {CITY_KEY_FIELD: ""}}
+    if collection in VERSIONED_COLLECTIONS:
+        update = versioned_update(update)
+    return UpdateOne({"_id": doc["_id"]}, update)
+
+
+async def backfill_collection(db, name: str, dry_run: bool) -> Dict[str, int]:
+    stats = {"scanned": 0, "updated": 0}
+    batch: List[Any] = []
+
+    async def flush():
+        if batch and not dry_run:
+            result = await db[name].bulk_write(batch, ordered=False)
+            stats["updated"] += result.modified_count
+        elif batch:
+            stats["updated"] += len(batch)
+        batch.clear()
+
+    # Every listing is checked: alias and normalization changes rekey old documents too
+    async for doc in db[name].find({}, {"_id": 1, "city": 1, CITY_KEY_FIELD: 1}):
+        stats["scanned"] += 1
+        op = backfill_op(name, doc)
+        if op is not None:
+            batch.append(op)
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    await flush()
+
+    if stats["updated"] and not dry_run and name in VERSIONED_COLLECTIONS:
+        await bump_collection_version(db, name)
+    return stats
+
+
+async def drop_superseded_indexes(db, name: str) -> List[str]:
+    """Drop the `city` indexes whose city_key counterpart is now in the registry"""
+    existing = await db[name].index_information()
+    dropped = []
+    for spec in INDEXES[name]:
+        if spec.keys[0][0] != CITY_KEY_FIELD:
+            continue
+        old_name = "city_" + spec.name[len(CITY_KEY_FIELD) + 1:]
+        if old_name in existing:
+            try:
+                await db[name].drop_index(old_name)
+                dropped.append(old_name)
+            except PyMongoError as e:
+                logger.error(f"Could not drop index {name}.{old_name}: {e}")
+    return dropped
+
+
+async def migrate(mongo_url: str, db_name: str, dry_run: bool):
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    for name in CITY_COLLECTIONS:
+        stats = await backfill_collection(db, name, dry_run)
+        verb = "would update" if dry_run else "updated"
+        logger.info(f"{name}: scanned {stats['scanned']}, {verb} {stats['updated']}")
+
+    if not dry_run:
+        report = await reconcile_indexes(db, {name: INDEXES[name] for name in CITY_COLLECTIONS})
+        logger.info(f"Indexes: {report['created']} created, {report['failed']} failed")
+        # Only once the replacements exist, so city filters never lose their index
+        if not report["failed"]:
+            for name in CITY_COLLECTIONS:
+                dropped = await drop_superseded_indexes(db, name)
+                if dropped:
+                    logger.info(f"{name}: dropped {', '.join(dropped)}")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--dry-run", action="store_true", help="count the documents that would change")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.mongo_url, args.db, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+GeoJSON backfill for 18 Cricket Network
+Adds the `geo` point and `geohash` (see geo.py) to documents that only have
+flat latitude/longitude fields, then builds the geo indexes. Safe to re-run:
+documents that already carry the right point are not touched.
+
+Usage: python migrate_geo.py --mongo-url mongodb://localhost:27017 --db 18cricketnetwork [--dry-run]
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import logging
+
+from db_indexes import INDEXES, reconcile_indexes
+from etags import VERSIONED_COLLECTIONS, bump_collection_version, versioned_update
+from geo import GEO_COLLECTIONS, GEO_FIELD, GEOHASH_FIELD, geo_fields
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1_000
+
+# Documents with coordinates whose point is missing or out of date
+NEEDS_BACKFILL = {"latitude": {"$type": "number"}, "longitude": {"$type": "number"}}
+HAS_POINT_ONLY = {GEO_FIELD: {"$exists": True}, "$or": [{"latitude": None}, {"longitude": None}]}
+
+
+def backfill_op(collection: str, doc: Dict[str, Any]) -> Any:
+    """The update for one document, or None when it is already correct"""
+    fields = geo_fields(doc.get("latitude"), doc.get("longitude"))
+    if fields.get(GEO_FIELD) == doc.get(GEO_FIELD) and fields.get(GEOHASH_FIELD) == doc.get(GEOHASH_FIELD):
+        return None
+    update: Dict[str, Any] = {"$set": fields} if fields else {"$unset": {GEO_FIELD: "", GEOHASH_FIELD: ""}}
+    if collection in VERSIONED_COLLECTIONS:
+        update = versioned_update(update)
+    return UpdateOne({"_id": doc["_id"]}, update)
+
+
+async def backfill_collection(db, name: str, dry_run: bool) -> Dict[str, int]:
+    stats = {"scanned": 0, "updated": 0}
+    projection = {"_id": 1, "latitude": 1, "longitude": 1, GEO_FIELD: 1, GEOHASH_FIELD: 1}
+    batch: List[Any] = []
+
+    async def flush():
+        if batch and not dry_run:
+            result = await db[name].bulk_write(batch, ordered=False)
+            stats["updated"] += result.modified_count
+        elif batch:
+            stats["updated"] += len(batch)
+        batch.clear()
+
+    async for doc in db[name].find({"$or": [NEEDS_BACKFILL, HAS_POINT_ONLY]}, projection):
+        stats["scanned"] += 1
+        op = backfill_op(name, doc)
+        if op is not None:
+            batch.append(op)
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    await flush()
+
+    if stats["updated"] and not dry_run and name in VERSIONED_COLLECTIONS:
+        await bump_collection_version(db, name)
+    return stats
+
+
+async def migrate(mongo_url: str, db_name: str, dry_run: bool):
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    for name in GEO_COLLECTIONS:
+        stats = await backfill_collection(db, name, dry_run)
+        verb = "would update" if dry_run else "updated"
+        logger.info(f"{name}: scanned {stats['scanned']}, {verb} {stats['updated']}")
+
+    if not dry_run:
+        # Points first: a 2dsphere index build fails on malformed geometry
+        report = await reconcile_indexes(db, {name: INDEXES[name] for name in GEO_COLLECTIONS})
+        logger.info(f"Indexes: {report['created']} created, {report['failed']} failed")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--dry-run", action="store_true", help="count the documents that would change")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.mongo_url, args.db, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Search words backfill for 18 Cricket Network
+Stamps the folded `search_words` (see query_compiler.py) on documents written
+before search input was compiled into prefix ranges on it, and builds the
+search_words indexes. Until a collection is backfilled its older documents
+are only found through the full-text index. Safe to re-run: documents whose
+words are already right are not touched.
+
+Usage: python migrate_search_words.py --mongo-url mongodb://localhost:27017 --db 18cricketnetwork [--dry-run]
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import logging
+
+from db_indexes import INDEXES, reconcile_indexes
+from etags import VERSIONED_COLLECTIONS, bump_collection_version, versioned_update
+from query_compiler import SEARCH_WORDS_FIELD, WORD_FIELDS, search_words
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1_000
+
+
+def backfill_op(collection: str, doc: Dict[str, Any]) -> Any:
+    """The update for one document, or None when it is already correct"""
+    found = search_words(collection, doc)
+    if found == doc.get(SEARCH_WORDS_FIELD):
+        return None
+    update: Dict[str, Any] = {"$set": {SEARCH_WORDS_FIELD: found}}
+    if collection in VERSIONED_COLLECTIONS:
+        update = versioned_update(update)
+    return UpdateOne({"_id": doc["_id"]}, update)
+
+
+async def backfill_collection(db, name: str, dry_run: bool) -> Dict[str, int]:
+    stats = {"scanned": 0, "updated": 0}
+    batch: List[Any] = []
+
+    async def flush():
+        if batch and not dry_run:
+            result = await db[name].bulk_write(batch, ordered=False)
+            stats["updated"] += result.modified_count
+        elif batch:
+            stats["updated"] += len(batch)
+        batch.clear()
+
+    # Every document is checked: folding changes reword old documents too
+    projection = {"_id": 1, SEARCH_WORDS_FIELD: 1, **{field: 1 for field in WORD_FIELDS[name]}}
+    async for doc in db[name].find({}, projection):
+        stats["scanned"] += 1
+        op = backfill_op(name, doc)
+        if op is not None:
+            batch.append(op)
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    await flush()
+
+    if stats["updated"] and not dry_run and name in VERSIONED_COLLECTIONS:
+        await bump_collection_version(db, name)
+    return stats
+
+
+async def migrate(mongo_url: str, db_name: str, dry_run: bool):
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    for name in WORD_FIELDS:
+        stats = await backfill_collection(db, name, dry_run)
+        verb = "would update" if dry_run else "updated"
+        logger.info(f"{name}: scanned {stats['scanned']}, {verb} {stats['updated']}")
+
+    if not dry_run:
+        report = await reconcile_indexes(db, {name: INDEXES[name] for name in WORD_FIELDS})
+        logger.info(f"Indexes: {report['created']} created, {report['failed']} failed")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--dry-run", action="store_true", help="count the documents that would change")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.mongo_url, args.db, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Payment gateway outbox for 18 Cricket Network
+Checkout no longer calls the gateway. create_order writes the gateway call it
+owes into the order document itself (`gateway_outbox`), and since that is a
+single-document insert, the order and its outbox entry are stored together
+or not at all, without a transaction. OutboxWorker tasks claim due entries
+with find_one_and_update, call the gateway and record the razorpay order id.
+
+A claim is a lease: an entry whose worker died mid-call is claimed again
+once the lease runs out, and the second delivery looks the order's receipt
+up before creating anything (payment_gateway.py), so a gateway order is
+never made twice. Calls that keep failing back off up to OUTBOX_MAX_ATTEMPTS
+times; then the order is marked failed and its stock released.
+"""
+
+from pymongo.errors import PyMongoError
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+import uuid
+
+import inventory
+from metrics import Counter, Histogram, LATENCY_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FIELD = "gateway_outbox"
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+# Outlasts one delivery: every client retry of the create and its receipt lookup
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+# Checkout wakes the workers; the poll picks up retries and other workers' entries
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+# Backoff between attempts, doubled each time up to the cap
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+
+# Entries a worker may claim: new, or leased by a worker that never finished
+OPEN = ["pending", "in_flight"]
+
+outbox_deliveries = registry.register(
+    Counter("payment_outbox_deliveries_total", "Outbox delivery attempts by outcome (done, retry, failed, lost)")
+)
+outbox_delay = registry.register(
+    Histogram("payment_outbox_delay_seconds", "Time from checkout to the gateway order being recorded", LATENCY_BUCKETS)
+)
+
+
+def outbox_entry(amount: float, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """The gateway order an order owes, for its insert; amount in rupees"""
+    now = now or datetime.utcnow()
+    return {
+        "status": "pending",
+        # Razorpay takes paise
+        "amount": int(round(amount * 100)),
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+async def claim(db, lease: float = OUTBOX_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """Lease the most overdue entry to this caller, or None when nothing is due"""
+    now = datetime.utcnow()
+    leased = {"status": "in_flight", "next_attempt_at": now + timedelta(seconds=lease), "claim": uuid.uuid4().hex}
+    order = await db.orders.find_one_and_update(
+        {f"{OUTBOX_FIELD}.status": {"$in": OPEN}, f"{OUTBOX_FIELD}.next_attempt_at": {"$lte": now}},
+        {
+            "$set": {f"{OUTBOX_FIELD}.{field}": value for field, value in leased.items()},
+            "$inc": {f"{OUTBOX_FIELD}.attempts": 1},
+        },
+        projection={"_id": 0, "id": 1, OUTBOX_FIELD: 1},
+        sort=[(f"{OUTBOX_FIELD}.next_attempt_at", 1)],
+    )
+    if order is None:
+        return None
+    entry = order[OUTBOX_FIELD]
+    order[OUTBOX_FIELD] = {**entry, **leased, "attempts": entry["attempts"] + 1}
+    return order
+
+
+async def deliver(db, gateway, order: Dict[str, Any]) -> str:
+    """Make the claimed order's gateway call and record the outcome: done, retry, failed or lost"""
+    # Imported here so aiohttp stays off the startup import path
+    from payment_gateway import GatewayError
+
+    entry = order[OUTBOX_FIELD]
+    now = datetime.utcnow()
+    # Fenced by the claim: a worker whose lease ran out cannot overwrite its successor
+    fence = {"id": order["id"], f"{OUTBOX_FIELD}.claim": entry["claim"]}
+    try:
+        created = await gateway.create_order(
+            entry["amount"],
+            order["id"],
+            notes={"order_id": order["id"]},
+            # An earlier attempt may have created it before its response was lost
+            check_existing=entry["attempts"] > 1,
+        )
+    except GatewayError as e:
+        if e.retryable and entry["attempts"] < OUTBOX_MAX_ATTEMPTS:
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (entry["attempts"] - 1))
+            result = await db.orders.update_one(fence, {"$set": {
+                f"{OUTBOX_FIELD}.status": "pending",
+                f"{OUTBOX_FIELD}.next_attempt_at": now + timedelta(seconds=random.uniform(delay / 2, delay)),
+                f"{OUTBOX_FIELD}.last_error": str(e),
+            }})
+            outcome = "retry"
+        else:
+            result = await db.orders.update_one(fence, {"$set": {
+                f"{OUTBOX_FIELD}.status": "failed",
+                f"{OUTBOX_FIELD}.last_error": str(e),
+                "payment_status": "failed",
+                "order_status": "cancelled",
+                "updated_at": now,
+            }})
+            if result.matched_count:
+                await inventory.release(db, order["id"])
+            logger.error(f"Gateway order for {order['id']} failed after {entry['attempts']} attempts: {e}")
+            outcome = "failed"
+    else:
+        result = await db.orders.update_one(fence, {"$set": {
+            "razorpay_order_id": created["id"],
+            f"{OUTBOX_FIELD}.status": "done",
+            f"{OUTBOX_FIELD}.completed_at": now,
+            "updated_at": now,
+        }})
+        if result.matched_count:
+            outbox_delay.observe((now - entry["created_at"]).total_seconds())
+        outcome = "done"
+    if not result.matched_count:
+        # Reclaimed by another worker; it reuses whatever this call created
+        outcome = "lost"
+    outbox_deliveries.inc(outcome=outcome)
+    return outcome
+
+
+async def process_next(db, gateway, lease: float = OUTBOX_LEASE_SECONDS) -> Optional[str]:
+    """Claim and deliver one due entry; None when there was none"""
+    order = await claim(db, lease)
+    if order is None:
+        return None
+    return await deliver(db, gateway, order)
+
+
+class OutboxWorker:
+    """Delivery tasks for this process; any number of processes can run one"""
+
+    def __init__(
+        self,
+        db,
+        gateway,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+        lease: float = OUTBOX_LEASE_SECONDS,
+    ):
+        self.db = db
+        self.gateway = gateway
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.delivered: Dict[str, int] = {}
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self):
+        """An entry was just written: wake the idle tasks"""
+        self._wake.set()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            # Cleared before looking, so an entry written meanwhile is found or wakes us
+            self._wake.clear()
+            try:
+                outcome = await process_next(self.db, self.gateway, self.lease)
+            except PyMongoError as e:
+                logger.error(f"Payment outbox: {e}")
+                outcome = None
+            if outcome is not None:
+                self.delivered[outcome] = self.delivered.get(outcome, 0) + 1
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def report(self) -> Dict[str, Any]:
+        counts = await self.db.orders.aggregate([
+            {"$match": {f"{OUTBOX_FIELD}.status": {"$exists": True}}},
+            {"$group": {"_id": f"${OUTBOX_FIELD}.status", "count": {"$sum": 1}}},
+        ]).to_list(None)
+        return {
+            "tasks": len(self._tasks),
+            "delivered": dict(self.delivered),
+            "entries": {row["_id"]: row["count"] for row in counts},
+        }
@@ -0,0 +1,126 @@
+"""
+Keyset pagination for 18 Cricket Network
+Opaque cursors over (created_at, id) so every page is an index seek instead
+of a skip over all the rows before it
+"""
+
+from fastapi import HTTPException
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+
+import orjson
+
+from fast_json import NO_ID
+
+# Newest first, with id breaking ties between documents created in the same millisecond
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+MAX_PAGE_SIZE = 100
+
+# Header carrying the next cursor for endpoints that return a bare list
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Offset parameters these endpoints took before cursors; ignoring them would
+# hand an old client the first page on every call
+OFFSET_PARAMS = ("skip", "page")
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = orjson.dumps({"t": created_at, "id": doc["id"]})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = orjson.loads(raw)
+        return datetime.fromisoformat(data["t"]), str(data["id"])
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def reject_offset_params(params) -> None:
+    """400 for a request still paging by offset, so old clients fail instead of looping over page one"""
+    for name in OFFSET_PARAMS:
+        if name in params:
+            raise HTTPException(
+                status_code=400,
+                detail=f"'{name}' is no longer supported; pass the next cursor from the previous page as 'cursor'",
+            )
+
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict `query` to documents strictly after `cursor` in KEYSET_SORT order"""
+    if not cursor:
+        return query
+    created_at, last_id = decode_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": last_id}},
+    ]}
+    if not query:
+        return after
+    return {"$and": [query, after]}
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    cursor: Optional[str],
+    limit: int,
+    projection: Dict[str, Any] = NO_ID,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of `collection` in KEYSET_SORT order and the cursor for the next
+    page (None on the last page). Needs an index ending in created_at -1, id -1.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    docs = await collection.find(keyset_query(query, cursor), projection).sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
+
+
+# ==================== ANY SORT FIELD ====================
+
+def encode_sort_cursor(doc: Dict[str, Any], field: str) -> str:
+    """Cursor after `doc` in a (field, id) keyset order; records the field so a cursor is not reused across sorts"""
+    value = doc.get(field)
+    data: Dict[str, Any] = {"f": field, "v": value, "id": doc["id"]}
+    if isinstance(value, datetime):
+        data = {"f": field, "t": value.isoformat(), "id": doc["id"]}
+    raw = orjson.dumps(data)
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sort_cursor(cursor: str, field: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = orjson.loads(raw)
+        value = datetime.fromisoformat(data["t"]) if "t" in data else data["v"]
+        if data["f"] != field:
+            raise ValueError(field)
+        return value, str(data["id"])
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def sort_keyset_query(query: Dict[str, Any], field: str, direction: int, cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict `query` to documents strictly after `cursor` in [(field, direction), ("id", direction)] order"""
+    if not cursor:
+        return query
+    value, last_id = decode_sort_cursor(cursor, field)
+    op = "$lt" if direction < 0 else "$gt"
+    after = {"$or": [
+        {field: {op: value}},
+        {field: value, "id": {op: last_id}},
+    ]}
+    if not query:
+        return after
+    return {"$and": [query, after]}
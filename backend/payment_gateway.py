@@ -0,0 +1,152 @@
+"""
+Payment gateway client for 18 Cricket Network
+Async Razorpay Orders API client on one pooled aiohttp session: bounded
+connections kept alive between calls, a per-attempt timeout and retries with
+jittered backoff for connection errors, timeouts, 429s and 5xx. Orders are
+created with the store order id as their `receipt`. A retry after a
+response that may have been lost first looks the receipt up, so a retry
+never creates a second gateway order. Point RAZORPAY_API_URL at
+fake_gateway.py to run against a local stand-in.
+"""
+
+from typing import Any, Dict, Optional
+import asyncio
+import base64
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+from metrics import Counter, Histogram, LATENCY_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+RAZORPAY_API_URL = os.environ.get("RAZORPAY_API_URL", "https://api.razorpay.com")
+# Per attempt: a stuck call is abandoned and retried, not waited out
+PAYMENT_GATEWAY_TIMEOUT = float(os.environ.get("PAYMENT_GATEWAY_TIMEOUT", "10"))
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.environ.get("PAYMENT_GATEWAY_CONNECT_TIMEOUT", "3"))
+PAYMENT_GATEWAY_CONNECTIONS = int(os.environ.get("PAYMENT_GATEWAY_CONNECTIONS", "20"))
+PAYMENT_GATEWAY_RETRIES = int(os.environ.get("PAYMENT_GATEWAY_RETRIES", "3"))
+# First backoff; doubled per retry, with full jitter
+BACKOFF_SECONDS = 0.2
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+gateway_requests = registry.register(
+    Counter("payment_gateway_requests_total", "Gateway calls by operation and outcome (ok, retry, error)")
+)
+gateway_latency = registry.register(
+    Histogram("payment_gateway_request_duration_seconds", "Time per gateway call attempt", LATENCY_BUCKETS)
+)
+
+
+class GatewayError(Exception):
+    """A gateway call that failed; `retryable` when trying again later may succeed"""
+
+    def __init__(self, message: str, retryable: bool, status: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+
+class PaymentGateway:
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        base_url: str = RAZORPAY_API_URL,
+        timeout: float = PAYMENT_GATEWAY_TIMEOUT,
+        connect_timeout: float = PAYMENT_GATEWAY_CONNECT_TIMEOUT,
+        max_connections: int = PAYMENT_GATEWAY_CONNECTIONS,
+        retries: int = PAYMENT_GATEWAY_RETRIES,
+    ):
+        self.base_url = base_url.rstrip("/")
+        credentials = base64.b64encode(f"{key_id}:{key_secret}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {credentials}"}
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.retries = retries
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Built on first use, inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                self.base_url, connector=connector, timeout=self.timeout, headers=self.headers, raise_for_status=False
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _call(self, operation: str, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """One attempt; GatewayError says whether another is worth it"""
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, path, **kwargs) as response:
+                body = await response.json(content_type=None)
+                if response.status >= 400:
+                    error = (body or {}).get("error", {}) if isinstance(body, dict) else {}
+                    raise GatewayError(
+                        f"{operation}: HTTP {response.status} {error.get('description', '')}".strip(),
+                        retryable=response.status in RETRYABLE_STATUS,
+                        status=response.status,
+                    )
+                return body
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # The request may have reached the gateway: retries must check before creating again
+            raise GatewayError(f"{operation}: {type(e).__name__} {e}", retryable=True) from e
+        finally:
+            gateway_latency.observe(time.perf_counter() - start, operation=operation)
+
+    async def _with_retries(self, operation: str, attempt):
+        """Run `attempt(n)` until it succeeds, fails for good or runs out of retries"""
+        for n in range(self.retries + 1):
+            try:
+                result = await attempt(n)
+                gateway_requests.inc(operation=operation, outcome="ok")
+                return result
+            except GatewayError as e:
+                if not e.retryable or n == self.retries:
+                    gateway_requests.inc(operation=operation, outcome="error")
+                    raise
+                gateway_requests.inc(operation=operation, outcome="retry")
+                await asyncio.sleep(random.uniform(0, BACKOFF_SECONDS * 2 ** n))
+
+    async def _lookup(self, receipt: str) -> Optional[Dict[str, Any]]:
+        found = await self._call("find_order", "GET", "/v1/orders", params={"receipt": receipt})
+        items = found.get("items", []) if isinstance(found, dict) else []
+        return items[0] if items else None
+
+    async def find_order(self, receipt: str) -> Optional[Dict[str, Any]]:
+        """The gateway order created for `receipt`, if any"""
+        return await self._with_retries("find_order", lambda n: self._lookup(receipt))
+
+    async def create_order(
+        self,
+        amount: int,
+        receipt: str,
+        currency: str = "INR",
+        notes: Optional[Dict[str, str]] = None,
+        check_existing: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Create a gateway order for `amount` (in paise). With check_existing,
+        or on any retry, an order already made for `receipt` is returned instead
+        """
+        payload = {"amount": amount, "currency": currency, "receipt": receipt, "payment_capture": 1, "notes": notes or {}}
+
+        async def attempt(n: int):
+            if n or check_existing:
+                existing = await self._lookup(receipt)
+                if existing is not None:
+                    return existing
+            return await self._call("create_order", "POST", "/v1/orders", json=payload)
+
+        return await self._with_retries("create_order", attempt)
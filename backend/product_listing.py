@@ -0,0 +1,257 @@
+"""
+Product listing planner for 18 Cricket Network
+Plans the marketplace product list (api_marketplace.list_products). Filters
+are split into equality, range and search clauses. The page query is pinned
+to the registry index (db_indexes.py) whose equality prefix and sort field
+fit the request best, and pages are keyset cursors over (sort field, id).
+Facet counts for brand, category, condition and price come from one $facet
+aggregation, each facet counted under every filter but its own. Facets of
+the category landing pages, the hot keys, are cached until the next
+product write.
+"""
+
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+
+from coalesce import single_flight
+from db_indexes import INDEXES, IndexSpec
+from etags import collection_version
+from pagination import MAX_PAGE_SIZE, encode_sort_cursor, sort_keyset_query
+from query_compiler import search_clause
+
+logger = logging.getLogger(__name__)
+
+# sort_by -> stored field
+SORTS = {"created_at": "created_at", "price": "price", "rating": "rating", "popularity": "reviews_count"}
+ORDERS = {"asc": 1, "desc": -1}
+
+# Filters an index prefix can match, by query parameter
+EQUALITY_FIELDS = {"category": "category", "brand": "brand", "seller_id": "vendor_id"}
+# Fields a search that does not compile to prefix ranges falls back to
+SEARCH_FIELDS = ("name", "description", "brand")
+
+# Lower bounds of the price buckets; the last one is open-ended
+PRICE_BUCKETS = (0, 500, 1_000, 2_500, 5_000, 10_000, 25_000)
+# Values listed per brand and category facet
+FACET_SIZE = 20
+# Cached category facets also expire, so workers that missed a write catch up
+FACET_CACHE_TTL = float(os.getenv("PRODUCT_FACET_TTL", "60"))
+# Listings without a graded `condition` count as "new" or "used"
+CONDITION_LABEL = {"$ifNull": ["$condition", {"$cond": ["$is_used", "used", "new"]}]}
+
+
+class ListingPlan(NamedTuple):
+    # Every filter of the request
+    query: Dict[str, Any]
+    # Filters shared by all facets (seller, search)
+    base: Dict[str, Any]
+    # Facet -> the request's own filter on it
+    facet_filters: Dict[str, Dict[str, Any]]
+    field: str
+    direction: int
+    # Index the page query is pinned to, None to leave it to the server
+    index: Optional[IndexSpec]
+    # Whether the facets are those of a category landing page
+    hot: bool
+
+    @property
+    def sort(self) -> List[Tuple[str, int]]:
+        return [(self.field, self.direction), ("id", self.direction)]
+
+
+def condition_clause(condition: str) -> Dict[str, Any]:
+    if condition == "new":
+        return {"is_used": False}
+    return {"is_used": True, "condition": condition}
+
+
+def price_clause(min_price: Optional[float], max_price: Optional[float]) -> Dict[str, Any]:
+    bounds = {}
+    if min_price is not None:
+        bounds["$gte"] = min_price
+    if max_price is not None:
+        bounds["$lte"] = max_price
+    return {"price": bounds} if bounds else {}
+
+
+def choose_index(equality: Set[str], field: str) -> Optional[IndexSpec]:
+    """
+    The products index that serves the filters and sort without a blocking
+    sort: equality fields only in front of the sort field, at most id after
+    it. Longest matched prefix wins, then an id tie-breaker
+    """
+    best, best_rank = None, None
+    for spec in INDEXES["products"]:
+        names = [name for name, _ in spec.keys]
+        if field not in names:
+            continue
+        at = names.index(field)
+        prefix, rest = names[:at], names[at + 1:]
+        if not set(prefix) <= equality or rest not in ([], ["id"]):
+            continue
+        rank = (len(prefix), rest == ["id"])
+        if best_rank is None or rank > best_rank:
+            best, best_rank = spec, rank
+    return best
+
+
+def plan_listing(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    condition: Optional[str] = None,
+    seller_id: Optional[str] = None,
+    search: Optional[str] = None,
+    sort_by: str = "created_at",
+    order: str = "desc",
+) -> ListingPlan:
+    if sort_by not in SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort_by: {sort_by} (one of {', '.join(SORTS)})")
+    if order not in ORDERS:
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+
+    base: Dict[str, Any] = {}
+    if seller_id:
+        base["vendor_id"] = seller_id
+    if search:
+        base.update(search_clause("products", search, SEARCH_FIELDS))
+    facet_filters = {
+        "category": {"category": category} if category else {},
+        "brand": {"brand": brand} if brand else {},
+        "condition": condition_clause(condition) if condition else {},
+        "price": price_clause(min_price, max_price),
+    }
+    query = dict(base)
+    for clause in facet_filters.values():
+        query.update(clause)
+
+    equality = {field for field in EQUALITY_FIELDS.values() if isinstance(query.get(field), str)}
+    # A search brings its own selective index (search_words or the text hits), so the server picks
+    index = None if search else choose_index(equality, SORTS[sort_by])
+    hot = not base and not any(clause for name, clause in facet_filters.items() if name != "category")
+    return ListingPlan(query, base, facet_filters, SORTS[sort_by], ORDERS[order], index, hot)
+
+
+async def fetch_listing(
+    db,
+    plan: ListingPlan,
+    cursor: Optional[str],
+    limit: int,
+    projection: Dict[str, Any],
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page in the plan's keyset order and the cursor for the next page (None on the last)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # The cursor is built from the sort field and id
+    if any(value not in (0, False) for field, value in projection.items() if field != "_id"):
+        projection = {**projection, plan.field: 1, "id": 1}
+    query = sort_keyset_query(plan.query, plan.field, plan.direction, cursor)
+
+    def find(hinted: bool):
+        found = db.products.find(query, projection).sort(plan.sort).limit(limit + 1)
+        return found.hint(plan.index.keys) if hinted else found
+
+    try:
+        docs = await find(plan.index is not None).to_list(limit + 1)
+    except OperationFailure as e:
+        # The index is still being built by the reconciler (db_indexes.py)
+        logger.warning(f"Listing plan {plan.index.name if plan.index else None} failed, unpinned: {e}")
+        docs = await find(False).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_sort_cursor(docs[-1], plan.field)
+
+
+def facet_pipeline(plan: ListingPlan) -> List[Dict[str, Any]]:
+    """One $facet: the total under every filter, each facet under all filters but its own"""
+    def others(name: str) -> Dict[str, Any]:
+        match: Dict[str, Any] = {}
+        for other, clause in plan.facet_filters.items():
+            if other != name:
+                match.update(clause)
+        return {"$match": match}
+
+    def top(name: str, group_by: Any) -> List[Dict[str, Any]]:
+        return [
+            others(name),
+            {"$group": {"_id": group_by, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": FACET_SIZE},
+        ]
+
+    everything: Dict[str, Any] = {}
+    for clause in plan.facet_filters.values():
+        everything.update(clause)
+    return [
+        {"$match": plan.base},
+        {"$facet": {
+            "total": [{"$match": everything}, {"$count": "count"}],
+            "brand": top("brand", "$brand"),
+            "category": top("category", "$category"),
+            "condition": top("condition", CONDITION_LABEL),
+            "price": [
+                others("price"),
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": list(PRICE_BUCKETS),
+                    # Prices from the last bound up (and any non-numeric price)
+                    "default": PRICE_BUCKETS[-1],
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+
+
+def _shape_facets(raw: Dict[str, Any]) -> Dict[str, Any]:
+    counted = {bucket["_id"]: bucket["count"] for bucket in raw["price"]}
+    bounds = list(PRICE_BUCKETS) + [None]
+    return {
+        "total": raw["total"][0]["count"] if raw["total"] else 0,
+        "brand": [{"value": row["_id"], "count": row["count"]} for row in raw["brand"]],
+        "category": [{"value": row["_id"], "count": row["count"]} for row in raw["category"]],
+        "condition": [{"value": row["_id"], "count": row["count"]} for row in raw["condition"]],
+        "price": [
+            {"min": low, "max": high, "count": counted.get(low, 0)}
+            for low, high in zip(bounds, bounds[1:])
+        ],
+    }
+
+
+async def facet_counts(db, plan: ListingPlan) -> Dict[str, Any]:
+    async def run():
+        rows = await db.products.aggregate(facet_pipeline(plan)).to_list(1)
+        return _shape_facets(rows[0])
+
+    if not plan.hot:
+        return await run()
+    # Keyed by the collection version, so a product write shows up at once
+    version = await collection_version(db, "products")
+    key = (db.name, version, plan.facet_filters["category"].get("category"))
+    return await single_flight.do("product facets", key, run, FACET_CACHE_TTL)
+
+
+async def list_products(
+    db,
+    plan: ListingPlan,
+    cursor: Optional[str],
+    limit: int,
+    projection: Dict[str, Any],
+) -> Dict[str, Any]:
+    """A page, its next cursor and the facet counts, queried concurrently"""
+    (products, next_cursor), facets = await asyncio.gather(
+        fetch_listing(db, plan, cursor, limit, projection),
+        facet_counts(db, plan),
+    )
+    return {
+        "products": products,
+        "next_cursor": next_cursor,
+        "total": facets["total"],
+        "facets": {name: values for name, values in facets.items() if name != "total"},
+        "plan": {"index": plan.index.name if plan.index else None, "sort": [list(key) for key in plan.sort]},
+    }
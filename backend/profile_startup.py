@@ -0,0 +1,146 @@
+"""
+Cold-start profiler for the API apps
+Imports an app module in fresh interpreters (as a new worker would), reports
+the median import wall time and the slowest modules from -X importtime
+
+Usage: python profile_startup.py --module server --runs 5 --top 20 --budget-ms 1200
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# SDKs that must stay out of the import path of a fresh worker
+LAZY_MODULES = ("openai", "aiohttp")
+# Also kept out of the startup handlers, which run before the worker serves:
+# the in-memory indexes import NumPy from their background loads
+STARTUP_LAZY_MODULES = LAZY_MODULES + ("numpy",)
+
+# Enough environment to import the apps without a reachable database;
+# Motor does not connect until the first query
+PROFILE_ENV = {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "DB_NAME": "startup_profile",
+}
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_ms": elapsed * 1000, "loaded": sorted(m for m in {lazy!r} if m in sys.modules)}}))
+"""
+
+# Runs the app's startup handlers as the server would, then exits without
+# waiting for the background tasks they start
+_STARTUP_PROBE = """
+import asyncio, sys, time, json, os
+import {module}
+async def startup():
+    start = time.perf_counter()
+    for handler in {module}.app.router.on_startup:
+        await handler()
+    return time.perf_counter() - start
+elapsed = asyncio.new_event_loop().run_until_complete(startup())
+print(json.dumps({{"startup_ms": elapsed * 1000, "loaded": sorted(m for m in {lazy!r} if m in sys.modules)}}), flush=True)
+os._exit(0)
+"""
+
+
+def run_once(module: str, importtime: bool = False) -> Tuple[Dict, str]:
+    """Import `module` in a new interpreter; returns the probe result and the -X importtime log"""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE.format(module=module, lazy=LAZY_MODULES)]
+    env = {**os.environ, **PROFILE_ENV}
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def measure_startup(module: str = "server") -> Dict:
+    """Time of the app's startup handlers in a fresh interpreter, and the heavy modules they imported"""
+    command = [sys.executable, "-c", _STARTUP_PROBE.format(module=module, lazy=STARTUP_LAZY_MODULES)]
+    env = {**os.environ, **PROFILE_ENV}
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"module": module, "startup_ms": round(result["startup_ms"], 1), "eager_lazy_modules": result["loaded"]}
+
+
+def parse_importtime(log: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for each line of -X importtime output"""
+    rows = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str = "server", runs: int = 5) -> Dict:
+    """Median cold import time over `runs` fresh interpreters"""
+    samples = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        result, _ = run_once(module)
+        samples.append(result["import_ms"])
+        loaded = result["loaded"]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 1),
+        "best_ms": round(min(samples), 1),
+        "eager_lazy_modules": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    summary = measure(args.module, args.runs)
+    _, log = run_once(args.module, importtime=True)
+    rows = parse_importtime(log)
+
+    startup = measure_startup(args.module)
+
+    print(f"{args.module}: median {summary['median_ms']}ms, best {summary['best_ms']}ms over {args.runs} cold imports")
+    print(f"startup handlers: {startup['startup_ms']}ms")
+    if summary["eager_lazy_modules"]:
+        print(f"Imported at startup but should be lazy: {', '.join(summary['eager_lazy_modules'])}")
+    if startup["eager_lazy_modules"]:
+        print(f"Imported by startup handlers but should be lazy: {', '.join(startup['eager_lazy_modules'])}")
+
+    top_level = [row for row in rows if "." not in row[0]]
+    print(f"\n{'top-level package':<40}{'cumulative ms':>15}")
+    for name, _, cumulative in sorted(top_level, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:<40}{cumulative / 1000:>15.1f}")
+
+    print(f"\n{'module (self time)':<40}{'self ms':>15}")
+    for name, self_us, _ in sorted(rows, key=lambda r: -r[1])[:args.top]:
+        print(f"{name:<40}{self_us / 1000:>15.1f}")
+
+    failed: Optional[str] = None
+    if summary["eager_lazy_modules"] or startup["eager_lazy_modules"]:
+        failed = "lazy modules imported at startup"
+    elif args.budget_ms is not None and summary["median_ms"] > args.budget_ms:
+        failed = f"median {summary['median_ms']}ms over budget {args.budget_ms}ms"
+    if failed:
+        print(f"\nFAIL: {failed}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Projections for 18 Cricket Network list endpoints
+Default "summary" fieldsets per collection plus a client-chosen `fields=`
+list, both applied in the Mongo query so unused fields (base64 images,
+time slots, nested arrays) are never read off the wire or serialized
+"""
+
+from fastapi import HTTPException
+from typing import Any, Dict, Iterable, List, Optional
+import re
+
+from fast_json import NO_ID
+
+# What a list card renders (frontend/app/*/list.tsx and the marketplace tab read
+# these unguarded); detail endpoints still return whole documents
+SUMMARY_FIELDS: Dict[str, tuple] = {
+    "products": ("id", "name", "brand", "category", "price", "original_price", "is_used",
+                 "is_featured", "rating", "reviews_count", "vendor_id", "vendor_name"),
+    "academies": ("id", "name", "city", "location", "fees", "facilities", "rating"),
+    "tournaments": ("id", "name", "city", "location", "start_date", "end_date", "tournament_type",
+                    "registration_fee", "prize_money", "max_teams", "teams_registered", "status"),
+    "grounds": ("id", "name", "city", "location", "latitude", "longitude", "ground_type", "pricing",
+                "facilities", "rating", "reviews_count", "is_verified"),
+    "training_facilities": ("id", "name", "facility_type", "city", "location", "latitude", "longitude",
+                            "pricing", "rating", "is_verified"),
+    "personal_trainers": ("id", "name", "specialization", "experience_years", "city", "location",
+                          "latitude", "longitude", "pricing", "rating", "reviews_count", "is_verified"),
+    "cricket_gyms": ("id", "name", "city", "location", "latitude", "longitude", "pricing", "opening_hours",
+                     "rating", "is_verified"),
+    "teams": ("id", "name", "city", "logo", "captain_id", "captain_name", "matches_played", "matches_won"),
+    "leagues": ("id", "name", "city", "start_date", "end_date", "registration_fee", "max_teams", "status",
+                "organizer_name"),
+    "livestreams": ("id", "title", "thumbnail", "broadcaster_id", "broadcaster_name", "broadcaster_type",
+                    "is_live", "viewers", "started_at", "region"),
+    "users": ("_id", "name", "user_type", "profile_image", "is_verified", "verification_type"),
+}
+
+# Collections whose summary carries the first image as the card thumbnail
+THUMBNAIL_COLLECTIONS = {
+    "products", "academies", "tournaments", "grounds", "training_facilities", "personal_trainers", "cricket_gyms",
+}
+
+# Projection used for fields=all and by detail routes
+FULL_PROJECTIONS: Dict[str, Dict[str, Any]] = {
+    "users": {"password": 0},
+    # Checkout bookkeeping (inventory.py): holds name other buyers' reservations
+    "products": {"_id": 0, "holds": 0, "reserved": 0},
+}
+
+# Never returned, even when asked for by name
+FORBIDDEN_FIELDS = {"password"}
+
+# Changed by checkout without a collection version bump (inventory.py): lists,
+# whose ETags follow that version, never carry them; detail routes still do
+LIST_HIDDEN_FIELDS: Dict[str, set] = {
+    "products": {"stock"},
+}
+
+ALL_FIELDS = ("all", "*")
+MAX_FIELDS = 40
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+
+def parse_fields(fields: str, hidden: Iterable[str] = FORBIDDEN_FIELDS) -> List[str]:
+    """Validate a comma-separated `fields=` value; naming a `hidden` field is an error"""
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if len(names) > MAX_FIELDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FIELDS} fields can be requested")
+    for name in names:
+        if not _FIELD_RE.match(name) or name.split(".")[0] in hidden:
+            raise HTTPException(status_code=400, detail=f"Invalid field: {name}")
+    return names
+
+
+def _drop_overlapping(names: Iterable[str]) -> List[str]:
+    """MongoDB rejects 'pricing' together with 'pricing.hourly'; keep the parent"""
+    unique = sorted(set(names))
+    kept: List[str] = []
+    for name in unique:
+        if not any(name.startswith(parent + ".") for parent in kept):
+            kept.append(name)
+    return kept
+
+
+def build_projection(collection: str, fields: Optional[str] = None, required: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Projection for a list query on `collection`.
+
+    fields=None gives the summary fieldset, fields=all the whole document and
+    anything else is read as a comma-separated list. `required` names fields
+    the handler itself needs (sort keys, coordinates) and is always included.
+    """
+    volatile = LIST_HIDDEN_FIELDS.get(collection, set())
+    if fields in ALL_FIELDS:
+        return {**FULL_PROJECTIONS.get(collection, NO_ID), **{name: 0 for name in volatile}}
+
+    if fields:
+        hidden = FORBIDDEN_FIELDS | volatile | set(FULL_PROJECTIONS.get(collection, ())) - {"_id"}
+        names = parse_fields(fields, hidden)
+        slice_images = False
+    else:
+        names = list(SUMMARY_FIELDS[collection])
+        slice_images = collection in THUMBNAIL_COLLECTIONS
+
+    projection: Dict[str, Any] = {name: 1 for name in _drop_overlapping([*names, *required])}
+    if slice_images and "images" not in projection:
+        projection["images"] = {"$slice": 1}
+    if "_id" not in projection:
+        projection["_id"] = 0
+    return projection
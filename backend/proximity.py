@@ -0,0 +1,262 @@
+"""
+In-memory proximity engine for 18 Cricket Network
+Keeps the coordinates of listings in contiguous NumPy arrays so ranking that
+Mongo cannot do for us (distance blended with price and rating, distances
+from one user to many venues) is a bounding-box prefilter, one vectorized
+haversine and an argpartition top-k instead of a Python loop per document
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import math
+
+import numpy as np
+
+from coalesce import single_flight
+from geo import GEO_COLLECTIONS, PROXIMITY_PROJECTION as LOAD_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+INITIAL_CAPACITY = 1024
+
+# Weights of the blended score; lower scores rank first
+DEFAULT_WEIGHTS = {"distance": 1.0, "price": 0.0, "rating": 0.0}
+
+
+def listing_price(doc: Dict[str, Any]) -> float:
+    """Lowest advertised price ("from" price), NaN when the listing has none"""
+    prices = [value for value in (doc.get("pricing") or {}).values() if isinstance(value, (int, float))]
+    return float(min(prices)) if prices else math.nan
+
+
+class ProximityIndex:
+    """
+    Coordinates, price and rating of one collection's listings, one slot per
+    listing. upsert()/remove() touch a single slot, so write paths keep the
+    index current without a reload; removed slots are reused.
+    """
+
+    def __init__(self, collection: str, capacity: int = INITIAL_CAPACITY):
+        self.collection = collection
+        self._allocate(capacity)
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self.size = 0
+        self.loaded = False
+        # Writes that arrive while load() is reading the collection
+        self._pending: Optional[List[Tuple[str, Any]]] = None
+
+    def _allocate(self, capacity: int):
+        self.lat = np.zeros(capacity, dtype=np.float64)
+        self.lon = np.zeros(capacity, dtype=np.float64)
+        self.price = np.full(capacity, np.nan, dtype=np.float64)
+        self.rating = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = (self.lat, self.lon, self.price, self.rating, self.active)
+        capacity = len(self.lat) * 2
+        self._allocate(capacity)
+        for new, current in zip((self.lat, self.lon, self.price, self.rating, self.active), old):
+            new[:len(current)] = current
+        self.ids.extend([None] * (capacity - len(old[0])))
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # ==================== WRITES ====================
+
+    def upsert(self, doc: Dict[str, Any]):
+        """Add or move a listing; one without valid coordinates is removed"""
+        if self._pending is not None:
+            self._pending.append(("upsert", doc))
+        doc_id = doc.get("id")
+        lat, lon = doc.get("latitude"), doc.get("longitude")
+        if not doc_id:
+            return
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            self._remove(doc_id)
+            return
+
+        slot = self.slots.get(doc_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self.size == len(self.lat):
+                    self._grow()
+                slot = self.size
+                self.size += 1
+            self.slots[doc_id] = slot
+            self.ids[slot] = doc_id
+        self.lat[slot] = math.radians(lat)
+        self.lon[slot] = math.radians(lon)
+        self.price[slot] = listing_price(doc)
+        rating = doc.get("rating")
+        self.rating[slot] = float(rating) if isinstance(rating, (int, float)) else 0.0
+        self.active[slot] = True
+
+    def remove(self, doc_id: str):
+        if self._pending is not None:
+            self._pending.append(("remove", doc_id))
+        self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        slot = self.slots.pop(doc_id, None)
+        if slot is None:
+            return
+        self.active[slot] = False
+        self.ids[slot] = None
+        self._free.append(slot)
+
+    async def load(self, db, batch_size: int = 5_000):
+        """Rebuild from the collection; writes made meanwhile are replayed on top"""
+        fresh = ProximityIndex(self.collection)
+        self._pending = []
+        try:
+            cursor = db[self.collection].find({"latitude": {"$type": "number"}, "longitude": {"$type": "number"}}, LOAD_PROJECTION)
+            async for doc in cursor.batch_size(batch_size):
+                fresh.upsert(doc)
+            pending, self._pending = self._pending, None
+        except BaseException:
+            self._pending = None
+            raise
+        for op, value in pending:
+            if op == "upsert":
+                fresh.upsert(value)
+            else:
+                fresh._remove(value)
+        (self.lat, self.lon, self.price, self.rating, self.active, self.ids, self.slots, self._free, self.size) = (
+            fresh.lat, fresh.lon, fresh.price, fresh.rating, fresh.active, fresh.ids, fresh.slots, fresh._free, fresh.size
+        )
+        self.loaded = True
+        logger.info(f"Proximity index for {self.collection}: {len(self.slots)} listings")
+
+    # ==================== QUERIES ====================
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Slots inside the bounding box of the search circle"""
+        n = self.size
+        mask = self.active[:n].copy()
+        dlat = radius_km / EARTH_RADIUS_KM
+        mask &= np.abs(self.lat[:n] - lat) <= dlat
+        cos_lat = math.cos(lat)
+        # Near the poles every longitude is within reach
+        if cos_lat > 1e-6 and dlat / cos_lat < math.pi:
+            dlon = math.asin(min(1.0, math.sin(dlat) / cos_lat))
+            wrapped = np.abs((self.lon[:n] - lon + math.pi) % (2 * math.pi) - math.pi)
+            mask &= wrapped <= dlon
+        return np.flatnonzero(mask)
+
+    def _haversine(self, slots: np.ndarray, lat: float, lon: float) -> np.ndarray:
+        lat2, lon2 = self.lat[slots], self.lon[slots]
+        a = np.sin((lat2 - lat) / 2) ** 2 + math.cos(lat) * np.cos(lat2) * np.sin((lon2 - lon) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        k: int = 20,
+        weights: Optional[Dict[str, float]] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top `k` listings within `radius_km`, ranked by a blended score:
+        distance (as a fraction of the radius), price (as a fraction of the
+        dearest candidate) and rating (out of 5, higher is better). With the
+        default weights this is plain nearest-first.
+        """
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        slots = self._candidates(lat, lon, radius_km)
+        if slots.size == 0:
+            return []
+
+        distances = self._haversine(slots, lat, lon)
+        keep = distances <= radius_km
+        if max_price is not None:
+            keep &= self.price[slots] <= max_price
+        if min_rating is not None:
+            keep &= self.rating[slots] >= min_rating
+        slots, distances = slots[keep], distances[keep]
+        if slots.size == 0:
+            return []
+
+        score = weights["distance"] * distances / max(radius_km, 1e-9)
+        if weights["price"]:
+            prices = self.price[slots]
+            top = np.nanmax(prices) if not np.all(np.isnan(prices)) else 0.0
+            # Listings without a price rank as the dearest
+            score = score + weights["price"] * np.where(np.isnan(prices), 1.0, prices / top if top else 0.0)
+        if weights["rating"]:
+            score = score - weights["rating"] * self.rating[slots] / 5
+
+        k = min(k, slots.size)
+        top_k = np.argpartition(score, k - 1)[:k] if k < slots.size else np.arange(slots.size)
+        top_k = top_k[np.lexsort((distances[top_k], score[top_k]))]
+        return [
+            {"id": self.ids[slots[i]], "distance_km": round(float(distances[i]), 2), "score": round(float(score[i]), 4)}
+            for i in top_k
+        ]
+
+    def distances(self, latitude: float, longitude: float, ids: Iterable[str]) -> Dict[str, float]:
+        """Great-circle km from the point to each listing in `ids` that is indexed"""
+        known = [(doc_id, self.slots[doc_id]) for doc_id in ids if doc_id in self.slots]
+        if not known:
+            return {}
+        slots = np.fromiter((slot for _, slot in known), dtype=np.int64, count=len(known))
+        values = self._haversine(slots, math.radians(latitude), math.radians(longitude))
+        return {doc_id: round(float(value), 2) for (doc_id, _), value in zip(known, values)}
+
+
+class ProximityEngine:
+    """One ProximityIndex per geo collection"""
+
+    def __init__(self, collections: Iterable[str] = GEO_COLLECTIONS):
+        self.indexes = {name: ProximityIndex(name) for name in collections}
+
+    def __getitem__(self, collection: str) -> ProximityIndex:
+        return self.indexes[collection]
+
+    def upsert(self, collection: str, doc: Dict[str, Any]):
+        index = self.indexes.get(collection)
+        if index is not None:
+            index.upsert(doc)
+
+    def remove(self, collection: str, doc_id: str):
+        index = self.indexes.get(collection)
+        if index is not None:
+            index.remove(doc_id)
+
+    async def ensure_loaded(self, db, collection: str) -> ProximityIndex:
+        """The index for `collection`, loading it first if this worker has not yet"""
+        index = self.indexes[collection]
+        if not index.loaded:
+            await single_flight.do("proximity load", (db.name, collection), lambda: index.load(db))
+        return index
+
+    async def load(self, db):
+        """(Re)load every index, e.g. to pick up writes made by other workers"""
+        results = await asyncio.gather(
+            *[single_flight.do("proximity load", (db.name, name), lambda index=index: index.load(db)) for name, index in self.indexes.items()],
+            return_exceptions=True,
+        )
+        for name, result in zip(self.indexes, results):
+            if isinstance(result, Exception):
+                logger.error(f"Could not load proximity index for {name}: {result}")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            name: {"listings": len(index), "capacity": len(index.lat), "loaded": index.loaded}
+            for name, index in self.indexes.items()
+        }
+
+
+# Shared instance for the apps in this process
+engine = ProximityEngine()
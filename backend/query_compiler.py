@@ -0,0 +1,134 @@
+"""
+Search query compilation for 18 Cricket Network
+User search input never reaches MongoDB as a pattern. A plain query
+("kookaburra ba", "Wankhede") is folded into words and compiled into
+anchored range scans on the indexed `search_words` field, one per word, each
+word matching as a prefix ("ba" ~ "bat", "balls"). Words match from their
+start, not in the middle: "98765" finds a phone number that begins with it,
+"ball" does not find "football". Anything else (operators,
+symbols, scripts that fold to nothing, very long input) is routed to the
+full-text index, or to an escaped substring match bounded by maxTimeMS while
+that index is still loading on this worker.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import re
+import sys
+
+from bson import ObjectId
+
+from typeahead import words
+
+SEARCH_WORDS_FIELD = "search_words"
+
+# Fields folded into SEARCH_WORDS_FIELD, per collection: every field the
+# search routes used to match (server.SEARCH_SECTIONS), so a word of a
+# description or the digits of a phone number still find the document
+# (backfilled by migrate_search_words.py)
+WORD_FIELDS: Dict[str, tuple] = {
+    "users": ("name", "phone"),
+    "products": ("name", "brand", "description"),
+    "academies": ("name", "city", "description"),
+    "tournaments": ("name", "city", "description"),
+    "grounds": ("name", "city", "description"),
+    "livestreams": ("title", "broadcaster_name"),
+    "teams": ("name", "city"),
+}
+# Free text adds words but little else: only its opening words are folded in,
+# as in the full-text index (text_search.MAX_FIELD_TOKENS)
+LONG_TEXT_FIELDS = {"description"}
+MAX_TEXT_WORDS = 64
+
+MAX_QUERY_LENGTH = 100
+MAX_QUERY_WORDS = 5
+# Hits taken from the full-text index for a list route, before its other filters
+TEXT_ROUTE_HITS = 500
+# Server-side budget of a search that ends up as a literal match
+LITERAL_MAX_TIME_MS = 500
+
+# Letters, digits, spaces and the punctuation found in names ("Gray-Nicolls",
+# "St. Xavier's", "M.S. Dhoni"); anything else is not a plain query
+_PLAIN = re.compile(r"[\w\s'&.,-]*")
+
+
+def field_words(field: str, value: Any) -> List[str]:
+    found = words(value)
+    return found[:MAX_TEXT_WORDS] if field in LONG_TEXT_FIELDS else found
+
+
+def search_words(collection: str, doc: Dict[str, Any]) -> List[str]:
+    """Distinct folded words of the collection's WORD_FIELDS, sorted"""
+    return sorted({word for field in WORD_FIELDS.get(collection, ()) for word in field_words(field, doc.get(field))})
+
+
+def with_search_words(collection: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Stamp SEARCH_WORDS_FIELD on a document about to be inserted"""
+    doc[SEARCH_WORDS_FIELD] = search_words(collection, doc)
+    return doc
+
+
+def search_words_update(collection: str, doc: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep SEARCH_WORDS_FIELD in step with a $set of any word field in update
+    operators; `doc` is the document before the update. Modifies and
+    returns `update`
+    """
+    fields = update.get("$set", {})
+    if any(field in fields for field in WORD_FIELDS.get(collection, ())):
+        fields[SEARCH_WORDS_FIELD] = search_words(collection, {**doc, **fields})
+    return update
+
+
+def compile_search(query: str) -> Optional[List[str]]:
+    """Folded words of a plain query, None when it has to go to the text index"""
+    if not isinstance(query, str) or len(query) > MAX_QUERY_LENGTH or not _PLAIN.fullmatch(query):
+        return None
+    folded = words(query)
+    if not folded or len(folded) > MAX_QUERY_WORDS:
+        return None
+    return folded
+
+
+def prefix_range(prefix: str) -> Dict[str, str]:
+    """Range holding exactly the strings that start with `prefix` (folded, so [0-9a-z])"""
+    return {"$gte": prefix, "$lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)}
+
+
+def prefix_match(folded: Sequence[str]) -> Dict[str, Any]:
+    """Documents with a word starting with each query word; the first range drives the index scan"""
+    # $elemMatch holds both bounds to one word of the array, so the multikey
+    # scan stays within the range. Longest word first: the most selective
+    clauses = [
+        {SEARCH_WORDS_FIELD: {"$elemMatch": prefix_range(word)}}
+        for word in sorted(set(folded), key=len, reverse=True)
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def literal_match(query: str, fields: Sequence[str]) -> Dict[str, Any]:
+    """Escaped case-insensitive substring match; no index, so only ever run under maxTimeMS"""
+    pattern = {"$regex": re.escape(query[:MAX_QUERY_LENGTH]), "$options": "i"}
+    return {"$or": [{field: pattern} for field in fields]}
+
+
+def text_route(collection: str, query: str, fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Clause for a query that does not compile: the keys of its full-text hits
+    when this worker has loaded the index (text_search.py), else a literal match
+    """
+    text_search = sys.modules.get("text_search")
+    if text_search is None or not text_search.index.loaded or collection not in text_search.SOURCES:
+        return literal_match(query, fields)
+    source = text_search.SOURCES[collection]
+    keys: List[Any] = [key for key, _ in text_search.index.search(query, [collection], TEXT_ROUTE_HITS)[collection]]
+    if source.key == "_id":
+        keys = [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+    return {source.key: {"$in": keys}}
+
+
+def search_clause(collection: str, query: str, fields: Sequence[str]) -> Dict[str, Any]:
+    """Query clause for user search input on a collection; `fields` back the literal fallback"""
+    folded = compile_search(query)
+    if folded is not None and collection in WORD_FIELDS:
+        return prefix_match(folded)
+    return text_route(collection, query, fields)
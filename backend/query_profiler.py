@@ -0,0 +1,274 @@
+"""
+Query Profiler for 18 Cricket Network
+Attributes MongoDB round trips, DB time and documents returned to each
+request and route using PyMongo command monitoring, and keeps a slow-query
+log with sampled explain() plans
+"""
+
+from pymongo import monitoring
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+# Same query shape repeated this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Commands that can be explained by the server
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Driver/session fields that must not be sent back inside an explain
+SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "signature"}
+# Internal commands that are not interesting to attribute
+IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "explain"}
+
+
+def _shape(value: Any) -> Any:
+    """Replace literal values in a filter with '?' so the log has no user data"""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shape(v) for v in value[:3]]
+    return "?"
+
+
+def _documents_returned(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+        return len(batch)
+    if command_name in ("count", "insert", "delete", "update"):
+        return int(reply.get("n", 0))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class RequestQueryStats:
+    """Queries issued while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.documents = 0
+        self.shapes: Dict[str, int] = {}
+        self.slow: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, shape_key: str, duration_ms: float, documents: int):
+        with self._lock:
+            self.count += 1
+            self.duration_ms += duration_ms
+            self.documents += documents
+            self.shapes[shape_key] = self.shapes.get(shape_key, 0) + 1
+
+
+_current_request: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_request_queries", default=None)
+
+
+class RouteQueryStats:
+    """Running totals for one route template"""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time_ms = 0.0
+        self.documents = 0
+        self.max_queries = 0
+        self.n_plus_one = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": round(self.queries / requests, 2),
+            "max_queries": self.max_queries,
+            "db_time_ms": round(self.db_time_ms, 2),
+            "avg_db_time_ms": round(self.db_time_ms / requests, 2),
+            "documents": self.documents,
+            "avg_documents": round(self.documents / requests, 2),
+            "n_plus_one_requests": self.n_plus_one,
+        }
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Command listener plus per-route aggregation.
+
+    Pass it to the Motor client with `event_listeners=[profiler]`. Motor runs
+    PyMongo on executor threads with a copy of the caller's context, so the
+    request context var set by QueryProfilerMiddleware is visible here.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE):
+        self.slow_query_ms = slow_query_ms
+        self.explain_rate = explain_rate
+        self.db = None  # set by the app so sampled explains can be run
+        self.routes: Dict[str, RouteQueryStats] = {}
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._explains: set = set()
+        self._lock = threading.Lock()
+
+    # ---------- pymongo.monitoring.CommandListener ----------
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = {
+                "command_name": event.command_name,
+                "database": event.database_name,
+                "command": event.command,
+            }
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        started = self._pop(event)
+        if started is None:
+            return
+        self._record(started, event.duration_micros / 1000, _documents_returned(event.command_name, event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        started = self._pop(event)
+        if started is None:
+            return
+        self._record(started, event.duration_micros / 1000, 0)
+
+    def _pop(self, event) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _record(self, started: Dict[str, Any], duration_ms: float, documents: int):
+        command = started["command"]
+        command_name = started["command_name"]
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            collection = command.get("collection")  # getMore carries the cursor id instead
+        query = command.get("filter", command.get("query", command.get("pipeline", {})))
+        shape_key = f"{command_name} {collection} {_shape(query)}"
+
+        stats = _current_request.get()
+        if stats is not None:
+            stats.add(shape_key, duration_ms, documents)
+
+        if duration_ms >= self.slow_query_ms:
+            entry = {
+                "at": datetime.utcnow().isoformat(),
+                "command": command_name,
+                "collection": collection,
+                "shape": _shape(query),
+                "duration_ms": round(duration_ms, 2),
+                "documents": documents,
+                "plan": None,
+            }
+            self.slow_queries.append(entry)
+            logger.warning(f"Slow query {duration_ms:.1f}ms: {command_name} {collection} {entry['shape']}")
+            if stats is not None and command_name in EXPLAINABLE and random.random() < self.explain_rate:
+                stats.slow.append({"entry": entry, "database": started["database"], "command": command})
+
+    # ---------- request attribution ----------
+
+    def begin_request(self) -> RequestQueryStats:
+        stats = RequestQueryStats()
+        _current_request.set(stats)
+        return stats
+
+    def end_request(self, route: str, stats: RequestQueryStats):
+        _current_request.set(None)
+        route_stats = self.routes.get(route)
+        if route_stats is None:
+            route_stats = self.routes.setdefault(route, RouteQueryStats())
+        route_stats.requests += 1
+        route_stats.queries += stats.count
+        route_stats.db_time_ms += stats.duration_ms
+        route_stats.documents += stats.documents
+        route_stats.max_queries = max(route_stats.max_queries, stats.count)
+
+        repeated = {shape: n for shape, n in stats.shapes.items() if n >= N_PLUS_ONE_THRESHOLD}
+        if repeated:
+            route_stats.n_plus_one += 1
+            logger.warning(f"Possible N+1 on {route}: {repeated}")
+
+        for slow in stats.slow:
+            task = asyncio.create_task(self._explain(slow))
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, slow: Dict[str, Any]):
+        if self.db is None:
+            return
+        command = {k: v for k, v in slow["command"].items() if not k.startswith("$") and k not in SESSION_FIELDS}
+        try:
+            result = await self.db.client[slow["database"]].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            winning = result.get("queryPlanner", {}).get("winningPlan", {})
+            slow["entry"]["plan"] = self._summarize_plan(winning)
+        except Exception as e:
+            logger.error(f"explain() failed for slow {slow['entry']['command']}: {e}")
+
+    @staticmethod
+    def _summarize_plan(plan: Dict[str, Any]) -> List[str]:
+        """Flatten the winning plan into stages like ['FETCH', 'IXSCAN city_1']"""
+        stages = []
+        while plan:
+            stage = plan.get("stage", "?")
+            if plan.get("indexName"):
+                stage = f"{stage} {plan['indexName']}"
+            stages.append(stage)
+            plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0] or plan.get("queryPlan")
+        return stages
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "routes": {
+                route: stats.to_dict()
+                for route, stats in sorted(self.routes.items(), key=lambda item: -item[1].db_time_ms)
+            },
+            "slow_queries": list(self.slow_queries),
+        }
+
+
+class QueryProfilerMiddleware:
+    """ASGI middleware that scopes query stats to each HTTP request"""
+
+    def __init__(self, app, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = self.profiler.begin_request()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope.get("path", "unknown")
+            self.profiler.end_request(f"{scope.get('method', 'GET')} {path}", stats)
+
+
+# Shared instance for the apps in this process
+profiler = QueryProfiler()
@@ -0,0 +1,275 @@
+"""
+Response cache for 18 Cricket Network listings
+Rendered list responses tagged by collection and city filter, invalidated
+precisely by the write routes, LRU-bounded by memory. Set RESPONSE_CACHE_URL
+to a redis:// URL (with the `redis` package installed) to share entries and
+invalidations between workers.
+"""
+
+from fastapi import Request
+from fastapi.responses import Response
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import logging
+import os
+import time
+
+import orjson
+
+from cities import city_key
+from etags import etag_matches, not_modified
+from metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Upper bound on staleness when several workers each keep their own cache
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+
+ANY_CITY = "*"
+
+cache_requests = registry.register(Counter("response_cache_requests_total", "Response cache lookups by route and outcome"))
+cache_invalidations = registry.register(Counter("response_cache_invalidated_total", "Entries dropped by tag invalidation"))
+cache_bytes = registry.register(Gauge("response_cache_bytes", "Bytes held by the in-process response cache"))
+
+# Cached headers worth replaying on a hit
+_KEPT_HEADERS = ("etag", "cache-control", "x-next-cursor")
+
+
+def city_filter_key(city: Optional[str]) -> str:
+    """Tag value for a city filter: the city_key the list routes look up"""
+    return city_key(city) or ANY_CITY
+
+
+def _tags(collection: str, city: Optional[str]) -> List[str]:
+    return [collection, f"{collection}:city:{city_filter_key(city)}"]
+
+
+class CacheEntry:
+    __slots__ = ("body", "headers", "tags", "expires_at", "size")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], tags: List[str], expires_at: float):
+        self.body = body
+        self.headers = headers
+        self.tags = tags
+        self.expires_at = expires_at
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers.items())
+
+
+class RouteCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+class MemoryBackend:
+    """In-process LRU bounded by the bytes of the cached bodies"""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        for tag in entry.tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        cache_bytes.set(self.bytes)
+
+    async def invalidate(self, tags: List[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._by_tag.get(tag, set())
+        for key in keys:
+            self._remove(key)
+        cache_bytes.set(self.bytes)
+        return len(keys)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+class RedisBackend:
+    """
+    Shared backend. Entries expire with RESPONSE_CACHE_TTL; memory bounds and
+    LRU eviction come from the server's maxmemory / allkeys-lru policy.
+    """
+
+    def __init__(self, client, ttl: float = RESPONSE_CACHE_TTL, prefix: str = "rc:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self.client.get(self.prefix + "entry:" + key)
+        if raw is None:
+            return None
+        data = orjson.loads(raw)
+        return CacheEntry(data["body"].encode(), data["headers"], data["tags"], 0)
+
+    async def set(self, key: str, entry: CacheEntry):
+        payload = orjson.dumps({"body": entry.body.decode(), "headers": entry.headers, "tags": entry.tags})
+        ttl_ms = int(self.ttl * 1000)
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + "entry:" + key, payload, px=ttl_ms)
+        for tag in entry.tags:
+            pipe.sadd(self.prefix + "tag:" + tag, key)
+            pipe.pexpire(self.prefix + "tag:" + tag, ttl_ms)
+        await pipe.execute()
+
+    async def invalidate(self, tags: List[str]) -> int:
+        keys: Set[bytes] = set()
+        for tag in tags:
+            keys |= await self.client.smembers(self.prefix + "tag:" + tag)
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.delete(self.prefix + "entry:" + (key.decode() if isinstance(key, bytes) else key))
+        for tag in tags:
+            pipe.delete(self.prefix + "tag:" + tag)
+        await pipe.execute()
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "ttl_seconds": self.ttl}
+
+
+def _make_backend():
+    if RESPONSE_CACHE_URL:
+        try:
+            import redis.asyncio as redis_asyncio
+            return RedisBackend(redis_asyncio.from_url(RESPONSE_CACHE_URL))
+        except ImportError:
+            logger.warning("RESPONSE_CACHE_URL is set but the redis package is not installed; using the in-process cache")
+    return MemoryBackend()
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend or _make_backend()
+        self.ttl = ttl
+        self.routes: Dict[str, RouteCacheStats] = {}
+        # Bumped by every invalidation; a miss that raced a write is not stored
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+
+    def _stats(self, route: str) -> RouteCacheStats:
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes.setdefault(route, RouteCacheStats())
+        return stats
+
+    async def respond(
+        self,
+        request: Request,
+        collection: str,
+        city: Optional[str],
+        build: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """
+        Serve a list route from the cache, or build it and cache the 200.
+        An entry keeps the ETag it was rendered with, so If-None-Match is
+        answered from the entry without touching the database.
+        """
+        route = request.scope.get("route")
+        route_name = getattr(route, "path", request.url.path)
+        stats = self._stats(route_name)
+        key = self.key_for(request)
+
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {e}")
+            entry = None
+
+        if entry is not None:
+            stats.hits += 1
+            cache_requests.inc(route=route_name, outcome="hit")
+            etag = entry.headers.get("etag")
+            if etag and etag_matches(request, etag):
+                return not_modified(etag)
+            return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+
+        stats.misses += 1
+        cache_requests.inc(route=route_name, outcome="miss")
+        generation = self._generations.get(collection, 0)
+        response = await build()
+        if self._generations.get(collection, 0) != generation:
+            return response
+        if response.status_code == 200 and getattr(response, "body", None):
+            headers = {k: v for k, v in response.headers.items() if k in _KEPT_HEADERS}
+            entry = CacheEntry(bytes(response.body), headers, _tags(collection, city), time.monotonic() + self.ttl)
+            try:
+                await self.backend.set(key, entry)
+            except Exception as e:
+                logger.error(f"Response cache write failed: {e}")
+        return response
+
+    async def invalidate(self, collection: str, *cities: Optional[str]):
+        """
+        Drop entries a write to `collection` in `cities` can change: unfiltered
+        listings plus the listings filtered to one of the cities' keys. With no
+        cities the whole collection is dropped. Call it after
+        bump_collection_version(): a listing cached in between would pair the
+        new data with the old ETag and answer 304 to clients holding the old body.
+        """
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        try:
+            if not any(cities):
+                dropped = await self.backend.invalidate([collection])
+            else:
+                keys = {ANY_CITY} | {city_filter_key(city) for city in cities if city}
+                dropped = await self.backend.invalidate([f"{collection}:city:{key}" for key in sorted(keys)])
+            if dropped:
+                cache_invalidations.inc(dropped, collection=collection)
+        except Exception as e:
+            logger.error(f"Response cache invalidation failed for {collection}: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.backend.stats(),
+            "ttl_seconds": self.ttl,
+            "routes": {route: stats.to_dict() for route, stats in sorted(self.routes.items())},
+        }
+
+
+# Shared instance for the apps in this process
+response_cache = ResponseCache()
@@ -9,6 +9,8 @@ from datetime import datetime
 import asyncio
 import logging
 
+from metrics import job_timer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,18 +25,20 @@ from news_aggregator import aggregate_news
 async def run_matches_job():
     """Run matches aggregation job"""
     try:
-        logger.info(f"[{datetime.now()}] Starting matches aggregation...")
-        await aggregate_matches()
-        logger.info(f"[{datetime.now()}] Matches aggregation completed")
+        async with job_timer("matches_aggregator"):
+            logger.info(f"[{datetime.now()}] Starting matches aggregation...")
+            await aggregate_matches()
+            logger.info(f"[{datetime.now()}] Matches aggregation completed")
     except Exception as e:
         logger.error(f"Error in matches aggregation: {e}")
 
 async def run_news_job():
     """Run news aggregation job"""
     try:
-        logger.info(f"[{datetime.now()}] Starting news aggregation...")
-        await aggregate_news()
-        logger.info(f"[{datetime.now()}] News aggregation completed")
+        async with job_timer("news_aggregator"):
+            logger.info(f"[{datetime.now()}] Starting news aggregation...")
+            await aggregate_news()
+            logger.info(f"[{datetime.now()}] News aggregation completed")
     except Exception as e:
         logger.error(f"Error in news aggregation: {e}")
 
@@ -0,0 +1,34 @@
+"""
+Search sources for 18 Cricket Network
+What the full-text (text_search.py) and typo-tolerant (fuzzy_search.py)
+indexes read: collection, key field and weighted fields per result type.
+Kept apart from the indexes, which need NumPy, so the app can subscribe to
+their collections at startup without importing them.
+"""
+
+from typing import Any, Dict, NamedTuple
+
+
+class SearchSource(NamedTuple):
+    collection: str
+    # Field the documents are fetched back by
+    key: str
+    # Indexed field -> weight of one occurrence
+    fields: Dict[str, float]
+    # Only documents matching this are searchable
+    query: Dict[str, Any] = {}
+
+
+TEXT_SOURCES: Dict[str, SearchSource] = {
+    "users": SearchSource("users", "_id", {"name": 3.0, "phone": 1.0}),
+    "products": SearchSource("products", "id", {"name": 3.0, "brand": 2.0, "category": 1.0, "description": 1.0}),
+    "academies": SearchSource("academies", "id", {"name": 3.0, "city": 1.5, "location": 1.0, "description": 1.0}),
+    "tournaments": SearchSource("tournaments", "id", {"name": 3.0, "city": 1.5, "tournament_type": 1.0, "description": 1.0}),
+    "grounds": SearchSource("grounds", "id", {"name": 3.0, "city": 1.5, "location": 1.0, "ground_type": 1.0, "description": 1.0}),
+    "livestreams": SearchSource("livestreams", "id", {"title": 3.0, "broadcaster_name": 2.0}, {"is_live": True}),
+}
+
+FUZZY_SOURCES: Dict[str, SearchSource] = {
+    "users": SearchSource("users", "_id", {"name": 1.0}),
+    "teams": SearchSource("teams", "id", {"name": 1.0}),
+}
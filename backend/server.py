@@ -4,48 +4,141 @@ from pathlib import Path
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Query, Depends, Header
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Query, Depends, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import sys
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
+import asyncio
+import time
 from datetime import datetime, timedelta
-import razorpay
 import jwt
 import bcrypt
 from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
 import base64
+from fast_json import FastJSONResponse, NO_ID
+from pagination import NEXT_CURSOR_HEADER, fetch_page, reject_offset_params
+from projections import ALL_FIELDS, FULL_PROJECTIONS, build_projection
+from cities import autocomplete, city_filter, city_key_update, with_city_key
+from query_compiler import LITERAL_MAX_TIME_MS, search_clause, search_words_update, with_search_words
+from coalesce import shared_json_response, single_flight
+from etags import bump_collection_version, conditional_document, conditional_list, versioned_insert, versioned_update
+from geo import GEO_COLLECTIONS, GEOHASH_FIELD, PROXIMITY_PROJECTION, fetch_nearby, fetch_nearby_merged, geo_update, with_geo_point
+from geo_tiles import tile_cache, viewport
+from typeahead import TYPEAHEAD_TYPES, WEIGHT_FIELDS, typeahead
+from typeahead import SOURCES as TYPEAHEAD_SOURCES
+from search_sources import FUZZY_SOURCES, TEXT_SOURCES
+from change_feed import ChangeEvent, ChangeFeed
+from inventory import AlreadyCommitted, OutOfStock
+import inventory
+from order_outbox import OUTBOX_FIELD, OutboxWorker, outbox_entry
+from response_cache import response_cache
+import db_indexes
+from query_profiler import profiler, QueryProfilerMiddleware
+from metrics import MetricsMiddleware, lag_probe, pool_listener, render_metrics, search_type_latency, search_type_timeouts
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[profiler, pool_listener])
 db = client[os.environ['DB_NAME']]
+profiler.db = db
 
 # Create the main app
-app = FastAPI(title="18 Cricket Ecosystem API")
+app = FastAPI(title="18 Cricket Ecosystem API", default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 
-# Razorpay client (will be initialized when keys are provided)
+# Micro-TTLs (seconds) for the match-time hot reads; identical concurrent
+# requests are coalesced into one query on top of these
+STORIES_TTL = float(os.environ.get('STORIES_TTL', '2'))
+LIVESTREAMS_TTL = float(os.environ.get('LIVESTREAMS_TTL', '1'))
+TOURNAMENTS_TTL = float(os.environ.get('TOURNAMENTS_TTL', '1'))
+
+# Razorpay gateway (payment_gateway.py, built on first use when keys are
+# provided; aiohttp is not needed to serve anything but checkout). Checkout
+# only queues the gateway call; the outbox worker makes it (order_outbox.py)
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
+_payment_gateway = None
+payment_outbox = None
+
+def get_payment_gateway():
+    global _payment_gateway
+    if _payment_gateway is None and RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
+        from payment_gateway import PaymentGateway
+        _payment_gateway = PaymentGateway(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+    return _payment_gateway
+
+# In-memory proximity engine (proximity.py). It needs NumPy, so it is
+# imported by its background load once the app serves; writes from other
+# workers arrive through the change feed, or where there is none by a reload
+# every PROXIMITY_REFRESH_SECONDS
+PROXIMITY_REFRESH_SECONDS = float(os.environ.get('PROXIMITY_REFRESH_SECONDS', '300'))
+
+def get_proximity():
+    import proximity
+    return proximity.engine
+
+def proximity_upsert(collection: str, doc: dict):
+    if 'proximity' in sys.modules:
+        get_proximity().upsert(collection, doc)
+
+# Full-text search index (text_search.py), loaded the same way; a worker
+# serves /search with indexed prefix queries (query_compiler.py) until its
+# index is built. The typeahead index (typeahead.py) is rebuilt on the same
+# schedule
+SEARCH_REFRESH_SECONDS = float(os.environ.get('SEARCH_REFRESH_SECONDS', '900'))
+
+def get_text_search():
+    import text_search
+    return text_search
+
+# Typo-tolerant name index (fuzzy_search.py) behind /search?mode=fuzzy,
+# loaded after the full-text one
+def get_fuzzy_search():
+    import fuzzy_search
+    return fuzzy_search
+
+def indexed_inline(sources: dict, type_name: str) -> bool:
+    """
+    Whether a route re-indexes its own write of `type_name`: only while the
+    change feed is not delivering that collection's writes to the indexes
+    """
+    return type_name in sources and not change_feed.live((sources[type_name].collection,))
+
+def search_upsert(type_name: str, doc: dict):
+    if 'text_search' in sys.modules and indexed_inline(TEXT_SOURCES, type_name):
+        get_text_search().index.upsert(type_name, doc)
+    if 'fuzzy_search' in sys.modules and indexed_inline(FUZZY_SOURCES, type_name):
+        get_fuzzy_search().index.upsert(type_name, doc)
+
+def search_remove(type_name: str, key: str):
+    if 'text_search' in sys.modules and indexed_inline(TEXT_SOURCES, type_name):
+        get_text_search().index.remove(type_name, key)
+    if 'fuzzy_search' in sys.modules and indexed_inline(FUZZY_SOURCES, type_name):
+        get_fuzzy_search().index.remove(type_name, key)
 
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-else:
-    razorpay_client = None
+def typeahead_upsert(type_name: str, doc: dict):
+    if indexed_inline(TYPEAHEAD_SOURCES, type_name):
+        typeahead.upsert(type_name, doc)
+
+def typeahead_remove(type_name: str, key: str):
+    if indexed_inline(TYPEAHEAD_SOURCES, type_name):
+        typeahead.remove(type_name, key)
 
 # ==================== MODELS ====================
 
@@ -591,6 +684,11 @@ async def get_current_user(authorization: str = Header(None)):
     user['_id'] = str(user['_id'])
     return user
 
+def page_response(items: List[dict], next_cursor: Optional[str]) -> FastJSONResponse:
+    # Lists stay bare for existing clients; the next page is requested with ?cursor=<X-Next-Cursor>
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -610,8 +708,10 @@ async def register(user_data: UserRegister):
     user_dict['wishlist'] = []
     user_dict['cart'] = []
     
-    result = await db.users.insert_one(user_dict)
+    result = await db.users.insert_one(with_search_words("users", user_dict))
     user_dict['_id'] = str(result.inserted_id)
+    search_upsert("users", user_dict)
+    typeahead_upsert("players", user_dict)
     
     # Create token
     token = create_access_token({"phone": user_data.phone, "user_type": user_data.user_type})
@@ -662,16 +762,21 @@ async def create_product(product: ProductCreate, current_user: dict = Depends(ge
     product_dict['rating'] = 0.0
     product_dict['reviews_count'] = 0
     
-    result = await db.products.insert_one(product_dict)
+    result = await db.products.insert_one(versioned_insert(with_search_words("products", product_dict)))
+    search_upsert("products", product_dict)
+    typeahead_upsert("products", product_dict)
+    await bump_collection_version(db, "products")
     product_dict['_id'] = str(result.inserted_id)
     return product_dict
 
 @api_router.get("/products")
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     is_used: Optional[bool] = None,
     search: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None
 ):
     query = {}
     if category:
@@ -679,24 +784,19 @@ async def get_products(
     if is_used is not None:
         query['is_used'] = is_used
     if search:
-        query['$or'] = [
-            {'name': {'$regex': search, '$options': 'i'}},
-            {'description': {'$regex': search, '$options': 'i'}},
-            {'brand': {'$regex': search, '$options': 'i'}}
-        ]
+        query.update(search_clause("products", search, SEARCH_SECTIONS["products"]))
     
-    products = await db.products.find(query).limit(limit).to_list(limit)
-    for product in products:
-        product['_id'] = str(product['_id'])
-    return products
+    async def load():
+        cursor = db.products.find(query, build_projection("products", fields)).max_time_ms(LITERAL_MAX_TIME_MS)
+        try:
+            return await cursor.limit(limit).to_list(limit)
+        except ExecutionTimeout:
+            raise HTTPException(status_code=503, detail="Search took too long, try a more specific query")
+    return await conditional_list(request, db, "products", load)
 
 @api_router.get("/products/{product_id}")
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    product['_id'] = str(product['_id'])
-    return product
+async def get_product(product_id: str, request: Request):
+    return await conditional_document(request, db.products, product_id, "Product not found")
 
 @api_router.put("/products/{product_id}")
 async def update_product(product_id: str, product_update: ProductCreate, current_user: dict = Depends(get_current_user)):
@@ -708,7 +808,10 @@ async def update_product(product_id: str, product_update: ProductCreate, current
         raise HTTPException(status_code=403, detail="Not authorized")
     
     update_data = product_update.dict(exclude_unset=True)
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
+    await db.products.update_one({"id": product_id}, versioned_update(search_words_update("products", product, {"$set": update_data})))
+    search_upsert("products", {**product, **update_data})
+    typeahead_upsert("products", {**product, **update_data})
+    await bump_collection_version(db, "products")
     return {"message": "Product updated successfully"}
 
 @api_router.delete("/products/{product_id}")
@@ -721,6 +824,9 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.products.delete_one({"id": product_id})
+    search_remove("products", product_id)
+    typeahead_remove("products", product_id)
+    await bump_collection_version(db, "products")
     return {"message": "Product deleted successfully"}
 
 # ==================== ACADEMY ROUTES ====================
@@ -737,27 +843,27 @@ async def create_academy(academy: AcademyCreate, current_user: dict = Depends(ge
     academy_dict['rating'] = 0.0
     academy_dict['lead_count'] = 0
     
-    await db.academies.insert_one(academy_dict)
+    await db.academies.insert_one(versioned_insert(with_city_key(with_search_words("academies", academy_dict))))
+    search_upsert("academies", academy_dict)
+    await bump_collection_version(db, "academies")
+    await response_cache.invalidate("academies", academy_dict.get('city'))
     return academy_dict
 
 @api_router.get("/academies")
-async def get_academies(city: Optional[str] = None, limit: int = 50):
+async def get_academies(request: Request, city: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     
-    academies = await db.academies.find(query).limit(limit).to_list(limit)
-    for academy in academies:
-        academy['_id'] = str(academy['_id'])
-    return academies
+    async def load():
+        return await db.academies.find(query, build_projection("academies", fields)).limit(limit).to_list(limit)
+    return await response_cache.respond(
+        request, "academies", city, lambda: conditional_list(request, db, "academies", load)
+    )
 
 @api_router.get("/academies/{academy_id}")
-async def get_academy(academy_id: str):
-    academy = await db.academies.find_one({"id": academy_id})
-    if not academy:
-        raise HTTPException(status_code=404, detail="Academy not found")
-    academy['_id'] = str(academy['_id'])
-    return academy
+async def get_academy(academy_id: str, request: Request):
+    return await conditional_document(request, db.academies, academy_id, "Academy not found")
 
 @api_router.post("/academies/{academy_id}/leads")
 async def create_academy_lead(academy_id: str, message: Optional[str] = None, current_user: dict = Depends(get_current_user)):
@@ -775,7 +881,9 @@ async def create_academy_lead(academy_id: str, message: Optional[str] = None, cu
     )
     
     await db.academy_leads.insert_one(lead.dict())
-    await db.academies.update_one({"id": academy_id}, {"$inc": {"lead_count": 1}})
+    await db.academies.update_one({"id": academy_id}, versioned_update({"$inc": {"lead_count": 1}}))
+    await bump_collection_version(db, "academies")
+    await response_cache.invalidate("academies", academy.get('city'))
     
     return {"message": "Lead submitted successfully", "lead": lead.dict()}
 
@@ -795,41 +903,34 @@ async def create_tournament(tournament: TournamentCreate, current_user: dict = D
     tournament_dict['status'] = 'upcoming'
     tournament_dict['created_at'] = datetime.utcnow()
     
-    await db.tournaments.insert_one(tournament_dict)
+    await db.tournaments.insert_one(versioned_insert(with_city_key(with_search_words("tournaments", tournament_dict))))
+    search_upsert("tournaments", tournament_dict)
+    await bump_collection_version(db, "tournaments")
+    await response_cache.invalidate("tournaments", tournament_dict.get('city'))
     return tournament_dict
 
 @api_router.get("/tournaments")
-async def get_tournaments(city: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+async def get_tournaments(request: Request, city: Optional[str] = None, status: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     if status:
         query['status'] = status
     
-    tournaments = await db.tournaments.find(query).sort('start_date', -1).limit(limit).to_list(limit)
-    for tournament in tournaments:
-        tournament['_id'] = str(tournament['_id'])
-        tournament['start_date'] = tournament['start_date'].isoformat()
-        tournament['end_date'] = tournament['end_date'].isoformat()
-    return tournaments
+    async def load():
+        return await db.tournaments.find(query, build_projection("tournaments", fields)).sort('start_date', -1).limit(limit).to_list(limit)
+    return await response_cache.respond(
+        request, "tournaments", city, lambda: conditional_list(request, db, "tournaments", load, coalesce_ttl=TOURNAMENTS_TTL)
+    )
 
 @api_router.get("/tournaments/{tournament_id}")
-async def get_tournament(tournament_id: str):
-    tournament = await db.tournaments.find_one({"id": tournament_id})
-    if not tournament:
-        raise HTTPException(status_code=404, detail="Tournament not found")
-    tournament['_id'] = str(tournament['_id'])
-    tournament['start_date'] = tournament['start_date'].isoformat()
-    tournament['end_date'] = tournament['end_date'].isoformat()
-    return tournament
+async def get_tournament(tournament_id: str, request: Request):
+    return await conditional_document(request, db.tournaments, tournament_id, "Tournament not found")
 
 @api_router.get("/tournaments/{tournament_id}/matches")
 async def get_tournament_matches(tournament_id: str):
-    matches = await db.matches.find({"tournament_id": tournament_id}).to_list(100)
-    for match in matches:
-        match['_id'] = str(match['_id'])
-        match['match_date'] = match['match_date'].isoformat()
-    return matches
+    matches = await db.matches.find({"tournament_id": tournament_id}, NO_ID).to_list(100)
+    return FastJSONResponse(matches)
 
 # ==================== GROUND ROUTES ====================
 
@@ -846,68 +947,78 @@ async def create_ground(ground: GroundCreate, current_user: dict = Depends(get_c
     ground_dict['is_verified'] = False
     ground_dict['commission_rate'] = 0.15
     
-    await db.grounds.insert_one(ground_dict)
+    await db.grounds.insert_one(versioned_insert(with_city_key(with_search_words("grounds", with_geo_point(ground_dict)))))
+    tile_cache.invalidate("grounds", ground_dict.get('geohash'))
+    proximity_upsert("grounds", ground_dict)
+    search_upsert("grounds", ground_dict)
+    typeahead_upsert("grounds", ground_dict)
+    await bump_collection_version(db, "grounds")
+    await response_cache.invalidate("grounds", ground_dict.get('city'))
     return ground_dict
 
 @api_router.get("/grounds")
 async def get_grounds(
+    request: Request,
     city: Optional[str] = None, 
     ground_type: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: float = 10,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
+    if latitude is not None and longitude is not None:
+        return await get_nearby_grounds(
+            request, latitude=latitude, longitude=longitude, radius_km=radius_km,
+            ground_type=ground_type, city=city, limit=limit, fields=fields, cursor=cursor,
+        )
+
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     if ground_type:
         query['ground_type'] = ground_type
     
-    # Nearby search using coordinates
-    if latitude is not None and longitude is not None:
-        query['latitude'] = {'$exists': True}
-        query['longitude'] = {'$exists': True}
-        # Simple distance calculation (for production, use MongoDB geospatial queries)
-        grounds = await db.grounds.find(query).to_list(200)
-        
-        # Calculate distance and filter
-        nearby_grounds = []
-        for ground in grounds:
-            if ground.get('latitude') and ground.get('longitude'):
-                # Haversine formula approximation
-                lat_diff = abs(ground['latitude'] - latitude)
-                lon_diff = abs(ground['longitude'] - longitude)
-                distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111  # rough km
-                if distance <= radius_km:
-                    ground['distance_km'] = round(distance, 2)
-                    ground['_id'] = str(ground['_id'])
-                    nearby_grounds.append(ground)
-        
-        nearby_grounds.sort(key=lambda x: x.get('distance_km', 999))
-        return nearby_grounds[:limit]
+    async def load():
+        return await db.grounds.find(query, build_projection("grounds", fields)).limit(limit).to_list(limit)
     
-    grounds = await db.grounds.find(query).limit(limit).to_list(limit)
-    for ground in grounds:
-        ground['_id'] = str(ground['_id'])
-    return grounds
+    return await response_cache.respond(
+        request, "grounds", city, lambda: conditional_list(request, db, "grounds", load)
+    )
 
 @api_router.get("/grounds/nearby")
 async def get_nearby_grounds(
+    request: Request,
     latitude: float,
     longitude: float,
     radius_km: float = 10,
-    ground_type: Optional[str] = None
+    ground_type: Optional[str] = None,
+    city: Optional[str] = None,
+    limit: int = 20,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    return await get_grounds(latitude=latitude, longitude=longitude, radius_km=radius_km, ground_type=ground_type)
+    """Grounds within radius_km by great-circle distance, nearest first; next page via X-Next-Cursor"""
+    query = {}
+    if city:
+        query.update(city_filter(city))
+    if ground_type:
+        query['ground_type'] = ground_type
+
+    async def load():
+        grounds, next_cursor = await fetch_nearby(
+            db.grounds, latitude, longitude, radius_km, query, build_projection("grounds", fields), limit, cursor
+        )
+        return page_response(grounds, next_cursor)
+
+    return await response_cache.respond(
+        request, "grounds", city, lambda: conditional_list(request, db, "grounds", load)
+    )
 
 @api_router.get("/grounds/{ground_id}")
-async def get_ground(ground_id: str):
-    ground = await db.grounds.find_one({"id": ground_id})
-    if not ground:
-        raise HTTPException(status_code=404, detail="Ground not found")
-    ground['_id'] = str(ground['_id'])
-    return ground
+async def get_ground(ground_id: str, request: Request):
+    return await conditional_document(request, db.grounds, ground_id, "Ground not found")
 
 @api_router.put("/grounds/{ground_id}")
 async def update_ground(ground_id: str, ground_update: GroundCreate, current_user: dict = Depends(get_current_user)):
@@ -916,9 +1027,121 @@ async def update_ground(ground_id: str, ground_update: GroundCreate, current_use
         raise HTTPException(status_code=403, detail="Not authorized")
     
     update_data = ground_update.dict(exclude_unset=True)
-    await db.grounds.update_one({"id": ground_id}, {"$set": update_data})
+    update = search_words_update("grounds", ground, city_key_update(geo_update(ground, update_data)))
+    await db.grounds.update_one({"id": ground_id}, versioned_update(update))
+    tile_cache.invalidate("grounds", ground.get('geohash'), update["$set"].get('geohash'))
+    proximity_upsert("grounds", {**ground, **update_data})
+    search_upsert("grounds", {**ground, **update_data})
+    typeahead_upsert("grounds", {**ground, **update_data})
+    # A moved ground leaves listings of its old city as well
+    await bump_collection_version(db, "grounds")
+    await response_cache.invalidate("grounds", ground.get('city'), update_data.get('city'))
     return {"message": "Ground updated"}
 
+# ==================== CITIES ====================
+
+@api_router.get("/cities/autocomplete")
+async def autocomplete_cities(q: str, limit: int = 10):
+    """City suggestions by current or former name ("bom" -> Mumbai); `key` is the value list filters match"""
+    return FastJSONResponse(autocomplete(q, max(1, min(limit, 25))))
+
+# ==================== NEARBY (ALL VERTICALS) ====================
+
+# Result type -> collection searched by /nearby
+NEARBY_TYPES = {
+    "ground": "grounds",
+    "training_facility": "training_facilities",
+    "personal_trainer": "personal_trainers",
+    "cricket_gym": "cricket_gyms",
+}
+
+@api_router.get("/nearby")
+async def get_nearby(
+    latitude: float,
+    longitude: float,
+    radius_km: float = 10,
+    types: Optional[str] = None,
+    limit: int = 20,
+    quota: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """
+    Grounds, training facilities, personal trainers and cricket gyms near a
+    point in one list, nearest first, each item tagged with its `type`.
+    `quota` caps the items of one type on a page while other types have
+    items to show; next page via X-Next-Cursor.
+    """
+    wanted = [name.strip() for name in types.split(",") if name.strip()] if types else list(NEARBY_TYPES)
+    unknown = [name for name in wanted if name not in NEARBY_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(unknown)}")
+    if quota is not None and quota < 1:
+        raise HTTPException(status_code=400, detail="quota must be at least 1")
+
+    sources = {
+        name: (db[NEARBY_TYPES[name]], {}, build_projection(NEARBY_TYPES[name]))
+        for name in wanted
+    }
+    results, next_cursor = await fetch_nearby_merged(sources, latitude, longitude, radius_km, limit, quota, cursor)
+    return page_response(results, next_cursor)
+
+@api_router.get("/nearby/ranked")
+async def get_nearby_ranked(
+    latitude: float,
+    longitude: float,
+    listing_type: str = Query("ground", alias="type"),
+    radius_km: float = 10,
+    limit: int = 20,
+    distance_weight: float = 1.0,
+    price_weight: float = 0.0,
+    rating_weight: float = 0.0,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None
+):
+    """
+    Listings of one type near a point ranked by distance blended with price
+    and rating (lower score first), from the in-memory proximity engine
+    """
+    if listing_type not in NEARBY_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {listing_type}")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    collection = NEARBY_TYPES[listing_type]
+    index = await get_proximity().ensure_loaded(db, collection)
+    ranked = index.nearest(
+        latitude, longitude, min(radius_km, 100), k=max(1, min(limit, 100)),
+        weights={"distance": distance_weight, "price": price_weight, "rating": rating_weight},
+        max_price=max_price, min_rating=min_rating,
+    )
+    docs = await db[collection].find({"id": {"$in": [r["id"] for r in ranked]}}, build_projection(collection)).to_list(len(ranked))
+    by_id = {doc["id"]: doc for doc in docs}
+    results = []
+    for r in ranked:
+        doc = by_id.get(r["id"])
+        if doc is not None:
+            results.append({**doc, "type": listing_type, "distance_km": r["distance_km"], "score": r["score"]})
+    return FastJSONResponse(results)
+
+@api_router.get("/map/viewport")
+async def get_map_viewport(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    zoom: Optional[int] = None,
+    types: Optional[str] = None
+):
+    """
+    Markers for the visible map area from cached geohash tiles. Wide or
+    low-zoom viewports come back as clusters ({"kind": "cluster", count, ...})
+    instead of thousands of points.
+    """
+    wanted = [name.strip() for name in types.split(",") if name.strip()] if types else list(NEARBY_TYPES)
+    unknown = [name for name in wanted if name not in NEARBY_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(unknown)}")
+    return FastJSONResponse(await viewport(db, {name: NEARBY_TYPES[name] for name in wanted}, min_lat, min_lon, max_lat, max_lon, zoom))
+
 # ==================== TRAINING FACILITIES ====================
 
 @api_router.post("/training-facilities")
@@ -932,51 +1155,48 @@ async def create_training_facility(facility: TrainingFacilityCreate, current_use
     facility_dict['is_verified'] = False
     facility_dict['commission_rate'] = 0.12
     
-    await db.training_facilities.insert_one(facility_dict)
+    await db.training_facilities.insert_one(with_city_key(with_geo_point(facility_dict)))
+    tile_cache.invalidate("training_facilities", facility_dict.get('geohash'))
+    proximity_upsert("training_facilities", facility_dict)
+    await response_cache.invalidate("training_facilities", facility_dict.get('city'))
     return facility_dict
 
 @api_router.get("/training-facilities")
 async def get_training_facilities(
+    request: Request,
     city: Optional[str] = None,
     facility_type: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: float = 10,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = {}
-    if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
-    if facility_type:
-        query['facility_type'] = facility_type
+    async def build():
+        query = {}
+        if city:
+            query.update(city_filter(city))
+        if facility_type:
+            query['facility_type'] = facility_type
     
-    if latitude is not None and longitude is not None:
-        facilities = await db.training_facilities.find(query).to_list(200)
-        nearby_facilities = []
-        for facility in facilities:
-            if facility.get('latitude') and facility.get('longitude'):
-                lat_diff = abs(facility['latitude'] - latitude)
-                lon_diff = abs(facility['longitude'] - longitude)
-                distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111
-                if distance <= radius_km:
-                    facility['distance_km'] = round(distance, 2)
-                    facility['_id'] = str(facility['_id'])
-                    nearby_facilities.append(facility)
-        nearby_facilities.sort(key=lambda x: x.get('distance_km', 999))
-        return nearby_facilities[:limit]
-    
-    facilities = await db.training_facilities.find(query).limit(limit).to_list(limit)
-    for facility in facilities:
-        facility['_id'] = str(facility['_id'])
-    return facilities
+        if latitude is not None and longitude is not None:
+            facilities, next_cursor = await fetch_nearby(
+                db.training_facilities, latitude, longitude, radius_km, query, build_projection("training_facilities", fields), limit, cursor
+            )
+            return page_response(facilities, next_cursor)
+    
+        facilities = await db.training_facilities.find(query, build_projection("training_facilities", fields)).limit(limit).to_list(limit)
+        return FastJSONResponse(facilities)
+
+    return await response_cache.respond(request, "training_facilities", city, build)
 
 @api_router.get("/training-facilities/{facility_id}")
 async def get_training_facility(facility_id: str):
-    facility = await db.training_facilities.find_one({"id": facility_id})
+    facility = await db.training_facilities.find_one({"id": facility_id}, NO_ID)
     if not facility:
         raise HTTPException(status_code=404, detail="Facility not found")
-    facility['_id'] = str(facility['_id'])
-    return facility
+    return FastJSONResponse(facility)
 
 # ==================== PERSONAL TRAINERS ====================
 
@@ -991,51 +1211,48 @@ async def create_personal_trainer(trainer: PersonalTrainerCreate, current_user:
     trainer_dict['is_verified'] = False
     trainer_dict['commission_rate'] = 0.10
     
-    await db.personal_trainers.insert_one(trainer_dict)
+    await db.personal_trainers.insert_one(with_city_key(with_geo_point(trainer_dict)))
+    tile_cache.invalidate("personal_trainers", trainer_dict.get('geohash'))
+    proximity_upsert("personal_trainers", trainer_dict)
+    await response_cache.invalidate("personal_trainers", trainer_dict.get('city'))
     return trainer_dict
 
 @api_router.get("/personal-trainers")
 async def get_personal_trainers(
+    request: Request,
     city: Optional[str] = None,
     specialization: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: float = 10,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = {}
-    if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
-    if specialization:
-        query['specialization'] = specialization
+    async def build():
+        query = {}
+        if city:
+            query.update(city_filter(city))
+        if specialization:
+            query['specialization'] = specialization
     
-    if latitude is not None and longitude is not None:
-        trainers = await db.personal_trainers.find(query).to_list(200)
-        nearby_trainers = []
-        for trainer in trainers:
-            if trainer.get('latitude') and trainer.get('longitude'):
-                lat_diff = abs(trainer['latitude'] - latitude)
-                lon_diff = abs(trainer['longitude'] - longitude)
-                distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111
-                if distance <= radius_km:
-                    trainer['distance_km'] = round(distance, 2)
-                    trainer['_id'] = str(trainer['_id'])
-                    nearby_trainers.append(trainer)
-        nearby_trainers.sort(key=lambda x: x.get('distance_km', 999))
-        return nearby_trainers[:limit]
-    
-    trainers = await db.personal_trainers.find(query).limit(limit).to_list(limit)
-    for trainer in trainers:
-        trainer['_id'] = str(trainer['_id'])
-    return trainers
+        if latitude is not None and longitude is not None:
+            trainers, next_cursor = await fetch_nearby(
+                db.personal_trainers, latitude, longitude, radius_km, query, build_projection("personal_trainers", fields), limit, cursor
+            )
+            return page_response(trainers, next_cursor)
+    
+        trainers = await db.personal_trainers.find(query, build_projection("personal_trainers", fields)).limit(limit).to_list(limit)
+        return FastJSONResponse(trainers)
+
+    return await response_cache.respond(request, "personal_trainers", city, build)
 
 @api_router.get("/personal-trainers/{trainer_id}")
 async def get_personal_trainer(trainer_id: str):
-    trainer = await db.personal_trainers.find_one({"id": trainer_id})
+    trainer = await db.personal_trainers.find_one({"id": trainer_id}, NO_ID)
     if not trainer:
         raise HTTPException(status_code=404, detail="Trainer not found")
-    trainer['_id'] = str(trainer['_id'])
-    return trainer
+    return FastJSONResponse(trainer)
 
 # ==================== CRICKET GYMS ====================
 
@@ -1050,48 +1267,45 @@ async def create_cricket_gym(gym: CricketGymCreate, current_user: dict = Depends
     gym_dict['is_verified'] = False
     gym_dict['commission_rate'] = 0.12
     
-    await db.cricket_gyms.insert_one(gym_dict)
+    await db.cricket_gyms.insert_one(with_city_key(with_geo_point(gym_dict)))
+    tile_cache.invalidate("cricket_gyms", gym_dict.get('geohash'))
+    proximity_upsert("cricket_gyms", gym_dict)
+    await response_cache.invalidate("cricket_gyms", gym_dict.get('city'))
     return gym_dict
 
 @api_router.get("/cricket-gyms")
 async def get_cricket_gyms(
+    request: Request,
     city: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: float = 10,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = {}
-    if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+    async def build():
+        query = {}
+        if city:
+            query.update(city_filter(city))
     
-    if latitude is not None and longitude is not None:
-        gyms = await db.cricket_gyms.find(query).to_list(200)
-        nearby_gyms = []
-        for gym in gyms:
-            if gym.get('latitude') and gym.get('longitude'):
-                lat_diff = abs(gym['latitude'] - latitude)
-                lon_diff = abs(gym['longitude'] - longitude)
-                distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111
-                if distance <= radius_km:
-                    gym['distance_km'] = round(distance, 2)
-                    gym['_id'] = str(gym['_id'])
-                    nearby_gyms.append(gym)
-        nearby_gyms.sort(key=lambda x: x.get('distance_km', 999))
-        return nearby_gyms[:limit]
-    
-    gyms = await db.cricket_gyms.find(query).limit(limit).to_list(limit)
-    for gym in gyms:
-        gym['_id'] = str(gym['_id'])
-    return gyms
+        if latitude is not None and longitude is not None:
+            gyms, next_cursor = await fetch_nearby(
+                db.cricket_gyms, latitude, longitude, radius_km, query, build_projection("cricket_gyms", fields), limit, cursor
+            )
+            return page_response(gyms, next_cursor)
+    
+        gyms = await db.cricket_gyms.find(query, build_projection("cricket_gyms", fields)).limit(limit).to_list(limit)
+        return FastJSONResponse(gyms)
+
+    return await response_cache.respond(request, "cricket_gyms", city, build)
 
 @api_router.get("/cricket-gyms/{gym_id}")
 async def get_cricket_gym(gym_id: str):
-    gym = await db.cricket_gyms.find_one({"id": gym_id})
+    gym = await db.cricket_gyms.find_one({"id": gym_id}, NO_ID)
     if not gym:
         raise HTTPException(status_code=404, detail="Gym not found")
-    gym['_id'] = str(gym['_id'])
-    return gym
+    return FastJSONResponse(gym)
 
 @api_router.post("/bookings")
 async def create_booking(booking_data: dict, current_user: dict = Depends(get_current_user)):
@@ -1177,10 +1391,8 @@ async def contact_owner(contact_data: dict, current_user: dict = Depends(get_cur
 
 @api_router.get("/bookings")
 async def get_bookings(current_user: dict = Depends(get_current_user)):
-    bookings = await db.bookings.find({"user_id": str(current_user['_id'])}).to_list(100)
-    for booking in bookings:
-        booking['_id'] = str(booking['_id'])
-    return bookings
+    bookings = await db.bookings.find({"user_id": str(current_user['_id'])}, NO_ID).to_list(100)
+    return FastJSONResponse(bookings)
 
 # ==================== SOCIAL ROUTES ====================
 
@@ -1199,11 +1411,10 @@ async def create_post(post: PostCreate, current_user: dict = Depends(get_current
     return post_dict
 
 @api_router.get("/posts")
-async def get_posts(limit: int = 50, skip: int = 0):
-    posts = await db.posts.find().sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
-    for post in posts:
-        post['_id'] = str(post['_id'])
-    return posts
+async def get_posts(request: Request, limit: int = 50, cursor: Optional[str] = None):
+    reject_offset_params(request.query_params)
+    posts, next_cursor = await fetch_page(db.posts, {}, cursor, limit)
+    return page_response(posts, next_cursor)
 
 @api_router.post("/posts/{post_id}/like")
 async def like_post(post_id: str, current_user: dict = Depends(get_current_user)):
@@ -1255,20 +1466,17 @@ async def create_comment(post_id: str, comment: CommentCreate, current_user: dic
     return comment_dict
 
 @api_router.get("/posts/{post_id}/comments")
-async def get_comments(post_id: str, limit: int = 50):
-    comments = await db.comments.find({"post_id": post_id}).sort('created_at', -1).limit(limit).to_list(limit)
-    for comment in comments:
-        comment['_id'] = str(comment['_id'])
-    return comments
+async def get_comments(post_id: str, limit: int = 50, cursor: Optional[str] = None):
+    comments, next_cursor = await fetch_page(db.comments, {"post_id": post_id}, cursor, limit)
+    return page_response(comments, next_cursor)
 
 # ==================== REELS ====================
 
 @api_router.get("/reels")
-async def get_reels(limit: int = 50, skip: int = 0):
-    reels = await db.posts.find({"post_type": "reel", "is_archived": False}).sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
-    for reel in reels:
-        reel['_id'] = str(reel['_id'])
-    return reels
+async def get_reels(request: Request, limit: int = 50, cursor: Optional[str] = None):
+    reject_offset_params(request.query_params)
+    reels, next_cursor = await fetch_page(db.posts, {"post_type": "reel", "is_archived": False}, cursor, limit)
+    return page_response(reels, next_cursor)
 
 # ==================== STORIES ====================
 
@@ -1289,18 +1497,15 @@ async def create_story(story_data: dict, current_user: dict = Depends(get_curren
 @api_router.get("/stories")
 async def get_stories():
     # Get stories that haven't expired
-    current_time = datetime.utcnow()
-    stories = await db.stories.find({"expires_at": {"$gt": current_time}, "is_highlight": False}).to_list(100)
-    for story in stories:
-        story['_id'] = str(story['_id'])
-    return stories
+    async def load():
+        current_time = datetime.utcnow()
+        return await db.stories.find({"expires_at": {"$gt": current_time}, "is_highlight": False}, NO_ID).to_list(100)
+    return await shared_json_response("stories", None, load, ttl=STORIES_TTL)
 
 @api_router.get("/stories/highlights/{user_id}")
 async def get_highlights(user_id: str):
-    highlights = await db.stories.find({"user_id": user_id, "is_highlight": True}).to_list(100)
-    for highlight in highlights:
-        highlight['_id'] = str(highlight['_id'])
-    return highlights
+    highlights = await db.stories.find({"user_id": user_id, "is_highlight": True}, NO_ID).to_list(100)
+    return FastJSONResponse(highlights)
 
 # ==================== SQUAD (FRIENDS) ====================
 
@@ -1328,9 +1533,7 @@ async def remove_from_squad(user_id: str, current_user: dict = Depends(get_curre
 @api_router.get("/squad")
 async def get_squad(current_user: dict = Depends(get_current_user)):
     squad_members = await db.squad.find({"user_id": str(current_user['_id'])}).to_list(1000)
-    for member in squad_members:
-        member['_id'] = str(member['_id'])
-    return squad_members
+    return FastJSONResponse(squad_members)
 
 # ==================== DIRECT MESSAGES ====================
 
@@ -1354,10 +1557,7 @@ async def get_messages(user_id: str, current_user: dict = Depends(get_current_us
             {"sender_id": str(current_user['_id']), "receiver_id": user_id},
             {"sender_id": user_id, "receiver_id": str(current_user['_id'])}
         ]
-    }).sort('created_at', 1).to_list(1000)
-    
-    for message in messages:
-        message['_id'] = str(message['_id'])
+    }, NO_ID).sort('created_at', 1).to_list(1000)
     
     # Mark messages as read
     await db.direct_messages.update_many(
@@ -1365,7 +1565,7 @@ async def get_messages(user_id: str, current_user: dict = Depends(get_current_us
         {"$set": {"is_read": True}}
     )
     
-    return messages
+    return FastJSONResponse(messages)
 
 @api_router.get("/messages")
 async def get_conversations(current_user: dict = Depends(get_current_user)):
@@ -1396,7 +1596,7 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
         }
     ]).to_list(100)
     
-    return conversations
+    return FastJSONResponse(conversations)
 
 # ==================== GROUP CHATS ====================
 
@@ -1455,17 +1655,13 @@ async def get_group_messages(group_id: str, current_user: dict = Depends(get_cur
     if not group or str(current_user['_id']) not in group['members']:
         raise HTTPException(status_code=403, detail="Not a member of this group")
     
-    messages = await db.group_messages.find({"group_id": group_id}).sort('created_at', 1).to_list(1000)
-    for message in messages:
-        message['_id'] = str(message['_id'])
-    return messages
+    messages = await db.group_messages.find({"group_id": group_id}, NO_ID).sort('created_at', 1).to_list(1000)
+    return FastJSONResponse(messages)
 
 @api_router.get("/groups")
 async def get_groups(current_user: dict = Depends(get_current_user)):
-    groups = await db.group_chats.find({"members": str(current_user['_id'])}).to_list(100)
-    for group in groups:
-        group['_id'] = str(group['_id'])
-    return groups
+    groups = await db.group_chats.find({"members": str(current_user['_id'])}, NO_ID).to_list(100)
+    return FastJSONResponse(groups)
 
 # ==================== PROFILE PHOTO ====================
 
@@ -1497,27 +1693,26 @@ async def create_livestream(stream: LiveStreamCreate, current_user: dict = Depen
     stream_dict['viewers'] = 0
     stream_dict['started_at'] = datetime.utcnow()
     
-    await db.livestreams.insert_one(stream_dict)
+    await db.livestreams.insert_one(with_search_words("livestreams", stream_dict))
+    search_upsert("livestreams", stream_dict)
     return stream_dict
 
 @api_router.get("/livestreams")
-async def get_livestreams(region: Optional[str] = None, is_live: bool = True):
+async def get_livestreams(region: Optional[str] = None, is_live: bool = True, fields: Optional[str] = None):
     query = {"is_live": is_live}
     if region:
         query['region'] = region
     
-    streams = await db.livestreams.find(query).sort('started_at', -1).to_list(50)
-    for stream in streams:
-        stream['_id'] = str(stream['_id'])
-    return streams
+    async def load():
+        return await db.livestreams.find(query, build_projection("livestreams", fields)).sort('started_at', -1).to_list(50)
+    return await shared_json_response("livestreams", (region, is_live, fields), load, ttl=LIVESTREAMS_TTL)
 
 @api_router.get("/livestreams/{stream_id}")
 async def get_livestream(stream_id: str):
-    stream = await db.livestreams.find_one({"id": stream_id})
+    stream = await db.livestreams.find_one({"id": stream_id}, NO_ID)
     if not stream:
         raise HTTPException(status_code=404, detail="Stream not found")
-    stream['_id'] = str(stream['_id'])
-    return stream
+    return FastJSONResponse(stream)
 
 @api_router.post("/livestreams/{stream_id}/join")
 async def join_livestream(stream_id: str, current_user: dict = Depends(get_current_user)):
@@ -1536,103 +1731,149 @@ async def end_livestream(stream_id: str, current_user: dict = Depends(get_curren
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.livestreams.update_one({"id": stream_id}, {"$set": {"is_live": False}})
+    search_remove("livestreams", stream_id)
     return {"message": "Stream ended"}
 
 # ==================== ADVANCED SEARCH ====================
 
+# Result sections of /search, in response order, with the fields an
+# escaped literal match falls back to
+SEARCH_SECTIONS = {
+    "users": ("name", "phone"),
+    "products": ("name", "description", "brand"),
+    "academies": ("name", "city", "description"),
+    "tournaments": ("name", "city", "description"),
+    "grounds": ("name", "city", "description"),
+    "livestreams": ("title", "broadcaster_name"),
+}
+# Sections of /search?mode=fuzzy, which matches misspelt names
+FUZZY_SECTIONS = {
+    "users": ("name",),
+    "teams": ("name",),
+}
+
+# Shared budget of the per-type queries behind one /search; a type that
+# misses it is left empty and listed in `timed_out_types`
+SEARCH_DEADLINE_SECONDS = float(os.environ.get('SEARCH_DEADLINE_SECONDS', '0.5'))
+
 @api_router.get("/search")
 async def search(
     query: str,
     type: Optional[str] = None,  # users, products, academies, tournaments, grounds
     region: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,  # only honoured with a single type; "all" works for every type
+    mode: str = "text"  # text, or fuzzy: misspelt player and team names (users, teams)
 ):
-    results = {
-        "users": [],
-        "products": [],
-        "academies": [],
-        "tournaments": [],
-        "grounds": [],
-        "livestreams": []
-    }
-    
-    search_regex = {"$regex": query, "$options": "i"}
-    
-    if not type or type == "users":
-        users = await db.users.find({
-            "$or": [
-                {"name": search_regex},
-                {"phone": search_regex}
-            ]
-        }).limit(limit).to_list(limit)
-        for user in users:
-            user['_id'] = str(user['_id'])
-            user.pop('password', None)
-        results['users'] = users
-    
-    if not type or type == "products":
-        products = await db.products.find({
-            "$or": [
-                {"name": search_regex},
-                {"description": search_regex},
-                {"brand": search_regex}
-            ]
-        }).limit(limit).to_list(limit)
-        for product in products:
-            product['_id'] = str(product['_id'])
-        results['products'] = products
-    
-    if not type or type == "academies":
-        academies = await db.academies.find({
-            "$or": [
-                {"name": search_regex},
-                {"city": search_regex},
-                {"description": search_regex}
-            ]
-        }).limit(limit).to_list(limit)
-        for academy in academies:
-            academy['_id'] = str(academy['_id'])
-        results['academies'] = academies
-    
-    if not type or type == "tournaments":
-        tournaments = await db.tournaments.find({
-            "$or": [
-                {"name": search_regex},
-                {"city": search_regex},
-                {"description": search_regex}
-            ]
-        }).limit(limit).to_list(limit)
-        for tournament in tournaments:
-            tournament['_id'] = str(tournament['_id'])
-        results['tournaments'] = tournaments
-    
-    if not type or type == "grounds":
-        grounds = await db.grounds.find({
-            "$or": [
-                {"name": search_regex},
-                {"city": search_regex},
-                {"description": search_regex}
-            ]
-        }).limit(limit).to_list(limit)
-        for ground in grounds:
-            ground['_id'] = str(ground['_id'])
-        results['grounds'] = grounds
-    
-    if not type or type == "livestreams":
-        livestreams = await db.livestreams.find({
-            "$and": [
-                {"is_live": True},
-                {"$or": [
-                    {"title": search_regex},
-                    {"broadcaster_name": search_regex}
-                ]}
-            ]
-        }).limit(limit).to_list(limit)
-        for stream in livestreams:
-            stream['_id'] = str(stream['_id'])
-        results['livestreams'] = livestreams
-    
-    return results
+    """
+    Ranked full-text search over the in-memory index (text_search.py); each
+    hit carries its `relevance` and `ranked` orders hits across types. Until
+    this worker has loaded the index it answers with regex_search_query. The
+    per-type queries run concurrently under SEARCH_DEADLINE_SECONDS.
+    mode=fuzzy matches names by spelling similarity (fuzzy_search.py) instead.
+    """
+    if mode not in ("text", "fuzzy"):
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
+    sections = FUZZY_SECTIONS if mode == "fuzzy" else SEARCH_SECTIONS
+    module = "fuzzy_search" if mode == "fuzzy" else "text_search"
+
+    # Each section uses its summary fieldset unless the caller asked for more
+    def projection(collection: str):
+        return build_projection(collection, fields if type or fields in ALL_FIELDS else None)
+
+    results = {name: [] for name in sections}
+    types = [type] if type else list(sections)
+    if not set(types) <= set(sections):
+        return FastJSONResponse({**results, "timed_out_types": []})
+    max_time_ms = max(1, int(SEARCH_DEADLINE_SECONDS * 1000))
+
+    if module not in sys.modules or not sys.modules[module].index.loaded:
+        def run(name: str):
+            match = regex_search_query(name, query, sections)
+            return lambda: db[name].find(match, projection(name)).max_time_ms(max_time_ms).limit(limit).to_list(limit)
+
+        found, timed_out = await fan_out_search({name: run(name) for name in types}, "regex")
+        return FastJSONResponse({**results, **found, "timed_out_types": timed_out})
+
+    text_search = get_text_search()
+    index = sys.modules[module].index
+    hits = index.search(query, types, limit)
+
+    def fetch(name: str):
+        source = sys.modules[module].SOURCES[name]
+        return lambda: text_search.fetch_hits(db, name, hits[name], projection(name), max_time_ms, source)
+
+    found, timed_out = await fan_out_search({name: fetch(name) for name in types}, "fuzzy" if mode == "fuzzy" else "index")
+    ranked = sorted(
+        ({"type": name, "id": key, "relevance": score} for name in found for key, score in hits[name]),
+        key=lambda hit: -hit["relevance"],
+    )
+    return FastJSONResponse({**results, **found, "ranked": ranked[:limit], "timed_out_types": timed_out})
+
+def regex_search_query(name: str, query: str, sections: Dict[str, tuple] = SEARCH_SECTIONS) -> dict:
+    """
+    Match for the section while the index is loading: word-prefix ranges on
+    search_words for a plain query, else an escaped match on its fields
+    """
+    match = search_clause(name, query, sections[name])
+    if name == "livestreams":
+        return {"$and": [{"is_live": True}, match]}
+    return match
+
+async def fan_out_search(queries: Dict[str, Any], path: str):
+    """
+    Run each type's query (a coroutine function) concurrently and wait at
+    most SEARCH_DEADLINE_SECONDS. Returns the results of the types that made
+    it and the names of those that did not; an error in any type is raised.
+    """
+    async def timed(name: str, run):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await run()
+            outcome = "ok"
+            return result
+        except (asyncio.CancelledError, ExecutionTimeout):
+            outcome = "timeout"
+            raise
+        finally:
+            search_type_latency.observe(time.perf_counter() - start, type=name, path=path, outcome=outcome)
+
+    tasks = {name: asyncio.ensure_future(timed(name, run)) for name, run in queries.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=SEARCH_DEADLINE_SECONDS)
+    for task in pending:
+        task.cancel()
+    # maxTimeMS expiring on the server counts as missing the deadline
+    errors = [task.exception() for task in done if task.exception() is not None]
+    failures = [error for error in errors if not isinstance(error, ExecutionTimeout)]
+    if failures:
+        raise failures[0]
+
+    found, timed_out = {}, []
+    for name, task in tasks.items():
+        if task in done and task.exception() is None:
+            found[name] = task.result()
+        else:
+            timed_out.append(name)
+            search_type_timeouts.inc(type=name, path=path)
+    if timed_out:
+        logger.warning(f"Search for {len(queries)} types missed the {SEARCH_DEADLINE_SECONDS}s deadline: {', '.join(timed_out)}")
+    return found, timed_out
+
+# ==================== TYPEAHEAD ====================
+
+@api_router.get("/typeahead")
+async def get_typeahead(q: str, types: Optional[str] = None, limit: int = 10):
+    """
+    Search-box suggestions from the in-memory prefix index (typeahead.py):
+    products, players, grounds and teams whose name has a word starting with
+    each word of `q`, heaviest (rating and popularity) first
+    """
+    wanted = [name.strip() for name in types.split(",") if name.strip()] if types else None
+    unknown = [name for name in wanted or () if name not in TYPEAHEAD_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(unknown)}")
+    return FastJSONResponse({"suggestions": typeahead.suggest(q, wanted, limit)})
 
 # ==================== VERIFICATION ====================
 
@@ -1651,20 +1892,22 @@ async def verify_user(user_id: str, verification_data: dict, current_user: dict
             "verified_at": datetime.utcnow()
         }}
     )
+    # Verified players rank higher in typeahead
+    if indexed_inline(TYPEAHEAD_SOURCES, "players"):
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, {"name": 1, "user_type": 1, "is_verified": 1, "verification_type": 1})
+        if user:
+            typeahead.upsert("players", user)
     
     return {"message": f"User verified as {verification_type}"}
 
 @api_router.get("/users/verified")
-async def get_verified_users(type: Optional[str] = None):
+async def get_verified_users(type: Optional[str] = None, fields: Optional[str] = None):
     query = {"is_verified": True}
     if type:
         query['verification_type'] = type
     
-    users = await db.users.find(query).to_list(100)
-    for user in users:
-        user['_id'] = str(user['_id'])
-        user.pop('password', None)
-    return users
+    users = await db.users.find(query, build_projection("users", fields)).to_list(100)
+    return FastJSONResponse(users)
 
 # ==================== REGIONS ====================
 
@@ -1698,27 +1941,28 @@ async def create_team(team: TeamCreate, current_user: dict = Depends(get_current
     team_dict['matches_played'] = 0
     team_dict['matches_won'] = 0
     
-    await db.teams.insert_one(team_dict)
+    await db.teams.insert_one(versioned_insert(with_city_key(with_search_words("teams", team_dict))))
+    search_upsert("teams", team_dict)
+    typeahead_upsert("teams", team_dict)
+    await bump_collection_version(db, "teams")
+    await response_cache.invalidate("teams", team_dict.get('city'))
     return team_dict
 
 @api_router.get("/teams")
-async def get_teams(city: Optional[str] = None, limit: int = 50):
+async def get_teams(request: Request, city: Optional[str] = None, limit: int = 50, fields: Optional[str] = None):
     query = {}
     if city:
-        query['city'] = {'$regex': city, '$options': 'i'}
+        query.update(city_filter(city))
     
-    teams = await db.teams.find(query).limit(limit).to_list(limit)
-    for team in teams:
-        team['_id'] = str(team['_id'])
-    return teams
+    async def load():
+        return await db.teams.find(query, build_projection("teams", fields)).limit(limit).to_list(limit)
+    return await response_cache.respond(
+        request, "teams", city, lambda: conditional_list(request, db, "teams", load)
+    )
 
 @api_router.get("/teams/{team_id}")
-async def get_team(team_id: str):
-    team = await db.teams.find_one({"id": team_id})
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
-    team['_id'] = str(team['_id'])
-    return team
+async def get_team(team_id: str, request: Request):
+    return await conditional_document(request, db.teams, team_id, "Team not found")
 
 # ==================== ORDER ROUTES ====================
 
@@ -1741,52 +1985,53 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
         pincode=order_data.pincode
     )
     
-    # Create Razorpay order if configured
-    if razorpay_client:
-        try:
-            razorpay_order = razorpay_client.order.create({
-                "amount": int(total * 100),  # Amount in paise
-                "currency": "INR",
-                "payment_capture": 1
-            })
-            order.razorpay_order_id = razorpay_order['id']
-        except Exception as e:
-            logging.error(f"Razorpay error: {e}")
+    # Hold the stock before payment; it goes back on sale if payment never completes
+    try:
+        reservation = await inventory.reserve(db, order.id, [(item.product_id, item.quantity) for item in order_data.items])
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail={"message": "Out of stock", "product_ids": e.product_ids})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     order_dict = order.dict()
-    await db.orders.insert_one(order_dict)
+    order_dict['reservation_expires_at'] = reservation['expires_at']
+    # The Razorpay order is created by the outbox worker; clients poll the
+    # order until razorpay_order_id is set
+    if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
+        order_dict[OUTBOX_FIELD] = outbox_entry(total, order.created_at)
+    try:
+        await db.orders.insert_one(order_dict)
+    except Exception:
+        await inventory.release(db, order.id)
+        raise
+    if payment_outbox is not None:
+        payment_outbox.notify()
     
     return order_dict
 
 @api_router.get("/orders")
-async def get_orders(current_user: dict = Depends(get_current_user)):
+async def get_orders(limit: int = 100, cursor: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     if current_user['user_type'] == 'vendor':
         # Get orders containing vendor's products
-        orders = await db.orders.find(
-            {"items.vendor_id": str(current_user['_id'])}
-        ).sort('created_at', -1).to_list(100)
+        query = {"items.vendor_id": str(current_user['_id'])}
     elif current_user['user_type'] == 'admin':
-        orders = await db.orders.find().sort('created_at', -1).to_list(100)
+        query = {}
     else:
-        orders = await db.orders.find(
-            {"user_id": str(current_user['_id'])}
-        ).sort('created_at', -1).to_list(100)
+        query = {"user_id": str(current_user['_id'])}
     
-    for order in orders:
-        order['_id'] = str(order['_id'])
-    return orders
+    orders, next_cursor = await fetch_page(db.orders, query, cursor, limit)
+    return page_response(orders, next_cursor)
 
 @api_router.get("/orders/{order_id}")
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
-    order = await db.orders.find_one({"id": order_id})
+    order = await db.orders.find_one({"id": order_id}, NO_ID)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     if order['user_id'] != str(current_user['_id']) and current_user['user_type'] not in ['admin', 'vendor']:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    order['_id'] = str(order['_id'])
-    return order
+    return FastJSONResponse(order)
 
 @api_router.post("/orders/{order_id}/payment-success")
 async def payment_success(order_id: str, payment_data: dict, current_user: dict = Depends(get_current_user)):
@@ -1794,8 +2039,27 @@ async def payment_success(order_id: str, payment_data: dict, current_user: dict
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    await db.orders.update_one(
-        {"id": order_id},
+    if order.get('payment_status') != 'paid' and not await inventory.commit(db, order_id):
+        # Paid after the reservation expired: take the stock again if it is still there
+        lines = [(item['product_id'], item['quantity']) for item in order['items']]
+        try:
+            await inventory.reserve(db, order_id, lines)
+            await inventory.commit(db, order_id)
+        except AlreadyCommitted:
+            # A concurrent retry committed it meanwhile: the stock is this order's
+            pass
+        except OutOfStock:
+            await db.orders.update_one({"id": order_id}, {"$set": {
+                "payment_status": "refund_pending",
+                "order_status": "cancelled",
+                "razorpay_payment_id": payment_data.get('razorpay_payment_id'),
+                "updated_at": datetime.utcnow()
+            }})
+            raise HTTPException(status_code=409, detail="The reservation expired and the stock is gone; the payment will be refunded")
+    
+    # Once only: a retry after this finds the order paid (and commit above is idempotent)
+    await db.orders.find_one_and_update(
+        {"id": order_id, "payment_status": {"$ne": "paid"}},
         {
             "$set": {
                 "payment_status": "paid",
@@ -1803,7 +2067,8 @@ async def payment_success(order_id: str, payment_data: dict, current_user: dict
                 "razorpay_payment_id": payment_data.get('razorpay_payment_id'),
                 "updated_at": datetime.utcnow()
             }
-        }
+        },
+        projection={"_id": 1},
     )
     
     return {"message": "Payment successful", "order_id": order_id}
@@ -1828,12 +2093,10 @@ async def remove_from_wishlist(product_id: str, current_user: dict = Depends(get
 
 @api_router.get("/wishlist")
 async def get_wishlist(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"_id": ObjectId(current_user['_id'])})
+    user = await db.users.find_one({"_id": ObjectId(current_user['_id'])}, {"wishlist": 1})
     wishlist_ids = user.get('wishlist', [])
-    products = await db.products.find({"id": {"$in": wishlist_ids}}).to_list(100)
-    for product in products:
-        product['_id'] = str(product['_id'])
-    return products
+    products = await db.products.find({"id": {"$in": wishlist_ids}}, FULL_PROJECTIONS["products"]).to_list(100)
+    return FastJSONResponse(products)
 
 # ==================== STATS & DASHBOARD ====================
 
@@ -1872,14 +2135,92 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@api_router.get("/admin/indexes")
+async def get_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can view index status")
+    return db_indexes.last_report or {"status": "pending"}
+
+@api_router.get("/admin/coalescing")
+async def get_coalescing_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return single_flight.report()
+
+@api_router.get("/admin/response-cache")
+async def get_response_cache_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return response_cache.report()
+
+@api_router.get("/admin/map-tiles")
+async def get_map_tile_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return tile_cache.report()
+
+@api_router.get("/admin/search-index")
+async def get_search_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if 'text_search' not in sys.modules:
+        return {"loaded": False}
+    return get_text_search().index.report()
+
+@api_router.get("/admin/fuzzy-index")
+async def get_fuzzy_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if 'fuzzy_search' not in sys.modules:
+        return {"loaded": False}
+    return get_fuzzy_search().index.report()
+
+@api_router.get("/admin/change-feed")
+async def get_change_feed_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return change_feed.report()
+
+@api_router.get("/admin/typeahead")
+async def get_typeahead_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return typeahead.report()
+
+@api_router.get("/admin/payment-outbox")
+async def get_payment_outbox_report(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if payment_outbox is None:
+        return {"enabled": False}
+    return await payment_outbox.report()
+
+@api_router.get("/admin/query-profile")
+async def get_query_profile(current_user: dict = Depends(get_current_user)):
+    if current_user['user_type'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can view query stats")
+    return profiler.report()
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include router
 # ==================== CHATBOT MODELS & ENDPOINTS ====================
 
-from openai import OpenAI
-
-# Initialize OpenAI client with Emergent LLM key
+# OpenAI client with Emergent LLM key. The SDK takes most of a second to
+# import, so it is loaded on the first chatbot message rather than at startup
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', 'sk-emergent-63076Bb9c045bF69dA')
-openai_client = OpenAI(api_key=EMERGENT_LLM_KEY)
+# Set to build it on a worker thread once the app is serving (warm_optional_clients)
+OPENAI_WARMUP = os.environ.get('OPENAI_WARMUP', '').lower() in ('1', 'true', 'yes')
+_openai_client = None
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+        _openai_client = OpenAI(api_key=EMERGENT_LLM_KEY)
+    return _openai_client
 
 class ChatBotMessage(BaseModel):
     message: str
@@ -1911,13 +2252,25 @@ async def get_cricket_context(message: str, user_context: Dict = None):
     
     # Check for ground-related queries
     if any(word in message_lower for word in ['ground', 'book', 'field', 'turf', 'practice', 'net']):
-        grounds = await db.grounds.find().limit(5).to_list(length=5)
+        latitude = (user_context or {}).get('latitude')
+        longitude = (user_context or {}).get('longitude')
+        distances = {}
+        if isinstance(latitude, (int, float)) and isinstance(longitude, (int, float)):
+            # Nearest grounds to the user instead of any five
+            index = await get_proximity().ensure_loaded(db, "grounds")
+            nearest = index.nearest(latitude, longitude, 25, k=5)
+            distances = {r['id']: r['distance_km'] for r in nearest}
+            grounds = await db.grounds.find({"id": {"$in": list(distances)}}).to_list(length=5)
+            grounds.sort(key=lambda g: distances[g['id']])
+        else:
+            grounds = await db.grounds.find().limit(5).to_list(length=5)
         context_data['grounds'] = [
             {
                 'name': g.get('name'),
                 'location': g.get('location'),
                 'price_per_hour': g.get('price_per_hour'),
                 'ground_type': g.get('ground_type'),
+                **({'distance_km': distances[g['id']]} if g.get('id') in distances else {}),
             }
             for g in grounds
         ]
@@ -1997,7 +2350,7 @@ Guidelines:
             user_prompt += f"\n{key.upper()}:\n{value}\n"
     
     try:
-        response = openai_client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -2099,12 +2452,16 @@ async def chat_with_bot(chat_message: ChatBotMessage):
 
 app.include_router(api_router)
 
+app.add_middleware(QueryProfilerMiddleware, profiler=profiler)
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 logging.basicConfig(
@@ -2113,6 +2470,196 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+index_reconciliation: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def ensure_db_indexes():
+    global index_reconciliation
+    # Held here: the event loop keeps only a weak reference to its tasks
+    index_reconciliation = db_indexes.start_index_reconciliation(db)
+
+@app.on_event("startup")
+async def start_lag_probe():
+    lag_probe.start()
+
+@app.on_event("startup")
+async def warm_optional_clients():
+    # Opt-in: the openai import takes most of a second of GIL and import lock
+    # on its thread, right in the cold-start window. Off by default, the
+    # first chatbot request pays for it instead
+    if not OPENAI_WARMUP:
+        return
+
+    def report(future):
+        if future.exception() is not None:
+            logger.error(f"Warming the OpenAI client failed: {future.exception()}")
+
+    asyncio.get_running_loop().run_in_executor(None, get_openai_client).add_done_callback(report)
+
+# ==================== CHANGE FEED ====================
+
+# The in-memory indexes and the response cache follow writes from every
+# module and worker through MongoDB change streams (change_feed.py); each
+# index's full load runs as its subscription's reset. The refresh loops
+# below only rebuild where the feed cannot keep an index current: no
+# replica set, a broken stream, or deletes it could not apply
+change_feed = ChangeFeed("server")
+# Indexes holding entries of deletes that came without a pre-image
+stale_indexes = set()
+
+# Every collection served through response_cache.respond()
+CACHED_COLLECTIONS = ("academies", "tournaments", "grounds", "training_facilities", "personal_trainers", "cricket_gyms", "teams")
+
+def source_collections(*sources: dict) -> tuple:
+    return tuple(dict.fromkeys(source.collection for group in sources for source in group.values()))
+
+def source_fields(*sources: dict, extra: tuple = ()) -> tuple:
+    fields = {field for group in sources for source in group.values() for field in (*source.fields, source.key, *source.query)}
+    return tuple(sorted(fields | set(extra)))
+
+def sync_index(index, sources: dict, events: List[ChangeEvent]) -> bool:
+    """
+    Apply change events to an index built from `sources` (type name ->
+    source with collection, key and query). False when a delete could not
+    be matched to its key: no pre-image, and the key is not the _id.
+    """
+    complete = True
+    for event in events:
+        for type_name, source in sources.items():
+            if source.collection != event.collection:
+                continue
+            if not event.deleted:
+                index.upsert(type_name, event.doc)
+                continue
+            key = (event.before or {}).get(source.key, event.document_id if source.key == "_id" else None)
+            if key is None:
+                complete = False
+            else:
+                index.remove(type_name, key)
+    return complete
+
+async def apply_search_changes(events: List[ChangeEvent]):
+    text_search, fuzzy_search = get_text_search(), get_fuzzy_search()
+    complete = sync_index(text_search.index, text_search.SOURCES, events)
+    if not sync_index(fuzzy_search.index, fuzzy_search.SOURCES, events) or not complete:
+        stale_indexes.add("search")
+
+async def apply_typeahead_changes(events: List[ChangeEvent]):
+    if not sync_index(typeahead, TYPEAHEAD_SOURCES, events):
+        stale_indexes.add("typeahead")
+
+async def apply_proximity_changes(events: List[ChangeEvent]):
+    engine = get_proximity()
+    for event in events:
+        if not event.deleted:
+            engine.upsert(event.collection, event.doc)
+        elif event.before and event.before.get("id"):
+            engine.remove(event.collection, event.before["id"])
+        else:
+            stale_indexes.add("proximity")
+
+async def apply_cache_changes(events: List[ChangeEvent]):
+    """Drop the cached listings a batch of writes can change, as the write routes do"""
+    by_collection: Dict[str, List[ChangeEvent]] = {}
+    for event in events:
+        by_collection.setdefault(event.collection, []).append(event)
+    for collection, changes in by_collection.items():
+        # Without the pre-image an update may have moved a listing out of any city
+        if any(change.operation != "insert" and change.before is None for change in changes):
+            await response_cache.invalidate(collection)
+            continue
+        cities = {image.get("city") for change in changes for image in (change.doc, change.before) if image}
+        await response_cache.invalidate(collection, *cities)
+
+async def apply_tile_changes(events: List[ChangeEvent]):
+    """Drop the cached map tiles a batch of writes can change"""
+    for event in events:
+        # Without the pre-image an update may have moved a listing out of any tile
+        if event.operation != "insert" and event.before is None:
+            tile_cache.invalidate(event.collection)
+            continue
+        geohashes = [image[GEOHASH_FIELD] for image in (event.doc, event.before) if image and image.get(GEOHASH_FIELD)]
+        if geohashes:
+            tile_cache.invalidate(event.collection, *geohashes)
+
+async def load_search_indexes():
+    await get_text_search().index.load(db)
+    await get_fuzzy_search().index.load(db)
+
+@app.on_event("startup")
+async def start_change_feed():
+    # Registered before the refresh loops so their first turn already sees the
+    # feed. Sources and fields come from NumPy-free modules: the indexes
+    # themselves are imported by their background loads, after startup
+    proximity_fields = tuple(field for field in PROXIMITY_PROJECTION if field != "_id")
+    change_feed.subscribe("proximity", GEO_COLLECTIONS, apply_proximity_changes, proximity_fields,
+                          lambda: get_proximity().load(db))
+    change_feed.subscribe("search", source_collections(TEXT_SOURCES, FUZZY_SOURCES), apply_search_changes,
+                          source_fields(TEXT_SOURCES, FUZZY_SOURCES), load_search_indexes)
+    change_feed.subscribe("typeahead", source_collections(TYPEAHEAD_SOURCES), apply_typeahead_changes,
+                          source_fields(TYPEAHEAD_SOURCES, extra=WEIGHT_FIELDS), lambda: typeahead.load(db))
+    change_feed.subscribe("response-cache", CACHED_COLLECTIONS, apply_cache_changes, ("city",))
+    change_feed.subscribe("map-tiles", GEO_COLLECTIONS, apply_tile_changes, (GEOHASH_FIELD,))
+    change_feed.start(db)
+
+# Held here: the event loop keeps only a weak reference to its tasks
+refresh_tasks: List[asyncio.Task] = []
+
+def refresh_unless_maintained(name: str, collections: tuple, load, interval: float):
+    """Periodic rebuild of an index for whenever the change feed is not keeping it current"""
+    async def refresh():
+        while True:
+            if name in stale_indexes or not await change_feed.maintains(collections):
+                stale_indexes.discard(name)
+                try:
+                    await load()
+                except Exception as e:
+                    logger.error(f"Refreshing the {name} index failed: {e}")
+            await asyncio.sleep(interval)
+
+    refresh_tasks.append(asyncio.create_task(refresh()))
+
+@app.on_event("startup")
+async def start_proximity_engine():
+    refresh_unless_maintained("proximity", GEO_COLLECTIONS, lambda: get_proximity().load(db), PROXIMITY_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_search_index():
+    collections = source_collections(TEXT_SOURCES, FUZZY_SOURCES)
+    refresh_unless_maintained("search", collections, load_search_indexes, SEARCH_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_typeahead_index():
+    refresh_unless_maintained("typeahead", source_collections(TYPEAHEAD_SOURCES), lambda: typeahead.load(db), SEARCH_REFRESH_SECONDS)
+
+reservation_sweeper: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_reservation_sweeper():
+    global reservation_sweeper
+    # Held here: the event loop keeps only a weak reference to its tasks
+    reservation_sweeper = asyncio.create_task(inventory.run_sweeper(db))
+
+@app.on_event("startup")
+async def start_payment_outbox():
+    global payment_outbox
+    gateway = get_payment_gateway()
+    if gateway is not None:
+        payment_outbox = OutboxWorker(db, gateway)
+        payment_outbox.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    lag_probe.stop()
+    await change_feed.stop()
+    for task in refresh_tasks:
+        task.cancel()
+    refresh_tasks.clear()
+    if index_reconciliation is not None:
+        index_reconciliation.cancel()
+    if reservation_sweeper is not None:
+        reservation_sweeper.cancel()
+    if payment_outbox is not None:
+        await payment_outbox.stop()
+        await get_payment_gateway().close()
     client.close()
@@ -0,0 +1,467 @@
+"""
+Full-text search for 18 Cricket Network
+An in-memory inverted index over the names, brands, cities and descriptions
+of the searchable collections. Text is folded, tokenized, stemmed and mapped
+through cricket synonyms; a query scores every matching listing with BM25 in
+a few vectorized NumPy passes over the postings of its terms, so results are
+ranked across entity types instead of coming back in collection order.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import re
+import unicodedata
+
+from bson import ObjectId
+import numpy as np
+
+from cities import ALIASES as CITY_ALIASES
+from search_sources import TEXT_SOURCES as SOURCES, SearchSource
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_TYPES = tuple(SOURCES)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Long descriptions add little but postings; only their opening is indexed
+MAX_FIELD_TOKENS = 64
+# Weight of a synonym relative to the word the user typed
+SYNONYM_WEIGHT = 0.5
+# Slots of re-indexed or removed documents are compacted away once they
+# outnumber the live ones (and there are at least this many)
+COMPACT_MIN_STALE = 1_024
+
+# ==================== ANALYSIS ====================
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "near", "of", "on", "or", "the", "to", "with",
+})
+
+# Two-word forms indexed as one term
+PHRASES = {
+    ("one", "day"): "odi",
+    ("all", "rounder"): "allrounder",
+    ("wicket", "keeper"): "keeper",
+    ("leg", "guard"): "pad",
+    ("new", "delhi"): "delhi",
+}
+
+# Spellings indexed as the same term: former city names, then cricket jargon
+CANONICAL = {
+    **{alias: key for alias, key in CITY_ALIASES.items() if " " not in alias and " " not in key},
+    "twenty20": "t20",
+    "oneday": "odi",
+    "wicketkeeper": "keeper",
+    "wk": "keeper",
+    "keeping": "keeper",
+    "batsman": "batter",
+    "batsmen": "batter",
+    "batters": "batter",
+    "legguard": "pad",
+}
+
+# Related words a query also matches, at SYNONYM_WEIGHT
+SYNONYM_GROUPS = (
+    ("bat", "willow"),
+    ("ground", "stadium", "oval"),
+    ("turf", "pitch"),
+    ("academy", "coaching"),
+    ("net", "practice"),
+    ("tournament", "league", "cup", "championship"),
+    ("pacer", "seamer", "fast"),
+    ("spinner", "spin"),
+    ("kit", "gear", "equipment"),
+    ("helmet", "headgear"),
+    ("stream", "live", "broadcast"),
+)
+
+_WORD = re.compile(r"[0-9a-z]+")
+_NON_DIGIT = re.compile(r"\D+")
+_DOUBLED = re.compile(r"([b-df-hj-np-tv-z])\1$")
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripping: plurals, -ing and -ed, enough for "gloves" ~
+    "glove" and "batting" ~ "bat" without a full Porter stemmer's surprises
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    for suffix, min_base in (("ing", 3), ("ed", 4)):
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_base:
+            base = word[:-len(suffix)]
+            # batting -> batt -> bat; but not bowl(l)ing or pass(s)ing
+            return base[:-1] if _DOUBLED.search(base) and not base.endswith(("ll", "ss", "zz")) else base
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def analyze(text: Any, limit: Optional[int] = None) -> List[str]:
+    """Index terms of a field value, in order"""
+    if not isinstance(text, str):
+        return []
+    words = _WORD.findall(_fold(text))
+    terms: List[str] = []
+    i = 0
+    while i < len(words) and (limit is None or len(terms) < limit):
+        phrase = PHRASES.get((words[i], words[i + 1])) if i + 1 < len(words) else None
+        if phrase:
+            terms.append(phrase)
+            i += 2
+            continue
+        word = words[i]
+        i += 1
+        if word in STOPWORDS:
+            continue
+        # Canonical forms are looked up as typed and stemmed ("wicketkeepers")
+        base = stem(word)
+        canonical = CANONICAL.get(word) or CANONICAL.get(base)
+        terms.append(stem(canonical) if canonical else base)
+    return terms
+
+
+def phone_terms(value: Any) -> List[str]:
+    """A phone number as its digits and its last ten digits, so "+91 98765 43210" matches "9876543210" """
+    digits = _NON_DIGIT.sub("", value) if isinstance(value, str) else ""
+    if not digits:
+        return []
+    return sorted({digits, digits[-10:]})
+
+
+def document_terms(source: SearchSource, doc: Dict[str, Any]) -> Dict[str, float]:
+    """Weighted term frequencies of a document"""
+    weights: Dict[str, float] = {}
+    for field, weight in source.fields.items():
+        terms = phone_terms(doc.get(field)) if field == "phone" else analyze(doc.get(field), MAX_FIELD_TOKENS)
+        for term in terms:
+            weights[term] = weights.get(term, 0.0) + weight
+    return weights
+
+
+def _build_synonyms() -> Dict[str, Tuple[str, ...]]:
+    synonyms: Dict[str, Tuple[str, ...]] = {}
+    for group in SYNONYM_GROUPS:
+        terms = [analyze(word)[0] for word in group]
+        for term in terms:
+            synonyms[term] = tuple(other for other in terms if other != term)
+    return synonyms
+
+
+SYNONYMS = _build_synonyms()
+
+
+def query_terms(query: str) -> Dict[str, float]:
+    """Terms of a query with their weights: typed words 1.0, synonyms SYNONYM_WEIGHT"""
+    weights: Dict[str, float] = {}
+    typed = analyze(query) + [term for term in phone_terms(query) if len(term) >= 6]
+    for term in typed:
+        weights[term] = 1.0
+    for term in typed:
+        for synonym in SYNONYMS.get(term, ()):
+            weights.setdefault(synonym, SYNONYM_WEIGHT)
+    return weights
+
+
+# ==================== INDEX ====================
+
+class SearchIndex:
+    """
+    Postings are append-only array('i') slot lists with an array('f') of
+    weighted term frequencies, viewed as NumPy arrays without copying at
+    query time. A re-indexed or removed document only has its slot switched
+    off; once stale slots outnumber live ones the postings are compacted.
+    A write that leaves a document's terms as they were changes nothing.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._terms: Dict[str, int] = {}
+        self._posting_slots: List[array] = []
+        self._posting_weights: List[array] = []
+        self.keys: List[Optional[str]] = []
+        # Hash of each slot's weighted terms
+        self.signatures: List[int] = []
+        self.slots: Dict[Tuple[int, str], int] = {}
+        self._allocate(capacity)
+        self.size = 0
+        self.total_length = 0.0
+        self.loaded = False
+        # Writes that arrive while load() is reading the collections
+        self._pending: Optional[List[Tuple[str, str, Any]]] = None
+
+    def _allocate(self, capacity: int):
+        self.types = np.zeros(capacity, dtype=np.int8)
+        self.lengths = np.zeros(capacity, dtype=np.float32)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = (self.types, self.lengths, self.active)
+        self._allocate(len(self.types) * 2)
+        for new, current in zip((self.types, self.lengths, self.active), old):
+            new[:len(current)] = current
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # ==================== WRITES ====================
+
+    def upsert(self, type_name: str, doc: Dict[str, Any]):
+        """(Re)index a document of SOURCES[type_name]"""
+        if self._pending is not None:
+            self._pending.append(("upsert", type_name, doc))
+        source = SOURCES[type_name]
+        key = doc.get(source.key)
+        if key is None:
+            return
+        key = str(key)
+        if any(doc.get(field) != value for field, value in source.query.items()):
+            self._remove(type_name, key)
+            return
+        terms = document_terms(source, doc)
+        signature = hash(frozenset(terms.items()))
+        current = self.slots.get((SEARCH_TYPES.index(type_name), key))
+        # Counters and other unindexed fields change far more often than text
+        if current is not None and self.signatures[current] == signature:
+            return
+        self._remove(type_name, key)
+        if not terms:
+            self._compact_if_stale()
+            return
+
+        if self.size == len(self.types):
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.keys.append(key)
+        self.signatures.append(signature)
+        self.slots[(SEARCH_TYPES.index(type_name), key)] = slot
+        self.types[slot] = SEARCH_TYPES.index(type_name)
+        length = sum(terms.values())
+        self.lengths[slot] = length
+        self.active[slot] = True
+        self.total_length += length
+        for term, weight in terms.items():
+            posting = self._terms.get(term)
+            if posting is None:
+                posting = self._terms[term] = len(self._posting_slots)
+                self._posting_slots.append(array("i"))
+                self._posting_weights.append(array("f"))
+            self._posting_slots[posting].append(slot)
+            self._posting_weights[posting].append(weight)
+        self._compact_if_stale()
+
+    def remove(self, type_name: str, key: Any):
+        if self._pending is not None:
+            self._pending.append(("remove", type_name, key))
+        self._remove(type_name, str(key))
+        self._compact_if_stale()
+
+    def _remove(self, type_name: str, key: str):
+        slot = self.slots.pop((SEARCH_TYPES.index(type_name), key), None)
+        if slot is None:
+            return
+        self.active[slot] = False
+        self.keys[slot] = None
+        self.total_length -= float(self.lengths[slot])
+
+    def _compact_if_stale(self):
+        stale = self.size - len(self.slots)
+        if stale >= COMPACT_MIN_STALE and stale > len(self.slots):
+            self.compact()
+
+    def compact(self):
+        """Renumber the live slots densely and drop the postings of stale ones"""
+        live = np.flatnonzero(self.active[:self.size])
+        renumbered = np.full(self.size, -1, dtype=np.int32)
+        renumbered[live] = np.arange(len(live), dtype=np.int32)
+        fresh = SearchIndex(max(1024, 2 * len(live)))
+        for term, posting in self._terms.items():
+            slots = renumbered[np.frombuffer(self._posting_slots[posting], dtype=np.int32)]
+            keep = slots >= 0
+            if not keep.any():
+                continue
+            fresh._terms[term] = len(fresh._posting_slots)
+            fresh._posting_slots.append(array("i", slots[keep].tobytes()))
+            fresh._posting_weights.append(array("f", np.frombuffer(self._posting_weights[posting], dtype=np.float32)[keep].tobytes()))
+        fresh.keys = [self.keys[slot] for slot in live.tolist()]
+        fresh.signatures = [self.signatures[slot] for slot in live.tolist()]
+        fresh.slots = {type_key: int(renumbered[slot]) for type_key, slot in self.slots.items()}
+        fresh.size = len(live)
+        for name in ("types", "lengths", "active"):
+            getattr(fresh, name)[:fresh.size] = getattr(self, name)[live]
+        fresh.total_length = float(fresh.lengths[:fresh.size].sum())
+        self._adopt(fresh)
+
+    def _adopt(self, fresh: "SearchIndex"):
+        for name in ("_terms", "_posting_slots", "_posting_weights", "keys", "signatures", "slots", "types", "lengths",
+                     "active", "size", "total_length"):
+            setattr(self, name, getattr(fresh, name))
+
+    async def load(self, db, batch_size: int = 5_000):
+        """
+        Rebuild from the collections; writes made meanwhile are replayed on
+        top. Batches are indexed on a worker thread so a large rebuild does
+        not stall the event loop.
+        """
+        fresh = SearchIndex()
+        loop = asyncio.get_running_loop()
+        self._pending = []
+        try:
+            for type_name, source in SOURCES.items():
+                projection = {field: 1 for field in source.fields}
+                projection[source.key] = 1
+                projection.update({field: 1 for field in source.query})
+                if source.key != "_id":
+                    projection["_id"] = 0
+                batch: List[Dict[str, Any]] = []
+                async for doc in db[source.collection].find(source.query, projection).batch_size(batch_size):
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        await loop.run_in_executor(None, fresh._upsert_many, type_name, batch)
+                        batch = []
+                if batch:
+                    await loop.run_in_executor(None, fresh._upsert_many, type_name, batch)
+            pending, self._pending = self._pending, None
+        except BaseException:
+            self._pending = None
+            raise
+        for op, type_name, value in pending:
+            if op == "upsert":
+                fresh.upsert(type_name, value)
+            else:
+                fresh._remove(type_name, str(value))
+        self._adopt(fresh)
+        self.loaded = True
+        logger.info(f"Search index: {len(self.slots)} documents, {len(self._terms)} terms")
+
+    def _upsert_many(self, type_name: str, docs: Iterable[Dict[str, Any]]):
+        for doc in docs:
+            self.upsert(type_name, doc)
+
+    # ==================== QUERIES ====================
+
+    def search(
+        self,
+        query: str,
+        types: Optional[Iterable[str]] = None,
+        limit: int = 20,
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Best `limit` (key, score) matches per type, highest BM25 score first.
+        Scores are comparable across types: the whole index shares one set of
+        term statistics.
+        """
+        wanted = [SEARCH_TYPES.index(name) for name in (types or SEARCH_TYPES)]
+        hits: Dict[str, List[Tuple[str, float]]] = {SEARCH_TYPES[code]: [] for code in wanted}
+        live = len(self.slots)
+        if not live or limit <= 0:
+            return hits
+        avg_length = max(self.total_length / live, 1e-9)
+
+        slot_parts, score_parts = [], []
+        for term, query_weight in query_terms(query).items():
+            posting = self._terms.get(term)
+            if posting is None:
+                continue
+            slots = np.frombuffer(self._posting_slots[posting], dtype=np.int32)
+            tf = np.frombuffer(self._posting_weights[posting], dtype=np.float32)
+            # Stale postings (not compacted yet) are not documents
+            df = int(np.count_nonzero(self.active[slots]))
+            if not df:
+                continue
+            idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[slots] / avg_length)
+            slot_parts.append(slots)
+            score_parts.append(query_weight * idf * tf * (K1 + 1) / (tf + norm))
+        if not slot_parts:
+            return hits
+
+        all_slots, all_scores = np.concatenate(slot_parts), np.concatenate(score_parts)
+        if all_slots.size * 8 < self.size:
+            # Few postings: summing per slot after a sort beats a pass over every slot
+            order = np.argsort(all_slots, kind="stable")
+            all_slots = all_slots[order]
+            starts = np.flatnonzero(np.concatenate(([True], all_slots[1:] != all_slots[:-1])))
+            candidates = all_slots[starts]
+            candidate_scores = np.add.reduceat(all_scores[order], starts)
+        else:
+            scores = np.bincount(all_slots, weights=all_scores)
+            candidates = np.flatnonzero(scores)
+            candidate_scores = scores[candidates]
+        live_candidates = self.active[candidates]
+        candidates, candidate_scores = candidates[live_candidates], candidate_scores[live_candidates]
+        candidate_types = self.types[candidates]
+        for code in wanted:
+            of_type = candidate_types == code
+            matches, match_scores = candidates[of_type], candidate_scores[of_type]
+            if matches.size == 0:
+                continue
+            if matches.size > limit:
+                top = np.argpartition(-match_scores, limit - 1)[:limit]
+                matches, match_scores = matches[top], match_scores[top]
+            order = np.argsort(-match_scores, kind="stable")
+            hits[SEARCH_TYPES[code]] = [(self.keys[matches[i]], round(float(match_scores[i]), 4)) for i in order]
+        return hits
+
+    def report(self) -> Dict[str, Any]:
+        postings = sum(len(p) for p in self._posting_slots)
+        return {
+            "loaded": self.loaded,
+            "documents": len(self.slots),
+            "by_type": {name: int(np.count_nonzero(self.active[:self.size] & (self.types[:self.size] == code)))
+                        for code, name in enumerate(SEARCH_TYPES)},
+            "terms": len(self._terms),
+            "postings": postings,
+            "stale_slots": self.size - len(self.slots),
+            "posting_bytes": postings * 8,
+        }
+
+
+async def fetch_hits(
+    db,
+    type_name: str,
+    hits: List[Tuple[str, float]],
+    projection: Dict[str, Any],
+    max_time_ms: Optional[int] = None,
+    source: Optional[SearchSource] = None,
+) -> List[Dict[str, Any]]:
+    """The documents behind one type's hits, in rank order, each with its `relevance`"""
+    if not hits:
+        return []
+    source = source or SOURCES[type_name]
+    keys: List[Any] = [key for key, _ in hits]
+    if source.key == "_id":
+        keys = [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+    query = {source.key: {"$in": keys}, **source.query}
+    # Hits are matched back to their scores by key
+    if any(value not in (0, False) for field, value in projection.items() if field != "_id"):
+        projection = {**projection, source.key: 1}
+    cursor = db[source.collection].find(query, projection)
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+    docs = await cursor.to_list(len(keys))
+    scores = dict(hits)
+    for doc in docs:
+        doc["relevance"] = scores.get(str(doc.get(source.key)), 0.0)
+    docs.sort(key=lambda doc: -doc["relevance"])
+    return docs
+
+
+# Shared instance for the apps in this process
+index = SearchIndex()
@@ -0,0 +1,438 @@
+"""
+Typeahead for 18 Cricket Network
+Prefix suggestions for the search box from an in-memory sorted-prefix index:
+the distinct words of product, player, ground and team names in one sorted
+list, each with its listings ordered heaviest first (rating plus popularity).
+A prefix is a bisect to a run of words, and the top N come from a k-way merge
+of those words' lists; one- and two-letter prefixes, which match too many words
+to merge per keystroke, read each type's heaviest entries from a cache filled
+at load.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import heapq
+import logging
+import math
+import re
+import sys
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def _count(value: Any) -> float:
+    if isinstance(value, (list, tuple)):
+        return float(len(value))
+    return float(value) if isinstance(value, (int, float)) else 0.0
+
+
+class TypeaheadSource(NamedTuple):
+    collection: str
+    key: str
+    # Fields whose words are indexed; the first is the suggestion text
+    fields: Tuple[str, ...]
+    # Popularity signal: a count whose log is added to the rating
+    popularity: Callable[[Dict[str, Any]], float]
+    query: Dict[str, Any] = {}
+
+
+SOURCES: Dict[str, TypeaheadSource] = {
+    "products": TypeaheadSource("products", "id", ("name", "brand"), lambda doc: _count(doc.get("reviews_count"))),
+    "players": TypeaheadSource(
+        "users", "_id", ("name",),
+        lambda doc: 20.0 if doc.get("verification_type") == "official" else 5.0 if doc.get("is_verified") else 0.0,
+        {"user_type": "player"},
+    ),
+    "grounds": TypeaheadSource("grounds", "id", ("name",), lambda doc: _count(doc.get("reviews_count"))),
+    "teams": TypeaheadSource("teams", "id", ("name",), lambda doc: _count(doc.get("matches_played")) + _count(doc.get("members"))),
+}
+TYPEAHEAD_TYPES = tuple(SOURCES)
+# Fields the weights are computed from, read alongside each source's own
+WEIGHT_FIELDS = ("rating", "reviews_count", "matches_played", "members", "is_verified", "verification_type")
+
+MAX_SUGGESTIONS = 20
+# Prefixes up to this long have their heaviest entries of each type cached
+CACHED_PREFIX_LENGTH = 2
+CACHED_SUGGESTIONS = 50
+# Entries looked at for one query before giving up on filters (other words, types)
+MAX_SCAN = 5_000
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def words(text: Any) -> List[str]:
+    """Folded words of a name: "Gray-Nicolls Légend" -> ["gray", "nicolls", "legend"]"""
+    if not isinstance(text, str):
+        return []
+    decomposed = unicodedata.normalize("NFKD", text)
+    return _WORD.findall("".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold())
+
+
+def entry_weight(source: TypeaheadSource, doc: Dict[str, Any]) -> float:
+    rating = doc.get("rating")
+    rating = float(rating) if isinstance(rating, (int, float)) else 0.0
+    return rating + math.log1p(max(0.0, source.popularity(doc)))
+
+
+class PrefixIndex:
+    """
+    Entries live in parallel arrays indexed by entry number; removed
+    numbers are reused. Each word's posting array keeps its entries in
+    descending weight, so the heaviest match under a prefix is always at
+    the head of one of the prefix's posting arrays.
+    """
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self.postings: Dict[str, array] = {}
+        self.types = array("b")
+        self.weights = array("f")
+        self.keys: List[Optional[str]] = []
+        self.texts: List[Optional[str]] = []
+        self.words: List[Tuple[str, ...]] = []
+        self.slots: Dict[Tuple[int, str], int] = {}
+        self._free: List[int] = []
+        # (prefix, type code) -> heaviest entries; keys in _complete hold every match
+        self._cache: Dict[Tuple[str, int], List[int]] = {}
+        self._complete: Set[Tuple[str, int]] = set()
+        self.loaded = False
+        self._pending: Optional[List[Tuple[str, str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _heavier_first(self, entry: int) -> float:
+        return -self.weights[entry]
+
+    # ==================== WRITES ====================
+
+    def upsert(self, type_name: str, doc: Dict[str, Any]):
+        if self._pending is not None:
+            self._pending.append(("upsert", type_name, doc))
+        source = SOURCES[type_name]
+        key = doc.get(source.key)
+        if key is None:
+            return
+        key = str(key)
+        self._remove(type_name, key)
+        if any(doc.get(field) != value for field, value in source.query.items()):
+            return
+        entry_words = tuple(dict.fromkeys(word for field in source.fields for word in words(doc.get(field))))
+        if not entry_words:
+            return
+        entry = self._allocate(type_name, key, doc.get(source.fields[0]), entry_words, entry_weight(source, doc))
+        for word in entry_words:
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = array("i")
+                insort(self.terms, word)
+            insort(posting, entry, key=self._heavier_first)
+        self._touch(entry)
+
+    def remove(self, type_name: str, key: Any):
+        if self._pending is not None:
+            self._pending.append(("remove", type_name, key))
+        self._remove(type_name, str(key))
+
+    def _allocate(self, type_name: str, key: str, text: Any, entry_words: Tuple[str, ...], weight: float) -> int:
+        type_code = TYPEAHEAD_TYPES.index(type_name)
+        text = text if isinstance(text, str) else " ".join(entry_words)
+        if self._free:
+            entry = self._free.pop()
+            self.types[entry], self.weights[entry] = type_code, weight
+            self.keys[entry], self.texts[entry], self.words[entry] = key, text, entry_words
+        else:
+            entry = len(self.keys)
+            self.types.append(type_code)
+            self.weights.append(weight)
+            self.keys.append(key)
+            self.texts.append(text)
+            self.words.append(entry_words)
+        self.slots[(type_code, key)] = entry
+        return entry
+
+    def _remove(self, type_name: str, key: str):
+        entry = self.slots.pop((TYPEAHEAD_TYPES.index(type_name), key), None)
+        if entry is None:
+            return
+        self._touch(entry, removed=True)
+        heavier = self._heavier_first(entry)
+        for word in self.words[entry]:
+            posting = self.postings[word]
+            # The posting is ordered by weight: bisect to the entry's run of equal weights
+            position = bisect_left(posting, heavier, key=self._heavier_first)
+            while posting[position] != entry:
+                position += 1
+            del posting[position]
+            if not posting:
+                del self.postings[word]
+                del self.terms[bisect_left(self.terms, word)]
+        self.keys[entry] = self.texts[entry] = None
+        self.words[entry] = ()
+        self._free.append(entry)
+
+    def _touch(self, entry: int, removed: bool = False):
+        """Keep the cached short-prefix lists right for an added or removed entry"""
+        type_code, weight = self.types[entry], self.weights[entry]
+        prefixes = {word[:length] for word in self.words[entry] for length in range(1, CACHED_PREFIX_LENGTH + 1)}
+        for prefix in prefixes:
+            key = (prefix, type_code)
+            cached = self._cache.get(key)
+            if cached is None:
+                continue
+            if removed:
+                if entry in cached:
+                    # The list stays a correct (shorter) top; _cached() refills it once too short
+                    cached.remove(entry)
+            elif key in self._complete or (cached and weight > self.weights[cached[-1]]):
+                insort(cached, entry, key=self._heavier_first)
+                if len(cached) > CACHED_SUGGESTIONS:
+                    del cached[CACHED_SUGGESTIONS:]
+                    self._complete.discard(key)
+
+    def _heads(self, posting: array) -> Tuple[List[List[int]], List[bool]]:
+        """A posting's first CACHED_SUGGESTIONS entries of each type, and whether each type has more"""
+        heads: List[List[int]] = [[] for _ in TYPEAHEAD_TYPES]
+        more = [False] * len(TYPEAHEAD_TYPES)
+        types, full = self.types, 0
+        for entry in posting:
+            type_code = types[entry]
+            if len(heads[type_code]) < CACHED_SUGGESTIONS:
+                heads[type_code].append(entry)
+                if len(heads[type_code]) == CACHED_SUGGESTIONS:
+                    full += 1
+                    if full == len(heads):
+                        break
+            else:
+                more[type_code] = True
+        else:
+            return heads, more
+        return heads, [True] * len(heads)
+
+    def _rank(self, found: Iterable[int], truncated: bool) -> Tuple[List[int], bool]:
+        ranked = sorted(set(found), key=self._heavier_first)
+        return ranked[:CACHED_SUGGESTIONS], not truncated and len(ranked) <= CACHED_SUGGESTIONS
+
+    def _top_entries(self, prefix: str, type_code: int) -> Tuple[List[int], bool]:
+        """Heaviest entries of one type under `prefix`, and whether that is all of them"""
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + "\uffff", lo)
+        found: List[int] = []
+        truncated = False
+        for word in self.terms[lo:hi]:
+            heads, more = self._heads(self.postings[word])
+            found.extend(heads[type_code])
+            truncated = truncated or more[type_code]
+        return self._rank(found, truncated)
+
+    def _cached(self, prefix: str, type_code: int) -> List[int]:
+        key = (prefix, type_code)
+        cached = self._cache.get(key)
+        if cached is None or (key not in self._complete and len(cached) < CACHED_SUGGESTIONS // 2):
+            cached, complete = self._top_entries(prefix, type_code)
+            self._cache[key] = cached
+            if complete:
+                self._complete.add(key)
+            else:
+                self._complete.discard(key)
+        return cached
+
+    def _fill_cache(self):
+        """All short-prefix lists in one pass over the words"""
+        found: Dict[Tuple[str, int], List[int]] = {}
+        truncated: Set[Tuple[str, int]] = set()
+        for word in self.terms:
+            heads, more = self._heads(self.postings[word])
+            for prefix in {word[:length] for length in range(1, CACHED_PREFIX_LENGTH + 1)}:
+                for type_code, entries in enumerate(heads):
+                    # Types without a match get an empty list, so asking for them costs nothing
+                    found.setdefault((prefix, type_code), []).extend(entries)
+                    if more[type_code]:
+                        truncated.add((prefix, type_code))
+        self._cache.clear()
+        self._complete.clear()
+        for key, entries in found.items():
+            self._cache[key], complete = self._rank(entries, key in truncated)
+            if complete:
+                self._complete.add(key)
+
+    # ==================== BULK LOAD ====================
+
+    def _add_unsorted(self, type_name: str, docs: Iterable[Dict[str, Any]]):
+        """Append entries without ordering anything; _finish_bulk() sorts once"""
+        source = SOURCES[type_name]
+        for doc in docs:
+            key = doc.get(source.key)
+            entry_words = tuple(dict.fromkeys(word for field in source.fields for word in words(doc.get(field))))
+            if key is None or not entry_words or (TYPEAHEAD_TYPES.index(type_name), str(key)) in self.slots:
+                continue
+            if any(doc.get(field) != value for field, value in source.query.items()):
+                continue
+            entry = self._allocate(type_name, str(key), doc.get(source.fields[0]), entry_words, entry_weight(source, doc))
+            for word in entry_words:
+                posting = self.postings.get(word)
+                if posting is None:
+                    posting = self.postings[word] = array("i")
+                posting.append(entry)
+
+    def _finish_bulk(self):
+        weights = self.weights
+        for word, posting in self.postings.items():
+            if len(posting) > 1:
+                self.postings[word] = array("i", sorted(posting, key=lambda entry: -weights[entry]))
+        self.terms = sorted(self.postings)
+        self._fill_cache()
+
+    def _adopt(self, fresh: "PrefixIndex"):
+        for name in ("terms", "postings", "types", "weights", "keys", "texts", "words", "slots", "_free", "_cache", "_complete"):
+            setattr(self, name, getattr(fresh, name))
+
+    async def load(self, db, batch_size: int = 5_000):
+        """Rebuild from the collections on a worker thread; writes made meanwhile are replayed"""
+        fresh = PrefixIndex()
+        loop = asyncio.get_running_loop()
+        self._pending = []
+        try:
+            for type_name, source in SOURCES.items():
+                projection = {field: 1 for field in (*source.fields, *WEIGHT_FIELDS, *source.query)}
+                projection[source.key] = 1
+                if source.key != "_id":
+                    projection["_id"] = 0
+                batch: List[Dict[str, Any]] = []
+                async for doc in db[source.collection].find(source.query, projection).batch_size(batch_size):
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        await loop.run_in_executor(None, fresh._add_unsorted, type_name, batch)
+                        batch = []
+                if batch:
+                    await loop.run_in_executor(None, fresh._add_unsorted, type_name, batch)
+            await loop.run_in_executor(None, fresh._finish_bulk)
+            pending, self._pending = self._pending, None
+        except BaseException:
+            self._pending = None
+            raise
+        for op, type_name, value in pending:
+            if op == "upsert":
+                fresh.upsert(type_name, value)
+            else:
+                fresh._remove(type_name, str(value))
+        self._adopt(fresh)
+        self.loaded = True
+        logger.info(f"Typeahead index: {len(self.slots)} entries, {len(self.terms)} words")
+
+    # ==================== QUERIES ====================
+
+    def _merge(self, prefix: str) -> Iterable[int]:
+        """Entries with a word starting with `prefix`, heaviest first (an entry may repeat)"""
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + "\uffff", lo)
+        weights = self.weights
+        heap = []
+        for i in range(lo, hi):
+            posting = self.postings[self.terms[i]]
+            heap.append((-weights[posting[0]], i, 0))
+        heapq.heapify(heap)
+        while heap:
+            _, i, position = heap[0]
+            posting = self.postings[self.terms[i]]
+            yield posting[position]
+            position += 1
+            if position < len(posting):
+                heapq.heapreplace(heap, (-weights[posting[position]], i, position))
+            else:
+                heapq.heappop(heap)
+
+    def _candidates(self, prefix: str, wanted: Optional[Set[int]]) -> Iterable[int]:
+        if len(prefix) > CACHED_PREFIX_LENGTH:
+            return self._merge(prefix)
+        codes = range(len(TYPEAHEAD_TYPES)) if wanted is None else sorted(wanted)
+        cached = list(heapq.merge(*(self._cached(prefix, code) for code in codes), key=self._heavier_first))
+        if all((prefix, code) in self._complete for code in codes):
+            return cached
+        # The cache covers the usual request; rarer filters continue past it
+        return _chain_unique(cached, self._merge(prefix))
+
+    def suggest(self, query: str, types: Optional[Iterable[str]] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Heaviest entries with a word starting with each word of `query`
+        ("virat ko" -> Virat Kohli), optionally of some types only
+        """
+        tokens = words(query)
+        if not tokens:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        wanted = None if types is None else {TYPEAHEAD_TYPES.index(name) for name in types}
+        # The longest word is the most selective one to generate from
+        driver = max(tokens, key=len)
+        others = list(tokens)
+        others.remove(driver)
+
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        for scanned, entry in enumerate(self._candidates(driver, wanted)):
+            if scanned >= MAX_SCAN or len(results) >= limit:
+                break
+            if entry in seen or self.keys[entry] is None:
+                continue
+            seen.add(entry)
+            if wanted is not None and self.types[entry] not in wanted:
+                continue
+            entry_words = self.words[entry]
+            if others and not all(any(word.startswith(token) for word in entry_words) for token in others):
+                continue
+            results.append({
+                "type": TYPEAHEAD_TYPES[self.types[entry]],
+                "id": self.keys[entry],
+                "text": self.texts[entry],
+                "score": round(float(self.weights[entry]), 3),
+            })
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "entries": len(self.slots),
+            "words": len(self.terms),
+            "postings": sum(len(p) for p in self.postings.values()),
+            "cached_prefixes": len(self._cache),
+            "bytes": self.footprint(),
+        }
+
+    def footprint(self, sample: int = 2_000) -> Dict[str, int]:
+        """Approximate bytes held, from exact container sizes and sampled element sizes"""
+        def sampled(values: List[Any]) -> int:
+            if not values:
+                return 0
+            step = max(1, len(values) // sample)
+            picked = [value for value in values[::step] if value is not None]
+            if not picked:
+                return 0
+            return int(sum(sys.getsizeof(value) for value in picked) / len(picked) * len(values))
+
+        terms = sys.getsizeof(self.terms) + sampled(self.terms)
+        postings = sys.getsizeof(self.postings) + sum(sys.getsizeof(p) for p in self.postings.values())
+        entries = (
+            sys.getsizeof(self.types) + sys.getsizeof(self.weights)
+            + sys.getsizeof(self.keys) + sampled(self.keys)
+            + sys.getsizeof(self.texts) + sampled(self.texts)
+            + sys.getsizeof(self.words) + sampled(self.words)
+            + sys.getsizeof(self.slots) + len(self.slots) * sys.getsizeof((0, ""))
+        )
+        # Word strings are shared between `terms`, `postings` keys and entries
+        return {"terms": terms, "postings": postings, "entries": entries, "total": terms + postings + entries}
+
+
+def _chain_unique(first: List[int], rest: Iterable[int]) -> Iterable[int]:
+    yield from first
+    seen = set(first)
+    for entry in rest:
+        if entry not in seen:
+            seen.add(entry)
+            yield entry
+
+
+# Shared instance for the apps in this process
+typeahead = PrefixIndex()
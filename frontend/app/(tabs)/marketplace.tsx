@@ -29,7 +29,7 @@ interface Product {
   category: string;
   price: number;
   original_price?: number;
-  stock: number;
+  stock?: number;
   images: string[];
   brand?: string;
   vendor_name: string;
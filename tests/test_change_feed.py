@@ -0,0 +1,275 @@
+"""
+Change feed, on scripted streams over mongomock-motor and against a real
+MongoDB replica set. For the latter set CHANGE_FEED_MONGO_URL to a replica
+set, e.g. a single node started with `mongod --replSet rs0` and
+`rs.initiate()`, and connect with
+mongodb://localhost:27017/?replicaSet=rs0&directConnection=true
+"""
+
+from pathlib import Path
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+from bson import Timestamp
+from pymongo.errors import OperationFailure
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from change_feed import NOT_A_REPLICA_SET, ChangeFeed  # noqa: E402
+from text_search import SearchIndex  # noqa: E402
+
+MONGO_URL = os.environ.get("CHANGE_FEED_MONGO_URL")
+
+replica_set = pytest.mark.skipif(not MONGO_URL, reason="CHANGE_FEED_MONGO_URL (a replica set) is not set")
+
+
+async def wait_for(condition, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting for change events"
+        await asyncio.sleep(0.05)
+
+
+def run_with_db(test):
+    async def run():
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(MONGO_URL)
+        db = client[f"change_feed_{uuid.uuid4().hex[:8]}"]
+        try:
+            await test(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(run())
+
+
+@replica_set
+def test_batches_reset_and_checkpoint_resume():
+    async def test(db):
+        received, resets = [], []
+
+        async def handler(events):
+            received.extend(events)
+
+        async def reset():
+            resets.append(await db.items.count_documents({}))
+
+        await db.items.insert_one({"id": "before", "name": "loaded by the reset"})
+        feed = ChangeFeed("test", batch_size=10, max_wait=0.1)
+        feed.subscribe("items", ["items"], handler, ["id", "name"], reset)
+        feed.start(db)
+        assert await feed.maintains(["items"])
+        assert resets == [1]
+
+        await db.items.insert_many([{"id": f"i{n}", "name": f"item {n}", "image": "x" * 1000} for n in range(25)])
+        await db.items.update_one({"id": "i0"}, {"$set": {"name": "renamed"}})
+        await db.items.delete_one({"id": "i1"})
+        await wait_for(lambda: len(received) == 27)
+
+        assert [event.operation for event in received[-2:]] == ["update", "delete"]
+        assert received[-2].doc["name"] == "renamed"
+        # Only subscribed fields cross the wire
+        assert "image" not in received[0].doc
+        assert feed.streams["items"].batches >= 3
+        await wait_for(lambda: feed.streams["items"].saved_token is not None)
+        await feed.stop()
+
+        # Writes made while stopped are delivered from the checkpoint, earlier ones are not
+        received.clear()
+        await db.items.insert_one({"id": "while-stopped", "name": "late"})
+        feed = ChangeFeed("test", batch_size=10, max_wait=0.1)
+        feed.subscribe("items", ["items"], handler, ["id", "name"], reset)
+        feed.start(db)
+        await wait_for(lambda: len(received) >= 1)
+        await feed.stop()
+        assert [event.doc["id"] for event in received] == ["while-stopped"]
+        assert len(resets) == 2
+
+    run_with_db(test)
+
+
+@replica_set
+def test_failed_batch_is_delivered_again():
+    async def test(db):
+        attempts = []
+
+        async def flaky(events):
+            attempts.append([event.doc["id"] for event in events])
+            if len(attempts) == 1:
+                raise RuntimeError("handler down")
+
+        feed = ChangeFeed("flaky", batch_size=10, max_wait=0.1)
+        feed.subscribe("items", ["items"], flaky, ["id"])
+        feed.start(db)
+        assert await feed.maintains(["items"])
+        await db.items.insert_one({"id": "a"})
+        await wait_for(lambda: len(attempts) >= 2)
+        await feed.stop()
+        assert attempts[0] == attempts[1] == ["a"]
+        assert feed.streams["items"].errors == 1
+
+    run_with_db(test)
+
+
+# ==================== SCRIPTED STREAMS ====================
+
+class ScriptedStream:
+    """What watch() opens: the collection's scripted changes, then nothing; an exception in the script is raised"""
+
+    def __init__(self, script):
+        self.script = script
+        self.resume_token = {"_data": "start"}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def try_next(self):
+        if self.script:
+            change = self.script.pop(0)
+            if isinstance(change, Exception):
+                raise change
+            self.resume_token = change["_id"]
+            return change
+        await asyncio.sleep(0.01)
+        return None
+
+
+class ScriptedCollection:
+    def __init__(self, streams, name):
+        self._streams, self._name = streams, name
+
+    def watch(self, pipeline, **options):
+        self._streams.watched.append((self._name, options.get("resume_after")))
+        failures = self._streams.failures.get(self._name)
+        if failures:
+            raise failures.pop(0)
+        return ScriptedStream(self._streams.scripts.setdefault(self._name, []))
+
+    def __getattr__(self, name):
+        return getattr(self._streams.db[self._name], name)
+
+
+class ScriptedStreams:
+    """A mongomock-motor database whose collections stream scripted changes"""
+
+    def __init__(self, db):
+        self.db = db
+        self.scripts = {}
+        self.failures = {}
+        self.watched = []
+        self.sequence = 0
+
+    def __getitem__(self, name):
+        return ScriptedCollection(self, name)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    async def command(self, *args, **kwargs):
+        raise OperationFailure("no pre-images here")
+
+    def change(self, collection, operation, doc):
+        self.sequence += 1
+        change = {
+            "_id": {"_data": f"{self.sequence:08d}"},
+            "operationType": operation,
+            "documentKey": {"_id": doc["_id"]},
+            "fullDocument": None if operation == "delete" else doc,
+            "clusterTime": Timestamp(int(time.time()), 1),
+        }
+        self.scripts.setdefault(collection, []).append(change)
+        return change
+
+
+def run_with_streams(test):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        await test(ScriptedStreams(mongomock_motor.AsyncMongoMockClient()["feed"]))
+
+    asyncio.run(run())
+
+
+def search_feed(db, index, resets):
+    async def apply(events):
+        for event in events:
+            if event.deleted:
+                index.remove("products", event.document_id)
+            else:
+                index.upsert("products", event.doc)
+
+    async def reset():
+        resets.append(1)
+        await index.load(db)
+
+    feed = ChangeFeed("test", batch_size=10, max_wait=0.05)
+    feed.subscribe("search", ["products"], apply, ["id", "name", "brand", "reviews_count"], reset)
+    return feed
+
+
+def test_dispatch_and_reset_without_a_replica_set():
+    async def test(db):
+        await db.products.insert_one({"_id": "p1", "id": "p1", "name": "Kookaburra Kahuna Bat"})
+        index, resets = SearchIndex(), []
+        feed = search_feed(db, index, resets)
+        feed.start(db)
+        assert await feed.maintains(["products"]) and feed.live(["products"])
+        # The reset loaded what was there before the stream opened
+        assert resets == [1] and index.search("kahuna")["products"][0][0] == "p1"
+
+        last = db.change("products", "insert", {"_id": "p2", "id": "p2", "name": "SG Club Ball"})
+        for count in range(30):
+            db.change("products", "update", {"_id": "p1", "id": "p1", "name": "Kookaburra Kahuna Bat", "reviews_count": count})
+        db.change("products", "update", {"_id": "p2", "id": "p2", "name": "SG Test Ball"})
+        last = db.change("products", "delete", {"_id": "p1"})
+        await wait_for(lambda: feed.streams["products"].events == 33)
+        await wait_for(lambda: feed.streams["products"].saved_token == last["_id"])
+        await feed.stop()
+
+        assert feed.streams["products"].batches >= 4
+        assert index.search("kahuna")["products"] == []
+        assert [key for key, _ in index.search("test ball")["products"]] == ["p2"]
+        # Counter updates left the indexed text alone: nothing to go stale
+        assert index.report()["stale_slots"] <= 2
+        assert (await db.change_feed_checkpoints.find_one({"_id": "test:products"}))["token"] == last["_id"]
+
+    run_with_streams(test)
+
+
+def test_lost_resume_token_rebuilds():
+    async def test(db):
+        await db.products.insert_one({"_id": "p1", "id": "p1", "name": "Gray-Nicolls Legend"})
+        await db.change_feed_checkpoints.insert_one({"_id": "test:products", "token": {"_data": "saved"}})
+        index, resets = SearchIndex(), []
+        db.scripts["products"] = [OperationFailure("resume point lost", code=286)]
+        feed = search_feed(db, index, resets)
+        feed.start(db)
+        await wait_for(lambda: len(db.watched) == 2 and feed.live(["products"]), timeout=5)
+        await feed.stop()
+        # Resumed from the checkpoint, lost it, and started over with a second rebuild
+        assert db.watched == [("products", {"_data": "saved"}), ("products", None)]
+        assert resets == [1, 1] and feed.streams["products"].errors == 1
+
+    run_with_streams(test)
+
+
+def test_standalone_server_leaves_rebuilds_to_the_caller():
+    async def test(db):
+        resets = []
+        db.failures["products"] = [OperationFailure("not a replica set", code=NOT_A_REPLICA_SET)]
+        feed = search_feed(db, SearchIndex(), resets)
+        feed.start(db)
+        assert not await feed.maintains(["products"])
+        assert not feed.live(["products"]) and feed.streams["products"].status == "unavailable"
+        assert resets == []
+        await feed.stop()
+
+    run_with_streams(test)
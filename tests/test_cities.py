@@ -0,0 +1,39 @@
+"""
+City keys and autocomplete (cities.py)
+"""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from cities import CITY_KEY_FIELD, autocomplete, city_filter, city_key, city_key_update, with_city_key  # noqa: E402
+
+
+def test_spellings_of_a_city_share_a_key():
+    for name in ("Bengaluru", "bangalore", " BENGALURU ", "Bangalore, Karnataka", "Bengaluru (KA)", "Bengaluru Urban"):
+        assert city_key(name) == "bengaluru", name
+    assert city_key("Navi Mumbai") == "navi mumbai" != city_key("Mumbai")
+    assert city_key("Pondichéry") == "pondichery" and city_key("Puducherry") == city_key("Pondicherry")
+    # A filter is an exact key, not a substring
+    assert city_key("Punewadi") != city_key("Pune")
+    assert city_key("") is city_key("  ,") is city_key(None) is None
+    assert city_filter("Bombay") == {CITY_KEY_FIELD: "mumbai"}
+
+
+def test_writes_keep_the_key_in_step():
+    assert with_city_key({"city": "Calcutta"})[CITY_KEY_FIELD] == "kolkata"
+    assert CITY_KEY_FIELD not in with_city_key({"city": "", CITY_KEY_FIELD: "kolkata"})
+    assert city_key_update({"$set": {"city": "Madras"}}) == {"$set": {"city": "Madras", CITY_KEY_FIELD: "chennai"}}
+    assert city_key_update({"$set": {"city": None}}) == {"$set": {"city": None}, "$unset": {CITY_KEY_FIELD: ""}}
+    assert city_key_update({"$set": {"name": "Oval"}}) == {"$set": {"name": "Oval"}}
+
+
+def test_autocomplete_matches_current_and_former_names():
+    assert autocomplete("bom") == [{"city": "Mumbai", "key": "mumbai", "matched": "Bombay"}]
+    assert [entry["city"] for entry in autocomplete("Ban")] == ["Varanasi", "Bengaluru"]
+    # One entry per city even when several of its names match
+    assert [entry["city"] for entry in autocomplete("b")].count("Bengaluru") == 1
+    assert [entry["city"] for entry in autocomplete("mu")] == ["Mumbai"]
+    assert len(autocomplete("a", limit=3)) == 3
+    assert autocomplete("") == autocomplete("--") == autocomplete("zz") == []
@@ -0,0 +1,99 @@
+"""
+Single-flight request coalescing (coalesce.py)
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from coalesce import SingleFlight  # noqa: E402
+
+
+class Query:
+    """A database call that stays in flight until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return {"call": self.calls}
+
+
+def test_concurrent_reads_share_one_call():
+    async def run():
+        flight, query = SingleFlight(), Query()
+        query.release = asyncio.Event()
+        waiters = [asyncio.create_task(flight.do("grounds", "pune", query)) for _ in range(5)]
+        await asyncio.sleep(0)
+        query.release.set()
+        results = await asyncio.gather(*waiters)
+        assert query.calls == 1 and all(result is results[0] for result in results)
+        # Without a TTL the next read runs its own call
+        assert await flight.do("grounds", "pune", query) == {"call": 2}
+        stats = flight.report()["routes"]["grounds"]
+        assert stats["executed"] == 2 and stats["joined"] == 4 and stats["coalescing_ratio"] == round(1 - 2 / 6, 4)
+        assert flight.report()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_a_caller_going_away_does_not_cancel_the_others():
+    async def run():
+        flight, query = SingleFlight(), Query()
+        query.release = asyncio.Event()
+        leaving = asyncio.create_task(flight.do("grounds", "pune", query))
+        staying = asyncio.create_task(flight.do("grounds", "pune", query))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        query.release.set()
+        assert await staying == {"call": 1}
+        assert leaving.cancelled() and query.calls == 1
+
+    asyncio.run(run())
+
+
+def test_results_are_cached_for_the_ttl_and_errors_never():
+    async def run():
+        flight, calls = SingleFlight(), []
+
+        async def failing():
+            calls.append("failing")
+            raise RuntimeError("primary stepped down")
+
+        async def load():
+            calls.append("load")
+            return len(calls)
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await flight.do("scores", "m1", failing, ttl=60)
+        assert await flight.do("scores", "m1", load, ttl=60) == 3
+        assert await flight.do("scores", "m1", load, ttl=60) == 3
+        assert calls == ["failing", "failing", "load"]
+        assert flight.report()["routes"]["scores"]["cached"] == 1
+
+    asyncio.run(run())
+
+
+def test_cached_keys_are_bounded():
+    async def run():
+        flight = SingleFlight(max_entries=3)
+
+        async def load():
+            return "rows"
+
+        for n in range(10):
+            await flight.do("teams", n, load, ttl=60)
+        assert flight.report()["cached_keys"] == 3
+        await flight.do("teams", 9, load, ttl=60)
+        assert flight.routes["teams"].cached == 1
+
+    asyncio.run(run())
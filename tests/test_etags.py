@@ -0,0 +1,93 @@
+"""
+Conditional GET (etags.py) against mongomock-motor
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+from fastapi import HTTPException
+from starlette.requests import Request
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from etags import (  # noqa: E402
+    bump_collection_version, conditional_document, conditional_list, etag_matches, make_etag,
+    versioned_insert, versioned_update,
+)
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def get(path: str, query: str = "", if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+
+def test_if_none_match():
+    etag = make_etag("grounds", "g1", 3)
+    assert etag == make_etag("grounds", "g1", 3) != make_etag("grounds", "g1", 4)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag_matches(get("/", if_none_match=etag), etag)
+    # Weak comparison, lists and the wildcard
+    assert etag_matches(get("/", if_none_match=f'"other", W/{etag}'), etag)
+    assert etag_matches(get("/", if_none_match="*"), etag)
+    assert not etag_matches(get("/", if_none_match='"other"'), etag)
+    assert not etag_matches(get("/"), etag)
+
+
+def test_list_is_revalidated_from_the_collection_version():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["etags"]
+        loads = []
+
+        async def load():
+            loads.append(1)
+            return await db.grounds.find({}, {"_id": 0}).to_list(100)
+
+        await db.grounds.insert_one(versioned_insert({"id": "g1", "name": "Oval Maidan"}))
+        first = await conditional_list(get("/api/grounds", "city=Mumbai"), db, "grounds", load)
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+
+        again = await conditional_list(get("/api/grounds", "city=Mumbai", etag), db, "grounds", load)
+        assert again.status_code == 304 and again.headers["etag"] == etag and len(loads) == 1
+        # Another query string is another representation
+        other = await conditional_list(get("/api/grounds", "city=Pune", etag), db, "grounds", load)
+        assert other.status_code == 200
+
+        await db.grounds.insert_one(versioned_insert({"id": "g2", "name": "Cross Maidan"}))
+        await bump_collection_version(db, "grounds")
+        changed = await conditional_list(get("/api/grounds", "city=Mumbai", etag), db, "grounds", load)
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert b"Cross Maidan" in changed.body
+
+    asyncio.run(run())
+
+
+def test_document_is_revalidated_from_its_version():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["etags"]
+        await db.products.insert_one(versioned_insert({"id": "bat", "name": "Kahuna", "stock": 4,
+                                                       "holds": [{"r": "o1", "q": 1}], "reserved": 1}))
+        first = await conditional_document(get("/api/products/bat"), db.products, "bat", "Product not found")
+        etag = first.headers["etag"]
+        # Reservation bookkeeping is not part of the body
+        assert b"holds" not in first.body and b"reserved" not in first.body and b'"stock":4' in first.body
+
+        cached = await conditional_document(get("/api/products/bat", if_none_match=etag), db.products, "bat", "Product not found")
+        assert cached.status_code == 304
+
+        await db.products.update_one({"id": "bat"}, versioned_update({"$set": {"name": "Kahuna Pro"}}))
+        changed = await conditional_document(get("/api/products/bat", if_none_match=etag), db.products, "bat", "Product not found",
+                                             wrap=lambda doc: {"product": doc})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert b'{"product":' in changed.body and b"Kahuna Pro" in changed.body
+
+        for header in (None, etag):
+            with pytest.raises(HTTPException) as raised:
+                await conditional_document(get("/api/products/ball", if_none_match=header), db.products, "ball", "Product not found")
+            assert raised.value.status_code == 404
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+"""
+Cursor-paginated feed and chat routes (server.py, api_main.py) against mongomock-motor
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from pagination import NEXT_CURSOR_HEADER  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def apps(monkeypatch):
+    # Enough environment to import the apps without a reachable database
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "feed_test")
+    from fastapi.testclient import TestClient
+    import api_main
+    import server
+
+    db = mongomock_motor.AsyncMongoMockClient()["feed"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(api_main, "db", db)
+    api_main.app.dependency_overrides[api_main.get_current_user] = lambda: {"id": "u1"}
+
+    async def seed():
+        # Pairs share a created_at, so the id tie-breaker is exercised
+        await db.posts.insert_many([
+            {"id": f"post{n:02}", "post_type": "reel" if n % 2 else "photo", "is_archived": False,
+             "created_at": START - timedelta(minutes=n // 2)}
+            for n in range(12)
+        ])
+        await db.chat_threads.insert_one({"id": "t1", "participants": ["u1", "u2"]})
+        await db.chat_messages.insert_many([
+            {"id": f"m{n:02}", "thread_id": "t1", "created_at": START + timedelta(seconds=n)} for n in range(7)
+        ])
+
+    asyncio.run(seed())
+    yield TestClient(server.app), TestClient(api_main.app)
+    api_main.app.dependency_overrides.pop(api_main.get_current_user)
+
+
+def test_feeds_page_by_cursor(apps):
+    client, _ = apps
+    for path, expected in [("/api/posts", 12), ("/api/reels", 6)]:
+        seen, cursor = [], None
+        while True:
+            response = client.get(path, params={"limit": 4, **({"cursor": cursor} if cursor else {})})
+            assert response.status_code == 200, response.text
+            seen += [post["id"] for post in response.json()]
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+        assert len(seen) == len(set(seen)) == expected
+
+
+def test_chat_messages_page_by_cursor(apps):
+    _, client = apps
+    seen, cursor = [], None
+    while True:
+        params = {"page_size": 3, **({"cursor": cursor} if cursor else {})}
+        data = client.get("/api/v1/chat/threads/t1/messages", params=params).json()["data"]
+        seen += [message["id"] for message in data["messages"]]
+        cursor = data["next_cursor"]
+        if not data["has_more"]:
+            break
+    assert seen == [f"m{n:02}" for n in reversed(range(7))]
+
+
+@pytest.mark.parametrize("app, path, params", [
+    (0, "/api/posts", {"skip": 50}),
+    (0, "/api/reels", {"skip": 0}),
+    (1, "/api/v1/chat/threads/t1/messages", {"page": 2}),
+])
+def test_offset_paging_is_rejected(apps, app, path, params):
+    # Served page one on every call, an old client would scroll forever
+    response = apps[app].get(path, params=params)
+    assert response.status_code == 400
+    body = response.json()
+    # api_main wraps errors in its own envelope
+    assert "cursor" in body.get("detail", body.get("error"))
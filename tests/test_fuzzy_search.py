@@ -0,0 +1,72 @@
+"""
+Typo-tolerant name index (fuzzy_search.py)
+"""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from fuzzy_search import FuzzyIndex, distance, spelling  # noqa: E402
+from text_search import COMPACT_MIN_STALE  # noqa: E402
+
+PLAYERS = [
+    {"_id": "u1", "name": "Virat Kohli"},
+    {"_id": "u2", "name": "MS Dhoni"},
+    {"_id": "u3", "name": "Mohammed Shami"},
+]
+
+
+def roster() -> FuzzyIndex:
+    index = FuzzyIndex()
+    for doc in PLAYERS:
+        index.upsert("users", doc)
+    index.upsert("teams", {"id": "t1", "name": "Mumbai Indians"})
+    return index
+
+
+def keys(hits):
+    return [key for key, _ in hits]
+
+
+def test_transliterations_match():
+    index = roster()
+    assert spelling("dhony") == spelling("dhoni")
+    assert keys(index.search("Dhony")["users"]) == ["u2"]
+    assert keys(index.search("Muhammad Shami")["users"]) == ["u3"]
+    assert keys(index.search("kholi")["users"]) == ["u1"]
+    assert index.search("Mumbay", types=["teams"]) == {"teams": [("t1", index.search("Mumbay")["teams"][0][1])]}
+    assert distance("kohli", "kohli", 1.0) == 0.0
+
+
+def test_unchanged_names_are_not_reindexed():
+    index = roster()
+    for matches in range(5_000):
+        index.upsert("teams", {"id": "t1", "name": "Mumbai Indians", "matches_played": matches})
+    assert index.report()["stale_slots"] == 0
+    assert keys(index.search("mumbai")["teams"]) == ["t1"]
+
+
+def test_renames_are_compacted():
+    index = roster()
+    for n in range(3 * COMPACT_MIN_STALE):
+        index.upsert("teams", {"id": "t1", "name": f"Mumbai Indians {n}"})
+    report = index.report()
+    assert report["stale_slots"] <= COMPACT_MIN_STALE and report["names"] == 4
+    # Words of the old names went with their slots
+    assert report["words"] < 3 * COMPACT_MIN_STALE
+    assert keys(index.search("mumbai")["teams"]) == ["t1"]
+    assert keys(index.search("Virat Kohli")["users"]) == ["u1"]
+
+
+def test_compaction_keeps_results():
+    index = roster()
+    index.upsert("users", {"_id": "u1", "name": "Virat Kohli Jr"})
+    index.remove("users", "u2")
+    before = index.search("kohli"), index.search("shami")
+    index.compact()
+    assert index.report()["stale_slots"] == 0
+    assert (index.search("kohli"), index.search("shami")) == before
+    assert index.search("dhoni")["users"] == []
+    index.upsert("users", PLAYERS[1])
+    assert keys(index.search("dhoni")["users"]) == ["u2"]
@@ -0,0 +1,69 @@
+"""
+Viewport tiling (geo_tiles.cover_viewport) and the tile cache
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from geo import geohash_encode  # noqa: E402
+from geo_tiles import MAX_TILES, TileCache, cover_viewport  # noqa: E402
+
+
+def test_whole_world_falls_back_to_precision_one():
+    precision, tiles = cover_viewport(-90, -180, 90, 180)
+    assert precision == 1 and len(tiles) == 32
+
+
+def test_zoomed_out_viewport_is_covered():
+    precision, tiles = cover_viewport(-60, -170, 75, 170)
+    assert precision == 1 and tiles
+    for lat, lon in [(18.93, 72.83), (51.5, -0.12), (-33.9, 151.2), (40.7, -74.0)]:
+        assert geohash_encode(lat, lon, 1) in tiles
+
+
+def test_city_viewport_uses_fine_tiles():
+    precision, tiles = cover_viewport(18.9, 72.8, 19.1, 73.0)
+    assert precision > 1 and 0 < len(tiles) <= MAX_TILES
+    assert any(geohash_encode(19.0, 72.9, precision).startswith(tile) for tile in tiles)
+
+
+def test_antimeridian_viewport_covers_both_sides():
+    precision, tiles = cover_viewport(-20, 170, -10, -170)
+    assert geohash_encode(-15, 175, precision) in tiles
+    assert geohash_encode(-15, -175, precision) in tiles
+
+
+def test_tile_cache_invalidation():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    def ground(ground_id, lat, lon):
+        return {"id": ground_id, "name": ground_id, "latitude": lat, "longitude": lon, "geohash": geohash_encode(lat, lon)}
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["tiles"]
+        cache = TileCache()
+        wankhede, eden = ground("wankhede", 18.9389, 72.8258), ground("eden", 22.5646, 88.3433)
+        await db.grounds.insert_many([dict(wankhede), dict(eden)])
+        mumbai, kolkata = wankhede["geohash"][:5], eden["geohash"][:5]
+        assert [item["id"] for item in await cache.get(db, "grounds", mumbai)] == ["wankhede"]
+        assert len(await cache.get(db, "grounds", kolkata)) == 1
+
+        brabourne = ground("brabourne", 18.9322, 72.8264)
+        await db.grounds.insert_one(dict(brabourne))
+        assert len(await cache.get(db, "grounds", mumbai)) == 1
+        # A listing's write drops the tiles holding it, not the others
+        cache.invalidate("grounds", brabourne["geohash"])
+        assert len(await cache.get(db, "grounds", mumbai)) == 2
+        assert cache.report()["tiles"] == 2 and cache.misses == 3
+
+        await db.grounds.delete_many({})
+        # Without a geohash (an update seen without its pre-image) the whole collection goes
+        cache.invalidate("grounds")
+        assert await cache.get(db, "grounds", mumbai) == [] and await cache.get(db, "grounds", kolkata) == []
+
+    asyncio.run(run())
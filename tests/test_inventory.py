@@ -0,0 +1,147 @@
+"""
+Stock reservations (inventory.py) run against mongomock-motor
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+from fastapi import HTTPException
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import inventory  # noqa: E402
+from etags import collection_version  # noqa: E402
+from inventory import RESERVATIONS, AlreadyCommitted, OutOfStock  # noqa: E402
+from projections import FULL_PROJECTIONS, build_projection  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def run_with_catalog(test, stock):
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["inventory"]
+        await db.products.insert_many([{"id": product_id, "stock": count, "version": 1}
+                                       for product_id, count in stock.items()])
+        await test(db)
+
+    asyncio.run(run())
+
+
+async def product(db, product_id):
+    return await db.products.find_one({"id": product_id}, {"_id": 0})
+
+
+def test_checkouts_never_oversell():
+    async def test(db):
+        # Every checkout wants a ball, and there are three
+        results = await asyncio.gather(
+            *(inventory.reserve(db, f"r{n}", [("bat", 1), ("ball", 1)]) for n in range(5)),
+            return_exceptions=True,
+        )
+        held = [result for result in results if not isinstance(result, Exception)]
+        short = [result for result in results if isinstance(result, OutOfStock)]
+        assert len(held) == 3 and len(short) == 2
+        assert all(error.product_ids == ["ball"] for error in short)
+        ball, bat = await product(db, "ball"), await product(db, "bat")
+        assert ball["stock"] == 0 and ball["reserved"] == 3
+        # The bat lines of the rejected checkouts were given back
+        assert bat["stock"] == 7 and bat["reserved"] == 3 and len(bat["holds"]) == 3
+
+    run_with_catalog(test, {"bat": 10, "ball": 3})
+
+
+def test_short_line_releases_the_rest():
+    async def test(db):
+        with pytest.raises(OutOfStock) as raised:
+            await inventory.reserve(db, "r1", [("bat", 2), ("pads", 1), ("ball", 4)])
+        assert raised.value.product_ids == ["ball"]
+        for product_id, stock in {"bat": 5, "pads": 2, "ball": 3}.items():
+            doc = await product(db, product_id)
+            assert doc["stock"] == stock and doc.get("reserved", 0) == 0 and not doc.get("holds")
+        assert (await db[RESERVATIONS].find_one({"_id": "r1"}))["status"] == "out_of_stock"
+
+    run_with_catalog(test, {"bat": 5, "pads": 2, "ball": 3})
+
+
+def test_retried_reservation_holds_once():
+    async def test(db):
+        await inventory.reserve(db, "r1", [("bat", 2), ("bat", 1)])
+        await inventory.reserve(db, "r1", [("bat", 3)])
+        bat = await product(db, "bat")
+        assert bat["stock"] == 2 and bat["holds"] == [{"r": "r1", "q": 3}]
+
+    run_with_catalog(test, {"bat": 5})
+
+
+def test_commit_keeps_the_stock_sold():
+    async def test(db):
+        await inventory.reserve(db, "r1", [("bat", 2)])
+        assert "expires_at" in await db[RESERVATIONS].find_one({"_id": "r1"})
+        assert await inventory.commit(db, "r1")
+        reservation = await db[RESERVATIONS].find_one({"_id": "r1"})
+        # Out of reach of the TTL index
+        assert reservation["status"] == "committed" and "expires_at" not in reservation
+        bat = await product(db, "bat")
+        assert bat["stock"] == 3 and bat["reserved"] == 0 and bat["holds"] == []
+        # Sold stock is not put back, and a retried payment commits nothing new
+        assert await inventory.release(db, "r1") == 0
+        assert await inventory.commit(db, "r1")
+        assert (await product(db, "bat"))["stock"] == 3
+        with pytest.raises(AlreadyCommitted):
+            await inventory.reserve(db, "r1", [("bat", 2)])
+
+    run_with_catalog(test, {"bat": 5})
+
+
+def test_expired_reservation_is_not_committed():
+    async def test(db):
+        await inventory.reserve(db, "r1", [("bat", 2)])
+        await db[RESERVATIONS].delete_one({"_id": "r1"})
+        assert not await inventory.commit(db, "r1")
+
+    run_with_catalog(test, {"bat": 5})
+
+
+def test_sweep_restocks_deleted_reservations():
+    async def test(db):
+        await inventory.reserve(db, "paid", [("bat", 1)])
+        await inventory.reserve(db, "abandoned", [("bat", 2), ("ball", 1)])
+        # What the TTL index does once expires_at passes
+        await db[RESERVATIONS].delete_one({"_id": "abandoned"})
+        assert await inventory.sweep(db) == 1
+        bat, ball = await product(db, "bat"), await product(db, "ball")
+        assert bat["stock"] == 4 and bat["holds"] == [{"r": "paid", "q": 1}]
+        assert ball["stock"] == 1 and ball["reserved"] == 0
+        assert await inventory.sweep(db) == 0
+
+    run_with_catalog(test, {"bat": 5, "ball": 1})
+
+
+def test_checkout_leaves_list_versions_alone():
+    async def test(db):
+        # Selling out and restocking included: lists do not carry stock
+        await inventory.reserve(db, "r1", [("bat", 1), ("ball", 1)])
+        await inventory.release(db, "r1")
+        await inventory.reserve(db, "r2", [("ball", 1)])
+        assert await collection_version(db, "products") == 0
+        # Detail ETags still follow every hold
+        assert (await product(db, "bat"))["version"] == 3
+
+    run_with_catalog(test, {"bat": 5, "ball": 1})
+
+
+def test_holds_stay_out_of_product_reads():
+    async def test(db):
+        await inventory.reserve(db, "someone-else", [("bat", 1)])
+        doc = await db.products.find_one({"id": "bat"}, FULL_PROJECTIONS["products"])
+        assert doc == {"id": "bat", "stock": 4, "version": 2, "updated_at": doc["updated_at"]}
+        listed = await db.products.find_one({"id": "bat"}, build_projection("products", "all"))
+        assert listed == {"id": "bat", "version": 2, "updated_at": doc["updated_at"]}
+        assert "stock" not in build_projection("products")
+        for fields in ("id,holds.r", "id,stock"):
+            with pytest.raises(HTTPException):
+                build_projection("products", fields)
+
+    run_with_catalog(test, {"bat": 5})
@@ -0,0 +1,132 @@
+"""
+Payment gateway outbox (order_outbox.py) run against mongomock-motor
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import inventory  # noqa: E402
+from inventory import RESERVATIONS  # noqa: E402
+from order_outbox import OUTBOX_FIELD, OUTBOX_MAX_ATTEMPTS, claim, deliver, outbox_entry  # noqa: E402
+from payment_gateway import GatewayError  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class Gateway:
+    """PaymentGateway.create_order over a dict; `fates` are errors to raise, in order"""
+
+    def __init__(self, *fates: GatewayError):
+        self.fates = list(fates)
+        self.orders = {}
+        self.calls = []
+
+    async def create_order(self, amount, receipt, notes=None, check_existing=False):
+        self.calls.append(check_existing)
+        if check_existing and receipt in self.orders:
+            return self.orders[receipt]
+        if self.fates:
+            raise self.fates.pop(0)
+        created = {"id": f"order_{len(self.calls)}", "amount": amount, "receipt": receipt}
+        self.orders[receipt] = created
+        return created
+
+
+def run_with_order(test, attempts=0):
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["outbox"]
+        await db.products.insert_one({"id": "bat", "stock": 5})
+        await inventory.reserve(db, "o1", [("bat", 2)])
+        entry = {**outbox_entry(499.0), "attempts": attempts}
+        await db.orders.insert_one({"id": "o1", "payment_status": "pending", "order_status": "placed",
+                                    OUTBOX_FIELD: entry})
+        await test(db)
+
+    asyncio.run(run())
+
+
+async def stored(db):
+    return await db.orders.find_one({"id": "o1"}, {"_id": 0})
+
+
+def test_expired_lease_is_reclaimed():
+    async def test(db):
+        gateway = Gateway()
+        # A worker that leased the entry, made the gateway order and died before recording it
+        first = await claim(db, lease=-1)
+        await gateway.create_order(first[OUTBOX_FIELD]["amount"], "o1")
+        second = await claim(db)
+        assert second[OUTBOX_FIELD]["attempts"] == 2
+        assert second[OUTBOX_FIELD]["claim"] != first[OUTBOX_FIELD]["claim"]
+        assert await deliver(db, gateway, second) == "done"
+        # The retry found the order by its receipt instead of making another
+        assert gateway.calls == [False, True] and len(gateway.orders) == 1
+        order = await stored(db)
+        assert order["razorpay_order_id"] == gateway.orders["o1"]["id"]
+        assert order[OUTBOX_FIELD]["status"] == "done"
+        assert await claim(db) is None
+
+    run_with_order(test)
+
+
+def test_live_lease_is_not_reclaimed():
+    async def test(db):
+        assert await claim(db) is not None
+        assert await claim(db) is None
+
+    run_with_order(test)
+
+
+def test_lost_lease_cannot_overwrite_its_successor():
+    async def test(db):
+        stale = await claim(db, lease=-1)
+        current = await claim(db)
+        assert await deliver(db, Gateway(), current) == "done"
+        recorded = (await stored(db))["razorpay_order_id"]
+        # Late success and late failure alike leave the successor's result alone
+        assert await deliver(db, Gateway(), stale) == "lost"
+        assert await deliver(db, Gateway(GatewayError("Bad request", retryable=False, status=400)), stale) == "lost"
+        order = await stored(db)
+        assert order["razorpay_order_id"] == recorded and order[OUTBOX_FIELD]["status"] == "done"
+        assert order["payment_status"] == "pending" and order["order_status"] == "placed"
+        assert (await db.products.find_one({"id": "bat"}))["stock"] == 3
+
+    run_with_order(test)
+
+
+def test_retryable_error_backs_off():
+    async def test(db):
+        order = await claim(db)
+        assert await deliver(db, Gateway(GatewayError("Gateway returned 503", retryable=True, status=503)), order) == "retry"
+        entry = (await stored(db))[OUTBOX_FIELD]
+        assert entry["status"] == "pending" and entry["attempts"] == 1 and "503" in entry["last_error"]
+        # Not due again until the backoff has passed
+        assert await claim(db) is None
+        assert (await db.products.find_one({"id": "bat"}))["stock"] == 3
+
+    run_with_order(test)
+
+
+@pytest.mark.parametrize("attempts, error", [
+    (OUTBOX_MAX_ATTEMPTS - 1, GatewayError("Gateway returned 503", retryable=True, status=503)),
+    (0, GatewayError("The amount must be atleast INR 1.00", retryable=False, status=400)),
+])
+def test_failed_delivery_cancels_the_order_and_releases_its_stock(attempts, error):
+    async def test(db):
+        order = await claim(db)
+        assert await deliver(db, Gateway(error), order) == "failed"
+        order = await stored(db)
+        assert order[OUTBOX_FIELD]["status"] == "failed"
+        assert order["payment_status"] == "failed" and order["order_status"] == "cancelled"
+        assert "razorpay_order_id" not in order
+        bat = await db.products.find_one({"id": "bat"})
+        assert bat["stock"] == 5 and bat["holds"] == []
+        assert (await db[RESERVATIONS].find_one({"_id": "o1"}))["status"] == "released"
+        assert await claim(db) is None
+
+    run_with_order(test, attempts)
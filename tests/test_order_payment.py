@@ -0,0 +1,98 @@
+"""
+Marking an order paid (server.py payment-success) against mongomock-motor
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import inventory  # noqa: E402
+from inventory import RESERVATIONS  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+ORDER = {"id": "o1", "user_id": "u1", "items": [{"product_id": "bat", "quantity": 2}],
+         "payment_status": "pending", "order_status": "placed"}
+
+
+@pytest.fixture
+def checkout(monkeypatch):
+    # Enough environment to import the app without a reachable database
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "payment_test")
+    from fastapi.testclient import TestClient
+    import server
+
+    db = mongomock_motor.AsyncMongoMockClient()["checkout"]
+    monkeypatch.setattr(server, "db", db)
+    server.app.dependency_overrides[server.get_current_user] = lambda: {"_id": "u1", "user_type": "player"}
+
+    async def seed():
+        await db.products.insert_one({"id": "bat", "stock": 5})
+        await inventory.reserve(db, "o1", [("bat", 2)])
+        await db.orders.insert_one(dict(ORDER))
+
+    asyncio.run(seed())
+    yield TestClient(server.app), db
+    server.app.dependency_overrides.pop(server.get_current_user)
+
+
+def pay(client):
+    return client.post("/api/orders/o1/payment-success", json={"razorpay_payment_id": "pay_1"})
+
+
+def state(db):
+    async def read():
+        order = await db.orders.find_one({"id": "o1"})
+        return order, (await db.products.find_one({"id": "bat"}))["stock"]
+
+    return asyncio.run(read())
+
+
+def test_retried_payment_is_still_a_success(checkout):
+    client, db = checkout
+    assert pay(client).status_code == 200
+    assert pay(client).status_code == 200
+    order, stock = state(db)
+    assert order["payment_status"] == "paid" and order["order_status"] == "confirmed" and stock == 3
+
+
+def test_committed_reservation_of_an_unpaid_order(checkout):
+    client, db = checkout
+    # An earlier call committed, then failed before marking the order paid
+    assert asyncio.run(inventory.commit(db, "o1"))
+    assert pay(client).status_code == 200
+    order, stock = state(db)
+    assert order["payment_status"] == "paid" and stock == 3
+
+
+def test_expired_reservation_takes_the_stock_again(checkout):
+    client, db = checkout
+
+    async def expire():
+        await db[RESERVATIONS].delete_one({"_id": "o1"})
+        await inventory.sweep(db)
+
+    asyncio.run(expire())
+    assert state(db)[1] == 5
+    assert pay(client).status_code == 200
+    order, stock = state(db)
+    assert order["payment_status"] == "paid" and stock == 3
+
+
+def test_expired_reservation_without_stock_is_refunded(checkout):
+    client, db = checkout
+
+    async def sell_out():
+        await db[RESERVATIONS].delete_one({"_id": "o1"})
+        await inventory.sweep(db)
+        await inventory.reserve(db, "someone-else", [("bat", 4)])
+
+    asyncio.run(sell_out())
+    assert pay(client).status_code == 409
+    order, stock = state(db)
+    assert order["payment_status"] == "refund_pending" and stock == 1
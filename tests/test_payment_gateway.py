@@ -0,0 +1,110 @@
+"""
+Payment gateway client against the in-process fake gateway (fake_gateway.py)
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import payment_gateway  # noqa: E402
+from fake_gateway import FakeGateway  # noqa: E402
+from payment_gateway import GatewayError, PaymentGateway  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(payment_gateway, "BACKOFF_SECONDS", 0.01)
+
+
+def run_with_gateway(test, **fake_options):
+    async def run():
+        fake = FakeGateway(latency=0.01, seed=18, **fake_options)
+        url = await fake.start()
+        client = PaymentGateway(fake.key_id, fake.key_secret, url, timeout=0.5, connect_timeout=0.5, max_connections=4)
+        try:
+            await test(fake, client)
+        finally:
+            await client.close()
+            await fake.stop()
+
+    asyncio.run(run())
+
+
+def test_creates_an_order_per_receipt():
+    async def test(fake, client):
+        created = await client.create_order(49_900, "order-1", notes={"order_id": "order-1"})
+        assert created["id"].startswith("order_") and created["amount"] == 49_900
+        assert (await client.find_order("order-1"))["id"] == created["id"]
+        assert await client.find_order("order-2") is None
+        # Asked again for the same receipt, the existing order comes back
+        again = await client.create_order(49_900, "order-1", check_existing=True)
+        assert again["id"] == created["id"] and len(fake.orders) == 1
+
+    run_with_gateway(test)
+
+
+def test_retries_server_errors():
+    async def test(fake, client):
+        fake.script = ["error", "error"]
+        created = await client.create_order(10_000, "order-retry")
+        assert created["receipt"] == "order-retry" and len(fake.orders) == 1
+
+    run_with_gateway(test)
+
+
+def test_timed_out_create_is_not_duplicated():
+    async def test(fake, client):
+        # The first create hangs past the client timeout, then completes on the gateway anyway
+        fake.script = ["hang"]
+        created = await client.create_order(25_000, "order-slow")
+        # The retry looked the receipt up instead of creating a second order
+        assert len(fake.orders) == 1 and created["id"] in fake.orders
+
+    run_with_gateway(test, hang_seconds=0.6)
+
+
+def test_client_errors_are_not_retried():
+    async def test(fake, client):
+        with pytest.raises(GatewayError) as raised:
+            await client.create_order(50, "order-tiny")
+        assert raised.value.status == 400 and not raised.value.retryable
+        assert fake.requests == 1
+
+    run_with_gateway(test)
+
+
+def test_bad_credentials_fail_for_good():
+    async def test(fake, client):
+        wrong = PaymentGateway(fake.key_id, "wrong", client.base_url)
+        try:
+            with pytest.raises(GatewayError) as raised:
+                await wrong.create_order(10_000, "order-auth")
+        finally:
+            await wrong.close()
+        assert raised.value.status == 401 and not raised.value.retryable and fake.requests == 1
+
+    run_with_gateway(test)
+
+
+def test_exhausted_retries_raise_retryable():
+    async def test(fake, client):
+        fake.script = ["error"] * (client.retries + 1)
+        with pytest.raises(GatewayError) as raised:
+            await client.create_order(10_000, "order-down")
+        assert raised.value.retryable and not fake.orders
+
+    run_with_gateway(test)
+
+
+def test_connections_are_pooled_and_bounded():
+    async def test(fake, client):
+        await asyncio.gather(*(client.create_order(10_000, f"order-{n}") for n in range(40)))
+        assert len(fake.orders) == 40
+        # max_connections=4: the rest queued for a pooled connection
+        assert fake.peak_in_flight <= 4
+
+    run_with_gateway(test)
@@ -0,0 +1,141 @@
+"""
+Product listing planner (product_listing.py), keyset cursors (pagination.py)
+and the storefront listing route, run against mongomock-motor
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
+import random
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from pagination import encode_sort_cursor, sort_keyset_query  # noqa: E402
+from product_listing import choose_index, plan_listing  # noqa: E402
+from query_compiler import with_search_words  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_products(count: int = 60):
+    rng = random.Random(18)
+    start = datetime(2026, 1, 1)
+    return [
+        with_search_words("products", {
+            "id": f"p{n:03}",
+            "name": f"{brand} bat {n}",
+            "brand": brand,
+            "category": category,
+            # Few distinct values, so the id tie-breaker matters
+            "price": float(rng.choice([300, 800, 2000, 7000])),
+            "is_used": n % 5 == 0,
+            "rating": rng.choice([3.5, 4.0, 4.5]),
+            "reviews_count": rng.randint(0, 5),
+            "created_at": start - timedelta(hours=n % 7),
+            "vendor_id": f"v{n % 3}",
+        })
+        for n, (brand, category) in enumerate(
+            (rng.choice(["SG", "SS", "MRF"]), rng.choice(["bats", "balls"])) for _ in range(count)
+        )
+    ]
+
+
+def test_choose_index_prefers_the_longest_equality_prefix():
+    assert choose_index(set(), "price").name == "price_1_id_1"
+    assert choose_index({"category"}, "created_at").name == "category_1_created_at_-1_id_-1"
+    assert choose_index({"category", "brand"}, "price").name == "category_1_brand_1_price_1_id_1"
+    # Equality on a field no index puts before the sort field: sort index alone
+    assert choose_index({"vendor_id"}, "rating").name == "rating_-1_id_-1"
+    assert choose_index(set(), "stock") is None
+
+
+def test_plan_listing():
+    plan = plan_listing(category="bats", brand="SG", sort_by="price", order="asc")
+    assert plan.query == {"category": "bats", "brand": "SG"}
+    assert plan.index.name == "category_1_brand_1_price_1_id_1"
+    assert plan.sort == [("price", 1), ("id", 1)] and not plan.hot
+
+    landing = plan_listing(category="bats")
+    assert landing.hot and landing.field == "created_at" and landing.direction == -1
+
+    used = plan_listing(condition="new", min_price=500, max_price=5000)
+    assert used.query == {"is_used": False, "price": {"$gte": 500, "$lte": 5000}}
+
+    # A search brings its own index
+    assert plan_listing(search="kookaburra", sort_by="rating").index is None
+
+    with pytest.raises(HTTPException) as raised:
+        plan_listing(sort_by="colour")
+    assert raised.value.status_code == 400
+
+
+def test_sort_keyset_query_pages_without_gaps_or_repeats():
+    docs = make_products()
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["listing"]
+        await db.products.insert_many([dict(doc) for doc in docs])
+        for field, direction in [("price", 1), ("price", -1), ("created_at", -1)]:
+            seen, cursor = [], None
+            while True:
+                query = sort_keyset_query({"category": "bats"}, field, direction, cursor)
+                page = await db.products.find(query).sort([(field, direction), ("id", direction)]).limit(7).to_list(7)
+                seen += [doc["id"] for doc in page]
+                if len(page) < 7:
+                    break
+                cursor = encode_sort_cursor(page[-1], field)
+            expected = sorted((doc for doc in docs if doc["category"] == "bats"),
+                              key=lambda doc: (doc[field], doc["id"]), reverse=direction < 0)
+            assert seen == [doc["id"] for doc in expected]
+
+    asyncio.run(run())
+
+
+def test_cursor_of_another_sort_is_rejected():
+    cursor = encode_sort_cursor({"id": "p001", "rating": 4.5}, "rating")
+    with pytest.raises(HTTPException) as raised:
+        sort_keyset_query({}, "price", 1, cursor)
+    assert raised.value.status_code == 400
+
+
+@pytest.fixture
+def storefront(monkeypatch):
+    # Enough environment to import the app without a reachable database
+    # Always set: a configured (e.g. SRV) URL would be resolved at import
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "listing_test")
+    from fastapi.testclient import TestClient
+    import api_main
+    import api_marketplace
+
+    db = mongomock_motor.AsyncMongoMockClient()["storefront"]
+    monkeypatch.setattr(api_marketplace, "db", db)
+    return TestClient(api_main.app), db
+
+
+def test_listing_route_is_served_by_api_main(storefront):
+    client, db = storefront
+    docs = make_products()
+    asyncio.run(db.products.insert_many([dict(doc) for doc in docs]))
+
+    seen, cursor = [], None
+    while True:
+        params = {"category": "bats", "sort_by": "price", "order": "asc", "page_size": 9}
+        response = client.get("/api/v1/products", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        data = response.json()["data"]
+        seen += [product["id"] for product in data["products"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    bats = [doc for doc in docs if doc["category"] == "bats"]
+    assert seen == [doc["id"] for doc in sorted(bats, key=lambda doc: (doc["price"], doc["id"]))]
+    assert data["plan"]["index"] == "category_1_price_1_id_1"
+    assert data["total"] == len(bats)
+    # Facets count each dimension under the other filters only
+    categories = {row["value"]: row["count"] for row in data["facets"]["category"]}
+    assert categories == {"bats": len(bats), "balls": len(docs) - len(bats)}
@@ -0,0 +1,110 @@
+"""
+In-memory proximity engine (proximity.py)
+"""
+
+from pathlib import Path
+import asyncio
+import math
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from proximity import EARTH_RADIUS_KM, ProximityEngine, ProximityIndex, listing_price  # noqa: E402
+
+MUMBAI = (19.0760, 72.8777)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def make_grounds(count: int = 300):
+    rng = random.Random(18)
+    return [
+        {"id": f"g{n:03}", "latitude": MUMBAI[0] + rng.uniform(-0.5, 0.5), "longitude": MUMBAI[1] + rng.uniform(-0.5, 0.5),
+         "pricing": {"hourly": rng.choice([500, 1500, 4000])}, "rating": rng.choice([3.0, 4.0, 5.0])}
+        for n in range(count)
+    ]
+
+
+def test_nearest_matches_brute_force():
+    grounds = make_grounds()
+    # Starts small, so the arrays have to grow
+    index = ProximityIndex("grounds", capacity=8)
+    for doc in grounds:
+        index.upsert(doc)
+    hits = index.nearest(*MUMBAI, radius_km=25, k=10)
+    expected = sorted((haversine(*MUMBAI, doc["latitude"], doc["longitude"]), doc["id"]) for doc in grounds)
+    expected = [(doc_id, distance) for distance, doc_id in expected if distance <= 25][:10]
+    assert [hit["id"] for hit in hits] == [doc_id for doc_id, _ in expected]
+    assert [hit["distance_km"] for hit in hits] == pytest.approx([distance for _, distance in expected], abs=0.01)
+    assert index.nearest(0.0, 0.0, radius_km=100) == []
+
+
+def test_blended_score_and_filters():
+    index = ProximityIndex("grounds")
+    index.upsert({"id": "near-dear", "latitude": 19.08, "longitude": 72.88, "pricing": {"hourly": 4000}, "rating": 3.0})
+    index.upsert({"id": "far-cheap", "latitude": 19.20, "longitude": 72.88, "pricing": {"hourly": 500, "daily": 3000}, "rating": 5.0})
+    index.upsert({"id": "unpriced", "latitude": 19.10, "longitude": 72.88})
+    assert [hit["id"] for hit in index.nearest(*MUMBAI, radius_km=20)] == ["near-dear", "unpriced", "far-cheap"]
+    blended = index.nearest(*MUMBAI, radius_km=20, weights={"distance": 0.2, "price": 1.0, "rating": 1.0})
+    assert [hit["id"] for hit in blended] == ["far-cheap", "near-dear", "unpriced"]
+    assert [hit["id"] for hit in index.nearest(*MUMBAI, radius_km=20, max_price=1000)] == ["far-cheap"]
+    assert [hit["id"] for hit in index.nearest(*MUMBAI, radius_km=20, min_rating=4)] == ["far-cheap"]
+    assert listing_price({"pricing": {"hourly": 500, "daily": 3000, "note": "ask"}}) == 500
+    assert math.isnan(listing_price({}))
+
+
+def test_moves_and_removals_reuse_slots():
+    index = ProximityIndex("grounds")
+    index.upsert({"id": "g1", "latitude": 19.08, "longitude": 72.88})
+    index.upsert({"id": "g2", "latitude": 19.09, "longitude": 72.88})
+    index.upsert({"id": "g1", "latitude": 28.61, "longitude": 77.21})
+    assert [hit["id"] for hit in index.nearest(*MUMBAI, radius_km=20)] == ["g2"]
+    # Coordinates gone or out of range: dropped from the index
+    index.upsert({"id": "g2", "latitude": 190.0, "longitude": 72.88})
+    assert index.nearest(*MUMBAI, radius_km=20) == [] and len(index) == 1
+    index.upsert({"id": "g3", "latitude": 19.08, "longitude": 72.88})
+    assert index.size == 2 and index.slots["g3"] == 1
+    assert set(index.distances(*MUMBAI, ["g1", "g3", "missing"])) == {"g1", "g3"}
+
+
+class Collection:
+    """Just enough of a Motor collection for load(); yields to the loop between documents"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            await asyncio.sleep(0)
+            yield dict(doc)
+
+
+def test_load_replays_writes_made_while_reading():
+    async def run():
+        engine = ProximityEngine(["grounds"])
+        index = engine["grounds"]
+        load = asyncio.create_task(index.load({"grounds": Collection(make_grounds(20))}))
+        await asyncio.sleep(0)
+        # Mid-read: one listing added, one the reader has not reached yet removed
+        engine.upsert("grounds", {"id": "new", "latitude": MUMBAI[0], "longitude": MUMBAI[1]})
+        engine.remove("grounds", "g019")
+        await load
+        assert index.loaded and len(index) == 20
+        assert "new" in index.slots and "g019" not in index.slots
+        assert index.nearest(*MUMBAI, radius_km=1)[0]["id"] == "new"
+        assert engine.report()["grounds"]["listings"] == 20
+
+    asyncio.run(run())
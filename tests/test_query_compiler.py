@@ -0,0 +1,57 @@
+"""
+Search input compilation (query_compiler.py) run against mongomock-motor
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from query_compiler import MAX_TEXT_WORDS, compile_search, search_clause, search_words, with_search_words  # noqa: E402
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+PRODUCTS = [
+    {"id": "p1", "name": "Kookaburra Kahuna Bat", "brand": "Kookaburra", "description": "Grade 1 English willow"},
+    {"id": "p2", "name": "Club Ball", "brand": "SG", "description": "Four-piece leather, ideal for turf nets"},
+    {"id": "p3", "name": "Football", "brand": "Nivia", "description": ""},
+]
+
+
+def find_ids(collection: str, docs, query: str):
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["search"]
+        await db[collection].insert_many([with_search_words(collection, dict(doc)) for doc in docs])
+        found = await db[collection].find(search_clause(collection, query, ("name",))).to_list(None)
+        return sorted(doc.get("id", doc.get("name")) for doc in found)
+
+    return asyncio.run(run())
+
+
+def test_plain_queries_compile_to_words():
+    assert compile_search("Gray-Nicolls Légend") == ["gray", "nicolls", "legend"]
+    assert compile_search("bat $where") is None
+    assert compile_search("a b c d e f") is None
+
+
+def test_word_prefixes_across_name_brand_and_description():
+    assert find_ids("products", PRODUCTS, "kook ba") == ["p1"]
+    assert find_ids("products", PRODUCTS, "willow") == ["p1"]
+    assert find_ids("products", PRODUCTS, "leather turf") == ["p2"]
+    # Words match from their start only
+    assert find_ids("products", PRODUCTS, "ball") == ["p2"]
+
+
+def test_users_are_found_by_phone_prefix():
+    users = [{"name": "Rohit Sharma", "phone": "9876543210"}, {"name": "Rohit Patel", "phone": "9123456780"}]
+    assert find_ids("users", users, "98765") == ["Rohit Sharma"]
+    assert find_ids("users", users, "rohit") == ["Rohit Patel", "Rohit Sharma"]
+
+
+def test_long_descriptions_fold_only_their_opening():
+    description = " ".join(f"word{n}" for n in range(MAX_TEXT_WORDS + 10))
+    found = search_words("products", {"name": "Bat", "description": description})
+    assert "word0" in found and f"word{MAX_TEXT_WORDS - 1}" in found and f"word{MAX_TEXT_WORDS}" not in found
@@ -0,0 +1,103 @@
+"""
+Listing response cache (response_cache.py) with the in-process backend
+"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+from fastapi.responses import Response
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from response_cache import CacheEntry, MemoryBackend, ResponseCache  # noqa: E402
+
+
+def get(path: str, query: str = "", if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+
+class Listing:
+    """A list route's build(); counts the times it ran"""
+
+    def __init__(self, body: bytes = b'[{"id":"a1"}]'):
+        self.body = body
+        self.builds = 0
+
+    async def __call__(self) -> Response:
+        self.builds += 1
+        return Response(content=self.body, media_type="application/json",
+                        headers={"ETag": f'"v{self.builds}"', "X-Request-Id": str(self.builds)})
+
+
+def test_hits_replay_the_rendered_response():
+    async def run():
+        cache, build = ResponseCache(MemoryBackend(), ttl=60), Listing()
+        first = await cache.respond(get("/api/academies", "city=Pune&limit=20"), "academies", "Pune", build)
+        # Query parameters in another order are the same listing
+        hit = await cache.respond(get("/api/academies", "limit=20&city=Pune"), "academies", "Pune", build)
+        assert build.builds == 1 and hit.body == first.body
+        assert hit.headers["etag"] == '"v1"' and "x-request-id" not in hit.headers
+        revalidated = await cache.respond(get("/api/academies", "city=Pune&limit=20", '"v1"'), "academies", "Pune", build)
+        assert revalidated.status_code == 304 and build.builds == 1
+        assert cache.report()["routes"]["/api/academies"] == {"hits": 2, "misses": 1, "hit_rate": round(2 / 3, 4)}
+
+    asyncio.run(run())
+
+
+def test_invalidation_drops_the_city_and_unfiltered_listings():
+    async def run():
+        cache, build = ResponseCache(MemoryBackend(), ttl=60), Listing()
+        queries = {"Mumbai": "city=Mumbai", "Pune": "city=Pune", None: ""}
+        for city, query in queries.items():
+            await cache.respond(get("/api/academies", query), "academies", city, build)
+        await cache.respond(get("/api/tournaments"), "tournaments", None, build)
+        assert build.builds == 4
+
+        # A former name keys as the current one
+        await cache.invalidate("academies", "Bombay")
+        for city, query in queries.items():
+            await cache.respond(get("/api/academies", query), "academies", city, build)
+        assert build.builds == 6
+
+        await cache.invalidate("academies")
+        await cache.respond(get("/api/academies", "city=Pune"), "academies", "Pune", build)
+        await cache.respond(get("/api/tournaments"), "tournaments", None, build)
+        assert build.builds == 7
+
+    asyncio.run(run())
+
+
+def test_a_build_that_raced_a_write_is_not_stored():
+    async def run():
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        build = Listing()
+
+        async def racing_build():
+            response = await build()
+            # The write lands while the listing is being rendered
+            await cache.invalidate("academies", "Pune")
+            return response
+
+        await cache.respond(get("/api/academies", "city=Pune"), "academies", "Pune", racing_build)
+        await cache.respond(get("/api/academies", "city=Pune"), "academies", "Pune", build)
+        assert build.builds == 2
+
+    asyncio.run(run())
+
+
+def test_memory_backend_is_bounded_by_bytes():
+    async def run():
+        backend = MemoryBackend(max_bytes=300)
+        for n in range(5):
+            await backend.set(f"k{n}", CacheEntry(b"x" * 100, {}, ["grounds"], expires_at=float("inf")))
+        assert backend.bytes <= 300 and await backend.get("k0") is None and await backend.get("k4") is not None
+        # Larger than the whole cache: not stored at all
+        await backend.set("huge", CacheEntry(b"x" * 301, {}, ["grounds"], expires_at=float("inf")))
+        assert await backend.get("huge") is None
+        assert await backend.invalidate(["grounds"]) == 3
+        assert backend.bytes == 0 and backend.stats()["entries"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,35 @@
+"""
+Cold-start budget for the API apps
+STARTUP_BUDGET_MS can be raised on slow CI machines
+"""
+
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from profile_startup import LAZY_MODULES, STARTUP_LAZY_MODULES, measure, measure_startup  # noqa: E402
+
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1200"))
+
+
+@pytest.mark.parametrize("module", ["server", "api_main"])
+def test_heavy_sdks_are_not_imported_at_startup(module):
+    result = measure(module, runs=1)
+    assert result["eager_lazy_modules"] == [], f"{module} imports {result['eager_lazy_modules']} eagerly; expected {LAZY_MODULES} to load on first use"
+
+
+@pytest.mark.parametrize("module", ["server", "api_main"])
+def test_cold_import_within_budget(module):
+    result = measure(module, runs=3)
+    assert result["median_ms"] <= STARTUP_BUDGET_MS, f"{module} cold import {result['median_ms']}ms > {STARTUP_BUDGET_MS}ms"
+
+
+@pytest.mark.parametrize("module", ["server", "api_main"])
+def test_startup_handlers_leave_heavy_modules_to_background_tasks(module):
+    result = measure_startup(module)
+    assert result["eager_lazy_modules"] == [], f"{module} startup handlers import {result['eager_lazy_modules']}; expected {STARTUP_LAZY_MODULES} to load after startup"
+    assert result["startup_ms"] <= STARTUP_BUDGET_MS, f"{module} startup handlers took {result['startup_ms']}ms > {STARTUP_BUDGET_MS}ms"
@@ -0,0 +1,80 @@
+"""
+Full-text index (text_search.py): analysis, BM25 ranking and re-indexing
+"""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from text_search import COMPACT_MIN_STALE, SearchIndex  # noqa: E402
+
+PRODUCTS = [
+    {"id": "p1", "name": "Kookaburra Kahuna Bat", "brand": "Kookaburra", "category": "bats"},
+    {"id": "p2", "name": "SG Club Ball", "brand": "SG", "category": "balls"},
+    {"id": "p3", "name": "MRF Genius Grand Bat", "brand": "MRF", "category": "bats"},
+]
+
+
+def catalog() -> SearchIndex:
+    index = SearchIndex()
+    for doc in PRODUCTS:
+        index.upsert("products", doc)
+    return index
+
+
+def test_counter_updates_do_not_grow_the_index():
+    index, once = catalog(), catalog()
+    stream = {"id": "l1", "title": "Nets session", "broadcaster_name": "Mumbai Academy", "is_live": True}
+    once.upsert("livestreams", stream)
+    for viewers in range(10_000):
+        index.upsert("livestreams", {**stream, "viewers": viewers})
+    report = index.report()
+    assert report["stale_slots"] == 0 and report["documents"] == 4
+    assert index.search("bat nets") == once.search("bat nets")
+
+
+def test_renames_are_compacted_and_scores_stay_positive():
+    index = catalog()
+    for n in range(3 * COMPACT_MIN_STALE):
+        index.upsert("livestreams", {"id": "l1", "title": f"Bat flip {n}", "broadcaster_name": "Club", "is_live": True})
+    report = index.report()
+    assert report["stale_slots"] <= COMPACT_MIN_STALE and report["documents"] == 4
+    hits = index.search("bat")
+    assert [key for key, _ in hits["products"]] in (["p1", "p3"], ["p3", "p1"])
+    assert hits["livestreams"][0][0] == "l1"
+    assert all(score > 0 for found in hits.values() for _, score in found)
+    # The latest title is what matches
+    assert index.search(f"flip {3 * COMPACT_MIN_STALE - 1}")["livestreams"][0][0] == "l1"
+
+
+def test_compaction_keeps_results():
+    index = catalog()
+    index.upsert("products", {**PRODUCTS[0], "name": "Kookaburra Ghost Bat"})
+    index.remove("products", "p2")
+    before = index.search("bat kookaburra ball")
+    index.compact()
+    assert index.report()["stale_slots"] == 0 and len(index) == 2
+    assert index.search("bat kookaburra ball") == before
+    index.upsert("products", PRODUCTS[1])
+    assert index.search("ball")["products"][0][0] == "p2"
+
+
+def test_stale_postings_do_not_count_as_documents():
+    index = catalog()
+    fresh = catalog()
+    for _ in range(50):
+        index.upsert("products", {**PRODUCTS[1], "name": "SG Club Ball Red"})
+        index.upsert("products", {**PRODUCTS[1], "name": "SG Club Ball"})
+    assert index.report()["stale_slots"] == 100
+    # Document frequencies are those of the live documents
+    assert index.search("ball") == fresh.search("ball")
+
+
+def test_removed_and_unlisted_documents_leave_results():
+    index = SearchIndex()
+    index.upsert("livestreams", {"id": "l1", "title": "Ranji final live", "broadcaster_name": "BCCI", "is_live": True})
+    assert index.search("ranji")["livestreams"][0][0] == "l1"
+    # No longer matching the source's query: unlisted like a delete
+    index.upsert("livestreams", {"id": "l1", "title": "Ranji final live", "broadcaster_name": "BCCI", "is_live": False})
+    assert index.search("ranji")["livestreams"] == []
@@ -0,0 +1,147 @@
+"""
+Sorted-prefix typeahead (typeahead.py)
+"""
+
+from pathlib import Path
+import asyncio
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from typeahead import CACHED_SUGGESTIONS, PrefixIndex, words  # noqa: E402
+
+DOCS = {
+    "products": [
+        {"id": "p1", "name": "Kookaburra Kahuna Bat", "brand": "Kookaburra", "rating": 4.5, "reviews_count": 500},
+        {"id": "p2", "name": "Gray-Nicolls Légend Bat", "brand": "Gray-Nicolls", "rating": 4.0, "reviews_count": 3},
+    ],
+    "players": [
+        {"_id": "u1", "name": "Virat Kohli", "user_type": "player", "verification_type": "official"},
+        {"_id": "u2", "name": "Virender Sehwag", "user_type": "player"},
+        {"_id": "u3", "name": "Kohli Fan Club", "user_type": "fan"},
+    ],
+    "teams": [{"id": "t1", "name": "Kolkata Knight Riders", "matches_played": 200, "rating": 4.0}],
+}
+
+
+def built() -> PrefixIndex:
+    index = PrefixIndex()
+    for type_name, docs in DOCS.items():
+        for doc in docs:
+            index.upsert(type_name, doc)
+    return index
+
+
+def ids(suggestions):
+    return [suggestion["id"] for suggestion in suggestions]
+
+
+def test_prefixes_suggest_the_heaviest_first():
+    index = built()
+    assert words("Gray-Nicolls Légend") == ["gray", "nicolls", "legend"]
+    assert ids(index.suggest("k")) == ["p1", "t1", "u1"]
+    assert ids(index.suggest("ko")) == ["p1", "t1", "u1"]
+    assert ids(index.suggest("kook")) == ["p1"]
+    # Every word of the query has to match a word of the name
+    assert ids(index.suggest("virat ko")) == ["u1"]
+    assert ids(index.suggest("vir")) == ["u1", "u2"]
+    assert ids(index.suggest("legend")) == ["p2"]
+    # Only players are players; the fan club is not indexed at all
+    assert ids(index.suggest("kohli")) == ["u1"]
+    assert ids(index.suggest("k", types=["teams", "players"])) == ["t1", "u1"]
+    assert ids(index.suggest("k", limit=1)) == ["p1"]
+    assert index.suggest("") == index.suggest("zzz") == []
+
+
+def test_updates_and_removals():
+    index = built()
+    index.upsert("teams", {"id": "t1", "name": "Kolkata Knight Riders", "matches_played": 0, "rating": 0})
+    assert ids(index.suggest("k")) == ["p1", "u1", "t1"]
+    index.upsert("players", {"_id": "u1", "name": "Virat Kohli", "user_type": "fan"})
+    assert ids(index.suggest("vir")) == ["u2"]
+    index.remove("products", "p1")
+    assert ids(index.suggest("ko")) == ["t1"] and "kookaburra" not in index.postings
+    # Removing what is gone is a no-op, and a freed entry is reused
+    index.remove("products", "p1")
+    index.upsert("teams", {"id": "t2", "name": "Kochi Tuskers"})
+    assert len(index) == 4 and len(index.keys) == 5
+
+
+def test_short_prefix_cache_follows_writes():
+    rng = random.Random(18)
+    names = [f"{rng.choice(['Sachin', 'Saurav', 'Sunil', 'Rahul'])} {n}" for n in range(3 * CACHED_SUGGESTIONS)]
+    # Distinct weights, so the order does not depend on how ties were inserted
+    players = [{"_id": f"u{n}", "name": name, "user_type": "player", "is_verified": n % 7 == 0, "rating": n / 100}
+               for n, name in enumerate(names)]
+    index = PrefixIndex()
+    index._add_unsorted("players", players)
+    index._finish_bulk()
+    # Writes after the cache was filled: lighter and heavier entries, removals
+    for doc in players[::3]:
+        index.remove("players", doc["_id"])
+    index.upsert("players", {"_id": "new", "name": "Sachin Baby", "user_type": "player", "rating": 5.0})
+
+    fresh = PrefixIndex()
+    for doc in players:
+        if doc["_id"] not in {d["_id"] for d in players[::3]}:
+            fresh.upsert("players", doc)
+    fresh.upsert("players", {"_id": "new", "name": "Sachin Baby", "user_type": "player", "rating": 5.0})
+    for prefix in ("s", "sa", "su", "r", "sach"):
+        assert ids(index.suggest(prefix, limit=20)) == ids(fresh.suggest(prefix, limit=20)), prefix
+    assert index.suggest("s")[0]["id"] == "new"
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            await asyncio.sleep(0)
+            yield doc
+
+
+class Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return Cursor([doc for doc in self.docs if all(doc.get(k) == v for k, v in query.items())])
+
+
+def test_load_matches_incremental_upserts():
+    db = {
+        "products": Collection(DOCS["products"]),
+        "users": Collection(DOCS["players"]),
+        "grounds": Collection([]),
+        "teams": Collection(DOCS["teams"]),
+    }
+
+    async def run():
+        index = PrefixIndex()
+        load = asyncio.create_task(index.load(db))
+        await asyncio.sleep(0)
+        # Written while loading: replayed on the fresh index
+        index.upsert("grounds", {"id": "g1", "name": "Kotla", "rating": 5.0, "reviews_count": 1_000})
+        await load
+        return index
+
+    index = asyncio.run(run())
+    expected = built()
+    expected.upsert("grounds", {"id": "g1", "name": "Kotla", "rating": 5.0, "reviews_count": 1_000})
+    assert index.loaded and index.report()["entries"] == 6
+    for prefix in ("k", "ko", "kot", "vi", "bat"):
+        assert index.suggest(prefix) == expected.suggest(prefix), prefix
+    assert ids(index.suggest("ko"))[0] == "g1"
+
+
+@pytest.mark.parametrize("query", ["K", "KOHLI", "Légend"])
+def test_queries_are_folded(query):
+    index = built()
+    assert index.suggest(query) == index.suggest(words(query)[0])